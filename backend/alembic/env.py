@@ -18,6 +18,7 @@ load_dotenv()
 from app.models.base import Base
 from app.models.user import User
 from app.models.trip import Trip, Itinerary, ItineraryItem, Expense
+from app.models.poi import Poi, PoiSearchCoverage  # noqa: E402
 
 # this is the Alembic Config object
 config = context.config
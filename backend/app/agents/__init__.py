@@ -2,12 +2,18 @@
 Agent模块
 
 实现各种AI Agent，包括行程规划、费用分析、对话助手等
+
+各Agent在首次访问时才导入（PEP 562），导入本包或其中一个Agent不会连带加载其他Agent的依赖。
 """
 
-from .base_agent import BaseAgent
-from .trip_planner_agent import TripPlannerAgent
-from .budget_analyzer_agent import BudgetAnalyzerAgent
-from .chat_assistant_agent import ChatAssistantAgent
+import importlib
+
+_EXPORTS = {
+    'BaseAgent': '.base_agent',
+    'TripPlannerAgent': '.trip_planner_agent',
+    'BudgetAnalyzerAgent': '.budget_analyzer_agent',
+    'ChatAssistantAgent': '.chat_assistant_agent',
+}
 
 __all__ = [
     'BaseAgent',
@@ -15,3 +21,9 @@ __all__ = [
     'BudgetAnalyzerAgent',
     'ChatAssistantAgent'
 ]
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -36,7 +36,8 @@ class BaseAgent(ABC):
         user_input: str,
         system_prompt: str = None,
         history: List[Dict[str, str]] = None,
-        run_id: str = None
+        run_id: str = None,
+        context: Dict[str, Any] = None
     ) -> AsyncGenerator[str, None]:
         """
         运行Agent
@@ -46,6 +47,7 @@ class BaseAgent(ABC):
             system_prompt: 系统提示词
             history: 对话历史
             run_id: 运行ID
+            context: 前端上下文（如当前行程ID），可选
             
         Yields:
             AG-UI格式的SSE事件流
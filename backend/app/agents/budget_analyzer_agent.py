@@ -11,6 +11,8 @@ from datetime import datetime
 
 from .base_agent import BaseAgent
 from ..services.llm_service import llm_service_instance
+from ..utils.gazetteer import gazetteer
+from ..utils.intent_matcher import intent_matcher
 
 
 class BudgetAnalyzerAgent(BaseAgent):
@@ -31,7 +33,8 @@ class BudgetAnalyzerAgent(BaseAgent):
         user_input: str,
         system_prompt: str = None,
         history: List[Dict[str, str]] = None,
-        run_id: str = None
+        run_id: str = None,
+        context: Dict[str, Any] = None
     ) -> AsyncGenerator[str, None]:
         """
         运行费用分析Agent
@@ -57,7 +60,7 @@ class BudgetAnalyzerAgent(BaseAgent):
             full_response = ""
             
             async for chunk in llm_service_instance.stream_llm_response(
-                user_input, system_prompt, history
+                user_input, system_prompt, history, agent_id=self.agent_id
             ):
                 try:
                     chunk_data = json.loads(chunk)
@@ -145,19 +148,15 @@ class BudgetAnalyzerAgent(BaseAgent):
     
     def _should_query_prices(self, user_input: str) -> bool:
         """判断是否需要查询价格"""
-        price_keywords = [
-            "价格", "费用", "预算", "花费", "成本", "多少钱", "贵不贵",
-            "酒店", "机票", "门票", "交通费", "餐饮费"
-        ]
-        
-        return any(keyword in user_input for keyword in price_keywords)
+        return intent_matcher.scan(user_input).has("price")
     
     async def _call_price_tools(self, user_input: str) -> List[Dict[str, Any]]:
         """调用价格查询工具"""
         tool_results = []
+        matches = intent_matcher.scan(user_input)
         
         # 根据用户输入决定查询哪些价格
-        if any(keyword in user_input for keyword in ["酒店", "住宿"]):
+        if matches.has("hotel_price"):
             call_id = f"hotel_price_{int(datetime.now().timestamp())}"
             tool_result = await self._call_frontend_tool("queryPrice", {
                 "type": "hotel",
@@ -169,7 +168,7 @@ class BudgetAnalyzerAgent(BaseAgent):
                 "result": tool_result
             })
         
-        if any(keyword in user_input for keyword in ["机票", "航班", "交通"]):
+        if matches.has("flight_price"):
             call_id = f"flight_price_{int(datetime.now().timestamp())}"
             tool_result = await self._call_frontend_tool("queryPrice", {
                 "type": "flight",
@@ -181,7 +180,7 @@ class BudgetAnalyzerAgent(BaseAgent):
                 "result": tool_result
             })
         
-        if any(keyword in user_input for keyword in ["门票", "景点", "游玩"]):
+        if matches.has("ticket_price"):
             call_id = f"ticket_price_{int(datetime.now().timestamp())}"
             tool_result = await self._call_frontend_tool("queryPrice", {
                 "type": "ticket",
@@ -196,14 +195,8 @@ class BudgetAnalyzerAgent(BaseAgent):
         return tool_results
     
     def _extract_location_from_input(self, user_input: str) -> str:
-        """从用户输入中提取地点信息"""
-        common_cities = ["北京", "上海", "广州", "深圳", "杭州", "南京", "成都", "西安", "武汉", "重庆"]
-        
-        for city in common_cities:
-            if city in user_input:
-                return city
-        
-        return "北京"
+        """从用户输入中提取地点信息（提到城区或地标时返回所属城市）"""
+        return gazetteer.find_city(user_input) or "北京"
     
     async def _generate_budget_analysis(self, user_input: str, price_results: List[Dict[str, Any]]) -> str:
         """生成预算分析"""
@@ -226,7 +219,7 @@ class BudgetAnalyzerAgent(BaseAgent):
         # 调用LLM生成分析
         analysis_response = ""
         async for chunk in llm_service_instance.stream_llm_response(
-            user_input, analysis_prompt, []
+            user_input, analysis_prompt, [], agent_id=self.agent_id
         ):
             try:
                 chunk_data = json.loads(chunk)
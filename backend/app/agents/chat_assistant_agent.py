@@ -31,7 +31,8 @@ class ChatAssistantAgent(BaseAgent):
         user_input: str,
         system_prompt: str = None,
         history: List[Dict[str, str]] = None,
-        run_id: str = None
+        run_id: str = None,
+        context: Dict[str, Any] = None
     ) -> AsyncGenerator[str, None]:
         """
         运行对话助手Agent
@@ -54,7 +55,7 @@ class ChatAssistantAgent(BaseAgent):
             full_response = ""
             
             async for chunk in llm_service_instance.stream_llm_response(
-                user_input, system_prompt, history
+                user_input, system_prompt, history, agent_id=self.agent_id
             ):
                 try:
                     chunk_data = json.loads(chunk)
@@ -10,8 +10,36 @@ from datetime import datetime
 from typing import Dict, Any, List, AsyncGenerator
 from app.agents.base_agent import BaseAgent
 from app.services.llm_service import llm_service_instance
-from app.utils.tool_definitions import get_all_tools
+from app.core.config import settings
+from app.core.metrics import observe_tool
+from app.core.prompts import register_prompt
+from app.utils.tool_definitions import AGENT_TOOLS
+from app.utils.tool_registry import ToolDispatcher, UnknownToolError
 from app.utils.baidu_map_tools import baidu_map_tools
+from app.utils.gazetteer import gazetteer
+
+# 静态前缀：能力说明与工具调用格式；对话上下文作为动态后缀追加在后面
+SIMPLE_TRIP_PROMPT = register_prompt("simple-trip", "2", """你是一个专业的旅行规划助手。你可以帮助用户：
+
+1. 搜索景点、餐厅、酒店等POI信息
+2. 在地图上标记指定地点
+3. 计算路线和距离
+4. 基于选中的地点规划完整行程
+5. 提供旅行建议和规划
+
+当用户要求"标记"、"在地图上标记"某个地点时，请使用：
+[TOOL_CALL:mark_location:{"location":"地点名称","label":"标记标签","category":"attraction"}]
+
+当用户询问关于地点、景点、餐厅、酒店等信息时，请使用：
+[TOOL_CALL:search_poi:{"keyword":"具体景点名称","city":"城市名称","category":"attraction"}]
+
+当用户询问路线、距离、交通方式时，请使用：
+[TOOL_CALL:calculate_route:{"origin":"起点","destination":"终点","mode":"driving"}]
+
+当用户要求"规划行程"、"生成行程"、"为这些地点规划行程"时，请使用：
+[TOOL_CALL:plan_trip:{"selected_locations":["地点ID1","地点ID2"],"trip_duration":"1天","transport_mode":"mixed"}]
+
+请根据用户的问题，智能地决定是否需要调用工具，并在回复中包含相应的工具调用指令。""")
 
 
 class SimpleTripAgent(BaseAgent):
@@ -22,6 +50,12 @@ class SimpleTripAgent(BaseAgent):
             agent_id="simple-trip-planner",
             agent_name="简化行程规划师"
         )
+        self._tools = ToolDispatcher(AGENT_TOOLS, {
+            "search_poi": self._tool_search_poi,
+            "calculate_route": self._tool_calculate_route,
+            "mark_location": self._tool_mark_location,
+            "plan_trip": self._tool_plan_trip,
+        }, source=self.agent_id)
     
     async def run(
         self, 
@@ -57,7 +91,7 @@ class SimpleTripAgent(BaseAgent):
             system_prompt = self._generate_system_prompt(system_prompt, context)
             
             # 4. 获取工具定义
-            tools = get_all_tools()
+            tools = self._tools.tools
             
             # 5. 先获取完整的LLM回复（不流式发送）
             message_id = f"msg_{int(datetime.now().timestamp())}"
@@ -70,7 +104,7 @@ class SimpleTripAgent(BaseAgent):
             try:
                 # 先收集完整的回复，不流式发送
                 async for chunk in llm_service_instance.stream_llm_response(
-                    user_input, system_prompt, history
+                    user_input, system_prompt, history, agent_id=self.agent_id
                 ):
                     try:
                         chunk_data = json.loads(chunk)
@@ -112,7 +146,10 @@ class SimpleTripAgent(BaseAgent):
                             )
                             
                             # 执行工具调用
-                            result = await self._execute_tool_call(tool_call["name"], tool_call["args"], context)
+                            result = await observe_tool(
+                                tool_call["name"], self.agent_id,
+                                self._execute_tool_call(tool_call["name"], tool_call["args"], context)
+                            )
                             
                             # 发送工具调用结果事件
                             yield self._create_tool_call_result_event(call_id, result)
@@ -180,31 +217,10 @@ class SimpleTripAgent(BaseAgent):
         if custom_prompt:
             return custom_prompt
         
-        base_prompt = """你是一个专业的旅行规划助手。你可以帮助用户：
-
-1. 搜索景点、餐厅、酒店等POI信息
-2. 在地图上标记指定地点
-3. 计算路线和距离
-4. 基于选中的地点规划完整行程
-5. 提供旅行建议和规划
-
-当用户要求"标记"、"在地图上标记"某个地点时，请使用：
-[TOOL_CALL:mark_location:{"location":"地点名称","label":"标记标签","category":"attraction"}]
-
-当用户询问关于地点、景点、餐厅、酒店等信息时，请使用：
-[TOOL_CALL:search_poi:{"keyword":"具体景点名称","city":"城市名称","category":"attraction"}]
-
-当用户询问路线、距离、交通方式时，请使用：
-[TOOL_CALL:calculate_route:{"origin":"起点","destination":"终点","mode":"driving"}]
-
-当用户要求"规划行程"、"生成行程"、"为这些地点规划行程"时，请使用：
-[TOOL_CALL:plan_trip:{"selected_locations":["地点ID1","地点ID2"],"trip_duration":"1天","transport_mode":"mixed"}]
-
-请根据用户的问题，智能地决定是否需要调用工具，并在回复中包含相应的工具调用指令。"""
-        
-        # 添加上下文信息
+        # 上下文信息作为动态后缀
+        context_info = None
         if context:
-            context_info = "\n\n当前对话上下文：\n"
+            context_info = "当前对话上下文：\n"
             
             if context.get("previous_pois"):
                 context_info += f"之前搜索过的POI: {', '.join([poi['name'] for poi in context['previous_pois']])}\n"
@@ -215,10 +231,8 @@ class SimpleTripAgent(BaseAgent):
             
             if context.get("map_markers"):
                 context_info += f"地图上的标记: {', '.join([marker['name'] for marker in context['map_markers']])}\n"
-            
-            base_prompt += context_info
         
-        return base_prompt
+        return SIMPLE_TRIP_PROMPT.render(context_info)
     
     def _parse_tool_calls(self, response: str) -> List[Dict[str, Any]]:
         """解析回复中的工具调用指令"""
@@ -592,11 +606,11 @@ class SimpleTripAgent(BaseAgent):
         try:
             # 首先检查硬编码的映射表
             location_mapping = {
-                "8fde79cc5a98e5c295ca072d": {"name": "天安门广场", "category": "attraction"},
-                "d24e48eb4aac8db4afee7aec": {"name": "故宫博物院", "category": "attraction"},
-                "26cb3536a49343e6f7e73bb2": {"name": "颐和园", "category": "attraction"},
-                "0bd3ec34ea3b725b43afe605": {"name": "天坛公园", "category": "attraction"},
-                "03ff6e2ecd84c091bea24001": {"name": "北海公园", "category": "attraction"},
+                "8fde79cc5a98e5c295ca072d": {"name": "天安门广场", "category": "attraction", "coordinates": {"lat": 39.9151, "lng": 116.4039}},
+                "d24e48eb4aac8db4afee7aec": {"name": "故宫博物院", "category": "attraction", "coordinates": {"lat": 39.9239, "lng": 116.4035}},
+                "26cb3536a49343e6f7e73bb2": {"name": "颐和园", "category": "attraction", "coordinates": {"lat": 40.0056, "lng": 116.2818}},
+                "0bd3ec34ea3b725b43afe605": {"name": "天坛公园", "category": "attraction", "coordinates": {"lat": 39.8884, "lng": 116.4136}},
+                "03ff6e2ecd84c091bea24001": {"name": "北海公园", "category": "attraction", "coordinates": {"lat": 39.9316, "lng": 116.3954}},
             }
             
             if location_id in location_mapping:
@@ -609,7 +623,8 @@ class SimpleTripAgent(BaseAgent):
                     if marker.get("id") == location_id:
                         return {
                             "name": marker.get("name", f"地点{location_id[:8]}"),
-                            "category": marker.get("category", "unknown")
+                            "category": marker.get("category", "unknown"),
+                            "coordinates": marker.get("coordinates")
                         }
             
             # 如果都没有找到，返回一个更友好的默认名称
@@ -647,129 +662,153 @@ class SimpleTripAgent(BaseAgent):
         """执行工具调用"""
         try:
             print(f"DEBUG: Executing tool call: {function_name} with args: {arguments}")
-            
-            if function_name == "search_poi":
-                keyword = arguments.get("keyword", "景点")
-                city = arguments.get("city", "北京")
-                category = arguments.get("category", "attraction")
-                location = arguments.get("location")
-                
-                # 如果有location参数，使用地理编码API获取坐标
-                location_coords = None
-                if location:
-                    # 使用百度地图地理编码API
-                    location_coords = baidu_map_tools.geocode(location)
-                    if not location_coords:
-                        print(f"DEBUG: 地理编码失败，使用城市中心点: {city}")
-                        # 如果地理编码失败，使用城市中心点
-                        city_centers = {
-                            "北京": {"lat": 39.9042, "lng": 116.4074},
-                            "上海": {"lat": 31.2304, "lng": 121.4737},
-                            "广州": {"lat": 23.1291, "lng": 113.2644},
-                            "深圳": {"lat": 22.5431, "lng": 114.0579},
-                            "杭州": {"lat": 30.2741, "lng": 120.1551},
-                            "南京": {"lat": 32.0603, "lng": 118.7969},
-                            "成都": {"lat": 30.5728, "lng": 104.0668},
-                            "武汉": {"lat": 30.5928, "lng": 114.3055}
-                        }
-                        location_coords = city_centers.get(city, city_centers["北京"])
-                
-                result = baidu_map_tools.search_poi(
-                    keyword=keyword,
-                    city=city,
-                    category=category,
-                    location=location_coords,
-                    radius=5000  # 5公里半径
-                )
-                return result.model_dump() if hasattr(result, 'model_dump') else result
-                
-            elif function_name == "calculate_route":
-                origin = arguments.get("origin")
-                destination = arguments.get("destination")
-                mode = arguments.get("mode", "driving")
-                
-                # 先进行地理编码，将地址转换为坐标
-                origin_coords = None
-                destination_coords = None
-                
-                if origin:
-                    origin_coords = baidu_map_tools.geocode(origin)
-                    if not origin_coords:
-                        print(f"DEBUG: 起点地理编码失败: {origin}")
-                        return {"success": False, "error": f"无法找到起点位置: {origin}"}
-                
-                if destination:
-                    destination_coords = baidu_map_tools.geocode(destination)
-                    if not destination_coords:
-                        print(f"DEBUG: 终点地理编码失败: {destination}")
-                        return {"success": False, "error": f"无法找到终点位置: {destination}"}
-                
-                # 使用坐标计算路线
-                result = baidu_map_tools.calculate_route(
-                    origin=f"{origin_coords['lat']},{origin_coords['lng']}",
-                    destination=f"{destination_coords['lat']},{destination_coords['lng']}",
-                    mode=mode
-                )
-                return result.model_dump() if hasattr(result, 'model_dump') else result
-                
-            elif function_name == "mark_location":
-                location = arguments.get("location")
-                label = arguments.get("label", "")
-                category = arguments.get("category", "attraction")
-                
-                # 进行地理编码获取坐标
-                coords = baidu_map_tools.geocode(location)
-                if not coords:
-                    return {"success": False, "error": f"无法找到地点: {location}"}
-                
-                # 生成标记ID
-                marker_id = f"marker_{int(datetime.now().timestamp())}_{uuid.uuid4().hex[:8]}"
-                
-                # 返回标记信息
-                return {
-                    "success": True,
-                    "data": {
-                        "marker_id": marker_id,
-                        "location": location,
-                        "label": label or location,
-                        "category": category,
-                        "coordinates": coords,
-                        "message": f"已在地图上标记: {label or location}"
-                    }
-                }
-                
-            elif function_name == "plan_trip":
-                selected_locations = arguments.get("selected_locations", [])
-                trip_duration = arguments.get("trip_duration", "1天")
-                transport_mode = arguments.get("transport_mode", "mixed")
-                interests = arguments.get("interests", [])
-                
-                if not selected_locations:
-                    return {"success": False, "error": "请先选择要规划的地点"}
-                
-                # 生成行程规划
-                trip_plan = await self._generate_trip_plan(
-                    selected_locations, trip_duration, transport_mode, interests, context
-                )
-                
-                return {
-                    "success": True,
-                    "data": {
-                        "trip_plan": trip_plan,
-                        "selected_locations": selected_locations,
-                        "trip_duration": trip_duration,
-                        "transport_mode": transport_mode,
-                        "interests": interests
-                    }
-                }
-                
-            else:
-                return {"success": False, "error": f"未知的工具: {function_name}"}
-                
+            return await self._tools.dispatch(function_name, arguments, context)
+        except UnknownToolError:
+            return {"success": False, "error": f"未知的工具: {function_name}"}
         except Exception as e:
             print(f"Error executing tool call {function_name}: {e}")
             return {"success": False, "error": str(e)}
     
+    async def _tool_search_poi(self, arguments: Dict[str, Any], context: Dict[str, Any] = None) -> Dict[str, Any]:
+        """搜索POI"""
+        keyword = arguments.get("keyword", "景点")
+        city = arguments.get("city", "北京")
+        category = arguments.get("category", "attraction")
+        location = arguments.get("location")
+        
+        # 如果有location参数，使用地理编码API获取坐标
+        location_coords = None
+        if location:
+            # 使用百度地图地理编码API
+            location_coords = await asyncio.to_thread(baidu_map_tools.geocode, location)
+            if not location_coords:
+                print(f"DEBUG: 地理编码失败，使用城市中心点: {city}")
+                # 如果地理编码失败，使用城市中心点
+                location_coords = gazetteer.city_center(city) or gazetteer.city_center("北京")
+        
+        # 百度地图接口是同步请求，在线程池中执行，工具的超时和并发限制才能生效
+        result = await asyncio.to_thread(
+            baidu_map_tools.search_poi,
+            keyword=keyword,
+            city=city,
+            category=category,
+            location=location_coords,
+            radius=5000  # 5公里半径
+        )
+        return result.model_dump() if hasattr(result, 'model_dump') else result
+    
+    async def _tool_calculate_route(self, arguments: Dict[str, Any], context: Dict[str, Any] = None) -> Dict[str, Any]:
+        """计算路线（先地理编码起终点）"""
+        origin = arguments.get("origin")
+        destination = arguments.get("destination")
+        mode = arguments.get("mode", "driving")
+        
+        # 先进行地理编码，将地址转换为坐标
+        origin_coords = None
+        destination_coords = None
+        
+        if origin:
+            origin_coords = await asyncio.to_thread(baidu_map_tools.geocode, origin)
+            if not origin_coords:
+                print(f"DEBUG: 起点地理编码失败: {origin}")
+                return {"success": False, "error": f"无法找到起点位置: {origin}"}
+        
+        if destination:
+            destination_coords = await asyncio.to_thread(baidu_map_tools.geocode, destination)
+            if not destination_coords:
+                print(f"DEBUG: 终点地理编码失败: {destination}")
+                return {"success": False, "error": f"无法找到终点位置: {destination}"}
+        
+        # 使用坐标计算路线
+        result = await asyncio.to_thread(
+            baidu_map_tools.calculate_route,
+            origin=f"{origin_coords['lat']},{origin_coords['lng']}",
+            destination=f"{destination_coords['lat']},{destination_coords['lng']}",
+            mode=mode,
+            zoom=settings.ROUTE_TOOL_SIMPLIFY_ZOOM
+        )
+        return result.model_dump() if hasattr(result, 'model_dump') else result
+    
+    async def _tool_mark_location(self, arguments: Dict[str, Any], context: Dict[str, Any] = None) -> Dict[str, Any]:
+        """在地图上标记地点"""
+        location = arguments.get("location")
+        label = arguments.get("label", "")
+        category = arguments.get("category", "attraction")
+        
+        # 进行地理编码获取坐标
+        coords = await asyncio.to_thread(baidu_map_tools.geocode, location)
+        if not coords:
+            return {"success": False, "error": f"无法找到地点: {location}"}
+        
+        # 生成标记ID
+        marker_id = f"marker_{int(datetime.now().timestamp())}_{uuid.uuid4().hex[:8]}"
+        
+        # 返回标记信息
+        return {
+            "success": True,
+            "data": {
+                "marker_id": marker_id,
+                "location": location,
+                "label": label or location,
+                "category": category,
+                "coordinates": coords,
+                "message": f"已在地图上标记: {label or location}"
+            }
+        }
+    
+    async def _tool_plan_trip(self, arguments: Dict[str, Any], context: Dict[str, Any] = None) -> Dict[str, Any]:
+        """基于选中的地点生成行程规划"""
+        selected_locations = arguments.get("selected_locations", [])
+        trip_duration = arguments.get("trip_duration", "1天")
+        transport_mode = arguments.get("transport_mode", "mixed")
+        interests = arguments.get("interests", [])
+        
+        if not selected_locations:
+            return {"success": False, "error": "请先选择要规划的地点"}
+        
+        # 生成行程规划
+        trip_plan = await self._generate_trip_plan(
+            selected_locations, trip_duration, transport_mode, interests, context
+        )
+        
+        return {
+            "success": True,
+            "data": {
+                "trip_plan": trip_plan,
+                "selected_locations": selected_locations,
+                "trip_duration": trip_duration,
+                "transport_mode": transport_mode,
+                "interests": interests
+            }
+        }
+    
+    async def _estimate_legs(self, location_infos: List[Dict[str, Any]], transport_mode: str) -> List[Dict[str, Any]]:
+        """
+        计算相邻地点之间的路段距离与耗时
+        
+        所有有坐标的路段合并为一次距离矩阵请求；缺少坐标的路段返回None
+        """
+        indexes = []
+        pairs = []
+        for i in range(len(location_infos) - 1):
+            origin = location_infos[i].get("coordinates")
+            destination = location_infos[i + 1].get("coordinates")
+            if origin and destination:
+                indexes.append(i)
+                pairs.append((origin, destination))
+        
+        legs = [None] * (len(location_infos) - 1)
+        if not pairs:
+            return legs
+        try:
+            results = await asyncio.to_thread(baidu_map_tools.pair_distances, pairs, transport_mode)
+        except Exception as e:
+            print(f"Error estimating legs: {e}")
+            return legs
+        for i, result in zip(indexes, results):
+            legs[i] = result
+        return legs
+    
     async def _generate_trip_plan(self, selected_locations: List[str], trip_duration: str, 
                                 transport_mode: str, interests: List[str], context: Dict[str, Any] = None) -> Dict[str, Any]:
         """生成行程规划"""
@@ -799,11 +838,16 @@ class SimpleTripAgent(BaseAgent):
             else:
                 time_slots = ["上午", "中午", "下午", "晚上"]
             
+            # 根据地点ID查找地点信息（每个地点只查一次）
+            location_infos = [
+                await self._get_location_info_by_id(location_id, context)
+                for location_id in selected_locations
+            ]
+            
             # 为每个地点分配时间段
             for i, location_id in enumerate(selected_locations):
                 if i < len(time_slots):
-                    # 根据地点ID查找地点信息
-                    location_info = await self._get_location_info_by_id(location_id, context)
+                    location_info = location_infos[i]
                     location_name = location_info.get("name", location_id)
                     
                     plan["schedule"].append({
@@ -815,19 +859,23 @@ class SimpleTripAgent(BaseAgent):
             
             # 生成路线建议
             if len(selected_locations) > 1:
+                legs = await self._estimate_legs(location_infos, transport_mode)
                 for i in range(len(selected_locations) - 1):
                     # 获取起点和终点的名称
-                    from_info = await self._get_location_info_by_id(selected_locations[i], context)
-                    to_info = await self._get_location_info_by_id(selected_locations[i + 1], context)
-                    from_name = from_info.get("name", selected_locations[i])
-                    to_name = to_info.get("name", selected_locations[i + 1])
+                    from_name = location_infos[i].get("name", selected_locations[i])
+                    to_name = location_infos[i + 1].get("name", selected_locations[i + 1])
                     
-                    plan["routes"].append({
+                    route = {
                         "from": f"{from_name}（{selected_locations[i]}）",
                         "to": f"{to_name}（{selected_locations[i + 1]}）",
                         "transport": transport_mode,
                         "estimated_time": "15-30分钟"
-                    })
+                    }
+                    if legs[i]:
+                        route["estimated_time"] = legs[i]["duration_text"]
+                        route["distance"] = legs[i]["distance"]
+                        route["duration"] = legs[i]["duration"]
+                    plan["routes"].append(route)
             
             # 生成实用建议
             plan["tips"] = [
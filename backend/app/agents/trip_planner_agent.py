@@ -11,8 +11,14 @@ from datetime import datetime
 
 from .base_agent import BaseAgent
 from ..services.llm_service import llm_service_instance
+from ..core.config import settings
+from ..core.metrics import observe_tool
 from ..utils.baidu_map_tools import baidu_map_tools
-from ..utils.tool_definitions import get_all_tools
+from ..utils.gazetteer import gazetteer
+from ..utils.intent_matcher import intent_matcher
+from ..utils.prefetch import SpeculativePrefetch
+from ..utils.tool_definitions import AGENT_TOOLS
+from ..utils.tool_registry import ToolDispatcher, UnknownToolError
 
 
 class TripPlannerAgent(BaseAgent):
@@ -27,6 +33,11 @@ class TripPlannerAgent(BaseAgent):
             agent_id="trip-planner",
             agent_name="行程规划助手"
         )
+        # 提供给LLM的工具中，这个Agent只直接执行地图查询
+        self._tools = ToolDispatcher(AGENT_TOOLS, {
+            "search_poi": self._tool_search_poi,
+            "calculate_route": self._tool_calculate_route,
+        }, source=self.agent_id)
         
         # 工具定义
         self.available_tools = [
@@ -113,7 +124,8 @@ class TripPlannerAgent(BaseAgent):
         user_input: str,
         system_prompt: str = None,
         history: List[Dict[str, str]] = None,
-        run_id: str = None
+        run_id: str = None,
+        context: Dict[str, Any] = None
     ) -> AsyncGenerator[str, None]:
         """
         运行行程规划Agent
@@ -121,6 +133,12 @@ class TripPlannerAgent(BaseAgent):
         if not run_id:
             run_id = f"trip_plan_{int(datetime.now().timestamp())}"
         
+        # 用户输入有POI意图时，搜索与第一次LLM调用并行开始，工具步骤需要时直接复用
+        prefetch = SpeculativePrefetch(self.agent_id)
+        poi_arguments = self._speculative_poi_arguments(user_input)
+        if poi_arguments:
+            prefetch.start("search_poi", poi_arguments, self._fetch_poi)
+        
         try:
             # 1. 发送RUN_STARTED事件
             yield self._create_run_started_event(run_id)
@@ -139,10 +157,10 @@ class TripPlannerAgent(BaseAgent):
             full_response = ""
             
             # 获取工具定义
-            tools = get_all_tools()
+            tools = self._tools.tools
             
             async for chunk in llm_service_instance.stream_llm_response_with_tools(
-                user_input, system_prompt, history, tools
+                user_input, system_prompt, history, tools, agent_id=self.agent_id
             ):
                 try:
                     chunk_data = json.loads(chunk)
@@ -187,7 +205,10 @@ class TripPlannerAgent(BaseAgent):
                                         )
                                         
                                         # 执行工具调用
-                                        result = await self._execute_tool_call(function_name, json.loads(function_args))
+                                        result = await observe_tool(
+                                            function_name, self.agent_id,
+                                            self._execute_tool_call(function_name, json.loads(function_args), prefetch)
+                                        )
                                         
                                         # 发送工具调用结果事件
                                         yield self._create_tool_call_result_event(
@@ -217,7 +238,7 @@ class TripPlannerAgent(BaseAgent):
                 yield self._create_system_message_event("正在搜索相关信息...")
                 
                 # 调用相关工具
-                tool_results = await self._call_relevant_tools(user_input, full_response)
+                tool_results = await self._call_relevant_tools(user_input, full_response, prefetch)
                 
                 # 发送工具调用请求和结果
                 for tool_result in tool_results:
@@ -249,7 +270,7 @@ class TripPlannerAgent(BaseAgent):
                     supplement_response = ""
                     
                     async for chunk in llm_service_instance.stream_llm_response(
-                        user_input, supplement_prompt, []
+                        user_input, supplement_prompt, [], agent_id=self.agent_id
                     ):
                         try:
                             chunk_data = json.loads(chunk)
@@ -283,6 +304,9 @@ class TripPlannerAgent(BaseAgent):
         except Exception as e:
             # 发送错误事件
             yield self._create_run_error_event(run_id, str(e))
+        finally:
+            # 模型没有用到的预取结果丢弃，计入浪费
+            prefetch.discard()
     
     def _generate_system_prompt(self, custom_prompt: str = None) -> str:
         """生成系统提示词"""
@@ -308,15 +332,9 @@ class TripPlannerAgent(BaseAgent):
     
     def _should_call_tools(self, user_input: str, response: str) -> bool:
         """判断是否需要调用工具"""
-        # 检查用户输入和AI回复中的关键词
-        tool_keywords = [
-            "搜索", "查找", "推荐", "附近", "价格", "费用", "路线", "距离", 
-            "天气", "酒店", "餐厅", "景点", "门票", "交通", "北京", "上海", "广州"
-        ]
-        
-        # 检查用户输入和AI回复
-        user_has_keywords = any(keyword in user_input for keyword in tool_keywords)
-        response_has_keywords = any(keyword in response for keyword in tool_keywords)
+        # 检查用户输入和AI回复中的关键词（用户输入已命中时不再扫描较长的AI回复）
+        user_has_keywords = intent_matcher.scan(user_input).has("tool")
+        response_has_keywords = not user_has_keywords and intent_matcher.scan(response).has("tool")
         
         # 添加调试信息
         print(f"DEBUG: user_input='{user_input}', user_has_keywords={user_has_keywords}")
@@ -325,16 +343,18 @@ class TripPlannerAgent(BaseAgent):
         
         return user_has_keywords or response_has_keywords
     
-    async def _call_relevant_tools(self, user_input: str, response: str) -> List[Dict[str, Any]]:
-        """调用相关工具"""
+    async def _call_relevant_tools(
+        self, user_input: str, response: str, prefetch: Optional[SpeculativePrefetch] = None
+    ) -> List[Dict[str, Any]]:
+        """调用相关工具（参数与请求开始时的预取一致时复用预取结果）"""
         tool_results = []
         
         print(f"DEBUG: _call_relevant_tools called with user_input='{user_input}'")
         
         # 根据用户输入和回复内容决定调用哪些工具
-        poi_keywords = ["景点", "餐厅", "酒店", "推荐", "附近"]
-        has_poi_keywords = any(keyword in user_input.lower() for keyword in poi_keywords)
-        print(f"DEBUG: checking POI keywords {poi_keywords}, has_poi_keywords={has_poi_keywords}")
+        matches = intent_matcher.scan(user_input)
+        has_poi_keywords = matches.has("poi")
+        print(f"DEBUG: checking POI keywords, has_poi_keywords={has_poi_keywords}")
         
         if has_poi_keywords:
             # 调用POI搜索
@@ -343,14 +363,15 @@ class TripPlannerAgent(BaseAgent):
             
             # 使用百度地图API搜索POI
             search_keyword = self._extract_search_keyword(user_input)
-            print(f"DEBUG: searching POI with keyword='{search_keyword}', city='{location}'")
+            # 用户提到的第一个分类（餐厅、酒店等），默认搜索景点
+            category = (matches.categories or ["attraction"])[0]
+            print(f"DEBUG: searching POI with keyword='{search_keyword}', city='{location}', category='{category}'")
             
+            poi_arguments = {"keyword": search_keyword, "city": location, "category": category}
             try:
-                poi_result = baidu_map_tools.search_poi(
-                    keyword=search_keyword,
-                    city=location,
-                    category="attraction"
-                )
+                poi_result = await prefetch.take("search_poi", poi_arguments) if prefetch else None
+                if poi_result is None:
+                    poi_result = await asyncio.to_thread(self._fetch_poi, poi_arguments)
                 print(f"DEBUG: POI search result: {poi_result}")
             except Exception as e:
                 print(f"DEBUG: POI search error: {e}")
@@ -369,22 +390,24 @@ class TripPlannerAgent(BaseAgent):
                 "parameters": {
                     "query": search_keyword,
                     "city": location,
-                    "category": "attraction"
+                    "category": category
                 },
                 "result": poi_result
             })
         
-        if any(keyword in user_input.lower() for keyword in ["路线", "距离", "时间", "怎么去"]):
+        if matches.has("route"):
             # 调用路线计算
             call_id = f"route_call_{int(datetime.now().timestamp())}"
             
             # 提取起点和终点
             origin, destination = self._extract_route_points(user_input)
             if origin and destination:
-                route_result = baidu_map_tools.calculate_route(
+                route_result = await asyncio.to_thread(
+                    baidu_map_tools.calculate_route,
                     origin=origin,
                     destination=destination,
-                    mode="driving"
+                    mode="driving",
+                    zoom=settings.ROUTE_TOOL_SIMPLIFY_ZOOM
                 )
                 
                 tool_results.append({
@@ -402,25 +425,14 @@ class TripPlannerAgent(BaseAgent):
         return tool_results
     
     def _extract_location_from_input(self, user_input: str) -> str:
-        """从用户输入中提取地点信息"""
-        # 简单的地点提取逻辑
-        common_cities = ["北京", "上海", "广州", "深圳", "杭州", "南京", "成都", "西安", "武汉", "重庆"]
-        
-        for city in common_cities:
-            if city in user_input:
-                return city
-        
-        # 如果没有找到常见城市，返回默认值
-        return "北京"
+        """从用户输入中提取地点信息（提到城区或地标时返回所属城市）"""
+        # 如果没有找到地名，返回默认值
+        return gazetteer.find_city(user_input) or "北京"
     
     def _extract_search_keyword(self, user_input: str) -> str:
         """从用户输入中提取搜索关键词"""
-        # 移除常见城市名称，提取搜索关键词
-        common_cities = ["北京", "上海", "广州", "深圳", "杭州", "南京", "成都", "西安", "武汉", "重庆"]
-        
-        keyword = user_input
-        for city in common_cities:
-            keyword = keyword.replace(city, "")
+        # 移除城市名称，提取搜索关键词
+        keyword = intent_matcher.scan(user_input).without("city")
         
         # 清理多余的空格
         keyword = keyword.strip()
@@ -430,44 +442,71 @@ class TripPlannerAgent(BaseAgent):
             return "北京景点"
         
         # 如果关键词包含"景点"相关词汇，使用更具体的搜索词
-        if any(word in keyword for word in ["景点", "旅游", "游玩", "观光"]):
+        if intent_matcher.scan(keyword).has("sightseeing"):
             return "北京景点"
         
         return keyword
     
-    async def _execute_tool_call(self, function_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    def _speculative_poi_arguments(self, user_input: str) -> Optional[Dict[str, Any]]:
+        """推测工具步骤会发起的POI搜索参数（与 _call_relevant_tools 的提取一致），没有POI意图时返回None"""
+        matches = intent_matcher.scan(user_input)
+        if not matches.has("poi"):
+            return None
+        return {
+            "keyword": self._extract_search_keyword(user_input),
+            "city": self._extract_location_from_input(user_input),
+            "category": (matches.categories or ["attraction"])[0]
+        }
+    
+    @staticmethod
+    def _search_poi_arguments(arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """补全search_poi的默认参数，作为执行和匹配预取的依据"""
+        return {
+            "keyword": arguments.get("keyword", "景点"),
+            "city": arguments.get("city", "北京"),
+            "category": arguments.get("category", "attraction")
+        }
+    
+    @staticmethod
+    def _fetch_poi(arguments: Dict[str, Any]) -> Any:
+        """同步调用百度地图POI搜索（预取时在线程池中执行）"""
+        return baidu_map_tools.search_poi(
+            keyword=arguments["keyword"],
+            city=arguments["city"],
+            category=arguments["category"]
+        )
+    
+    async def _execute_tool_call(
+        self, function_name: str, arguments: Dict[str, Any], prefetch: Optional[SpeculativePrefetch] = None
+    ) -> Dict[str, Any]:
         """执行工具调用"""
         try:
-            if function_name == "search_poi":
-                keyword = arguments.get("keyword", "景点")
-                city = arguments.get("city", "北京")
-                category = arguments.get("category", "attraction")
-                
-                result = baidu_map_tools.search_poi(
-                    keyword=keyword,
-                    city=city,
-                    category=category
-                )
-                return result.model_dump() if hasattr(result, 'model_dump') else result
-                
-            elif function_name == "calculate_route":
-                origin = arguments.get("origin")
-                destination = arguments.get("destination")
-                mode = arguments.get("mode", "driving")
-                
-                result = baidu_map_tools.calculate_route(
-                    origin=origin,
-                    destination=destination,
-                    mode=mode
-                )
-                return result.model_dump() if hasattr(result, 'model_dump') else result
-                
-            else:
-                return {"success": False, "error": f"未知的工具: {function_name}"}
-                
+            if prefetch is not None and function_name == "search_poi":
+                result = await prefetch.take(function_name, self._search_poi_arguments(arguments))
+                if result is not None:
+                    return result.model_dump() if hasattr(result, 'model_dump') else result
+            return await self._tools.dispatch(function_name, arguments)
+        except UnknownToolError:
+            return {"success": False, "error": f"未知的工具: {function_name}"}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
+    async def _tool_search_poi(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """搜索POI（百度地图接口是同步请求，在线程池中执行，工具的超时和并发限制才能生效）"""
+        result = await asyncio.to_thread(self._fetch_poi, self._search_poi_arguments(arguments))
+        return result.model_dump() if hasattr(result, 'model_dump') else result
+    
+    async def _tool_calculate_route(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """计算路线"""
+        result = await asyncio.to_thread(
+            baidu_map_tools.calculate_route,
+            origin=arguments.get("origin"),
+            destination=arguments.get("destination"),
+            mode=arguments.get("mode", "driving"),
+            zoom=settings.ROUTE_TOOL_SIMPLIFY_ZOOM
+        )
+        return result.model_dump() if hasattr(result, 'model_dump') else result
+    
     def _extract_route_points(self, user_input: str) -> tuple:
         """从用户输入中提取路线起点和终点"""
         # 简单的路线提取逻辑
@@ -3,6 +3,7 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.core.database import get_db
 from app.core.security import decode_token
 from app.models.user import User
@@ -95,3 +96,28 @@ def get_current_active_user(
     
     return current_user
 
+
+def get_current_admin_user(
+    current_user: User = Depends(get_current_user)
+) -> User:
+    """
+    Dependency to restrict operational endpoints to administrators
+    
+    Administrators are listed by email in settings.ADMIN_EMAILS.
+    
+    Args:
+        current_user: Current authenticated user
+        
+    Returns:
+        Current admin user
+        
+    Raises:
+        HTTPException: If user is not in the admin allow-list
+    """
+    if current_user.email.lower() not in settings.admin_emails_list:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    
+    return current_user
@@ -1,7 +1,7 @@
 """API v1 router aggregation"""
 
 from fastapi import APIRouter
-from app.api.v1.endpoints import auth, chat, voice, trip, budget, expenses, map as map_endpoints
+from app.api.v1.endpoints import auth, chat, voice, trip, budget, expenses, export, admin, map as map_endpoints
 
 # Create main API router
 api_router = APIRouter()
@@ -48,6 +48,13 @@ api_router.include_router(
     tags=["费用管理 Expenses"]
 )
 
+# Include export routes
+api_router.include_router(
+    export.router,
+    prefix="/export",
+    tags=["数据导出 Export"]
+)
+
 # Include map routes
 api_router.include_router(
     map_endpoints.router,
@@ -55,6 +62,13 @@ api_router.include_router(
     tags=["地图服务 Map"]
 )
 
+# Include admin routes
+api_router.include_router(
+    admin.router,
+    prefix="/admin",
+    tags=["运维管理 Admin"]
+)
+
 # Future: Include other route modules
 # api_router.include_router(
 #     agent.router,
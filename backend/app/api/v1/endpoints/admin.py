@@ -0,0 +1,74 @@
+"""
+运维管理API端点
+提供上游熔断器、对冲请求等运行状态的查看与操作，以及费用汇总重建等维护操作
+
+所有接口仅限 ADMIN_EMAILS 中的管理员访问（trace 包含所有用户的工具参数和SQL语句）
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.api.deps import get_current_admin_user, get_db
+from app.services.expense_rollup import rebuild_expense_rollups
+from app.utils.resilience import get_resilience_stats, find_circuit_breaker
+from app.services.llm_router import llm_router
+from app.core.prompts import list_prompts
+from app.core.tracing import tracer
+
+router = APIRouter(dependencies=[Depends(get_current_admin_user)])
+
+
+@router.get("/resilience")
+async def get_resilience_status():
+    """查看各上游熔断器状态与对冲请求统计"""
+    return get_resilience_stats()
+
+
+@router.post("/resilience/breakers/{name}/reset")
+async def reset_circuit_breaker(name: str):
+    """手动关闭指定熔断器"""
+    breaker = find_circuit_breaker(name)
+    if not breaker:
+        raise HTTPException(status_code=404, detail=f"熔断器 {name} 不存在")
+    breaker.reset()
+    return breaker.snapshot()
+
+
+@router.post("/expense-rollups/rebuild")
+async def rebuild_rollups(
+    user_id: Optional[str] = Query(None, description="只重建该用户，为空时重建全部"),
+    db: Session = Depends(get_db)
+):
+    """由原始费用重建费用日汇总（上线后补齐历史数据）"""
+    return {"rows": rebuild_expense_rollups(db, user_id)}
+
+
+@router.get("/llm-router")
+async def get_llm_router_status():
+    """查看LLM路由策略与各供应商的TTFT、错误率、前缀缓存命中率"""
+    return llm_router.stats()
+
+
+@router.get("/prompts")
+async def get_prompt_versions():
+    """查看已加载的系统提示词版本与静态前缀指纹（按需加载的Agent在首次使用后出现）"""
+    return list_prompts()
+
+
+@router.get("/traces")
+async def list_traces(
+    limit: int = Query(20, ge=1, le=200, description="返回最近的运行数")
+):
+    """最近的Agent运行trace摘要"""
+    return {"traces": [trace.summary() for trace in tracer.recent_traces(limit)]}
+
+
+@router.get("/traces/{run_id}")
+async def get_trace_waterfall(run_id: str):
+    """指定运行的瀑布图：LLM、工具、数据库、上游请求各span的偏移与耗时"""
+    trace = tracer.get_trace(run_id)
+    if not trace:
+        raise HTTPException(status_code=404, detail=f"运行 {run_id} 的trace不存在")
+    return trace.waterfall()
@@ -15,6 +15,7 @@ from app.schemas.auth import (
     AvatarUploadResponse,
 )
 from app.services.auth_service import AuthService
+from app.services.avatar_service import AvatarTooLargeError, InvalidImageError, save_avatar
 from app.models.user import User
 
 router = APIRouter()
@@ -44,7 +45,7 @@ async def register(
         TokenResponse: 包含access_token, refresh_token和用户信息
     """
     # Register user
-    user = AuthService.register_user(db, user_data)
+    user = await AuthService.register_user(db, user_data)
     
     # Create tokens
     tokens = AuthService.create_tokens(user.id)
@@ -78,7 +79,7 @@ async def login(
         TokenResponse: 包含access_token, refresh_token和用户信息
     """
     # Authenticate user
-    user = AuthService.authenticate_user(db, user_data)
+    user = await AuthService.authenticate_user(db, user_data)
     
     # Create tokens
     tokens = AuthService.create_tokens(user.id)
@@ -248,7 +249,7 @@ async def change_password(
     """
     try:
         # Change password
-        AuthService.change_password(
+        await AuthService.change_password(
             db, 
             current_user.id, 
             password_data.current_password, 
@@ -282,17 +283,15 @@ async def upload_avatar(
     """
     上传头像
     
-    上传用户头像文件并更新头像URL。
+    按块读取上传文件，在进程池中裁剪缩放为正方形头像和缩略图（WebP），以内容哈希命名保存，
+    并更新用户头像URL。同一张图片重复上传时复用已有文件。
     
-    - **file**: 头像图片文件 (支持 jpg, png, gif 格式)
+    - **file**: 头像图片文件 (支持 jpg, png, gif, webp 格式，不超过5MB)
     
     Returns:
-        AvatarUploadResponse: 包含头像URL的响应
+        AvatarUploadResponse: 包含头像URL和缩略图URL的响应
     """
-    print(f"头像上传请求 - 用户ID: {current_user.id}")
-    print(f"文件名: {file.filename}")
-    print(f"文件类型: {file.content_type}")
-    print(f"文件大小: {file.size}")
+    print(f"头像上传请求 - 用户ID: {current_user.id}, 文件名: {file.filename}, 类型: {file.content_type}")
     
     # 验证文件类型
     if not file.content_type or not file.content_type.startswith('image/'):
@@ -302,63 +301,19 @@ async def upload_avatar(
             detail="只支持图片文件格式"
         )
     
-    # 验证文件大小 (限制为5MB)
-    if file.size and file.size > 5 * 1024 * 1024:
-        print(f"文件大小验证失败: {file.size} bytes")
+    try:
+        avatar_url, thumbnail_url = await save_avatar(file)
+    except AvatarTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except InvalidImageError as e:
+        print(f"图片解码失败: {e}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="文件大小不能超过5MB"
+            detail="无法识别的图片文件"
         )
-    
-    try:
-        # 读取文件内容
-        print("开始读取文件内容...")
-        file_content = await file.read()
-        print(f"文件内容读取成功，大小: {len(file_content)} bytes")
-        
-        # 生成唯一文件名
-        import time
-        import hashlib
-        import os
-        
-        timestamp = int(time.time())
-        file_hash = hashlib.md5(file_content).hexdigest()[:8]
-        file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'jpg'
-        
-        print(f"文件扩展名: {file_extension}")
-        
-        # 确保文件扩展名是安全的
-        allowed_extensions = ['jpg', 'jpeg', 'png', 'gif', 'webp']
-        if file_extension.lower() not in allowed_extensions:
-            print(f"文件扩展名不在允许列表中，使用默认扩展名")
-            file_extension = 'jpg'
-        
-        # 生成文件名
-        filename = f"{current_user.id}_{timestamp}_{file_hash}.{file_extension}"
-        print(f"生成的文件名: {filename}")
-        
-        # 保存文件到本地
-        upload_dir = "uploads/avatars"
-        print(f"创建上传目录: {upload_dir}")
-        os.makedirs(upload_dir, exist_ok=True)
-        file_path = os.path.join(upload_dir, filename)
-        print(f"文件保存路径: {file_path}")
-        
-        with open(file_path, "wb") as buffer:
-            buffer.write(file_content)
-        print("文件保存成功")
-        
-        # 生成访问URL
-        avatar_url = f"/static/avatars/{filename}"
-        print(f"生成的头像URL: {avatar_url}")
-        
-        # Update avatar URL in database
-        print("开始更新数据库...")
-        updated_user = AuthService.update_avatar(db, current_user.id, avatar_url)
-        print("数据库更新成功")
-        
-        return AvatarUploadResponse(avatar_url=avatar_url)
-        
     except Exception as e:
         print(f"头像上传处理错误: {str(e)}")
         import traceback
@@ -367,4 +322,9 @@ async def upload_avatar(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="头像上传处理失败"
         )
+    
+    AuthService.update_avatar(db, current_user.id, avatar_url)
+    print(f"头像已更新: {avatar_url}")
+    
+    return AvatarUploadResponse(avatar_url=avatar_url, thumbnail_url=thumbnail_url)
 
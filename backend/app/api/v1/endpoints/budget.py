@@ -15,6 +15,7 @@ from app.api.deps import get_current_user, get_db
 from app.models.user import User
 from app.models.trip import Trip as TripModel, Expense as ExpenseModel
 from app.schemas.trip import Trip, TripUpdate, Expense, ExpenseCreate, ExpenseUpdate, ExpenseListResponse, ExpenseStats
+from app.services.expense_service import ExpenseService
 
 router = APIRouter()
 
@@ -359,19 +360,10 @@ async def get_expense_stats(
             func.sum(ExpenseModel.amount).label('amount')
         ).filter(ExpenseModel.trip_id == trip_id).group_by(ExpenseModel.category).all()
         
-        # 费用天数 - 使用日期字符串提取，避免数据库兼容性问题
-        expense_dates = db.query(ExpenseModel.expense_date).filter(
-            ExpenseModel.trip_id == trip_id,
-            ExpenseModel.expense_date.isnot(None)
-        ).all()
-        unique_dates = set()
-        for date_obj in expense_dates:
-            if date_obj:
-                if isinstance(date_obj, datetime):
-                    unique_dates.add(date_obj.date())
-                else:
-                    unique_dates.add(date_obj)
-        expense_days = len(unique_dates)
+        # 费用天数与月度趋势从日汇总读取
+        service = ExpenseService(db)
+        expense_days = await service.count_expense_days(current_user.id, trip_id)
+        monthly = await service.get_expense_timeseries(current_user.id, granularity="month", trip_id=trip_id)
         
         # 构建分类统计字典
         category_breakdown = {cat: float(amount) for cat, amount in category_stats}
@@ -387,8 +379,10 @@ async def get_expense_stats(
             "usage_percent": float((total_amount / trip.budget_total * 100)) if trip.budget_total and trip.budget_total > 0 else 0
         }
         
-        # 月度趋势（简化版，返回空列表）
-        monthly_trend = []
+        monthly_trend = [
+            {"month": point.bucket.strftime("%Y-%m"), "amount": point.amount, "count": point.count}
+            for point in monthly.points
+        ]
         
         return ExpenseStats(
             total_amount=float(total_amount),
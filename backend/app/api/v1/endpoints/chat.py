@@ -10,6 +10,8 @@ from typing import List, Dict, Any, Optional
 import json
 
 from app.api.deps import get_db, get_current_user
+from app.core.lifecycle import drain_sse_stream
+from app.core.metrics import track_sse_stream
 from app.models.user import User
 from app.services.llm_service import chat_with_agui_stream, simple_chat, test_llm_connection
 from app.services.agent_service import agent_service
@@ -62,7 +64,7 @@ async def stream_chat(
                 yield event
         
         return StreamingResponse(
-            generate_stream(),
+            track_sse_stream("chat_stream", drain_sse_stream(generate_stream(), run_id)),
             media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
@@ -275,7 +277,7 @@ async def run_agent_stream(
                 yield encoder.encode_event(error_event)
         
         return StreamingResponse(
-            generate_response(),
+            track_sse_stream("agent_run", drain_sse_stream(generate_response(), run_id)),
             media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
@@ -2,7 +2,7 @@
 费用管理API端点
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 from datetime import datetime, date
@@ -13,10 +13,11 @@ from ....core.database import get_db
 from ...deps import get_current_user
 from ....models.user import User
 from ....models.trip import Expense, Trip
-from ....schemas.expense import ExpenseCreate, ExpenseUpdate, ExpenseResponse
+from ....schemas.expense import ExpenseCreate, ExpenseUpdate, ExpenseResponse, ExpenseTimeseries, ExpenseImportResult
 from ....schemas.trip import ExpenseListResponse
 from ....services.expense_service import ExpenseService
 from ....services.expense_ai_service import ExpenseAIService
+from ....services.expense_import import ExpenseImportService, ImportLimitError, detect_format
 
 router = APIRouter()
 
@@ -59,6 +60,32 @@ async def get_expenses(
         total_amount=total_amount
     )
 
+@router.get("/timeseries", response_model=ExpenseTimeseries)
+async def get_expense_timeseries(
+    granularity: str = Query("day", pattern="^(day|week|month)$", description="粒度：day、week、month"),
+    tz: Optional[str] = Query(None, description="IANA时区，例如 Asia/Shanghai，默认为汇总时区"),
+    trip_id: Optional[str] = Query(None, description="行程ID"),
+    start_date: Optional[date] = Query(None, description="开始日期（该时区下，含）"),
+    end_date: Optional[date] = Query(None, description="结束日期（该时区下，含）"),
+    fill: bool = Query(True, description="没有费用的桶是否补零"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """费用时间序列（按天/周/月分桶，用于图表）"""
+    service = ExpenseService(db)
+    try:
+        return await service.get_expense_timeseries(
+            user_id=current_user.id,
+            granularity=granularity,
+            tz=tz,
+            trip_id=trip_id,
+            start_date=start_date,
+            end_date=end_date,
+            fill=fill
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/{expense_id}", response_model=ExpenseResponse)
 async def get_expense(
     expense_id: str,
@@ -92,6 +119,30 @@ async def create_expense(
     expense = await service.create_expense(expense_data, current_user.id)
     return expense
 
+@router.post("/import", response_model=ExpenseImportResult)
+async def import_expenses(
+    file: UploadFile = File(..., description="CSV（首行为表头）、JSON数组或NDJSON"),
+    trip_id: Optional[str] = Form(None, description="默认行程ID，行中没有trip_id时使用"),
+    file_format: Optional[str] = Form(None, alias="format", pattern="^(csv|json)$", description="文件格式，默认按文件名判断"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """批量导入费用：按块校验与写入，出错的行单独报告，不影响其余行"""
+    file_format = file_format or detect_format(file.filename, file.content_type)
+    if not file_format:
+        raise HTTPException(status_code=400, detail="无法识别文件格式，请使用 .csv / .json 文件或指定 format")
+    
+    service = ExpenseImportService(db, current_user.id)
+    if trip_id and trip_id not in service.trip_ids:
+        raise HTTPException(status_code=404, detail="行程不存在")
+    
+    try:
+        return await service.import_file(file, file_format, trip_id)
+    except ImportLimitError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.put("/{expense_id}", response_model=ExpenseResponse)
 async def update_expense(
     expense_id: str,
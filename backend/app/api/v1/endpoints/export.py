@@ -0,0 +1,69 @@
+"""
+数据导出API端点
+按行流式输出，数据库按批读取，内存占用与数据量无关
+"""
+
+from datetime import datetime
+from typing import Iterable, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from app.api.deps import get_current_user, get_db
+from app.models.trip import Trip as TripModel
+from app.models.user import User
+from app.services.export_service import CSV_RESOURCES, TripExporter, buffered
+
+router = APIRouter()
+
+
+def _exporter(db: Session, user: User, trip_id: Optional[str]) -> TripExporter:
+    if trip_id and not db.query(TripModel.id).filter(TripModel.id == trip_id, TripModel.user_id == user.id).first():
+        raise HTTPException(status_code=404, detail="行程不存在")
+    return TripExporter(db.get_bind(), user.id, trip_id)
+
+
+def _download(chunks: Iterable[str], media_type: str, name: str, extension: str) -> StreamingResponse:
+    filename = f"{name}-{datetime.utcnow():%Y%m%d}.{extension}"
+    return StreamingResponse(
+        buffered(chunks),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/trips.ndjson")
+async def export_trips_ndjson(
+    trip_id: Optional[str] = Query(None, description="只导出该行程，为空时导出全部"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """导出行程、每天安排、节点与费用，每行一条记录（type 字段区分类型）"""
+    exporter = _exporter(db, current_user, trip_id)
+    return _download(exporter.ndjson(), "application/x-ndjson", "trips", "ndjson")
+
+
+@router.get("/{resource}.csv")
+async def export_csv(
+    resource: str,
+    trip_id: Optional[str] = Query(None, description="只导出该行程，为空时导出全部"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """导出单个资源的CSV：trips、items（节点）或 expenses"""
+    if resource not in CSV_RESOURCES:
+        raise HTTPException(status_code=404, detail=f"不支持的导出资源: {resource}")
+    exporter = _exporter(db, current_user, trip_id)
+    return _download(exporter.csv(resource), "text/csv; charset=utf-8", resource, "csv")
+
+
+@router.get("/itinerary.ics")
+async def export_calendar(
+    trip_id: Optional[str] = Query(None, description="只导出该行程，为空时导出全部"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """导出行程节点为iCalendar日历，可导入手机或邮箱日历"""
+    exporter = _exporter(db, current_user, trip_id)
+    return _download(exporter.ics(), "text/calendar; charset=utf-8", "itinerary", "ics")
@@ -3,18 +3,29 @@
 提供POI搜索、地理编码、路线规划等地图服务
 """
 
+import json
+
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List, Optional
 from pydantic import BaseModel, Field
 
 from app.api.deps import get_current_user, get_db
+from app.core.config import settings
 from app.models.user import User
-from app.utils.baidu_map_tools import baidu_map_tools
+from app.utils.single_flight import get_single_flight_stats
 
 router = APIRouter()
 
 
+def _map_tools():
+    """百度地图工具（首次调用时导入，requests等依赖不计入启动时间）"""
+    from app.utils.baidu_map_tools import baidu_map_tools
+    return baidu_map_tools
+
+
 # 请求/响应模型
 class POISearchRequest(BaseModel):
     """POI搜索请求"""
@@ -28,6 +39,10 @@ class RouteRequest(BaseModel):
     origin: Dict[str, float] = Field(..., description="起点坐标 {lat, lng}")
     destination: Dict[str, float] = Field(..., description="终点坐标 {lat, lng}")
     mode: str = Field("driving", description="交通方式：driving/walking/transit/bicycling")
+    simplify_tolerance: Optional[float] = Field(None, ge=0, description="抽稀容差（米），为空时按zoom计算")
+    zoom: Optional[float] = Field(None, ge=3, le=19, description="前端地图缩放级别，用于计算抽稀容差")
+    polyline_format: str = Field("lnglat", pattern="^(lnglat|encoded)$", description="折线格式：lnglat/encoded")
+    include_steps: bool = Field(False, description="是否返回每个step的path")
 
 
 class GeocodeRequest(BaseModel):
@@ -36,6 +51,31 @@ class GeocodeRequest(BaseModel):
     city: str = Field(None, description="城市（可选）")
 
 
+class GeocodeBatchRequest(BaseModel):
+    """批量地理编码请求"""
+    addresses: List[str] = Field(..., min_length=1, max_length=settings.GEOCODE_BATCH_MAX_SIZE, description="地址列表")
+    city: Optional[str] = Field(None, description="城市（可选，拼接在每个地址前）")
+    stream: bool = Field(False, description="是否以NDJSON逐条返回")
+
+
+class LatLng(BaseModel):
+    """坐标"""
+    lat: float = Field(..., ge=-90, le=90)
+    lng: float = Field(..., ge=-180, le=180)
+
+
+class ReverseGeocodeBatchRequest(BaseModel):
+    """批量逆地理编码请求"""
+    locations: List[LatLng] = Field(..., min_length=1, max_length=settings.GEOCODE_BATCH_MAX_SIZE, description="坐标列表")
+    stream: bool = Field(False, description="是否以NDJSON逐条返回")
+
+
+def _ndjson(items: Iterator[Dict[str, Any]]) -> StreamingResponse:
+    """按行输出JSON（同步迭代器由Starlette在线程池中读取）"""
+    lines = (json.dumps(item, ensure_ascii=False) + "\n" for item in items)
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
 @router.post("/poi/search")
 async def search_poi(
     request: POISearchRequest,
@@ -44,7 +84,9 @@ async def search_poi(
 ):
     """搜索POI"""
     try:
-        result = baidu_map_tools.search_poi(
+        # 在线程池中执行同步请求，避免阻塞事件循环，同时让并发的相同请求得以合并
+        result = await run_in_threadpool(
+            _map_tools().search_poi,
             keyword=request.keyword,
             city=request.city,
             category=request.category
@@ -62,10 +104,15 @@ async def calculate_route(
 ):
     """计算路线"""
     try:
-        result = baidu_map_tools.calculate_route(
+        result = await run_in_threadpool(
+            _map_tools().calculate_route,
             origin=request.origin,
             destination=request.destination,
-            mode=request.mode
+            mode=request.mode,
+            simplify_tolerance=request.simplify_tolerance,
+            zoom=request.zoom,
+            polyline_format=request.polyline_format,
+            include_steps=request.include_steps
         )
         return result
     except Exception as e:
@@ -81,18 +128,76 @@ async def geocode_address(
     """地理编码 - 地址转坐标"""
     try:
         address = f"{request.city or ''}{request.address}"
-        result = baidu_map_tools.geocode(address)
+        result = await run_in_threadpool(_map_tools().geocode, address)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"地理编码失败: {str(e)}")
 
 
+@router.post("/geocode/batch")
+async def geocode_batch(
+    request: GeocodeBatchRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """批量地理编码：去重、缓存命中直接返回，未命中的并发查询，结果与输入顺序一致"""
+    addresses = [f"{request.city or ''}{address}" for address in request.addresses]
+    try:
+        results = await run_in_threadpool(_map_tools().geocode_batch, addresses)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"批量地理编码失败: {str(e)}")
+
+    items = (
+        {"index": index, "address": request.addresses[index], "location": location}
+        for index, location in results
+    )
+    if request.stream:
+        return _ndjson(items)
+    data = await run_in_threadpool(list, items)
+    return {
+        "success": True,
+        "data": {
+            "results": data,
+            "total": len(data),
+            "resolved": sum(1 for item in data if item["location"] is not None)
+        }
+    }
+
+
+@router.post("/reverse-geocode/batch")
+async def reverse_geocode_batch(
+    request: ReverseGeocodeBatchRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """批量逆地理编码：坐标转地址，去重与并发方式同批量地理编码"""
+    locations = [location.model_dump() for location in request.locations]
+    try:
+        results = await run_in_threadpool(_map_tools().reverse_geocode_batch, locations)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"批量逆地理编码失败: {str(e)}")
+
+    items = ({"index": index, "location": locations[index], **result} for index, result in results)
+    if request.stream:
+        return _ndjson(items)
+    data = await run_in_threadpool(list, items)
+    return {
+        "success": True,
+        "data": {
+            "results": data,
+            "total": len(data),
+            "resolved": sum(1 for item in data if item.get("success"))
+        }
+    }
+
+
 @router.get("/health")
 async def map_health():
     """地图服务健康检查"""
     return {
         "status": "healthy",
         "service": "map",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "single_flight": get_single_flight_stats()
     }
 
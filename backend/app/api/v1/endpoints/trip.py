@@ -2,7 +2,7 @@
 行程管理API端点
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Path
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Path
 from sqlalchemy.orm import Session
 from sqlalchemy import desc, asc, func
 from typing import List, Optional, Dict, Any
@@ -14,10 +14,12 @@ from app.models.trip import Trip as TripModel, Itinerary as ItineraryModel, Itin
 from app.schemas.trip import (
     TripCreate, TripUpdate, Trip, TripListResponse,
     ItineraryCreate, ItineraryUpdate, Itinerary,
-    ItineraryItemCreate, ItineraryItemUpdate, ItineraryItem,
+    ItineraryItemCreate, ItineraryItemUpdate, ItineraryItem, ItineraryItemBatchCreate, ItineraryItemMoveRequest,
     ExpenseCreate, ExpenseUpdate, Expense, ExpenseListResponse,
     TripStats, ExpenseStats
 )
+from app.services.expense_service import ExpenseService
+from app.services.itinerary_service import ItineraryService, item_payload, itinerary_payload, rebalance_itineraries
 
 router = APIRouter()
 
@@ -84,48 +86,13 @@ async def create_trip(
         )
         
         db.add(trip)
-        db.flush()  # 获取trip.id
+        db.flush()  # 先写入行程行，安排通过批量INSERT引用它
         
-        # 创建行程安排
+        # 创建行程安排及节点：所有天一条INSERT，所有节点一条INSERT
         if trip_data.itineraries:
-            for itinerary_data in trip_data.itineraries:
-                itinerary = ItineraryModel(
-                    trip_id=trip.id,
-                    day_number=itinerary_data.day_number,
-                    date=itinerary_data.date,
-                    title=itinerary_data.title,
-                    description=itinerary_data.description
-                )
-                
-                db.add(itinerary)
-                db.flush()  # 获取itinerary.id
-                
-                # 创建行程项目
-                if itinerary_data.items:
-                    for item_data in itinerary_data.items:
-                        item = ItineraryItemModel(
-                            itinerary_id=itinerary.id,
-                            poi_id=item_data.poi_id,
-                            name=item_data.name,
-                            description=item_data.description,
-                            address=item_data.address,
-                            coordinates=item_data.coordinates.model_dump() if item_data.coordinates else None,
-                            category=item_data.category,
-                            start_time=item_data.start_time,
-                            end_time=item_data.end_time,
-                            estimated_duration=item_data.estimated_duration,
-                            estimated_cost=item_data.estimated_cost,
-                            rating=item_data.rating,
-                            price_level=item_data.price_level,
-                            phone=item_data.phone,
-                            website=item_data.website,
-                            opening_hours=item_data.opening_hours,
-                            images=item_data.images or [],
-                            order_index=item_data.order_index,
-                            is_completed=item_data.is_completed,
-                            notes=item_data.notes
-                        )
-                        db.add(item)
+            ItineraryService(db).insert_itineraries(
+                trip.id, [itinerary_payload(itinerary_data) for itinerary_data in trip_data.itineraries]
+            )
         
         db.commit()
         db.refresh(trip)
@@ -321,47 +288,11 @@ async def create_itinerary(
         if not trip:
             raise HTTPException(status_code=404, detail="行程不存在")
         
-        # 创建行程安排
-        itinerary = ItineraryModel(
-            trip_id=trip_id,
-            day_number=itinerary_data.day_number,
-            date=itinerary_data.date,
-            title=itinerary_data.title,
-            description=itinerary_data.description
-        )
-        
-        db.add(itinerary)
-        db.flush()
-        
-        # 创建行程项目（节点）
-        if itinerary_data.items:
-            for item_data in itinerary_data.items:
-                item = ItineraryItemModel(
-                    itinerary_id=itinerary.id,
-                    poi_id=item_data.poi_id,
-                    name=item_data.name,
-                    description=item_data.description,
-                    address=item_data.address,
-                    coordinates=item_data.coordinates.model_dump() if item_data.coordinates else None,
-                    category=item_data.category,
-                    start_time=item_data.start_time,
-                    end_time=item_data.end_time,
-                    estimated_duration=item_data.estimated_duration,
-                    estimated_cost=item_data.estimated_cost,
-                    rating=item_data.rating,
-                    price_level=item_data.price_level,
-                    phone=item_data.phone,
-                    website=item_data.website,
-                    opening_hours=item_data.opening_hours,
-                    images=item_data.images or [],
-                    order_index=item_data.order_index,
-                    is_completed=item_data.is_completed,
-                    notes=item_data.notes
-                )
-                db.add(item)
+        # 创建行程安排及其节点（节点一条INSERT写入）
+        itinerary_id, = ItineraryService(db).insert_itineraries(trip_id, [itinerary_payload(itinerary_data)])
         
         db.commit()
-        db.refresh(itinerary)
+        itinerary = db.query(ItineraryModel).filter(ItineraryModel.id == itinerary_id).first()
         return itinerary
         
     except HTTPException:
@@ -591,10 +522,8 @@ async def get_expense_stats(
         
         category_breakdown = {cat: float(amount) for cat, amount in category_stats}
         
-        # 日平均费用
-        expense_days = db.query(func.count(func.distinct(func.date(ExpenseModel.expense_date)))).filter(
-            ExpenseModel.trip_id == trip_id
-        ).scalar() or 1
+        # 日平均费用（费用天数从日汇总读取）
+        expense_days = await ExpenseService(db).count_expense_days(current_user.id, trip_id) or 1
         
         daily_average = float(total_amount) / expense_days
         
@@ -615,8 +544,15 @@ async def get_expense_stats(
 
 # ==================== 行程节点管理 ====================
 
+def _schedule_rebalance(background_tasks: BackgroundTasks, db: Session, service: ItineraryService):
+    """排序键过长的天在响应之后重新分配"""
+    if service.needs_rebalance:
+        background_tasks.add_task(rebalance_itineraries, db.get_bind(), sorted(service.needs_rebalance))
+
+
 @router.post("/itineraries/{itinerary_id}/items", response_model=ItineraryItem)
 async def create_itinerary_item(
+    background_tasks: BackgroundTasks,
     itinerary_id: str = Path(..., description="行程ID"),
     item_data: ItineraryItemCreate = None,
     current_user: User = Depends(get_current_user),
@@ -663,9 +599,15 @@ async def create_itinerary_item(
             notes=item_data.notes
         )
         
+        # 显式给出 order_index 时插入到该位置，否则追加到末尾（见 itinerary_service 中的 before_insert）
+        service = ItineraryService(db)
+        if "order_index" in item_data.model_fields_set:
+            item.order_key = service.key_at(itinerary_id, item_data.order_index)
+        
         db.add(item)
         db.commit()
         db.refresh(item)
+        _schedule_rebalance(background_tasks, db, service)
         
         return item
         
@@ -677,8 +619,83 @@ async def create_itinerary_item(
         raise HTTPException(status_code=500, detail=f"添加节点失败: {str(e)}")
 
 
+@router.post("/{trip_id}/items/batch", response_model=List[ItineraryItem])
+async def create_itinerary_items_batch(
+    background_tasks: BackgroundTasks,
+    trip_id: str = Path(..., description="行程ID"),
+    batch: ItineraryItemBatchCreate = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """批量添加行程节点：按天追加，缺少的天自动创建，一次提交"""
+    try:
+        trip = db.query(TripModel.id).filter(
+            TripModel.id == trip_id,
+            TripModel.user_id == current_user.id
+        ).first()
+        
+        if not trip:
+            raise HTTPException(status_code=404, detail="行程不存在")
+        
+        service = ItineraryService(db)
+        rows = service.add_items(trip_id, [item_payload(item) for item in batch.items])
+        db.commit()
+        _schedule_rebalance(background_tasks, db, service)
+        
+        ids = [row["id"] for row in rows]
+        items = {item.id: item for item in db.query(ItineraryItemModel).filter(ItineraryItemModel.id.in_(ids))}
+        return [items[item_id] for item_id in ids]
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        print(f"Create itinerary items batch error: {e}")
+        raise HTTPException(status_code=500, detail=f"批量添加节点失败: {str(e)}")
+
+
+@router.post("/{trip_id}/items/move", response_model=List[ItineraryItem])
+async def move_itinerary_items(
+    background_tasks: BackgroundTasks,
+    trip_id: str = Path(..., description="行程ID"),
+    request: ItineraryItemMoveRequest = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """移动节点（同一天内调整顺序或移到另一天），一组移动在一个事务中应用，每个节点只改写一行"""
+    try:
+        trip = db.query(TripModel.id).filter(
+            TripModel.id == trip_id,
+            TripModel.user_id == current_user.id
+        ).first()
+        
+        if not trip:
+            raise HTTPException(status_code=404, detail="行程不存在")
+        
+        service = ItineraryService(db)
+        try:
+            rows = service.move_items(trip_id, [move.model_dump() for move in request.moves])
+        except ValueError as e:
+            db.rollback()
+            raise HTTPException(status_code=400, detail=str(e))
+        db.commit()
+        _schedule_rebalance(background_tasks, db, service)
+        
+        ids = [row["id"] for row in rows]
+        items = {item.id: item for item in db.query(ItineraryItemModel).filter(ItineraryItemModel.id.in_(ids))}
+        return [items[item_id] for item_id in ids]
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        print(f"Move itinerary items error: {e}")
+        raise HTTPException(status_code=500, detail=f"移动节点失败: {str(e)}")
+
+
 @router.put("/itineraries/{itinerary_id}/items/{item_id}", response_model=ItineraryItem)
 async def update_itinerary_item(
+    background_tasks: BackgroundTasks,
     itinerary_id: str = Path(..., description="行程ID"),
     item_id: str = Path(..., description="节点ID"),
     item_data: ItineraryItemUpdate = None,
@@ -710,11 +727,19 @@ async def update_itinerary_item(
         if 'coordinates' in update_data and update_data['coordinates']:
             update_data['coordinates'] = update_data['coordinates']
         
+        # order_index 按位置理解：只在位置变化时为该节点重新生成排序键，其余节点不动
+        service = ItineraryService(db)
+        if update_data.get('order_index') is not None:
+            position = update_data['order_index']
+            if position != service.position_of(itinerary_id, item_id):
+                item.order_key = service.key_at(itinerary_id, position, exclude_id=item_id)
+        
         for field, value in update_data.items():
             setattr(item, field, value)
         
         db.commit()
         db.refresh(item)
+        _schedule_rebalance(background_tasks, db, service)
         
         return item
         
@@ -4,6 +4,7 @@
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import Optional
 import io
@@ -15,9 +16,16 @@ import hashlib
 import os
 import time
 from datetime import datetime
+from urllib.parse import urlparse
 from app.api.deps import get_current_user, get_db
 from app.models.user import User
 from app.core.config import settings
+from app.utils.resilience import get_circuit_breaker
+from app.core.metrics import track_ffmpeg_job
+from app.core.tracing import tracer
+
+# 科大讯飞熔断器：服务不可用时快速失败，避免每个请求都等满30秒接收超时
+xunfei_breaker = get_circuit_breaker("xunfei")
 
 router = APIRouter()
 
@@ -191,7 +199,9 @@ async def speech_to_text(
         
         # 尝试转换音频格式
         try:
-            converted_audio = convert_audio_to_pcm(audio_data, audio_file.content_type)
+            # ffmpeg转换在线程池中执行，避免阻塞事件循环
+            with track_ffmpeg_job():
+                converted_audio = await run_in_threadpool(convert_audio_to_pcm, audio_data, audio_file.content_type)
             print(f"  - 转换后大小: {len(converted_audio)} 字节")
             audio_data = converted_audio
             
@@ -350,7 +360,7 @@ async def text_to_speech_stream(
         print(f"TTS stream error: {e}")
         raise HTTPException(status_code=500, detail=f"流式语音合成失败: {str(e)}")
 
-def _generate_xunfei_auth_url(host: str, path: str, api_key: str, api_secret: str) -> str:
+def _generate_xunfei_auth_url(host: str, path: str, api_key: str, api_secret: str, scheme: str = "wss") -> str:
     """
     生成科大讯飞WebSocket认证URL
     根据文档：https://www.xfyun.cn/doc/spark/spark_zh_iat.html
@@ -384,7 +394,7 @@ def _generate_xunfei_auth_url(host: str, path: str, api_key: str, api_secret: st
     # 对参数值进行URL编码
     query_string = "&".join([f"{k}={quote(str(v), safe='')}" for k, v in params.items()])
     
-    return f"wss://{host}{path}?{query_string}"
+    return f"{scheme}://{host}{path}?{query_string}"
 
 async def call_xunfei_asr(audio_data: bytes, language: str = "zh_cn") -> dict:
     """
@@ -422,10 +432,12 @@ async def call_xunfei_asr(audio_data: bytes, language: str = "zh_cn") -> dict:
         
         # 如果websockets可用，优先使用WebSocket接口
         if websockets:
-            return await _call_xunfei_asr_websocket(audio_data, language)
+            with tracer.span("http.xunfei_asr", kind="http", transport="websocket", audio_bytes=len(audio_data)):
+                return await xunfei_breaker.call_async(lambda: _call_xunfei_asr_websocket(audio_data, language))
         else:
             # 回退到HTTP接口（可能不支持）
-            return await _call_xunfei_asr_http(audio_data, language)
+            with tracer.span("http.xunfei_asr", kind="http", transport="http", audio_bytes=len(audio_data)):
+                return await xunfei_breaker.call_async(lambda: _call_xunfei_asr_http(audio_data, language))
         
     except Exception as e:
         print(f"Xunfei ASR API error: {e}")
@@ -452,11 +464,14 @@ async def _call_xunfei_asr_websocket(audio_data: bytes, language: str = "zh_cn")
             raise Exception("音频数据为空，无法进行识别")
         
         # 根据文档，中英识别大模型API的WebSocket端点
-        host = "iat-api.xfyun.cn"
-        path = "/v2/iat"
+        asr_url = urlparse(settings.XFYUN_ASR_URL)
+        host = asr_url.netloc
+        path = asr_url.path
         
         # 生成WebSocket认证URL
-        ws_url = _generate_xunfei_auth_url(host, path, settings.XFYUN_API_KEY, settings.XFYUN_API_SECRET)
+        ws_url = _generate_xunfei_auth_url(
+            host, path, settings.XFYUN_API_KEY, settings.XFYUN_API_SECRET, scheme=asr_url.scheme
+        )
         print(f"[WebSocket ASR] WebSocket URL生成成功 (长度: {len(ws_url)})")
         
         # 将音频数据转换为base64
@@ -520,6 +535,7 @@ async def _call_xunfei_asr_websocket(audio_data: bytes, language: str = "zh_cn")
             result_text = ""
             message_count = 0
             is_finished = False
+            timed_out = False
             
             # 设置超时时间（30秒）
             import asyncio
@@ -668,6 +684,7 @@ async def _call_xunfei_asr_websocket(audio_data: bytes, language: str = "zh_cn")
                             
                     except asyncio.TimeoutError:
                         print(f"[WebSocket ASR] 等待响应超时（30秒）")
+                        timed_out = True
                         break
                     except websockets.exceptions.ConnectionClosed:
                         print(f"[WebSocket ASR] WebSocket连接已关闭")
@@ -680,6 +697,10 @@ async def _call_xunfei_asr_websocket(audio_data: bytes, language: str = "zh_cn")
             
             print(f"[WebSocket ASR] 最终识别结果: '{result_text}' (长度: {len(result_text)})")
             
+            # 超时且没有任何结果时视为上游失败，计入熔断
+            if timed_out and not result_text:
+                raise asyncio.TimeoutError("科大讯飞ASR响应超时")
+            
             if not result_text:
                 print("[WebSocket ASR] 警告: 识别结果为空，可能是:")
                 print("  1. 音频格式不正确（需要PCM格式，16kHz采样率）")
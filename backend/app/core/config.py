@@ -2,7 +2,7 @@
 
 from pydantic_settings import BaseSettings
 from pydantic import ConfigDict
-from typing import List
+from typing import Dict, List
 from functools import lru_cache
 import json
 
@@ -30,10 +30,18 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 10080  # 7 days
     REFRESH_TOKEN_EXPIRE_MINUTES: int = 43200  # 30 days
     
+    # ===== Password Hashing =====
+    # pbkdf2_sha256 迭代次数（修改后旧密码在下次登录时按新值重新哈希）；哈希线程数与最大排队数（超出返回503）
+    PASSWORD_HASH_ROUNDS: int = 29000
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 64
+    
     # ===== Third-party APIs =====
     # 阿里云百炼平台
     ALIYUN_LLM_API_KEY: str = ""
-    ALIYUN_LLM_ENDPOINT: str = "https://dashscope.aliyuncs.com/api/v1"
+    # OpenAI兼容模式端点，与DeepSeek使用相同的 /chat/completions 协议
+    ALIYUN_LLM_ENDPOINT: str = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+    ALIYUN_LLM_MODEL: str = "deepseek-v3"
     
     # DeepSeek
     DEEPSEEK_API_KEY: str = ""
@@ -43,11 +51,130 @@ class Settings(BaseSettings):
     XFYUN_APP_ID: str = ""
     XFYUN_API_KEY: str = ""
     XFYUN_API_SECRET: str = ""
+    XFYUN_ASR_URL: str = "wss://iat-api.xfyun.cn/v2/iat"
     
     # 百度地图
     BAIDU_MAP_AK: str = ""
     BAIDU_MAP_SK: str = ""
+    BAIDU_MAP_BASE_URL: str = "https://api.map.baidu.com"
+    # Agent工具返回的路线按该地图缩放级别抽稀（约1像素误差），减小SSE事件体积
+    ROUTE_TOOL_SIMPLIFY_ZOOM: int = 16
+    # 距离矩阵点对缓存（驾车耗时受路况影响，TTL不宜过长）
+    DISTANCE_MATRIX_CACHE_SIZE: int = 10000
+    DISTANCE_MATRIX_CACHE_TTL: int = 6 * 3600
+    # 地理编码先查内置的离线地名库（城市、城区、热门地标）
+    GAZETTEER_ENABLED: bool = True
+    # 地理编码/逆地理编码结果缓存（只缓存成功结果）
+    GEOCODE_CACHE_SIZE: int = 20000
+    GEOCODE_CACHE_TTL: int = 7 * 24 * 3600
+    # 批量地理编码：单次请求最多条数；未命中缓存时并发请求百度的上限（所有请求共享，按账号QPS配额设置）
+    GEOCODE_BATCH_MAX_SIZE: int = 100
+    GEOCODE_BATCH_CONCURRENCY: int = 5
+    
+    # ===== Local POI Store =====
+    # 保存搜索过的POI和行程节点，带location的搜索在覆盖范围内且未过期时直接用本地数据
+    POI_STORE_ENABLED: bool = True
+    POI_STORE_COVERAGE_TTL: int = 7 * 24 * 3600
+    
+    # ===== Itinerary Ordering =====
+    # 节点排序键超过该长度时在后台重新均匀分配该天的排序键
+    ORDER_KEY_REBALANCE_LENGTH: int = 12
+    
+    # ===== Expense Rollups =====
+    # 费用日汇总按该时区划分自然日（expense_date 为UTC的无时区时间）；其他时区的时间序列直接按原始费用分桶
+    EXPENSE_ROLLUP_TIMEZONE: str = "Asia/Shanghai"
+    # 时间序列补零时最多返回的桶数（约10年的天数），超过则返回400
+    EXPENSE_TIMESERIES_MAX_BUCKETS: int = 3660
+    
+    # ===== Expense Import =====
+    # 批量导入：每块校验并写入的行数、单个文件的最大行数与字节数、响应中最多列出的错误行
+    EXPENSE_IMPORT_CHUNK_SIZE: int = 500
+    EXPENSE_IMPORT_MAX_ROWS: int = 20000
+    EXPENSE_IMPORT_MAX_BYTES: int = 10 * 1024 * 1024
+    EXPENSE_IMPORT_MAX_ERRORS: int = 200
+    
+    # ===== Avatar Upload =====
+    # 头像上传大小上限；输出头像与缩略图的边长（像素）与WebP质量；图片处理进程池大小
+    AVATAR_MAX_BYTES: int = 5 * 1024 * 1024
+    AVATAR_SIZE: int = 512
+    AVATAR_THUMBNAIL_SIZE: int = 128
+    AVATAR_QUALITY: int = 85
+    AVATAR_PROCESS_WORKERS: int = 2
+    # /static/avatars 下的文件以内容哈希命名，浏览器和CDN可长期缓存
+    AVATAR_CACHE_MAX_AGE: int = 365 * 24 * 3600
     
+    # ===== Tools =====
+    # 工具未声明超时时使用的默认值（秒）；声明了 cache_ttl 的工具每个最多缓存的结果数
+    TOOL_DEFAULT_TIMEOUT: float = 30.0
+    TOOL_RESULT_CACHE_SIZE: int = 256
+    # 请求到达时根据关键词推测并预取可能用到的查询（与第一次LLM调用并行）
+    TOOL_PREFETCH_ENABLED: bool = True
+    
+    # ===== Resilience Configuration =====
+    # 熔断器：连续失败次数阈值与打开后的冷却时间
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_BREAKER_RECOVERY_SECONDS: float = 30.0
+    # 对冲请求（仅用于幂等的地图查询）：延迟取p95并限制在区间内
+    HEDGE_ENABLED: bool = True
+    HEDGE_MIN_DELAY_MS: int = 100
+    HEDGE_MAX_DELAY_MS: int = 2000
+    
+    # ===== LLM Routing Configuration =====
+    # 路由策略：pin:<provider> 固定使用；prefer:<provider> 优先使用，不健康时切换；
+    # spread 按健康度加权分摊；best 总是选择当前评分最好的供应商
+    LLM_DEFAULT_POLICY: str = "prefer:deepseek"
+    # 按Agent覆盖策略，JSON对象，例如 {"chat-assistant": "spread"}
+    LLM_AGENT_POLICIES: str = '{}'
+    
+    @property
+    def llm_agent_policies(self) -> Dict[str, str]:
+        """Parse per-agent LLM routing policies from JSON string"""
+        try:
+            return json.loads(self.LLM_AGENT_POLICIES)
+        except json.JSONDecodeError:
+            return {}
+    
+    # ===== Tracing Configuration =====
+    TRACING_ENABLED: bool = True
+    TRACE_BUFFER_SIZE: int = 50  # 内存中保留最近的运行数
+    TRACE_MAX_SPANS: int = 2000  # 单次运行最多记录的span数
+    # span中含工具参数与SQL语句，默认只保留在内存中；设置路径（如 logs/traces.jsonl）后才写文件
+    TRACE_EXPORT_FILE: str = ""
+    TRACE_EXPORT_MAX_BYTES: int = 10 * 1024 * 1024
+    
+    # ===== Event Loop Monitoring =====
+    # 定期检测事件循环延迟（阻塞调用会导致延迟升高），导出为 event_loop_lag_seconds
+    EVENT_LOOP_LAG_MONITOR: bool = True
+    EVENT_LOOP_LAG_INTERVAL: float = 0.5
+    
+    # ===== Server =====
+    # 生产环境worker数（gunicorn.conf.py），0 表示按容器可用CPU数自动设置
+    WEB_CONCURRENCY: int = 0
+    # 停机时进行中的请求的最长等待时间；SSE流在 SSE_DRAIN_TIMEOUT 秒后提示客户端重试并结束
+    SERVER_GRACEFUL_TIMEOUT: int = 30
+    SSE_DRAIN_TIMEOUT: float = 20.0
+    
+    # ===== Startup =====
+    # Agent默认在首次使用时加载；开启后在启动阶段预热全部Agent，/ready 在预热完成后才返回200
+    AGENT_WARMUP_ON_STARTUP: bool = False
+
+    # ===== Transcript Record/Replay =====
+    # 记录每次Agent运行的LLM输出与地图接口响应，用于回放式性能测试（包含用户输入，默认关闭）
+    TRANSCRIPT_RECORD_ENABLED: bool = False
+    TRANSCRIPT_DIR: str = "logs/transcripts"
+
+    # ===== Admin =====
+    # 可以访问 /api/v1/admin 运维接口的用户邮箱（JSON数组格式），为空时运维接口对所有用户返回403
+    ADMIN_EMAILS: str = '[]'
+    
+    @property
+    def admin_emails_list(self) -> List[str]:
+        """Parse admin emails from JSON string"""
+        try:
+            return [email.lower() for email in json.loads(self.ADMIN_EMAILS)]
+        except json.JSONDecodeError:
+            return []
+
     # ===== CORS Configuration =====
     CORS_ORIGINS: str = '["http://localhost:5173","http://localhost:3000","http://localhost","http://localhost:80"]'
     
@@ -1,20 +1,78 @@
 """Database configuration and session management"""
 
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import QueuePool
 from typing import Generator
 from app.core.config import settings
+from app.core.metrics import DB_POOL_CHECKED_OUT, DB_POOL_OVERFLOW, DB_POOL_WAIT
+from app.core.tracing import tracer
+
+
+class InstrumentedQueuePool(QueuePool):
+    """记录获取连接耗时的连接池"""
+    
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - start)
+
 
 # Create database engine
 # Note: This will not actually connect until first use
 engine = create_engine(
     settings.DATABASE_URL,
+    poolclass=InstrumentedQueuePool,
     pool_pre_ping=True,  # Verify connections before using
     pool_size=10,
     max_overflow=20,
     echo=settings.ENVIRONMENT == "development"  # Log SQL in development
 )
 
+
+
+def _update_pool_metrics(*args):
+    """连接借出/归还时刷新连接池指标"""
+    DB_POOL_CHECKED_OUT.set(engine.pool.checkedout())
+    DB_POOL_OVERFLOW.set(max(0, engine.pool.overflow()))
+
+
+event.listen(engine, "checkout", _update_pool_metrics)
+event.listen(engine, "checkin", _update_pool_metrics)
+
+
+
+# ===== SQL Tracing =====
+# 对所有引擎生效；只有处于Agent运行的trace中才会记录
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = tracer.start_span("db.query", kind="db", statement=statement[:200])
+    conn.info.setdefault("trace_spans", []).append(span)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get("trace_spans")
+    span = spans.pop() if spans else None
+    if span:
+        span.set_attribute("rowcount", cursor.rowcount)
+        span.finish()
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_sql_error(exception_context):
+    conn = exception_context.connection
+    spans = conn.info.get("trace_spans") if conn is not None else None
+    span = spans.pop() if spans else None
+    if span:
+        span.set_error(exception_context.original_exception)
+        span.finish()
+
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
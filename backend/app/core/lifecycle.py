@@ -0,0 +1,62 @@
+"""
+进程生命周期：停机时排空SSE流
+
+worker 收到停止信号后（见 app.core.server.DrainingServer）调用 begin_drain：
+/ready 立即返回503，负载均衡不再把新请求发到这个worker；进行中的SSE流最多再持续
+SSE_DRAIN_TIMEOUT 秒，到期后在两个事件之间结束，并发送一个 RUN_ERROR 事件提示客户端重试，
+而不是等到 graceful_timeout 时连接被直接切断。长时间没有新事件的流（例如阻塞在工具调用上）
+由 uvicorn 在 graceful_timeout 前取消。
+"""
+
+import time
+from contextlib import aclosing
+from datetime import datetime
+from typing import AsyncGenerator, Optional
+
+from app.core.config import settings
+
+# 排空截止时间（time.monotonic），None 表示未在停机
+_drain_deadline: Optional[float] = None
+
+
+def begin_drain(timeout: Optional[float] = None):
+    """进入排空状态（重复调用不会延长截止时间）"""
+    global _drain_deadline
+    if _drain_deadline is None:
+        timeout = settings.SSE_DRAIN_TIMEOUT if timeout is None else timeout
+        _drain_deadline = time.monotonic() + timeout
+        print(f"开始排空：进行中的SSE流最多再持续 {timeout:.0f} 秒")
+
+
+def is_draining() -> bool:
+    return _drain_deadline is not None
+
+
+def drain_expired() -> bool:
+    return _drain_deadline is not None and time.monotonic() >= _drain_deadline
+
+
+def _shutdown_event(run_id: Optional[str]) -> str:
+    from app.utils.agui_encoder import AGUIEventEncoder
+    from app.utils.agui_types import create_event, AGUIEventType
+
+    return AGUIEventEncoder().encode_event(create_event(
+        AGUIEventType.RUN_ERROR,
+        data={
+            "runId": run_id or "unknown",
+            "error": "服务正在重启，请重试",
+            "code": "SERVER_SHUTDOWN",
+            "timestamp": datetime.now().isoformat()
+        }
+    ))
+
+
+async def drain_sse_stream(stream: AsyncGenerator[str, None], run_id: Optional[str] = None) -> AsyncGenerator[str, None]:
+    """包装SSE生成器：排空到期后结束流（每个事件后检查一次，正常运行时只有一次比较的开销）"""
+    async with aclosing(stream):
+        async for event in stream:
+            yield event
+            if _drain_deadline is not None and drain_expired():
+                print(f"排空到期，结束SSE流: {run_id}")
+                yield _shutdown_event(run_id)
+                return
@@ -0,0 +1,398 @@
+"""Prometheus metrics
+
+集中定义应用指标，通过 /metrics 以Prometheus文本格式导出。
+
+多进程（多个uvicorn/gunicorn worker）部署时，需要在启动前设置环境变量
+PROMETHEUS_MULTIPROC_DIR 指向一个空目录，各worker把指标写入该目录，
+/metrics 汇总所有worker的数据。gunicorn.conf.py 会设置该变量并在启动时清空目录。
+Counter/Histogram 在汇总时合并所有worker；按worker区分的指标带 worker 标签
+（gunicorn分配的固定编号，见 app/core/server.py），liveall 模式下还会带上 pid 标签。
+"""
+
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncGenerator, Awaitable, Dict, Iterable, Optional, Set, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.tracing import tracer
+
+# 覆盖LLM首字延迟和工具调用的区间（秒）
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+# ===== HTTP =====
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP请求耗时",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+SSE_ACTIVE_STREAMS = Gauge(
+    "sse_active_streams",
+    "进行中的SSE流数量",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+)
+
+# ===== LLM =====
+LLM_TTFT = Histogram(
+    "llm_ttft_seconds",
+    "LLM首个token延迟",
+    ["provider", "agent"],
+    buckets=LATENCY_BUCKETS,
+)
+
+LLM_DURATION = Histogram(
+    "llm_duration_seconds",
+    "LLM请求总耗时",
+    ["provider", "agent", "mode"],
+    buckets=LATENCY_BUCKETS,
+)
+
+LLM_ERRORS = Counter(
+    "llm_errors_total",
+    "LLM请求失败次数",
+    ["provider", "agent"],
+)
+
+LLM_PROMPT_TOKENS = Counter(
+    "llm_prompt_tokens_total",
+    "LLM输入token数（cache=hit 为命中供应商前缀缓存的部分）",
+    ["provider", "agent", "cache"],
+)
+
+# ===== Tools =====
+TOOL_DURATION = Histogram(
+    "tool_duration_seconds",
+    "工具调用耗时",
+    ["tool", "source"],
+    buckets=LATENCY_BUCKETS,
+)
+
+TOOL_ERRORS = Counter(
+    "tool_errors_total",
+    "工具调用失败次数（异常或返回success=False）",
+    ["tool", "source"],
+)
+
+TOOL_PREFETCH = Counter(
+    "tool_prefetch_total",
+    "推测性预取（outcome: started 开始、hit 被使用、waste 未使用被丢弃、error 失败）",
+    ["agent", "tool", "outcome"],
+)
+
+# ===== Database =====
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "已借出的数据库连接数",
+    multiprocess_mode="livesum",
+)
+
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow",
+    "超出pool_size的溢出连接数",
+    multiprocess_mode="livesum",
+)
+
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds",
+    "从连接池获取连接的耗时（含排队等待）",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+
+# ===== Voice =====
+FFMPEG_QUEUE_DEPTH = Gauge(
+    "ffmpeg_queue_depth",
+    "排队或进行中的ffmpeg音频转换数",
+    multiprocess_mode="livesum",
+)
+
+# ===== Avatar =====
+AVATAR_QUEUE_DEPTH = Gauge(
+    "avatar_processing_queue_depth",
+    "排队或进行中的头像图片处理数",
+    multiprocess_mode="livesum",
+)
+
+# ===== Password Hashing =====
+PASSWORD_HASH_QUEUE_DEPTH = Gauge(
+    "password_hash_queue_depth",
+    "排队或计算中的密码哈希数",
+    multiprocess_mode="livesum",
+)
+
+PASSWORD_HASH_WAIT = Histogram(
+    "password_hash_wait_seconds",
+    "密码哈希在线程池中的排队时间",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds",
+    "密码哈希计算耗时（operation: hash/verify，verify含需要时的重新哈希）",
+    ["operation"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected_total",
+    "排队已满被拒绝（503）的密码哈希请求数",
+)
+
+# ===== Workers =====
+WORKER_INFO = Gauge(
+    "app_worker_info",
+    "运行中的worker（值恒为1）",
+    ["worker"],
+    multiprocess_mode="liveall",
+)
+
+WORKER_REQUESTS_IN_PROGRESS = Gauge(
+    "worker_requests_in_progress",
+    "每个worker正在处理的HTTP请求数（SSE只统计到响应头返回为止）",
+    ["worker"],
+    multiprocess_mode="liveall",
+)
+
+WORKER_EVENT_LOOP_LAG = Gauge(
+    "worker_event_loop_lag_seconds",
+    "每个worker最近一次测得的事件循环延迟",
+    ["worker"],
+    multiprocess_mode="liveall",
+)
+
+# ===== Startup =====
+APP_STARTUP_SECONDS = Gauge(
+    "app_startup_seconds",
+    "应用启动耗时（从导入 app.main 到可以接收请求）",
+    ["phase"],
+    multiprocess_mode="max",
+)
+
+# ===== Event Loop =====
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "事件循环调度延迟（实际唤醒时间与预期的差值）",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+# ===== Upstream =====
+SINGLE_FLIGHT_COALESCED = Counter(
+    "single_flight_coalesced_total",
+    "被合并到进行中请求的上游调用次数",
+    ["name"],
+)
+DISTANCE_MATRIX_PAIRS = Counter(
+    "distance_matrix_pairs_total",
+    "距离矩阵查询的点对数（source: baidu/cache/estimate）",
+    ["mode", "source"],
+)
+GEOCODE_LOOKUPS = Counter(
+    "geocode_lookups_total",
+    "地理编码请求数（source: gazetteer/cache/upstream）",
+    ["source"],
+)
+REVERSE_GEOCODE_LOOKUPS = Counter(
+    "reverse_geocode_lookups_total",
+    "逆地理编码请求数（source: cache/upstream）",
+    ["source"],
+)
+POI_STORE_LOOKUPS = Counter(
+    "poi_store_lookups_total",
+    "本地POI库查询次数（result: hit/miss/incomplete/error）",
+    ["result"],
+)
+
+
+def worker_id() -> str:
+    """当前worker编号（单进程运行时为0）"""
+    return os.environ.get("APP_WORKER_ID", "0")
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    生成Prometheus文本格式的指标
+
+    Returns:
+        (指标内容, Content-Type)
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+# 已声明的工具名（见 app/utils/tool_registry.py）；工具名来自LLM输出，未声明的统一记为 unknown，避免标签基数无限增长
+_TOOL_NAMES: Set[str] = set()
+
+
+def register_tool_names(names: Iterable[str]):
+    """登记可以作为 tool 标签的工具名"""
+    _TOOL_NAMES.update(names)
+
+
+def tool_label(tool_name: str) -> str:
+    return tool_name if tool_name in _TOOL_NAMES else "unknown"
+
+
+def _is_failed_result(result: Any) -> bool:
+    return isinstance(result, dict) and result.get("success") is False
+
+
+async def observe_tool(tool_name: str, source: str, call: Awaitable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    记录一次工具调用的耗时与结果
+
+    Args:
+        tool_name: 工具名称
+        source: 调用方（tool_executor或Agent ID）
+        call: 工具调用的awaitable
+    """
+    start = time.perf_counter()
+    label = tool_label(tool_name)
+    try:
+        with tracer.span(f"tool.{tool_name}", kind="tool", source=source):
+            result = await call
+    except Exception:
+        TOOL_ERRORS.labels(tool=label, source=source).inc()
+        raise
+    finally:
+        TOOL_DURATION.labels(tool=label, source=source).observe(time.perf_counter() - start)
+    if _is_failed_result(result):
+        TOOL_ERRORS.labels(tool=label, source=source).inc()
+    return result
+
+
+class RequestMetricsMiddleware:
+    """
+    记录每个路由的请求耗时与每个worker进行中的请求数
+
+    纯ASGI中间件，只观察 http.response.start 消息，不包装响应体，SSE流不经过额外的任务和队列。
+    使用路由模板（如 /api/v1/trips/{trip_id}）作为标签，避免标签基数爆炸；
+    SSE接口只统计到响应头返回为止，流的持续时间见 sse_active_streams。
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        in_progress = WORKER_REQUESTS_IN_PROGRESS.labels(worker=worker_id())
+        in_progress.inc()
+        finished = False
+
+        def finish(status_code: int):
+            nonlocal finished
+            if finished:
+                return
+            finished = True
+            in_progress.dec()
+            # 路由匹配后 Starlette 把 route 写入同一个 scope
+            route_path = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUEST_DURATION.labels(
+                method=scope["method"],
+                route=route_path,
+                status=str(status_code)
+            ).observe(time.perf_counter() - start)
+
+        async def send_with_metrics(message: Message):
+            if message["type"] == "http.response.start":
+                finish(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            # 没有发出响应头（未处理的异常）时按500记录
+            finish(500)
+
+
+async def track_sse_stream(endpoint: str, stream: AsyncGenerator[str, None]) -> AsyncGenerator[str, None]:
+    """包装SSE生成器，统计进行中的流数量"""
+    SSE_ACTIVE_STREAMS.labels(endpoint=endpoint).inc()
+    try:
+        async for event in stream:
+            yield event
+    finally:
+        SSE_ACTIVE_STREAMS.labels(endpoint=endpoint).dec()
+
+
+@contextmanager
+def track_ffmpeg_job():
+    """统计排队或进行中的ffmpeg转换"""
+    FFMPEG_QUEUE_DEPTH.inc()
+    try:
+        yield
+    finally:
+        FFMPEG_QUEUE_DEPTH.dec()
+
+
+@contextmanager
+def track_avatar_job():
+    """统计排队或进行中的头像处理"""
+    AVATAR_QUEUE_DEPTH.inc()
+    try:
+        yield
+    finally:
+        AVATAR_QUEUE_DEPTH.dec()
+
+
+def observe_llm_stream(provider: str, agent: Optional[str], ttft: Optional[float], duration: float, failed: bool):
+    """记录一次LLM流式调用"""
+    agent = agent or "default"
+    if ttft is not None:
+        LLM_TTFT.labels(provider=provider, agent=agent).observe(ttft)
+    LLM_DURATION.labels(provider=provider, agent=agent, mode="stream").observe(duration)
+    if failed:
+        LLM_ERRORS.labels(provider=provider, agent=agent).inc()
+
+
+def observe_llm_completion(provider: str, agent: Optional[str], duration: float, failed: bool):
+    """记录一次LLM非流式调用"""
+    agent = agent or "default"
+    LLM_DURATION.labels(provider=provider, agent=agent, mode="complete").observe(duration)
+    if failed:
+        LLM_ERRORS.labels(provider=provider, agent=agent).inc()
+
+
+def observe_llm_usage(provider: str, agent: Optional[str], cache_hit_tokens: int, cache_miss_tokens: int):
+    """记录一次LLM调用的输入token，区分前缀缓存命中与未命中"""
+    agent = agent or "default"
+    LLM_PROMPT_TOKENS.labels(provider=provider, agent=agent, cache="hit").inc(cache_hit_tokens)
+    LLM_PROMPT_TOKENS.labels(provider=provider, agent=agent, cache="miss").inc(cache_miss_tokens)
+
+
+async def monitor_event_loop_lag(interval: float):
+    """
+    周期性睡眠并测量实际唤醒延迟
+
+    同步阻塞调用（如requests、ffmpeg、密码哈希）占用事件循环时延迟会明显升高。
+    """
+    loop = asyncio.get_running_loop()
+    worker_lag = WORKER_EVENT_LOOP_LAG.labels(worker=worker_id())
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        EVENT_LOOP_LAG.observe(lag)
+        worker_lag.set(lag)
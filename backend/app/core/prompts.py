@@ -0,0 +1,67 @@
+"""
+版本化的系统提示词
+
+LLM供应商（DeepSeek、阿里云百炼）会缓存请求的前缀，命中部分不再重新计算，首字延迟和费用都更低。
+前缀在第一个不同的字节处就失效，因此系统提示词统一分为两段：
+
+- 静态前缀：角色说明、工具用法、示例，进程内只构建一次，所有请求逐字节一致
+- 动态后缀：行程ID、节点列表、费用统计等随请求变化的内容，始终放在静态前缀之后
+
+修改静态前缀时需要同时提升版本号（tests/test_prompts.py 固定了各版本的指纹），
+这样缓存命中率的变化可以和提示词版本对应起来。
+"""
+
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+# 动态后缀前的分隔标题
+DYNAMIC_HEADER = "===== 当前上下文 ====="
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """一个系统提示词版本"""
+
+    name: str
+    version: str
+    static: str
+    fingerprint: str = field(init=False)
+
+    def __post_init__(self):
+        digest = hashlib.sha256(self.static.encode("utf-8")).hexdigest()[:12]
+        object.__setattr__(self, "fingerprint", digest)
+
+    def render(self, dynamic: Optional[str] = None) -> str:
+        """静态前缀 + 动态后缀；没有动态内容时只返回静态前缀"""
+        if not dynamic:
+            return self.static
+        return f"{self.static}\n\n{DYNAMIC_HEADER}\n{dynamic.strip()}\n"
+
+
+_registry: Dict[str, PromptTemplate] = {}
+
+
+def register_prompt(name: str, version: str, static: str) -> PromptTemplate:
+    """注册提示词；同名同版本重复注册时内容必须一致"""
+    template = PromptTemplate(name=name, version=version, static=static)
+    existing = _registry.get(name)
+    if existing is not None and existing.version == version and existing.static != static:
+        raise ValueError(f"提示词 {name} v{version} 内容已变化，请提升版本号")
+    _registry[name] = template
+    return template
+
+
+def get_prompt(name: str) -> PromptTemplate:
+    try:
+        return _registry[name]
+    except KeyError:
+        raise KeyError(f"未注册的提示词: {name}") from None
+
+
+def list_prompts() -> List[Dict[str, Any]]:
+    """已注册提示词的版本与指纹"""
+    return [
+        {"name": t.name, "version": t.version, "fingerprint": t.fingerprint, "static_chars": len(t.static)}
+        for t in sorted(_registry.values(), key=lambda t: t.name)
+    ]
@@ -1,13 +1,36 @@
-"""Security utilities for JWT and password hashing"""
+"""Security utilities for JWT and password hashing
 
+密码哈希（pbkdf2_sha256）每次需要数十到数百毫秒CPU，在请求中使用 *_async 版本：
+计算放到专用线程池（hashlib.pbkdf2_hmac 计算期间释放GIL，多个线程可以并行），
+线程数即并发上限；排队数超过 PASSWORD_HASH_MAX_PENDING 时直接返回503，避免登录高峰时无限排队。
+迭代次数由 PASSWORD_HASH_ROUNDS 配置，登录时发现旧哈希的迭代次数不同会顺带重新计算。
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Callable, Optional, Dict, Any, Tuple
+from fastapi import HTTPException, status
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.core.config import settings
+from app.core.metrics import (
+    PASSWORD_HASH_DURATION,
+    PASSWORD_HASH_QUEUE_DEPTH,
+    PASSWORD_HASH_REJECTED,
+    PASSWORD_HASH_WAIT,
+)
 
 # Password hashing context - use pbkdf2_sha256 only
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+# 迭代次数与配置不同（更低或更高）的哈希 needs_update 为真，登录时重新计算
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__default_rounds=settings.PASSWORD_HASH_ROUNDS,
+    pbkdf2_sha256__min_rounds=settings.PASSWORD_HASH_ROUNDS,
+    pbkdf2_sha256__max_rounds=settings.PASSWORD_HASH_ROUNDS,
+)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -40,6 +63,67 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+_hash_executor: Optional[ThreadPoolExecutor] = None
+# 排队或计算中的哈希数（只在事件循环线程中修改）
+_pending = 0
+
+
+def _get_hash_executor() -> ThreadPoolExecutor:
+    """按需创建线程池（多进程部署时在fork之后才创建）"""
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            thread_name_prefix="password-hash"
+        )
+    return _hash_executor
+
+
+async def _run_hashing(operation: str, func: Callable[..., Any], *args: Any) -> Any:
+    """在哈希线程池中执行，记录排队时间与计算耗时；排队过多时返回503"""
+    global _pending
+    if _pending >= settings.PASSWORD_HASH_MAX_PENDING:
+        PASSWORD_HASH_REJECTED.inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="服务繁忙，请稍后重试",
+            headers={"Retry-After": "1"},
+        )
+    
+    queued = time.perf_counter()
+    
+    def timed():
+        started = time.perf_counter()
+        PASSWORD_HASH_WAIT.observe(started - queued)
+        try:
+            return func(*args)
+        finally:
+            PASSWORD_HASH_DURATION.labels(operation=operation).observe(time.perf_counter() - started)
+    
+    _pending += 1
+    PASSWORD_HASH_QUEUE_DEPTH.inc()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_hash_executor(), timed)
+    finally:
+        _pending -= 1
+        PASSWORD_HASH_QUEUE_DEPTH.dec()
+
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash 的异步版本（在哈希线程池中计算）"""
+    return await _run_hashing("hash", get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    在哈希线程池中验证密码
+    
+    Returns:
+        (是否匹配, 新哈希)：密码正确且旧哈希的迭代次数与当前配置不同时返回重新计算的哈希，否则为None
+    """
+    return await _run_hashing("verify", pwd_context.verify_and_update, plain_password, hashed_password)
+
+
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
     """
     Create a JWT access token
@@ -0,0 +1,139 @@
+"""
+生产环境多进程启动
+
+由 gunicorn 管理多个 uvicorn worker（配置见 backend/gunicorn.conf.py，这里是其中引用的钩子和worker类）：
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+- worker数默认等于容器实际可用的CPU数（cgroup配额与CPU亲和性），WEB_CONCURRENCY 大于0时使用该值
+- preload_app：主进程导入应用一次，worker fork 后共享已导入的模块；fork 后丢弃继承的数据库连接池，
+  每个worker在首次使用时建立自己的连接（HTTP客户端都是按请求创建的，没有需要重建的共享连接池）
+- 停机时先进入排空状态（见 app.core.lifecycle），uvicorn 在 graceful_timeout 之前等待进行中的请求
+- 每个worker分配固定编号（0..N-1，重启的worker复用空出的编号），作为指标的 worker 标签；
+  worker退出后清理它在 PROMETHEUS_MULTIPROC_DIR 中的 live* 指标
+"""
+
+import math
+import os
+import shutil
+import sys
+from itertools import count
+from typing import Optional
+
+from gunicorn.arbiter import Arbiter
+from uvicorn.main import Server
+from uvicorn.workers import UvicornWorker
+
+from app.core.config import settings
+from app.core.lifecycle import begin_drain
+
+# 传给worker进程的编号
+WORKER_ID_ENV = "APP_WORKER_ID"
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_quota(root: str = "/sys/fs/cgroup") -> Optional[float]:
+    """容器的CPU配额（核数），未限制时返回None；依次尝试 cgroup v2 和 v1"""
+    cpu_max = _read(os.path.join(root, "cpu.max"))
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+    quota = _read(os.path.join(root, "cpu", "cpu.cfs_quota_us"))
+    period = _read(os.path.join(root, "cpu", "cpu.cfs_period_us"))
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def available_cpus(root: str = "/sys/fs/cgroup") -> int:
+    """当前进程可用的CPU数：CPU亲和性与cgroup配额（向上取整）中较小的一个"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = cgroup_cpu_quota(root)
+    if quota:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+
+def default_workers() -> int:
+    return settings.WEB_CONCURRENCY if settings.WEB_CONCURRENCY > 0 else available_cpus()
+
+
+def prepare_metrics_dir():
+    """
+    清空上次运行留下的多进程指标文件
+
+    preload_app 时主进程在调用 on_starting 之前就会导入应用（创建指标文件），
+    因此由 gunicorn.conf.py 在加载配置时调用。
+    """
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+
+# ===== gunicorn 钩子 =====
+
+def on_starting(server):
+    server.log.info(f"启动 {server.cfg.workers} 个worker（可用CPU: {available_cpus()}）")
+
+
+def pre_fork(server, worker):
+    """fork前在主进程中分配最小的空闲编号，子进程通过环境变量继承"""
+    used = {getattr(w, "app_worker_id", None) for w in server.WORKERS.values()}
+    worker.app_worker_id = next(i for i in count() if i not in used)
+    os.environ[WORKER_ID_ENV] = str(worker.app_worker_id)
+
+
+def post_fork(server, worker):
+    """fork后在子进程中丢弃从主进程继承的连接池，连接不能跨进程共享"""
+    from app.core.database import engine
+
+    engine.dispose(close=False)
+    server.log.info(f"worker {worker.app_worker_id} 已启动 (pid: {worker.pid})")
+
+
+def child_exit(server, worker):
+    """worker退出：清理其 live* 指标，避免 livesum 仍计入已退出的进程"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
+
+
+# ===== Worker =====
+
+class DrainingServer(Server):
+    """停机时先进入排空状态，再执行uvicorn的关闭流程（停止接受连接、等待进行中的请求）"""
+
+    async def shutdown(self, sockets=None):
+        begin_drain()
+        await super().shutdown(sockets=sockets)
+
+
+class DrainingUvicornWorker(UvicornWorker):
+    """支持SSE排空的uvicorn worker"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 比gunicorn强制结束worker早一点取消剩余请求，使应用的shutdown事件能够执行
+        self.config.timeout_graceful_shutdown = max(1, self.cfg.graceful_timeout - 2)
+
+    async def _serve(self):
+        self.config.app = self.wsgi
+        server = DrainingServer(config=self.config)
+        self._install_sigquit_handler()
+        await server.serve(sockets=self.sockets)
+        if not server.started:
+            sys.exit(Arbiter.WORKER_BOOT_ERROR)
@@ -0,0 +1,268 @@
+"""Lightweight tracing
+
+按 run_id 生成 trace，通过 contextvars 在 Agent运行 → LLM → 工具 → 数据库 → 上游HTTP
+之间传播，记录各阶段耗时。
+
+导出：
+- 内存中保留最近 TRACE_BUFFER_SIZE 个运行，供 /api/v1/admin/traces 查看瀑布图
+- 设置 TRACE_EXPORT_FILE 后写入文件（每行一个OTLP风格的JSON trace，默认关闭）
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.core.config import settings
+
+
+class Span:
+    """一个计时区间"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start", "end", "attributes", "status")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, kind: str, attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = time.time()
+        self.end: Optional[float] = None
+        self.attributes = attributes
+        self.status = "ok"
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_error(self, error: BaseException):
+        self.status = "error"
+        self.attributes["error"] = str(error)[:500]
+
+    def finish(self):
+        if self.end is None:
+            self.end = time.time()
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.time()
+        return (end - self.start) * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": int(self.start * 1e9),
+            "endTimeUnixNano": int((self.end or time.time()) * 1e9),
+            "status": self.status,
+            "attributes": self.attributes
+        }
+
+
+class Trace:
+    """一次Agent运行的所有span"""
+
+    def __init__(self, run_id: str, name: str, attributes: Dict[str, Any]):
+        self.run_id = run_id
+        # 由run_id确定性地生成128位trace id，便于跨服务关联
+        self.trace_id = hashlib.md5(run_id.encode("utf-8")).hexdigest()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self.root = self.add_span(None, name, "run", {"run_id": run_id, **attributes})
+
+    def add_span(self, parent_id: Optional[str], name: str, kind: str, attributes: Dict[str, Any]) -> Span:
+        span = Span(self.trace_id, parent_id, name, kind, attributes)
+        with self._lock:
+            # 防止长时间运行的trace无限增长（例如大量SQL）
+            if len(self.spans) < settings.TRACE_MAX_SPANS:
+                self.spans.append(span)
+        return span
+
+    def waterfall(self) -> Dict[str, Any]:
+        """生成瀑布图数据：按开始时间排序，给出相对偏移与层级"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        depth: Dict[str, int] = {}
+        rows = []
+        for span in spans:
+            level = depth.get(span.parent_id, -1) + 1 if span.parent_id else 0
+            depth[span.span_id] = level
+            rows.append({
+                "span_id": span.span_id,
+                "parent_id": span.parent_id,
+                "name": span.name,
+                "kind": span.kind,
+                "depth": level,
+                "offset_ms": round((span.start - self.root.start) * 1000, 2),
+                "duration_ms": round(span.duration_ms, 2),
+                "status": span.status,
+                "attributes": span.attributes
+            })
+        return {
+            "run_id": self.run_id,
+            "trace_id": self.trace_id,
+            "duration_ms": round(self.root.duration_ms, 2),
+            "span_count": len(rows),
+            "spans": rows
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            span_count = len(self.spans)
+            kinds: Dict[str, float] = {}
+            for span in self.spans:
+                if span.kind != "run":
+                    kinds[span.kind] = kinds.get(span.kind, 0.0) + span.duration_ms
+        return {
+            "run_id": self.run_id,
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "agent_id": self.root.attributes.get("agent_id"),
+            "started_at": self.root.start,
+            "duration_ms": round(self.root.duration_ms, 2),
+            "status": self.root.status,
+            "span_count": span_count,
+            # 各类span累计耗时，快速判断时间花在LLM、工具、数据库还是上游
+            "time_by_kind_ms": {k: round(v, 2) for k, v in kinds.items()}
+        }
+
+    def to_otlp(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = [span.to_dict() for span in self.spans]
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": {"service.name": settings.PROJECT_NAME}},
+                "scopeSpans": [{"scope": {"name": "app.core.tracing"}, "spans": spans}]
+            }]
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """trace收集与导出"""
+
+    def __init__(self):
+        self._traces: "OrderedDict[str, Trace]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 单线程写文件，避免阻塞事件循环
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trace-export")
+
+    @property
+    def enabled(self) -> bool:
+        return settings.TRACING_ENABLED
+
+    def begin_run(self, run_id: str, name: str, **attributes) -> Optional[Trace]:
+        """
+        开始一次运行的trace，并设为当前上下文
+
+        Returns:
+            Trace对象；未启用追踪时返回None
+        """
+        if not self.enabled:
+            return None
+        trace = Trace(run_id, name, attributes)
+        _current_trace.set(trace)
+        _current_span.set(trace.root)
+        with self._lock:
+            self._traces[run_id] = trace
+            while len(self._traces) > settings.TRACE_BUFFER_SIZE:
+                self._traces.popitem(last=False)
+        return trace
+
+    def end_run(self, trace: Optional[Trace], error: Optional[BaseException] = None):
+        """结束运行的trace并导出"""
+        if trace is None:
+            return
+        if error is not None:
+            trace.root.set_error(error)
+        trace.root.finish()
+        if _current_trace.get() is trace:
+            _current_trace.set(None)
+            _current_span.set(None)
+        if settings.TRACE_EXPORT_FILE:
+            self._writer.submit(self._export_to_file, trace)
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", **attributes) -> Iterator[Optional[Span]]:
+        """
+        在当前trace下创建子span并设为当前span
+
+        没有活动trace时不做任何记录。
+        """
+        trace = _current_trace.get()
+        if trace is None:
+            yield None
+            return
+        parent = _current_span.get()
+        span = trace.add_span(parent.span_id if parent else None, name, kind, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            span.finish()
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # 异步生成器在其他上下文中被关闭
+                pass
+
+    def start_span(self, name: str, kind: str = "internal", **attributes) -> Optional[Span]:
+        """
+        创建叶子span但不改变当前上下文，适用于跨越yield的流式调用
+
+        调用方负责 span.finish()。
+        """
+        trace = _current_trace.get()
+        if trace is None:
+            return None
+        parent = _current_span.get()
+        return trace.add_span(parent.span_id if parent else None, name, kind, attributes)
+
+    def get_trace(self, run_id: str) -> Optional[Trace]:
+        with self._lock:
+            return self._traces.get(run_id)
+
+    def recent_traces(self, limit: int) -> List[Trace]:
+        with self._lock:
+            traces = list(self._traces.values())
+        return list(reversed(traces))[:limit]
+
+    def _export_to_file(self, trace: Trace):
+        path = settings.TRACE_EXPORT_FILE
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # 简单的按大小轮转
+            if os.path.exists(path) and os.path.getsize(path) > settings.TRACE_EXPORT_MAX_BYTES:
+                os.replace(path, f"{path}.1")
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(trace.to_otlp(), ensure_ascii=False, default=str) + "\n")
+        except Exception as e:
+            print(f"trace导出失败: {e}")
+
+
+def current_trace_id() -> Optional[str]:
+    """当前上下文的trace id"""
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+
+# 全局tracer实例
+tracer = Tracer()
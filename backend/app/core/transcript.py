@@ -0,0 +1,337 @@
+"""Agent transcript record & replay
+
+记录一次Agent运行中上游返回的内容（LLM流式chunk、非流式结果、百度地图接口响应）及其时间，
+之后可以在 DeepSeekLLMService 与 BaiduMapTools 中按原始时间或压缩后的时间回放，
+把真实对话变成可重复的性能测试用例（覆盖解析、编码和工具调度，而不依赖线上LLM输出）。
+
+记录：设置 TRANSCRIPT_RECORD_ENABLED=true，每次Agent运行写入 TRANSCRIPT_DIR/<run_id>.json
+回放：
+    with replaying("logs/transcripts/run_xxx.json", speed=0):
+        async for event in agent_service.run_agent(...):
+            ...
+speed=1 按原始时间回放，speed=10 压缩为1/10，speed=0 不等待。
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncGenerator, Deque, Dict, Iterator, List, Optional, Union
+
+from app.core.config import settings
+
+TRANSCRIPT_VERSION = 1
+
+# 不写入文件、也不参与匹配的参数（密钥和签名）
+_SECRET_PARAMS = {"ak", "sk", "sn"}
+
+
+class TranscriptMissError(LookupError):
+    """回放时找不到对应的记录"""
+
+
+def _public_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in params.items() if k not in _SECRET_PARAMS}
+
+
+def _http_key(service: str, endpoint: str, params: Dict[str, Any]) -> str:
+    return json.dumps([service, endpoint, _public_params(params)], sort_keys=True, ensure_ascii=False, default=str)
+
+
+class TranscriptRecorder:
+    """一次Agent运行的上游记录"""
+
+    def __init__(self, run_id: str, agent_id: str, inputs: Dict[str, Any]):
+        self.run_id = run_id
+        self.agent_id = agent_id
+        self.inputs = inputs
+        self.started_at = time.time()
+        self._start = time.monotonic()
+        self.events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def _add(self, event: Dict[str, Any], started: float):
+        event["offset"] = round(started - self._start, 4)
+        with self._lock:
+            self.events.append(event)
+
+    def begin_llm_stream(self, started: float) -> "LLMStreamRecord":
+        """
+        开始记录一次流式LLM调用
+
+        chunk在产生时即写入记录，调用方提前关闭生成器时已收到的部分也不会丢失。
+
+        Args:
+            started: 调用开始的 time.monotonic()
+        """
+        event = {"type": "llm_stream", "provider": None, "chunks": [], "error": None}
+        self._add(event, started)
+        return LLMStreamRecord(event, started)
+
+    def record_llm_completion(
+        self, provider: str, started: float, duration: float, result: Optional[Dict[str, Any]], error: Optional[str] = None
+    ):
+        """记录一次非流式LLM调用"""
+        self._add({
+            "type": "llm_completion",
+            "provider": provider,
+            "duration": round(duration, 4),
+            "result": result,
+            "error": error
+        }, started)
+
+    def record_http(
+        self,
+        service: str,
+        endpoint: str,
+        params: Dict[str, Any],
+        started: float,
+        duration: float,
+        status_code: Optional[int] = None,
+        content_type: str = "",
+        body: str = "",
+        error: Optional[str] = None
+    ):
+        """记录一次上游HTTP调用（参数中的密钥不会写入）"""
+        self._add({
+            "type": "http",
+            "service": service,
+            "endpoint": endpoint,
+            "params": _public_params(params),
+            "duration": round(duration, 4),
+            "status_code": status_code,
+            "content_type": content_type,
+            "body": body,
+            "error": error
+        }, started)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            # 流式记录可能仍在追加chunk，复制一份
+            events = [dict(e, chunks=list(e["chunks"])) if "chunks" in e else dict(e) for e in self.events]
+        return {
+            "version": TRANSCRIPT_VERSION,
+            "run_id": self.run_id,
+            "agent_id": self.agent_id,
+            "started_at": self.started_at,
+            "duration": round(time.monotonic() - self._start, 4),
+            "inputs": self.inputs,
+            "events": events
+        }
+
+
+class LLMStreamRecord:
+    """一次流式LLM调用的记录"""
+
+    def __init__(self, event: Dict[str, Any], started: float):
+        self.event = event
+        self.started = started
+
+    def add_chunk(self, provider: str, data: str):
+        """记录调用方收到的一个chunk"""
+        self.event["provider"] = provider
+        self.event["chunks"].append([round(time.monotonic() - self.started, 4), data])
+
+    def set_error(self, provider: str, error: BaseException):
+        self.event["provider"] = self.event["provider"] or provider
+        self.event["error"] = str(error)
+
+
+class TranscriptPlayer:
+    """
+    回放器
+
+    LLM调用按记录顺序依次回放；HTTP调用按 (服务, 接口, 参数) 匹配，
+    同一请求出现多次时按顺序回放，因此本地缓存命中与否不会打乱回放。
+    """
+
+    def __init__(self, transcript: Dict[str, Any], speed: float = 1.0):
+        if transcript.get("version") != TRANSCRIPT_VERSION:
+            raise ValueError(f"不支持的transcript版本: {transcript.get('version')}")
+        if speed < 0:
+            raise ValueError("speed不能为负数")
+        self.transcript = transcript
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._llm_streams: Deque[Dict[str, Any]] = deque()
+        self._llm_completions: Deque[Dict[str, Any]] = deque()
+        self._http: Dict[str, Deque[Dict[str, Any]]] = {}
+        for event in transcript.get("events", []):
+            if event["type"] == "llm_stream":
+                self._llm_streams.append(event)
+            elif event["type"] == "llm_completion":
+                self._llm_completions.append(event)
+            elif event["type"] == "http":
+                key = _http_key(event["service"], event["endpoint"], event["params"])
+                self._http.setdefault(key, deque()).append(event)
+        self.replayed = 0
+        self.missed = 0
+
+    @classmethod
+    def load(cls, path: str, speed: float = 1.0) -> "TranscriptPlayer":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), speed)
+
+    def _delay(self, seconds: float) -> float:
+        if self.speed == 0 or seconds <= 0:
+            return 0.0
+        return seconds / self.speed
+
+    def _pop(self, queue: Optional[Deque[Dict[str, Any]]], what: str) -> Dict[str, Any]:
+        with self._lock:
+            if not queue:
+                self.missed += 1
+                raise TranscriptMissError(f"transcript中没有更多的{what}记录")
+            self.replayed += 1
+            return queue.popleft()
+
+    async def replay_llm_stream(self) -> AsyncGenerator[str, None]:
+        """按记录的时间间隔回放下一次流式LLM调用"""
+        event = self._pop(self._llm_streams, "LLM流式调用")
+        elapsed = 0.0
+        for offset, data in event["chunks"]:
+            delay = self._delay(offset - elapsed)
+            if delay:
+                await asyncio.sleep(delay)
+            elapsed = offset
+            yield data
+        if event.get("error"):
+            raise Exception(event["error"])
+
+    async def replay_llm_completion(self) -> Dict[str, Any]:
+        """回放下一次非流式LLM调用"""
+        event = self._pop(self._llm_completions, "LLM非流式调用")
+        delay = self._delay(event["duration"])
+        if delay:
+            await asyncio.sleep(delay)
+        if event.get("error"):
+            raise Exception(event["error"])
+        return event["result"]
+
+    def replay_http(self, service: str, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        回放一次同步HTTP调用（在线程池中执行，使用阻塞sleep）
+
+        Returns:
+            记录的响应：status_code、content_type、body
+        """
+        queue = self._http.get(_http_key(service, endpoint, params))
+        event = self._pop(queue, f"{service} {endpoint} {_public_params(params)}")
+        delay = self._delay(event["duration"])
+        if delay:
+            time.sleep(delay)
+        if event.get("error"):
+            raise Exception(event["error"])
+        return event
+
+    def remaining(self) -> int:
+        """尚未回放的记录数"""
+        with self._lock:
+            return len(self._llm_streams) + len(self._llm_completions) + sum(len(q) for q in self._http.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "run_id": self.transcript.get("run_id"),
+            "speed": self.speed,
+            "replayed": self.replayed,
+            "missed": self.missed,
+            "remaining": self.remaining()
+        }
+
+
+_current_recorder: ContextVar[Optional[TranscriptRecorder]] = ContextVar("current_transcript_recorder", default=None)
+_current_player: ContextVar[Optional[TranscriptPlayer]] = ContextVar("current_transcript_player", default=None)
+
+
+def current_recorder() -> Optional[TranscriptRecorder]:
+    """当前上下文的记录器"""
+    return _current_recorder.get()
+
+
+def current_player() -> Optional[TranscriptPlayer]:
+    """当前上下文的回放器"""
+    return _current_player.get()
+
+
+class TranscriptStore:
+    """记录的开始、结束与落盘"""
+
+    def __init__(self):
+        # 单线程写文件，避免阻塞事件循环
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transcript-export")
+
+    @property
+    def enabled(self) -> bool:
+        return settings.TRANSCRIPT_RECORD_ENABLED
+
+    def begin_recording(self, run_id: str, agent_id: str, **inputs) -> Optional[TranscriptRecorder]:
+        """
+        开始记录一次Agent运行，并设为当前上下文
+
+        回放中的运行不会再被记录。
+
+        Returns:
+            记录器；未启用时返回None
+        """
+        if not self.enabled or current_player() is not None:
+            return None
+        recorder = TranscriptRecorder(run_id, agent_id, inputs)
+        _current_recorder.set(recorder)
+        return recorder
+
+    def end_recording(self, recorder: Optional[TranscriptRecorder], error: Optional[BaseException] = None):
+        """结束记录并写入 TRANSCRIPT_DIR"""
+        if recorder is None:
+            return
+        if _current_recorder.get() is recorder:
+            _current_recorder.set(None)
+        data = recorder.to_dict()
+        if error is not None:
+            data["error"] = str(error)[:500]
+        self._writer.submit(self._write, data)
+
+    def path_for(self, run_id: str) -> str:
+        return os.path.join(settings.TRANSCRIPT_DIR, f"{run_id}.json")
+
+    def _write(self, data: Dict[str, Any]):
+        try:
+            os.makedirs(settings.TRANSCRIPT_DIR, exist_ok=True)
+            with open(self.path_for(data["run_id"]), "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, default=str)
+        except Exception as e:
+            print(f"transcript写入失败: {e}")
+
+    def flush(self):
+        """等待已提交的写入完成"""
+        self._writer.submit(lambda: None).result()
+
+
+@contextmanager
+def replaying(transcript: Union[str, Dict[str, Any], TranscriptPlayer], speed: float = 1.0) -> Iterator[TranscriptPlayer]:
+    """
+    在当前上下文中启用回放
+
+    Args:
+        transcript: transcript文件路径、已加载的字典或回放器
+        speed: 时间压缩倍数，0表示不等待
+    """
+    if isinstance(transcript, TranscriptPlayer):
+        player = transcript
+    elif isinstance(transcript, dict):
+        player = TranscriptPlayer(transcript, speed)
+    else:
+        player = TranscriptPlayer.load(transcript, speed)
+    token = _current_player.set(player)
+    try:
+        yield player
+    finally:
+        _current_player.reset(token)
+
+
+# 全局实例
+transcript_store = TranscriptStore()
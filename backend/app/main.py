@@ -1,12 +1,29 @@
 """FastAPI application entry point"""
 
+import asyncio
 import os
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
-from app.core.config import settings
-from app.api.v1.api import api_router
+import time
+
+# 导入开始时间，用于统计冷启动耗时
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.middleware.cors import CORSMiddleware  # noqa: E402
+from fastapi.responses import JSONResponse, Response  # noqa: E402
+from fastapi.staticfiles import StaticFiles  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.api.v1.api import api_router  # noqa: E402
+from app.core.lifecycle import is_draining  # noqa: E402
+from app.core.metrics import (  # noqa: E402
+    APP_STARTUP_SECONDS,
+    WORKER_INFO,
+    RequestMetricsMiddleware,
+    monitor_event_loop_lag,
+    render_metrics,
+    worker_id,
+)
+from app.services.agent_service import agent_service  # noqa: E402
+from app.services.avatar_service import shutdown_avatar_executor  # noqa: E402
 
 # Create FastAPI application
 app = FastAPI(
@@ -28,6 +45,11 @@ app.add_middleware(
 )
 
 
+# ===== Metrics Middleware =====
+# 纯ASGI中间件；后添加的中间件位于外层，耗时包含CORS处理
+app.add_middleware(RequestMetricsMiddleware)
+
+
 # ===== Root Endpoints =====
 
 @app.get("/", tags=["Root"])
@@ -59,13 +81,53 @@ async def health_check():
     }
 
 
+@app.get("/ready", tags=["Health"])
+async def readiness_check():
+    """
+    Readiness check endpoint
+    
+    启动事件（含可选的Agent预热）完成前和停机排空期间返回503，负载均衡/编排系统据此决定何时把流量切到新实例
+    """
+    if is_draining():
+        return JSONResponse(status_code=503, content={"status": "draining"})
+    if not getattr(app.state, "ready", False):
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {
+        "status": "ready",
+        "import_seconds": round(app.state.import_seconds, 3),
+        "startup_seconds": round(app.state.startup_seconds, 3)
+    }
+
+
+@app.get("/metrics", tags=["Health"], include_in_schema=False)
+async def metrics():
+    """
+    Prometheus metrics endpoint
+    """
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
+
 # ===== Static Files =====
-# 创建必要的上传目录
-os.makedirs("uploads/audio", exist_ok=True)
-os.makedirs("uploads/avatars", exist_ok=True)
 
-# 挂载静态文件服务，用于访问上传的头像
-app.mount("/static", StaticFiles(directory="uploads"), name="static")
+class ImmutableStaticFiles(StaticFiles):
+    """文件名随内容变化的静态目录：响应带长期不变的缓存头，浏览器和CDN无需重新验证"""
+
+    async def get_response(self, path, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = f"public, max-age={settings.AVATAR_CACHE_MAX_AGE}, immutable"
+        return response
+
+
+# 头像以内容哈希命名，单独挂载以加上缓存头（需在 /static 之前挂载）
+# 上传目录在启动事件中创建，这里不检查目录是否存在
+app.mount("/static/avatars", ImmutableStaticFiles(directory="uploads/avatars", check_dir=False), name="avatars")
+# 挂载静态文件服务，用于访问上传的文件
+app.mount("/static", StaticFiles(directory="uploads", check_dir=False), name="static")
+
+# 导入阶段（模块加载、路由注册）到此结束
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
 
 # ===== API Routes =====
 app.include_router(api_router, prefix="/api/v1")
@@ -108,6 +170,26 @@ async def startup_event():
     print(f"📝 Environment: {settings.ENVIRONMENT}")
     print(f"🌐 CORS origins: {settings.cors_origins_list}")
     print(f"📚 API docs: http://{settings.HOST}:{settings.PORT}/docs")
+    
+    # 创建必要的上传目录
+    os.makedirs("uploads/audio", exist_ok=True)
+    os.makedirs("uploads/avatars", exist_ok=True)
+    
+    if settings.EVENT_LOOP_LAG_MONITOR:
+        app.state.loop_lag_task = asyncio.create_task(
+            monitor_event_loop_lag(settings.EVENT_LOOP_LAG_INTERVAL)
+        )
+    
+    if settings.AGENT_WARMUP_ON_STARTUP:
+        await asyncio.to_thread(agent_service.warm_up)
+    
+    app.state.import_seconds = IMPORT_SECONDS
+    app.state.startup_seconds = time.perf_counter() - IMPORT_STARTED
+    APP_STARTUP_SECONDS.labels(phase="import").set(app.state.import_seconds)
+    APP_STARTUP_SECONDS.labels(phase="ready").set(app.state.startup_seconds)
+    app.state.ready = True
+    WORKER_INFO.labels(worker=worker_id()).set(1)
+    print(f"✅ Ready in {app.state.startup_seconds:.2f}s (imports {app.state.import_seconds:.2f}s)")
 
 
 @app.on_event("shutdown")
@@ -116,10 +198,18 @@ async def shutdown_event():
     Run on application shutdown
     """
     print(f"👋 {settings.PROJECT_NAME} shutting down...")
+    app.state.ready = False
+    
+    loop_lag_task = getattr(app.state, "loop_lag_task", None)
+    if loop_lag_task:
+        loop_lag_task.cancel()
+    
+    shutdown_avatar_executor()
 
 
 # ===== Main Entry Point =====
 
+# 开发环境单进程运行；生产环境使用 gunicorn -c gunicorn.conf.py app.main:app（见 app/core/server.py）
 if __name__ == "__main__":
     import uvicorn
     
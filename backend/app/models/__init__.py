@@ -2,7 +2,8 @@
 
 from app.models.base import Base
 from app.models.user import User
-from app.models.trip import Trip, Itinerary, ItineraryItem, Expense
+from app.models.trip import Trip, Itinerary, ItineraryItem, Expense, ExpenseDailyRollup
+from app.models.poi import Poi, PoiSearchCoverage
 
-__all__ = ["Base", "User", "Trip", "Itinerary", "ItineraryItem", "Expense"]
+__all__ = ["Base", "User", "Trip", "Itinerary", "ItineraryItem", "Expense", "ExpenseDailyRollup", "Poi", "PoiSearchCoverage"]
 
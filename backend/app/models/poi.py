@@ -0,0 +1,45 @@
+"""
+本地POI库数据模型
+"""
+
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Float
+from sqlalchemy.sql import func
+from .base import Base
+
+
+class Poi(Base):
+    """POI模型 - 来自百度地图搜索结果或用户行程节点"""
+    __tablename__ = "pois"
+
+    id = Column(String(100), primary_key=True)  # 百度POI uid；行程节点无uid时为 item:<节点ID>
+    name = Column(String(200), nullable=False, index=True)
+    address = Column(String(500))
+    category = Column(String(100))  # 百度分类标签或行程节点类别
+    lat = Column(Float, nullable=False)
+    lng = Column(Float, nullable=False)
+    geohash = Column(String(12), nullable=False, index=True)  # 空间索引，按前缀范围查询
+    rating = Column(Float)
+    price = Column(String(50))
+    phone = Column(String(100))
+    website = Column(String(500))
+    opening_hours = Column(Text)
+    description = Column(Text)
+    source = Column(String(20), default="baidu")  # baidu, itinerary
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class PoiSearchCoverage(Base):
+    """POI搜索覆盖记录 - 某关键词在某个圆形区域内已向百度查询过"""
+    __tablename__ = "poi_search_coverage"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    keyword = Column(String(100), nullable=False, index=True)
+    category = Column(String(50))
+    lat = Column(Float, nullable=False)
+    lng = Column(Float, nullable=False)
+    radius = Column(Integer, nullable=False)  # 米
+    page_size = Column(Integer, nullable=False)  # 请求的数量上限
+    result_count = Column(Integer, nullable=False)  # 小于page_size说明该区域的结果已全部返回
+    poi_ids = Column(JSON)  # 本次搜索返回的POI
+    searched_at = Column(DateTime, nullable=False, index=True)  # UTC
@@ -2,7 +2,7 @@
 行程管理相关数据模型
 """
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Float
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Boolean, ForeignKey, JSON, Float, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .base import Base
@@ -50,7 +50,7 @@ class Itinerary(Base):
 
     # 关系
     trip = relationship("Trip", back_populates="itineraries")
-    items = relationship("ItineraryItem", back_populates="itinerary", cascade="all, delete-orphan", order_by="ItineraryItem.order_index")
+    items = relationship("ItineraryItem", back_populates="itinerary", cascade="all, delete-orphan", order_by="(ItineraryItem.order_key.nulls_first(), ItineraryItem.order_index)")
     expenses = relationship("Expense", back_populates="itinerary", cascade="all, delete-orphan")
 
 class ItineraryItem(Base):
@@ -82,7 +82,8 @@ class ItineraryItem(Base):
     images = Column(JSON)  # 图片URL列表
     
     # 节点管理
-    order_index = Column(Integer, default=0)  # 排序索引
+    order_index = Column(Integer, default=0)  # 排序索引（兼容字段，移动节点时不再改写，接口返回时按order_key重新编号）
+    order_key = Column(String(64))  # 分数排序键（app/utils/order_key.py），同一天内按字典序排列，旧数据为NULL时排在最前
     is_completed = Column(Boolean, default=False)  # 是否已完成
     notes = Column(Text)  # 备注
     
@@ -96,6 +97,10 @@ class ItineraryItem(Base):
     itinerary = relationship("Itinerary", back_populates="items")
     expenses = relationship("Expense", back_populates="itinerary_item", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_itinerary_items_itinerary_order", "itinerary_id", "order_key"),
+    )
+
 class Expense(Base):
     """费用记录模型 - 可以挂钩在行程、某天行程或具体节点上"""
     __tablename__ = "expenses"
@@ -139,6 +144,23 @@ class Expense(Base):
     itinerary = relationship("Itinerary", back_populates="expenses")
     itinerary_item = relationship("ItineraryItem", back_populates="expenses")
 
+class ExpenseDailyRollup(Base):
+    """费用日汇总 - 每个用户、行程、日期（EXPENSE_ROLLUP_TIMEZONE 下的自然日）、类别一行，随费用写入增量维护"""
+    __tablename__ = "expense_daily_rollups"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String(36), nullable=False)
+    trip_id = Column(String(36), nullable=False, index=True)  # 不加外键：删除行程时先删行程再写汇总增量
+    day = Column(Date, nullable=False)
+    category = Column(String(50), nullable=False)
+    amount = Column(Float, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "trip_id", "day", "category", name="uq_expense_daily_rollups_key"),
+        Index("ix_expense_daily_rollups_user_day", "user_id", "day"),
+    )
+
 # 更新User模型以包含关系
 from .user import User
 User.trips = relationship("Trip", back_populates="user")
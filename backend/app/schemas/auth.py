@@ -95,11 +95,13 @@ class AvatarUploadResponse(BaseModel):
     """Avatar upload response schema"""
     
     avatar_url: str = Field(..., description="Uploaded avatar URL")
+    thumbnail_url: Optional[str] = Field(None, description="Avatar thumbnail URL")
     
     model_config = ConfigDict(
         json_schema_extra={
             "example": {
-                "avatar_url": "https://example.com/avatars/user123.jpg"
+                "avatar_url": "/static/avatars/9f86d081884c7d659a2feaa0c55ad015.webp",
+                "thumbnail_url": "/static/avatars/9f86d081884c7d659a2feaa0c55ad015_thumb.webp"
             }
         }
     )
@@ -3,7 +3,7 @@
 """
 
 from pydantic import BaseModel, Field, field_validator
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime, date
 
 
@@ -82,3 +82,36 @@ class CategoryStats(BaseModel):
     amount: float = Field(..., description="金额")
     count: int = Field(..., description="笔数")
     percentage: float = Field(..., description="占比")
+
+
+class ExpenseTimeseriesPoint(BaseModel):
+    """时间序列中的一个桶"""
+    bucket: date = Field(..., description="桶的起始日期（周从周一开始，月从1号开始）")
+    amount: float = Field(..., description="金额")
+    count: int = Field(..., description="笔数")
+    category_breakdown: Dict[str, float] = Field(default_factory=dict, description="分类金额")
+
+
+class ExpenseTimeseries(BaseModel):
+    """费用时间序列"""
+    granularity: str = Field(..., description="粒度：day、week、month")
+    timezone: str = Field(..., description="分桶使用的时区")
+    source: str = Field(..., description="数据来源：rollup（日汇总）或 expenses（原始费用）")
+    total_amount: float = Field(..., description="总金额")
+    total_count: int = Field(..., description="总笔数")
+    points: List[ExpenseTimeseriesPoint] = Field(default_factory=list, description="按时间排列的桶")
+
+
+class ExpenseImportError(BaseModel):
+    """导入失败的一行"""
+    row: int = Field(..., description="数据行号（从1开始，不含CSV表头）")
+    errors: List[str] = Field(..., description="错误原因")
+
+
+class ExpenseImportResult(BaseModel):
+    """批量导入结果"""
+    total: int = Field(..., description="读取的行数")
+    imported: int = Field(..., description="成功导入的行数")
+    failed: int = Field(..., description="失败的行数")
+    errors: List[ExpenseImportError] = Field(default_factory=list, description="失败的行（最多 EXPENSE_IMPORT_MAX_ERRORS 条）")
+    errors_truncated: bool = Field(False, description="失败的行是否多于列出的")
@@ -2,7 +2,7 @@
 行程管理相关Pydantic schemas
 """
 
-from pydantic import BaseModel, Field, validator, ConfigDict
+from pydantic import BaseModel, Field, validator, model_validator, ConfigDict
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from enum import Enum
@@ -68,6 +68,24 @@ class ItineraryItemBase(BaseModel):
 class ItineraryItemCreate(ItineraryItemBase):
     pass
 
+class ItineraryItemBatchEntry(ItineraryItemBase):
+    """批量添加中的一个节点"""
+    id: Optional[str] = Field(None, pattern=r'^[0-9a-fA-F-]{36}$', description="客户端生成的节点ID（UUID），为空时由服务端生成")
+    day_number: int = Field(..., ge=1, description="第几天，当天安排不存在时自动创建")
+
+class ItineraryItemBatchCreate(BaseModel):
+    items: List[ItineraryItemBatchEntry] = Field(..., min_length=1, max_length=500)
+
+class ItineraryItemMove(BaseModel):
+    """移动一个节点：放到 after_id 之后或 before_id 之前，都不给时放到目标天末尾"""
+    item_id: str
+    itinerary_id: Optional[str] = Field(None, description="目标天的安排ID，为空时在原来的天内移动")
+    after_id: Optional[str] = None
+    before_id: Optional[str] = None
+
+class ItineraryItemMoveRequest(BaseModel):
+    moves: List[ItineraryItemMove] = Field(..., min_length=1, max_length=500)
+
 class ItineraryItemUpdate(BaseModel):
     name: Optional[str] = Field(None, min_length=1, max_length=200)
     description: Optional[str] = None
@@ -91,6 +109,7 @@ class ItineraryItemUpdate(BaseModel):
 class ItineraryItem(ItineraryItemBase):
     id: str
     itinerary_id: str
+    order_key: Optional[str] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -121,6 +140,13 @@ class Itinerary(ItineraryBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+    @model_validator(mode="after")
+    def renumber_items(self):
+        # 节点已按 order_key 排列，order_index 按位置重新编号，兼容按 order_index 排序的客户端
+        for index, item in enumerate(self.items):
+            item.order_index = index
+        return self
+
 class TripBase(BaseModel):
     """整个旅行计划"""
     title: str = Field(..., min_length=1, max_length=200)
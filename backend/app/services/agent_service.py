@@ -2,16 +2,49 @@
 Agent服务
 
 管理各种Agent的创建和调用
+
+Agent只在注册表中登记模块路径和展示信息，首次使用时才导入模块并实例化，
+导入 app.main 时不会加载各Agent依赖的百度地图工具、意图匹配器等模块，缩短冷启动时间。
 """
 
-from typing import Dict, Any, AsyncGenerator, Optional
-from ..agents import (
-    BaseAgent,
-    TripPlannerAgent,
-    BudgetAnalyzerAgent,
-    ChatAssistantAgent
-)
-from ..agents.simple_trip_agent import SimpleTripAgent
+import importlib
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Any, AsyncGenerator, Optional
+from ..core.tracing import tracer
+from ..core.transcript import transcript_store
+from ..utils.agui_utils import generate_run_id
+
+if TYPE_CHECKING:
+    from ..agents.base_agent import BaseAgent
+
+
+@dataclass(frozen=True)
+class AgentSpec:
+    """Agent注册信息"""
+    module: str
+    class_name: str
+    name: str
+    description: str
+
+
+AGENT_REGISTRY: Dict[str, AgentSpec] = {
+    "trip-planner": AgentSpec(
+        "app.agents.trip_planner_agent", "TripPlannerAgent", "行程规划助手",
+        "专业的旅行行程规划助手，帮助您制定详细的旅行计划"
+    ),
+    "simple-trip-planner": AgentSpec(
+        "app.agents.simple_trip_agent", "SimpleTripAgent", "简化行程规划师",
+        "简化的行程规划助手，专注于LLM Function Calling"
+    ),
+    "budget-analyzer": AgentSpec(
+        "app.agents.budget_analyzer_agent", "BudgetAnalyzerAgent", "费用分析助手",
+        "费用分析专家，协助您制定和管理旅行预算"
+    ),
+    "chat-assistant": AgentSpec(
+        "app.agents.chat_assistant_agent", "ChatAssistantAgent", "对话助手",
+        "通用对话助手，回答各种问题和提供咨询服务"
+    ),
+}
 
 
 class AgentService:
@@ -21,29 +54,32 @@ class AgentService:
     负责管理各种Agent的创建、配置和调用
     """
     
-    def __init__(self):
-        self.agents: Dict[str, BaseAgent] = {}
-        self._initialize_agents()
+    def __init__(self, registry: Optional[Dict[str, AgentSpec]] = None):
+        self.registry = AGENT_REGISTRY if registry is None else registry
+        # 已实例化的Agent
+        self.agents: Dict[str, "BaseAgent"] = {}
     
-    def _initialize_agents(self):
-        """初始化所有Agent"""
-        self.agents = {
-            "trip-planner": TripPlannerAgent(),
-            "simple-trip-planner": SimpleTripAgent(),
-            "budget-analyzer": BudgetAnalyzerAgent(),
-            "chat-assistant": ChatAssistantAgent()
-        }
+    def get_agent(self, agent_id: str) -> Optional["BaseAgent"]:
+        """获取指定ID的Agent（首次获取时导入并实例化）"""
+        agent = self.agents.get(agent_id)
+        if agent is None and agent_id in self.registry:
+            spec = self.registry[agent_id]
+            agent_class = getattr(importlib.import_module(spec.module), spec.class_name)
+            agent = self.agents[agent_id] = agent_class()
+            print(f"Agent已加载: {agent_id}")
+        return agent
     
-    def get_agent(self, agent_id: str) -> Optional[BaseAgent]:
-        """获取指定ID的Agent"""
-        return self.agents.get(agent_id)
+    def warm_up(self):
+        """实例化全部已注册的Agent（可在启动后预热，避免首个请求承担导入开销）"""
+        for agent_id in self.registry:
+            self.get_agent(agent_id)
     
     def get_available_agents(self) -> Dict[str, str]:
-        """获取所有可用的Agent"""
-        return {
-            agent_id: agent.agent_name 
-            for agent_id, agent in self.agents.items()
-        }
+        """获取所有可用的Agent（不触发加载）"""
+        agents = {agent_id: spec.name for agent_id, spec in self.registry.items()}
+        for agent_id, agent in self.agents.items():
+            agents.setdefault(agent_id, agent.agent_name)
+        return agents
     
     async def run_agent(
         self,
@@ -86,31 +122,35 @@ class AgentService:
             yield encoder.encode_event(error_event)
             return
         
-        # 运行Agent
-        async for event in agent.run(user_input, system_prompt, history, run_id, context):
-            yield event
+        # 运行Agent，整个运行作为一个trace
+        if not run_id:
+            run_id = generate_run_id()
+        trace = tracer.begin_run(run_id, f"agent.{agent_id}", agent_id=agent_id)
+        recorder = transcript_store.begin_recording(
+            run_id, agent_id,
+            user_input=user_input, system_prompt=system_prompt, history=history, context=context
+        )
+        error = None
+        try:
+            async for event in agent.run(user_input, system_prompt, history, run_id, context):
+                yield event
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            transcript_store.end_recording(recorder, error)
+            tracer.end_run(trace, error)
     
     def get_agent_info(self, agent_id: str) -> Optional[Dict[str, Any]]:
-        """获取Agent信息"""
-        agent = self.get_agent(agent_id)
+        """获取Agent信息（不触发加载）"""
+        spec = self.registry.get(agent_id)
+        if spec:
+            return {"agentId": agent_id, "agentName": spec.name, "description": spec.description}
+        
+        agent = self.agents.get(agent_id)
         if not agent:
             return None
-        
-        return {
-            "agentId": agent.agent_id,
-            "agentName": agent.agent_name,
-            "description": self._get_agent_description(agent_id)
-        }
-    
-    def _get_agent_description(self, agent_id: str) -> str:
-        """获取Agent描述"""
-        descriptions = {
-            "trip-planner": "专业的旅行行程规划助手，帮助您制定详细的旅行计划",
-            "simple-trip-planner": "简化的行程规划助手，专注于LLM Function Calling",
-            "budget-analyzer": "费用分析专家，协助您制定和管理旅行预算",
-            "chat-assistant": "通用对话助手，回答各种问题和提供咨询服务"
-        }
-        return descriptions.get(agent_id, "未知Agent")
+        return {"agentId": agent.agent_id, "agentName": agent.agent_name, "description": "未知Agent"}
 
 
 # 全局Agent服务实例
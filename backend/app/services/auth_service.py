@@ -5,8 +5,8 @@ from fastapi import HTTPException, status
 from app.models.user import User
 from app.schemas.auth import UserRegister, UserLogin
 from app.core.security import (
-    verify_password,
-    get_password_hash,
+    verify_password_async,
+    get_password_hash_async,
     create_access_token,
     create_refresh_token,
     decode_token,
@@ -20,10 +20,12 @@ class AuthService:
     """
     
     @staticmethod
-    def register_user(db: Session, user_data: UserRegister) -> User:
+    async def register_user(db: Session, user_data: UserRegister) -> User:
         """
         Register a new user
         
+        密码哈希在哈希线程池中计算，不阻塞事件循环
+        
         Args:
             db: Database session
             user_data: User registration data (email, password, name)
@@ -43,7 +45,7 @@ class AuthService:
             )
         
         # Hash password
-        password_hash = get_password_hash(user_data.password)
+        password_hash = await get_password_hash_async(user_data.password)
         
         # Create new user
         new_user = User(
@@ -59,10 +61,12 @@ class AuthService:
         return new_user
     
     @staticmethod
-    def authenticate_user(db: Session, user_data: UserLogin) -> User:
+    async def authenticate_user(db: Session, user_data: UserLogin) -> User:
         """
         Authenticate user credentials
         
+        密码验证在哈希线程池中进行；旧哈希的迭代次数与当前配置不同时顺带更新为新哈希
+        
         Args:
             db: Database session
             user_data: User login data (email, password)
@@ -84,13 +88,20 @@ class AuthService:
             )
         
         # Verify password
-        if not verify_password(user_data.password, user.password_hash):
+        password_valid, new_hash = await verify_password_async(user_data.password, user.password_hash)
+        if not password_valid:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect email or password",
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
+        if new_hash:
+            print(f"密码哈希参数已变更，重新哈希: {user.id}")
+            user.password_hash = new_hash
+            db.commit()
+            db.refresh(user)
+        
         return user
     
     @staticmethod
@@ -215,7 +226,7 @@ class AuthService:
         return user
     
     @staticmethod
-    def change_password(db: Session, user_id: str, current_password: str, new_password: str) -> User:
+    async def change_password(db: Session, user_id: str, current_password: str, new_password: str) -> User:
         """
         Change user password
         
@@ -247,7 +258,7 @@ class AuthService:
         print(f"找到用户: {user.email}")
         
         # Verify current password
-        password_valid = verify_password(current_password, user.password_hash)
+        password_valid, _ = await verify_password_async(current_password, user.password_hash)
         print(f"密码验证结果: {password_valid}")
         
         if not password_valid:
@@ -258,7 +269,7 @@ class AuthService:
             )
         
         # Update password
-        user.password_hash = get_password_hash(new_password)
+        user.password_hash = await get_password_hash_async(new_password)
         
         db.commit()
         db.refresh(user)
@@ -0,0 +1,187 @@
+"""
+头像上传处理
+
+上传文件按块读取，超过 AVATAR_MAX_BYTES 立即中止，同时增量计算SHA-256。
+解码、纠正EXIF方向、裁剪缩放和WebP编码都是CPU密集操作，放到独立的进程池执行，不占用事件循环，
+也不与其他请求争抢GIL。输出文件以原图内容哈希命名（头像与缩略图两张），同一张图片重复上传时
+直接复用已有文件，不再处理；文件名随内容变化，因此可以用长期不变的缓存头提供静态访问。
+"""
+
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import track_avatar_job
+
+AVATAR_DIR = os.path.join("uploads", "avatars")
+AVATAR_URL_PREFIX = "/static/avatars"
+READ_SIZE = 64 * 1024
+# 文件名取内容哈希的前32位十六进制（128位）
+NAME_LENGTH = 32
+
+
+class AvatarTooLargeError(ValueError):
+    """文件超过大小限制"""
+
+
+class InvalidImageError(ValueError):
+    """文件无法作为图片解码"""
+
+
+async def read_upload(file: UploadFile, max_bytes: int) -> Tuple[bytes, str]:
+    """
+    按块读取上传文件
+
+    Returns:
+        (文件内容, SHA-256十六进制摘要)
+
+    Raises:
+        AvatarTooLargeError: 超过 max_bytes（读到超出部分即停止）
+    """
+    digest = hashlib.sha256()
+    chunks = []
+    size = 0
+    while True:
+        chunk = await file.read(READ_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise AvatarTooLargeError(f"文件大小不能超过{max_bytes // (1024 * 1024)}MB")
+        digest.update(chunk)
+        chunks.append(chunk)
+    return b"".join(chunks), digest.hexdigest()
+
+
+def process_avatar(data: bytes, size: int, thumb_size: int) -> Tuple[bytes, bytes]:
+    """
+    在进程池中执行：解码图片，按EXIF纠正方向，居中裁剪为正方形，输出头像与缩略图（WebP）
+
+    动图只取第一帧；超过Pillow像素上限的图片按无效图片处理。
+    Pillow 只在处理进程中导入，不计入Web进程的启动时间。
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise InvalidImageError(f"无法识别的图片: {e}")
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+    image = image.convert("RGBA" if has_alpha else "RGB")
+    avatar = ImageOps.fit(image, (size, size), Image.LANCZOS)
+    thumbnail = avatar.resize((thumb_size, thumb_size), Image.LANCZOS)
+    return _encode(avatar), _encode(thumbnail)
+
+
+def _encode(image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="WEBP", quality=settings.AVATAR_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """按需创建进程池；使用spawn启动，子进程不继承父进程的线程、事件循环和数据库连接"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.AVATAR_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+def _discard_executor(broken: ProcessPoolExecutor):
+    """丢弃已损坏的进程池（工作进程崩溃，如超大图片导致OOM），下次使用时重新创建"""
+    global _executor
+    if _executor is broken:
+        _executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+async def _process_in_pool(data: bytes) -> Tuple[bytes, bytes]:
+    """在进程池中处理图片；进程池已损坏时重建并重试一次，仍然失败则抛出 BrokenProcessPool"""
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        executor = _get_executor()
+        try:
+            return await loop.run_in_executor(
+                executor, process_avatar, data, settings.AVATAR_SIZE, settings.AVATAR_THUMBNAIL_SIZE
+            )
+        except BrokenProcessPool:
+            print(f"头像处理进程池已损坏，重新创建（第{attempt + 1}次）")
+            _discard_executor(executor)
+            if attempt:
+                raise
+
+
+def shutdown_avatar_executor():
+    """关闭进程池（应用关闭时调用）"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _store(path: str, data: bytes):
+    """原子写入：先写临时文件再重命名，并发上传同一内容时不会读到写了一半的文件"""
+    if os.path.exists(path):
+        return
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            temp_file.write(data)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def avatar_paths(digest: str) -> Tuple[str, str]:
+    """内容哈希对应的头像和缩略图文件名"""
+    name = digest[:NAME_LENGTH]
+    return f"{name}.webp", f"{name}_thumb.webp"
+
+
+async def save_avatar(file: UploadFile) -> Tuple[str, str]:
+    """
+    读取、处理并保存头像
+
+    Returns:
+        (头像URL, 缩略图URL)
+
+    Raises:
+        AvatarTooLargeError: 文件超过 AVATAR_MAX_BYTES
+        InvalidImageError: 文件不是可解码的图片
+    """
+    data, digest = await read_upload(file, settings.AVATAR_MAX_BYTES)
+    avatar_name, thumbnail_name = avatar_paths(digest)
+    avatar_path = os.path.join(AVATAR_DIR, avatar_name)
+    thumbnail_path = os.path.join(AVATAR_DIR, thumbnail_name)
+
+    if os.path.exists(avatar_path) and os.path.exists(thumbnail_path):
+        print(f"头像内容已存在，复用文件: {avatar_name}")
+    else:
+        with track_avatar_job():
+            avatar, thumbnail = await _process_in_pool(data)
+        os.makedirs(AVATAR_DIR, exist_ok=True)
+        await run_in_threadpool(_store, avatar_path, avatar)
+        await run_in_threadpool(_store, thumbnail_path, thumbnail)
+        print(f"头像处理完成: {avatar_name}（原图 {len(data)} 字节，输出 {len(avatar)}/{len(thumbnail)} 字节）")
+
+    return f"{AVATAR_URL_PREFIX}/{avatar_name}", f"{AVATAR_URL_PREFIX}/{thumbnail_name}"
@@ -8,11 +8,250 @@ from typing import Dict, Any, List, Optional
 import json
 import re
 
+from ..core.prompts import register_prompt
 from ..models.trip import Expense, Trip
 from ..schemas.expense import ExpenseCreate, ExpenseUpdate
+from ..utils.tool_registry import ToolDispatcher, ToolSet, ToolSpec, UnknownToolError
 from .expense_service import ExpenseService
 from .llm_service import LLMService
 
+# 静态前缀（角色、分类、工具示例），行程和费用数据作为动态后缀追加在后面
+EXPENSE_PROMPT = register_prompt("expense", "2", """你是一名AI费用助手，辅助用户进行旅行行程的费用分析和管理。
+
+你的角色定位：
+- 帮助用户分析和管理旅行费用
+- 提供费用统计和预算建议
+- 协助用户添加、修改、删除费用记录
+- 根据用户需求筛选和查询费用数据
+
+费用分类包括：
+- transportation: 交通
+- accommodation: 住宿
+- food: 餐饮
+- attraction: 景点
+- shopping: 购物
+- entertainment: 娱乐
+- other: 其他
+
+重要提示：
+1. 当用户要求执行操作（如添加、修改、删除费用）时，必须立即使用相应的工具函数（add_expense、update_expense、delete_expense等）
+2. 工具函数调用会在前端显示确认卡片，由用户在前端确认后执行，所以你不需要询问用户确认，直接调用工具即可
+3. 如果用户提供了足够的信息（金额、分类、描述），直接调用工具函数。如果缺少trip_id，使用上下文中的trip_id
+4. 如果信息不足，可以询问用户补充信息，但一旦信息足够，立即调用工具
+5. 在回答用户问题时，要结合当前的行程信息和费用数据
+6. 提供清晰、准确的费用分析和建议
+
+工具使用示例：
+- 用户说"添加一笔100元的交通费用，描述是地铁票" -> 立即调用add_expense工具，参数：{"trip_id": "上下文中的trip_id", "amount": 100, "category": "transportation", "description": "地铁票"}
+- 用户说"删除费用ID为xxx的记录" -> 立即调用delete_expense工具，参数：{"expense_id": "xxx"}
+- 用户说"查询交通费用" -> 立即调用get_filtered_expenses工具，参数：{"trip_id": "上下文中的trip_id", "category": "transportation"}
+
+注意：你有可用的工具函数（tools），当用户要求执行操作时，必须调用相应的工具函数。不要只是回复文字，要实际调用工具！""")
+
+
+# 写入类操作需要用户在前端确认后才执行；查询按当前用户过滤，不合并、不缓存
+ADD_EXPENSE = ToolSpec(
+    name="add_expense",
+    description="添加费用记录",
+    parameters={
+        "type": "object",
+        "properties": {
+            "trip_id": {
+                "type": "string",
+                "description": "行程ID"
+            },
+            "category": {
+                "type": "string",
+                "enum": ["transportation", "accommodation", "food", "attraction", "shopping", "entertainment", "other"],
+                "description": "费用分类"
+            },
+            "amount": {
+                "type": "number",
+                "description": "金额（必须大于0）"
+            },
+            "description": {
+                "type": "string",
+                "description": "费用描述"
+            },
+            "expense_date": {
+                "type": "string",
+                "description": "费用日期，格式：YYYY-MM-DD（可选，默认为今天）"
+            },
+            "location": {
+                "type": "string",
+                "description": "地点（可选）"
+            },
+            "itinerary_item_id": {
+                "type": "string",
+                "description": "关联的行程节点ID（可选）"
+            }
+        },
+        "required": ["trip_id", "category", "amount", "description"]
+    },
+    timeout=10
+)
+
+UPDATE_EXPENSE = ToolSpec(
+    name="update_expense",
+    description="修改费用记录",
+    parameters={
+        "type": "object",
+        "properties": {
+            "expense_id": {
+                "type": "string",
+                "description": "费用记录ID"
+            },
+            "category": {
+                "type": "string",
+                "enum": ["transportation", "accommodation", "food", "attraction", "shopping", "entertainment", "other"],
+                "description": "费用分类（可选）"
+            },
+            "amount": {
+                "type": "number",
+                "description": "金额（可选，必须大于0）"
+            },
+            "description": {
+                "type": "string",
+                "description": "费用描述（可选）"
+            },
+            "expense_date": {
+                "type": "string",
+                "description": "费用日期，格式：YYYY-MM-DD（可选）"
+            },
+            "location": {
+                "type": "string",
+                "description": "地点（可选）"
+            }
+        },
+        "required": ["expense_id"]
+    },
+    timeout=10
+)
+
+DELETE_EXPENSE = ToolSpec(
+    name="delete_expense",
+    description="删除费用记录",
+    parameters={
+        "type": "object",
+        "properties": {
+            "expense_id": {
+                "type": "string",
+                "description": "费用记录ID"
+            }
+        },
+        "required": ["expense_id"]
+    },
+    timeout=10
+)
+
+GET_FILTERED_EXPENSES = ToolSpec(
+    name="get_filtered_expenses",
+    description="获取筛选的费用列表（支持按分类和时间区间筛选）",
+    parameters={
+        "type": "object",
+        "properties": {
+            "trip_id": {
+                "type": "string",
+                "description": "行程ID"
+            },
+            "category": {
+                "type": "string",
+                "enum": ["transportation", "accommodation", "food", "attraction", "shopping", "entertainment", "other"],
+                "description": "费用分类（可选，用于筛选）"
+            },
+            "start_date": {
+                "type": "string",
+                "description": "开始日期，格式：YYYY-MM-DD（可选）"
+            },
+            "end_date": {
+                "type": "string",
+                "description": "结束日期，格式：YYYY-MM-DD（可选）"
+            }
+        },
+        "required": ["trip_id"]
+    },
+    timeout=15
+)
+
+GET_EXPENSE_SUMMARY = ToolSpec(
+    name="get_expense_summary",
+    description="获取费用统计摘要",
+    parameters={
+        "type": "object",
+        "properties": {
+            "trip_id": {
+                "type": "string",
+                "description": "行程ID（可选）"
+            }
+        }
+    },
+    timeout=15
+)
+
+GET_CATEGORY_STATS = ToolSpec(
+    name="get_category_stats",
+    description="获取费用分类统计",
+    parameters={
+        "type": "object",
+        "properties": {
+            "trip_id": {
+                "type": "string",
+                "description": "行程ID（可选）"
+            }
+        }
+    },
+    timeout=15
+)
+
+ANALYZE_EXPENSE_TRENDS = ToolSpec(
+    name="analyze_expense_trends",
+    description="分析费用趋势",
+    parameters={
+        "type": "object",
+        "properties": {
+            "trip_id": {
+                "type": "string",
+                "description": "行程ID（可选）"
+            },
+            "period": {
+                "type": "string",
+                "enum": ["daily", "weekly", "monthly"],
+                "description": "分析周期"
+            }
+        }
+    },
+    timeout=15
+)
+
+EXPENSE_TOOLS = ToolSet("expense", [
+    ADD_EXPENSE,
+    UPDATE_EXPENSE,
+    DELETE_EXPENSE,
+    GET_FILTERED_EXPENSES,
+    GET_EXPENSE_SUMMARY,
+    GET_CATEGORY_STATS,
+    ANALYZE_EXPENSE_TRENDS
+])
+
+# 执行成功后展示给用户的消息
+_RESULT_MESSAGES = {
+    "add_expense": lambda result: f"✅ 已添加费用记录：¥{result.get('amount', 0):.2f} - {result.get('description', '')}",
+    "update_expense": lambda result: f"✅ 已更新费用记录：¥{result.get('amount', 0):.2f} - {result.get('description', '')}",
+    "delete_expense": lambda result: "✅ 已删除费用记录",
+    "get_filtered_expenses": lambda result: f"📋 已获取费用列表（共{len(result)}条）",
+    "get_expense_summary": lambda result: "📊 费用统计",
+    "get_category_stats": lambda result: "📈 分类统计",
+    "analyze_expense_trends": lambda result: "📉 费用趋势分析",
+}
+
+# _handle_tool_calls 直接执行（不经确认）的工具及其结果前缀
+_SUMMARY_PREFIXES = {
+    "add_expense": "✅ 已添加费用记录：",
+    "get_expense_summary": "📊 费用统计：\n",
+    "get_category_stats": "📈 分类统计：\n",
+    "analyze_expense_trends": "📉 费用趋势分析：\n",
+}
+
 
 class ExpenseAIService:
     """费用智能体服务"""
@@ -21,6 +260,16 @@ class ExpenseAIService:
         self.db = db
         self.expense_service = ExpenseService(db)
         self.llm_service = LLMService()
+        # 处理函数统一接收 (arguments, user_id, trip_id)
+        self._tools = ToolDispatcher(EXPENSE_TOOLS, {
+            "add_expense": self._add_expense,
+            "update_expense": lambda arguments, user_id, trip_id: self._update_expense(arguments, user_id),
+            "delete_expense": lambda arguments, user_id, trip_id: self._delete_expense(arguments, user_id),
+            "get_filtered_expenses": self._get_filtered_expenses,
+            "get_expense_summary": lambda arguments, user_id, trip_id: self._get_expense_summary(arguments, user_id),
+            "get_category_stats": lambda arguments, user_id, trip_id: self._get_category_stats(arguments, user_id),
+            "analyze_expense_trends": lambda arguments, user_id, trip_id: self._analyze_expense_trends(arguments, user_id),
+        }, source="expense-ai")
 
     async def process_natural_language_query(
         self, 
@@ -40,7 +289,8 @@ class ExpenseAIService:
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": query}
                 ],
-                tools=self._get_available_tools()
+                tools=self._tools.tools,
+                agent_id="expense-ai"
             )
         
             # 检查响应是否有效
@@ -95,40 +345,8 @@ class ExpenseAIService:
             raise
 
     def _build_system_prompt(self, user_id: str, trip_id: Optional[str], context: Optional[Dict[str, Any]]) -> str:
-        """构建系统提示"""
-        prompt = """你是一名AI费用助手，辅助用户进行旅行行程的费用分析和管理。
-
-你的角色定位：
-- 帮助用户分析和管理旅行费用
-- 提供费用统计和预算建议
-- 协助用户添加、修改、删除费用记录
-- 根据用户需求筛选和查询费用数据
-
-费用分类包括：
-- transportation: 交通
-- accommodation: 住宿
-- food: 餐饮
-- attraction: 景点
-- shopping: 购物
-- entertainment: 娱乐
-- other: 其他
-
-重要提示：
-1. 当用户要求执行操作（如添加、修改、删除费用）时，必须立即使用相应的工具函数（add_expense、update_expense、delete_expense等）
-2. 工具函数调用会在前端显示确认卡片，由用户在前端确认后执行，所以你不需要询问用户确认，直接调用工具即可
-3. 如果用户提供了足够的信息（金额、分类、描述），直接调用工具函数。如果缺少trip_id，使用上下文中的trip_id
-4. 如果信息不足，可以询问用户补充信息，但一旦信息足够，立即调用工具
-5. 在回答用户问题时，要结合当前的行程信息和费用数据
-6. 提供清晰、准确的费用分析和建议
-
-工具使用示例：
-- 用户说"添加一笔100元的交通费用，描述是地铁票" -> 立即调用add_expense工具，参数：{"trip_id": "上下文中的trip_id", "amount": 100, "category": "transportation", "description": "地铁票"}
-- 用户说"删除费用ID为xxx的记录" -> 立即调用delete_expense工具，参数：{"expense_id": "xxx"}
-- 用户说"查询交通费用" -> 立即调用get_filtered_expenses工具，参数：{"trip_id": "上下文中的trip_id", "category": "transportation"}
-
-注意：你有可用的工具函数（tools），当用户要求执行操作时，必须调用相应的工具函数。不要只是回复文字，要实际调用工具！
-"""
-
+        """构建系统提示：固定的静态前缀 + 行程和费用上下文"""
+        dynamic = None
         if context:
             # 构建详细的上下文信息
             context_parts = []
@@ -178,194 +396,9 @@ class ExpenseAIService:
 """)
             
             if context_parts:
-                prompt += "\n\n当前行程和费用信息：\n" + "\n".join(context_parts)
+                dynamic = "当前行程和费用信息：\n" + "\n".join(context_parts)
         
-        return prompt
-
-    def _get_available_tools(self) -> List[Dict[str, Any]]:
-        """获取可用工具列表"""
-        return [
-            {
-                "type": "function",
-                "function": {
-                    "name": "add_expense",
-                    "description": "添加费用记录",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "trip_id": {
-                                "type": "string",
-                                "description": "行程ID"
-                            },
-                            "category": {
-                                "type": "string",
-                                "enum": ["transportation", "accommodation", "food", "attraction", "shopping", "entertainment", "other"],
-                                "description": "费用分类"
-                            },
-                            "amount": {
-                                "type": "number",
-                                "description": "金额（必须大于0）"
-                            },
-                            "description": {
-                                "type": "string",
-                                "description": "费用描述"
-                            },
-                            "expense_date": {
-                                "type": "string",
-                                "description": "费用日期，格式：YYYY-MM-DD（可选，默认为今天）"
-                            },
-                            "location": {
-                                "type": "string",
-                                "description": "地点（可选）"
-                            },
-                            "itinerary_item_id": {
-                                "type": "string",
-                                "description": "关联的行程节点ID（可选）"
-                            }
-                        },
-                        "required": ["trip_id", "category", "amount", "description"]
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "update_expense",
-                    "description": "修改费用记录",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "expense_id": {
-                                "type": "string",
-                                "description": "费用记录ID"
-                            },
-                            "category": {
-                                "type": "string",
-                                "enum": ["transportation", "accommodation", "food", "attraction", "shopping", "entertainment", "other"],
-                                "description": "费用分类（可选）"
-                            },
-                            "amount": {
-                                "type": "number",
-                                "description": "金额（可选，必须大于0）"
-                            },
-                            "description": {
-                                "type": "string",
-                                "description": "费用描述（可选）"
-                            },
-                            "expense_date": {
-                                "type": "string",
-                                "description": "费用日期，格式：YYYY-MM-DD（可选）"
-                            },
-                            "location": {
-                                "type": "string",
-                                "description": "地点（可选）"
-                            }
-                        },
-                        "required": ["expense_id"]
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "delete_expense",
-                    "description": "删除费用记录",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "expense_id": {
-                                "type": "string",
-                                "description": "费用记录ID"
-                            }
-                        },
-                        "required": ["expense_id"]
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "get_filtered_expenses",
-                    "description": "获取筛选的费用列表（支持按分类和时间区间筛选）",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "trip_id": {
-                                "type": "string",
-                                "description": "行程ID"
-                            },
-                            "category": {
-                                "type": "string",
-                                "enum": ["transportation", "accommodation", "food", "attraction", "shopping", "entertainment", "other"],
-                                "description": "费用分类（可选，用于筛选）"
-                            },
-                            "start_date": {
-                                "type": "string",
-                                "description": "开始日期，格式：YYYY-MM-DD（可选）"
-                            },
-                            "end_date": {
-                                "type": "string",
-                                "description": "结束日期，格式：YYYY-MM-DD（可选）"
-                            }
-                        },
-                        "required": ["trip_id"]
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "get_expense_summary",
-                    "description": "获取费用统计摘要",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "trip_id": {
-                                "type": "string",
-                                "description": "行程ID（可选）"
-                            }
-                        }
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "get_category_stats",
-                    "description": "获取费用分类统计",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "trip_id": {
-                                "type": "string",
-                                "description": "行程ID（可选）"
-                            }
-                        }
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "analyze_expense_trends",
-                    "description": "分析费用趋势",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "trip_id": {
-                                "type": "string",
-                                "description": "行程ID（可选）"
-                            },
-                            "period": {
-                                "type": "string",
-                                "enum": ["daily", "weekly", "monthly"],
-                                "description": "分析周期"
-                            }
-                        }
-                    }
-                }
-            }
-        ]
+        return EXPENSE_PROMPT.render(dynamic)
 
     async def _handle_tool_calls(
         self, 
@@ -381,25 +414,14 @@ class ExpenseAIService:
             arguments = json.loads(tool_call['function']['arguments'])
             
             try:
-                if function_name == "add_expense":
-                    result = await self._add_expense(arguments, user_id)
-                    results.append(f"✅ 已添加费用记录：{result}")
-                
-                elif function_name == "get_expense_summary":
-                    result = await self._get_expense_summary(arguments, user_id)
-                    results.append(f"📊 费用统计：\n{result}")
-                
-                elif function_name == "get_category_stats":
-                    result = await self._get_category_stats(arguments, user_id)
-                    results.append(f"📈 分类统计：\n{result}")
-                
-                elif function_name == "analyze_expense_trends":
-                    result = await self._analyze_expense_trends(arguments, user_id)
-                    results.append(f"📉 费用趋势分析：\n{result}")
-                
-                else:
-                    results.append(f"❌ 未知功能：{function_name}")
+                prefix = _SUMMARY_PREFIXES.get(function_name)
+                if prefix is None:
+                    raise UnknownToolError(function_name)
+                result = await self._tools.dispatch(function_name, arguments, user_id, None)
+                results.append(f"{prefix}{result}")
             
+            except UnknownToolError:
+                results.append(f"❌ 未知功能：{function_name}")
             except Exception as e:
                 results.append(f"❌ 执行失败：{str(e)}")
         
@@ -490,58 +512,13 @@ class ExpenseAIService:
     ) -> Dict[str, Any]:
         """执行工具调用"""
         try:
-            if function_name == "add_expense":
-                result = await self._add_expense(arguments, user_id, trip_id)
-                return {
-                    "message": f"✅ 已添加费用记录：¥{result.get('amount', 0):.2f} - {result.get('description', '')}",
-                    "data": result
-                }
-            
-            elif function_name == "update_expense":
-                result = await self._update_expense(arguments, user_id)
-                return {
-                    "message": f"✅ 已更新费用记录：¥{result.get('amount', 0):.2f} - {result.get('description', '')}",
-                    "data": result
-                }
-            
-            elif function_name == "delete_expense":
-                result = await self._delete_expense(arguments, user_id)
-                return {
-                    "message": "✅ 已删除费用记录",
-                    "data": result
-                }
-            
-            elif function_name == "get_filtered_expenses":
-                result = await self._get_filtered_expenses(arguments, user_id, trip_id)
-                return {
-                    "message": f"📋 已获取费用列表（共{len(result)}条）",
-                    "data": result
-                }
-            
-            elif function_name == "get_expense_summary":
-                result = await self._get_expense_summary(arguments, user_id)
-                return {
-                    "message": "📊 费用统计",
-                    "data": result
-                }
-            
-            elif function_name == "get_category_stats":
-                result = await self._get_category_stats(arguments, user_id)
-                return {
-                    "message": "📈 分类统计",
-                    "data": result
-                }
-            
-            elif function_name == "analyze_expense_trends":
-                result = await self._analyze_expense_trends(arguments, user_id)
-                return {
-                    "message": "📉 费用趋势分析",
-                    "data": result
-                }
-            
-            else:
-                raise ValueError(f"未知功能：{function_name}")
-        
+            result = await self._tools.dispatch(function_name, arguments, user_id, trip_id)
+            return {
+                "message": _RESULT_MESSAGES[function_name](result),
+                "data": result
+            }
+        except UnknownToolError:
+            raise Exception(f"执行失败：未知功能：{function_name}")
         except Exception as e:
             raise Exception(f"执行失败：{str(e)}")
     
@@ -0,0 +1,297 @@
+"""
+费用批量导入
+
+上传的CSV/JSON按块读取、解析，每 EXPENSE_IMPORT_CHUNK_SIZE 行用 ExpenseCreate 校验一次并写入：
+PostgreSQL 使用 COPY，其他数据库使用一条 executemany 的 INSERT。
+校验失败或写入失败的行记录行号和原因后跳过，不影响其余行；费用日汇总在全部写入后更新一次，
+整个导入在一个事务中提交。
+"""
+
+import codecs
+import csv
+import io
+import json
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from fastapi import UploadFile
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.trip import Expense, Trip
+from app.schemas.expense import ExpenseCreate
+from app.services.expense_rollup import apply_deltas, rollup_deltas
+
+READ_SIZE = 64 * 1024
+
+# 写入的列（与 COPY 的列顺序一致）。COPY 不会应用模型在Python侧的默认值，
+# 有默认值的列（is_shared）显式写入，两种数据库导入的行与普通创建一致
+COLUMNS = ("id", "trip_id", "category", "amount", "description", "expense_date", "location", "currency", "is_shared")
+
+# 常见账单导出的中文表头
+HEADER_ALIASES = {
+    "日期": "expense_date", "date": "expense_date", "交易时间": "expense_date",
+    "金额": "amount", "分类": "category", "类别": "category",
+    "描述": "description", "备注": "description", "说明": "description",
+    "地点": "location", "货币": "currency", "币种": "currency", "行程": "trip_id"
+}
+
+
+class ImportLimitError(ValueError):
+    """文件超过大小或行数限制"""
+
+
+async def _iter_text(file: UploadFile) -> AsyncIterator[str]:
+    """按块读取上传文件并增量解码（去掉UTF-8 BOM）"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    size = 0
+    while True:
+        chunk = await file.read(READ_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > settings.EXPENSE_IMPORT_MAX_BYTES:
+            raise ImportLimitError(f"文件超过 {settings.EXPENSE_IMPORT_MAX_BYTES // (1024 * 1024)}MB")
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def _iter_lines(chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    pending = ""
+    async for text in chunks:
+        lines = (pending + text).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    if pending:
+        yield pending
+
+
+async def iter_csv(chunks: AsyncIterator[str]) -> AsyncIterator[Any]:
+    """逐条解析CSV记录，首行为表头；引号内的换行会与后续行合并为一条记录"""
+    header: Optional[List[str]] = None
+    pending = ""
+    async for line in _iter_lines(chunks):
+        pending += line
+        if pending.count('"') % 2:
+            continue
+        record, pending = pending, ""
+        values = next(csv.reader(io.StringIO(record)), [])
+        if not any(value.strip() for value in values):
+            continue
+        if header is None:
+            header = [HEADER_ALIASES.get(name.strip(), name.strip()) for name in values]
+            continue
+        yield {name: value.strip() for name, value in zip(header, values) if value.strip() != ""}
+
+
+async def iter_json(chunks: AsyncIterator[str]) -> AsyncIterator[Any]:
+    """逐个解析JSON数组的元素或NDJSON的行，不把整个文件读入内存"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+    is_array = False
+    finished = False
+    source = chunks.__aiter__()
+    while True:
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                started = True
+                is_array = buffer[position] == "["
+                if is_array:
+                    position += 1
+                    continue
+            if is_array and buffer[position] == "]":
+                return
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if finished:
+                    raise
+                break
+            # 数字等标量可能被块边界截断，未读完时等待更多数据再确认
+            if end == len(buffer) and not finished and not isinstance(value, (dict, list)):
+                break
+            yield value
+            position = end
+        buffer = buffer[position:]
+        if finished:
+            if buffer.strip():
+                raise json.JSONDecodeError("JSON不完整", buffer, 0)
+            return
+        try:
+            buffer += await source.__anext__()
+        except StopAsyncIteration:
+            finished = True
+
+
+class ExpenseImportService:
+    """费用批量导入服务"""
+
+    def __init__(self, db: Session, user_id: str):
+        self.db = db
+        self.user_id = user_id
+        self.trip_ids: Set[str] = {
+            row[0] for row in db.query(Trip.id).filter(Trip.user_id == user_id)
+        }
+        self.total = 0
+        self.imported = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.failed = 0
+        self.deltas = rollup_deltas(user_id, [])
+
+    async def import_file(self, file: UploadFile, file_format: str, trip_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        导入上传的文件
+
+        Args:
+            file_format: csv 或 json（JSON数组或NDJSON）
+            trip_id: 默认行程，行中没有 trip_id 时使用
+
+        Returns:
+            {total, imported, failed, errors: [{row, errors}], errors_truncated}
+
+        Raises:
+            ImportLimitError: 文件超过大小或行数限制（已写入的行回滚）
+            ValueError: 文件格式无法解析
+        """
+        records = iter_csv(_iter_text(file)) if file_format == "csv" else iter_json(_iter_text(file))
+        chunk: List[Tuple[int, Any]] = []
+        try:
+            async for record in records:
+                self.total += 1
+                if self.total > settings.EXPENSE_IMPORT_MAX_ROWS:
+                    raise ImportLimitError(f"超过最大行数 {settings.EXPENSE_IMPORT_MAX_ROWS}")
+                chunk.append((self.total, record))
+                if len(chunk) >= settings.EXPENSE_IMPORT_CHUNK_SIZE:
+                    self._process(chunk, trip_id)
+                    chunk = []
+            self._process(chunk, trip_id)
+        except (json.JSONDecodeError, csv.Error) as e:
+            self.db.rollback()
+            raise ValueError(f"文件解析失败（第 {self.total + 1} 条附近）: {e}")
+        except Exception:
+            self.db.rollback()
+            raise
+
+        # 汇总与预算在全部写入后更新一次
+        apply_deltas(self.db.connection(), self.deltas)
+        self.db.commit()
+
+        return {
+            "total": self.total,
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors)
+        }
+
+    def _process(self, chunk: List[Tuple[int, Any]], default_trip_id: Optional[str]):
+        rows = []
+        for number, record in chunk:
+            row = self._validate(number, record, default_trip_id)
+            if row is not None:
+                rows.append((number, row))
+        if rows:
+            self._load(rows)
+
+    def _validate(self, number: int, record: Any, default_trip_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not isinstance(record, dict):
+            self._error(number, ["每行必须是对象"])
+            return None
+        data = {HEADER_ALIASES.get(key, key): value for key, value in record.items()}
+        data.setdefault("trip_id", default_trip_id)
+        try:
+            expense = ExpenseCreate(**data)
+        except ValidationError as e:
+            self._error(number, [
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+            ])
+            return None
+        if expense.trip_id not in self.trip_ids:
+            self._error(number, [f"trip_id: 行程不存在: {expense.trip_id}"])
+            return None
+        row = expense.model_dump(include=set(COLUMNS))
+        row["id"] = str(uuid.uuid4())
+        row["is_shared"] = False
+        return row
+
+    def _load(self, rows: List[Tuple[int, Dict[str, Any]]]):
+        """写入一块；整块失败时逐行重试，找出出错的行"""
+        try:
+            with self.db.begin_nested():
+                self._write([row for _, row in rows])
+        except Exception as e:
+            print(f"费用导入整块写入失败，逐行重试: {e}")
+            for number, row in rows:
+                try:
+                    with self.db.begin_nested():
+                        self._write([row])
+                except Exception as row_error:
+                    self._error(number, [f"写入失败: {row_error}"])
+                else:
+                    self._loaded([row])
+        else:
+            self._loaded([row for _, row in rows])
+
+    def _write(self, rows: List[Dict[str, Any]]):
+        if self.db.get_bind().dialect.name == "postgresql":
+            self._copy(rows)
+        else:
+            self.db.execute(insert(Expense), rows)
+
+    def _copy(self, rows: List[Dict[str, Any]]):
+        """COPY FROM STDIN（CSV格式，未加引号的空值为NULL）"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([_copy_value(row[column]) for column in COLUMNS])
+        buffer.seek(0)
+        cursor = self.db.connection().connection.driver_connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY expenses ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+
+    def _loaded(self, rows: List[Dict[str, Any]]):
+        self.imported += len(rows)
+        for key, (amount, count) in rollup_deltas(self.user_id, rows).items():
+            self.deltas[key][0] += amount
+            self.deltas[key][1] += count
+
+    def _error(self, number: int, messages: List[str]):
+        self.failed += 1
+        if len(self.errors) < settings.EXPENSE_IMPORT_MAX_ERRORS:
+            self.errors.append({"row": number, "errors": messages})
+
+
+def _copy_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return value
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    """根据文件名或Content-Type判断格式"""
+    name = (filename or "").lower()
+    if name.endswith(".csv") or (content_type or "").startswith("text/csv"):
+        return "csv"
+    if name.endswith((".json", ".ndjson", ".jsonl")) or "json" in (content_type or ""):
+        return "json"
+    return None
@@ -0,0 +1,255 @@
+"""
+费用日汇总
+
+每个用户、行程、自然日、类别一行（ExpenseDailyRollup），由 Expense 的ORM事件增量维护：
+插入/更新/删除时把金额与笔数的增量记入 session.info，flush 结束后合并成一条 upsert 写入，
+与费用本身在同一事务中提交或回滚。统计与图表从汇总行读取，不再扫描全部费用。
+
+expense_date 按UTC的无时区时间处理，汇总的自然日按 EXPENSE_ROLLUP_TIMEZONE 划分。
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import Date, and_, cast, delete, event, func, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.core.config import settings
+from app.models.trip import Expense, ExpenseDailyRollup, Trip
+
+GRANULARITIES = ("day", "week", "month")
+
+# (user_id, trip_id, day, category) -> [金额增量, 笔数增量]
+RollupKey = Tuple[str, str, date, str]
+
+
+def local_day(value: Optional[datetime], tz: Optional[str] = None) -> Optional[date]:
+    """费用时间在指定时区（默认汇总时区）下的自然日"""
+    if value is None:
+        return None
+    if not isinstance(value, datetime):
+        return value
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(ZoneInfo(tz or settings.EXPENSE_ROLLUP_TIMEZONE)).date()
+
+
+def local_time(expr: Any, tz: str, dialect: str, at: Optional[datetime] = None) -> ColumnElement:
+    """
+    把UTC的无时区时间列转换为指定时区的当地时间（SQL表达式）
+
+    SQLite 没有时区数据库，按 at 时刻（默认当前）的固定偏移换算，夏令时切换前后可能差一小时，仅用于开发与测试。
+    """
+    if dialect == "postgresql":
+        return func.timezone(tz, func.timezone("UTC", expr))
+    offset = ZoneInfo(tz).utcoffset(at or datetime.utcnow())
+    return func.datetime(expr, f"{int(offset.total_seconds() // 60):+d} minutes")
+
+
+def as_date(expr: Any, dialect: str) -> ColumnElement:
+    return cast(expr, Date) if dialect == "postgresql" else func.date(expr, type_=Date)
+
+
+def bucket(expr: Any, granularity: str, dialect: str) -> ColumnElement:
+    """按天/周（周一开始）/月取桶的起始日期（SQL表达式）"""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"不支持的粒度: {granularity}")
+    if dialect == "postgresql":
+        return expr if granularity == "day" else cast(func.date_trunc(granularity, expr), Date)
+    if granularity == "week":
+        # 'weekday 0' 前进到本周日（当天是周日则不动），再退6天即本周一
+        return func.date(expr, "weekday 0", "-6 days", type_=Date)
+    if granularity == "month":
+        return func.date(expr, "start of month", type_=Date)
+    return func.date(expr, type_=Date)
+
+
+def bucket_start(day: date, granularity: str) -> date:
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start: date, granularity: str) -> date:
+    if granularity == "week":
+        return start + timedelta(days=7)
+    if granularity == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def bucket_count(first: date, last: date, granularity: str) -> int:
+    """first 与 last 所在的桶之间（含两端）的桶数"""
+    first, last = bucket_start(first, granularity), bucket_start(last, granularity)
+    if last < first:
+        return 0
+    if granularity == "week":
+        return (last - first).days // 7 + 1
+    if granularity == "month":
+        return (last.year - first.year) * 12 + last.month - first.month + 1
+    return (last - first).days + 1
+
+
+def parse_date(value: Any) -> date:
+    """各数据库返回的日期（date、datetime或ISO字符串）统一为date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def apply_deltas(connection: Connection, deltas: Dict[RollupKey, List[float]]):
+    """把增量合并写入汇总表，笔数归零的行删除"""
+    rows = [
+        {"user_id": user_id, "trip_id": trip_id, "day": day, "category": category,
+         "amount": amount, "count": count}
+        for (user_id, trip_id, day, category), (amount, count) in deltas.items()
+        if count or amount
+    ]
+    if not rows:
+        return
+    table = ExpenseDailyRollup.__table__
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = (postgresql if dialect == "postgresql" else sqlite).insert(table)
+        connection.execute(
+            insert.on_conflict_do_update(
+                index_elements=["user_id", "trip_id", "day", "category"],
+                set_={
+                    "amount": table.c.amount + insert.excluded.amount,
+                    "count": table.c.count + insert.excluded.count
+                }
+            ),
+            rows
+        )
+    else:
+        for row in rows:
+            key = and_(*(table.c[name] == row[name] for name in ("user_id", "trip_id", "day", "category")))
+            result = connection.execute(
+                update(table).where(key).values(amount=table.c.amount + row["amount"], count=table.c.count + row["count"])
+            )
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(**row))
+    users = {row["user_id"] for row in rows}
+    connection.execute(delete(table).where(table.c.user_id.in_(users), table.c.count <= 0))
+
+
+def rollup_deltas(user_id: str, rows: Iterable[Dict[str, Any]]) -> Dict[RollupKey, List[float]]:
+    """批量写入（不经过ORM事件）的费用行对应的汇总增量，交给 apply_deltas 写入"""
+    deltas: Dict[RollupKey, List[float]] = defaultdict(lambda: [0.0, 0])
+    for row in rows:
+        day = local_day(row.get("expense_date"))
+        if day is not None:
+            delta = deltas[(user_id, row["trip_id"], day, row["category"])]
+            delta[0] += row["amount"] or 0
+            delta[1] += 1
+    return deltas
+
+
+def rebuild_expense_rollups(db: Session, user_id: Optional[str] = None) -> int:
+    """
+    由原始费用重建汇总（上线时补齐历史数据，或修复不一致）
+
+    Args:
+        user_id: 只重建该用户，为空时重建全部
+
+    Returns:
+        写入的汇总行数
+    """
+    table = ExpenseDailyRollup.__table__
+    dialect = db.get_bind().dialect.name
+    day = as_date(local_time(Expense.expense_date, settings.EXPENSE_ROLLUP_TIMEZONE, dialect), dialect)
+    source = (
+        select(
+            Trip.user_id, Expense.trip_id, day.label("day"), Expense.category,
+            func.sum(Expense.amount), func.count(Expense.id)
+        )
+        .join(Trip, Trip.id == Expense.trip_id)
+        .where(Expense.expense_date.isnot(None))
+        .group_by(Trip.user_id, Expense.trip_id, day, Expense.category)
+    )
+    clear = delete(table)
+    if user_id:
+        source = source.where(Trip.user_id == user_id)
+        clear = clear.where(table.c.user_id == user_id)
+    db.execute(clear)
+    result = db.execute(
+        table.insert().from_select(["user_id", "trip_id", "day", "category", "amount", "count"], source)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def _deltas(session: Session) -> Dict[RollupKey, List[float]]:
+    return session.info.setdefault("expense_rollup_deltas", defaultdict(lambda: [0.0, 0]))
+
+
+def _user_of(session: Session, connection: Connection, trip_id: str) -> Optional[str]:
+    # 同一事务中同一行程只查一次；删除行程时费用先于行程删除，此时仍可查到
+    users = session.info.setdefault("expense_rollup_users", {})
+    if trip_id not in users:
+        users[trip_id] = connection.execute(select(Trip.user_id).where(Trip.id == trip_id)).scalar()
+    return users[trip_id]
+
+
+def _record(session: Session, connection: Connection, trip_id, expense_date, category, amount, sign: int):
+    day = local_day(expense_date)
+    if day is None or trip_id is None:
+        return
+    user_id = _user_of(session, connection, trip_id)
+    if user_id is None:
+        return
+    delta = _deltas(session)[(user_id, trip_id, day, category)]
+    delta[0] += sign * (amount or 0)
+    delta[1] += sign
+
+
+def _previous(target: Expense, name: str) -> Any:
+    history = inspect(target).attrs[name].history
+    return history.deleted[0] if history.deleted else getattr(target, name)
+
+
+@event.listens_for(Expense, "after_insert")
+def _expense_inserted(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        _record(session, connection, target.trip_id, target.expense_date, target.category, target.amount, 1)
+
+
+@event.listens_for(Expense, "after_update")
+def _expense_updated(mapper, connection, target):
+    session = object_session(target)
+    fields = ("trip_id", "expense_date", "category", "amount")
+    if session is None or not any(inspect(target).attrs[name].history.has_changes() for name in fields):
+        return
+    _record(session, connection, *(_previous(target, name) for name in fields), -1)
+    _record(session, connection, target.trip_id, target.expense_date, target.category, target.amount, 1)
+
+
+@event.listens_for(Expense, "after_delete")
+def _expense_deleted(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        _record(session, connection, target.trip_id, target.expense_date, target.category, target.amount, -1)
+
+
+@event.listens_for(Session, "after_flush")
+def _flush_rollups(session, flush_context):
+    deltas = session.info.pop("expense_rollup_deltas", None)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _reset_rollup_state(session):
+    session.info.pop("expense_rollup_users", None)
+    session.info.pop("expense_rollup_deltas", None)
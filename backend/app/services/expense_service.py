@@ -6,10 +6,16 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func, and_, or_
 from typing import List, Optional, Dict, Any
 from datetime import datetime, date
+from zoneinfo import ZoneInfo
 import uuid
 
-from ..models.trip import Expense, Trip
-from ..schemas.expense import ExpenseCreate, ExpenseUpdate, ExpenseResponse, ExpenseSummary, CategoryStats
+from ..core.config import settings
+from ..models.trip import Expense, ExpenseDailyRollup, Trip
+from ..schemas.expense import (
+    ExpenseCreate, ExpenseUpdate, ExpenseResponse, ExpenseSummary, CategoryStats,
+    ExpenseTimeseries, ExpenseTimeseriesPoint
+)
+from .expense_rollup import as_date, bucket, bucket_count, bucket_start, local_time, next_bucket, parse_date
 
 
 class ExpenseService:
@@ -131,66 +137,61 @@ class ExpenseService:
         
         return True
 
-    async def get_expense_summary(
+    def _rollups(
         self,
         user_id: str,
         trip_id: Optional[str] = None,
         start_date: Optional[date] = None,
         end_date: Optional[date] = None
-    ) -> ExpenseSummary:
-        """获取费用统计摘要"""
-        query = self.db.query(Expense).join(Trip).filter(Trip.user_id == user_id)
-        
+    ):
+        """当前用户的费用日汇总查询（日期按汇总时区的自然日过滤）"""
+        query = self.db.query(ExpenseDailyRollup).filter(ExpenseDailyRollup.user_id == user_id)
         if trip_id:
-            query = query.filter(Expense.trip_id == trip_id)
+            query = query.filter(ExpenseDailyRollup.trip_id == trip_id)
         if start_date:
-            query = query.filter(Expense.expense_date >= start_date)
+            query = query.filter(ExpenseDailyRollup.day >= start_date)
         if end_date:
-            query = query.filter(Expense.expense_date <= end_date)
-        
-        # 总金额和笔数
-        total_result = query.with_entities(
-            func.sum(Expense.amount).label('total_amount'),
-            func.count(Expense.id).label('total_count')
-        ).first()
-        
-        total_amount = total_result.total_amount or 0
-        total_count = total_result.total_count or 0
+            query = query.filter(ExpenseDailyRollup.day <= end_date)
+        return query
+
+    async def get_expense_summary(
+        self,
+        user_id: str,
+        trip_id: Optional[str] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None
+    ) -> ExpenseSummary:
+        """获取费用统计摘要（从日汇总按日期、类别读取，行数与天数×类别数相当）"""
+        rows = self._rollups(user_id, trip_id, start_date, end_date).with_entities(
+            ExpenseDailyRollup.day,
+            ExpenseDailyRollup.category,
+            func.sum(ExpenseDailyRollup.amount).label('amount'),
+            func.sum(ExpenseDailyRollup.count).label('count')
+        ).group_by(ExpenseDailyRollup.day, ExpenseDailyRollup.category).all()
+        
+        total_amount = sum(row.amount for row in rows)
+        total_count = int(sum(row.count for row in rows))
         average_amount = total_amount / total_count if total_count > 0 else 0
         
-        # 分类明细
-        category_results = query.with_entities(
-            Expense.category,
-            func.sum(Expense.amount).label('amount'),
-            func.count(Expense.id).label('count')
-        ).group_by(Expense.category).all()
-        
+        # 分类明细与每日明细
         category_breakdown = {}
-        for result in category_results:
-            percentage = (result.amount / total_amount * 100) if total_amount > 0 else 0
-            category_breakdown[result.category] = {
-                'amount': result.amount,
-                'count': result.count,
-                'percentage': round(percentage, 2)
-            }
-        
-        # 每日明细
-        daily_results = query.with_entities(
-            Expense.expense_date,
-            func.sum(Expense.amount).label('amount')
-        ).group_by(Expense.expense_date).all()
-        
-        daily_breakdown = {
-            str(result.date): result.amount 
-            for result in daily_results
-        }
+        daily_breakdown = {}
+        for row in rows:
+            stats = category_breakdown.setdefault(row.category, {'amount': 0, 'count': 0})
+            stats['amount'] += row.amount
+            stats['count'] += int(row.count)
+            day = str(parse_date(row.day))
+            daily_breakdown[day] = round(daily_breakdown.get(day, 0) + row.amount, 2)
+        for stats in category_breakdown.values():
+            stats['amount'] = round(stats['amount'], 2)
+            stats['percentage'] = round(stats['amount'] / total_amount * 100, 2) if total_amount > 0 else 0
         
         return ExpenseSummary(
-            total_amount=total_amount,
+            total_amount=round(total_amount, 2),
             total_count=total_count,
             average_amount=round(average_amount, 2),
             category_breakdown=category_breakdown,
-            daily_breakdown=daily_breakdown
+            daily_breakdown=dict(sorted(daily_breakdown.items()))
         )
 
     async def get_category_stats(
@@ -201,37 +202,124 @@ class ExpenseService:
         end_date: Optional[date] = None
     ) -> List[CategoryStats]:
         """获取费用分类统计"""
-        query = self.db.query(Expense).join(Trip).filter(Trip.user_id == user_id)
+        results = self._rollups(user_id, trip_id, start_date, end_date).with_entities(
+            ExpenseDailyRollup.category,
+            func.sum(ExpenseDailyRollup.amount).label('amount'),
+            func.sum(ExpenseDailyRollup.count).label('count')
+        ).group_by(ExpenseDailyRollup.category).all()
         
-        if trip_id:
-            query = query.filter(Expense.trip_id == trip_id)
-        if start_date:
-            query = query.filter(Expense.expense_date >= start_date)
-        if end_date:
-            query = query.filter(Expense.expense_date <= end_date)
-        
-        # 总金额
-        total_amount = query.with_entities(func.sum(Expense.amount)).scalar() or 0
-        
-        # 分类统计
-        results = query.with_entities(
-            Expense.category,
-            func.sum(Expense.amount).label('amount'),
-            func.count(Expense.id).label('count')
-        ).group_by(Expense.category).all()
+        total_amount = sum(result.amount for result in results)
         
         stats = []
         for result in results:
             percentage = (result.amount / total_amount * 100) if total_amount > 0 else 0
             stats.append(CategoryStats(
                 category=result.category,
-                amount=result.amount,
-                count=result.count,
+                amount=round(result.amount, 2),
+                count=int(result.count),
                 percentage=round(percentage, 2)
             ))
         
         return stats
 
+    async def get_expense_timeseries(
+        self,
+        user_id: str,
+        granularity: str = "day",
+        tz: Optional[str] = None,
+        trip_id: Optional[str] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        fill: bool = True
+    ) -> ExpenseTimeseries:
+        """
+        按天/周/月分桶的费用时间序列
+
+        时区与汇总时区相同时在日汇总上分桶；其他时区在原始费用上按当地时间分桶。
+        两种情况都在SQL中完成分桶与聚合。
+
+        Args:
+            tz: IANA时区名，默认 EXPENSE_ROLLUP_TIMEZONE
+            start_date / end_date: 该时区下的自然日（含）
+            fill: 是否为没有费用的桶补零
+
+        Raises:
+            ValueError: 粒度或时区无效，或补零的桶数超过 EXPENSE_TIMESERIES_MAX_BUCKETS
+        """
+        tz = tz or settings.EXPENSE_ROLLUP_TIMEZONE
+        try:
+            ZoneInfo(tz)
+        except Exception:
+            raise ValueError(f"无效的时区: {tz}")
+        dialect = self.db.get_bind().dialect.name
+        
+        if tz == settings.EXPENSE_ROLLUP_TIMEZONE:
+            source = "rollup"
+            key = bucket(ExpenseDailyRollup.day, granularity, dialect).label('bucket')
+            category = ExpenseDailyRollup.category
+            query = self._rollups(user_id, trip_id, start_date, end_date).with_entities(
+                key,
+                category,
+                func.sum(ExpenseDailyRollup.amount).label('amount'),
+                func.sum(ExpenseDailyRollup.count).label('count')
+            )
+        else:
+            source = "expenses"
+            at = datetime.combine(end_date, datetime.min.time()) if end_date else None
+            day = as_date(local_time(Expense.expense_date, tz, dialect, at), dialect)
+            key = bucket(day, granularity, dialect).label('bucket')
+            category = Expense.category
+            query = self.db.query(
+                key,
+                category,
+                func.sum(Expense.amount).label('amount'),
+                func.count(Expense.id).label('count')
+            ).join(Trip).filter(Trip.user_id == user_id, Expense.expense_date.isnot(None))
+            if trip_id:
+                query = query.filter(Expense.trip_id == trip_id)
+            if start_date:
+                query = query.filter(day >= start_date)
+            if end_date:
+                query = query.filter(day <= end_date)
+        
+        rows = query.group_by(key, category).all()
+        
+        points: Dict[date, ExpenseTimeseriesPoint] = {}
+        for row in rows:
+            start = parse_date(row.bucket)
+            point = points.setdefault(start, ExpenseTimeseriesPoint(bucket=start, amount=0, count=0))
+            point.amount = round(point.amount + row.amount, 2)
+            point.count += int(row.count)
+            point.category_breakdown[row.category] = round(row.amount, 2)
+        
+        if fill and (points or (start_date and end_date)):
+            first = bucket_start(start_date or min(points), granularity)
+            last = end_date or max(points)
+            if bucket_count(first, last, granularity) > settings.EXPENSE_TIMESERIES_MAX_BUCKETS:
+                raise ValueError(f"时间范围过大：最多 {settings.EXPENSE_TIMESERIES_MAX_BUCKETS} 个桶")
+            current = first
+            while current <= last:
+                points.setdefault(current, ExpenseTimeseriesPoint(bucket=current, amount=0, count=0))
+                if current >= bucket_start(date.max, granularity):
+                    break
+                current = next_bucket(current, granularity)
+        
+        series = [points[start] for start in sorted(points)]
+        return ExpenseTimeseries(
+            granularity=granularity,
+            timezone=tz,
+            source=source,
+            total_amount=round(sum(point.amount for point in series), 2),
+            total_count=sum(point.count for point in series),
+            points=series
+        )
+
+    async def count_expense_days(self, user_id: str, trip_id: str) -> int:
+        """有费用的天数（按汇总时区的自然日）"""
+        return self._rollups(user_id, trip_id).with_entities(
+            func.count(func.distinct(ExpenseDailyRollup.day))
+        ).scalar() or 0
+
     async def _update_budget(self, trip_id: str):
         """更新预算信息（预算现在在Trip模型中）"""
         # 计算已花费金额
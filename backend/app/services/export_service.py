@@ -0,0 +1,234 @@
+"""
+行程与费用导出
+
+导出按行生成（NDJSON、CSV、iCalendar），每种记录一条查询，使用服务端游标（yield_per，
+PostgreSQL 上为 stream_results）按批读取列值而不是ORM对象，不经过身份映射，
+输出按约64KB分块交给 StreamingResponse。内存占用与用户的行程数量无关。
+
+生成器在响应发送期间才执行，此时请求的数据库会话可能已关闭，因此在同一引擎上另开会话。
+"""
+
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.models.trip import Expense, Itinerary, ItineraryItem, Trip
+
+BATCH_SIZE = 500
+FLUSH_BYTES = 64 * 1024
+
+TRIP_COLUMNS = (
+    Trip.id, Trip.title, Trip.description, Trip.destination, Trip.start_date, Trip.end_date,
+    Trip.duration_days, Trip.budget_total, Trip.currency, Trip.status, Trip.traveler_count,
+    Trip.tags, Trip.created_at
+)
+ITINERARY_COLUMNS = (
+    Itinerary.id, Itinerary.trip_id, Itinerary.day_number, Itinerary.date, Itinerary.title, Itinerary.description
+)
+ITEM_COLUMNS = (
+    ItineraryItem.id, Itinerary.trip_id, ItineraryItem.itinerary_id, Itinerary.day_number,
+    ItineraryItem.order_key, ItineraryItem.name, ItineraryItem.category, ItineraryItem.address,
+    ItineraryItem.coordinates, ItineraryItem.start_time, ItineraryItem.end_time,
+    ItineraryItem.estimated_duration, ItineraryItem.estimated_cost, ItineraryItem.is_completed, ItineraryItem.notes
+)
+EXPENSE_COLUMNS = (
+    Expense.id, Expense.trip_id, Expense.itinerary_id, Expense.itinerary_item_id, Expense.amount,
+    Expense.currency, Expense.category, Expense.description, Expense.location, Expense.payment_method,
+    Expense.expense_date, Expense.notes
+)
+
+# 可单独导出为CSV的资源
+CSV_RESOURCES = ("trips", "items", "expenses")
+
+
+def _value(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+class TripExporter:
+    """按用户导出行程、节点与费用"""
+
+    def __init__(self, bind: Engine, user_id: str, trip_id: Optional[str] = None):
+        self.bind = bind
+        self.user_id = user_id
+        self.trip_id = trip_id
+
+    def _trips(self, query):
+        query = query.where(Trip.user_id == self.user_id)
+        if self.trip_id:
+            query = query.where(Trip.id == self.trip_id)
+        return query
+
+    def _queries(self) -> Dict[str, Any]:
+        return {
+            "trips": self._trips(select(*TRIP_COLUMNS)).order_by(Trip.created_at, Trip.id),
+            "itineraries": self._trips(
+                select(*ITINERARY_COLUMNS).join(Trip, Trip.id == Itinerary.trip_id)
+            ).order_by(Itinerary.trip_id, Itinerary.day_number),
+            "items": self._trips(
+                select(*ITEM_COLUMNS)
+                .join(Itinerary, Itinerary.id == ItineraryItem.itinerary_id)
+                .join(Trip, Trip.id == Itinerary.trip_id)
+            ).order_by(Itinerary.trip_id, Itinerary.day_number, ItineraryItem.order_key.nulls_first(), ItineraryItem.order_index),
+            "expenses": self._trips(
+                select(*EXPENSE_COLUMNS).join(Trip, Trip.id == Expense.trip_id)
+            ).order_by(Expense.trip_id, Expense.expense_date),
+        }
+
+    def _stream(self, query) -> Iterator[Any]:
+        """服务端游标按批读取，每批 BATCH_SIZE 行"""
+        with Session(bind=self.bind) as db:
+            result = db.execute(query.execution_options(yield_per=BATCH_SIZE))
+            for partition in result.partitions():
+                yield from partition
+
+    def ndjson(self) -> Iterator[str]:
+        """每行一条记录，type 为 trip / itinerary / item / expense，按类型依次输出"""
+        for record_type, name in (("trip", "trips"), ("itinerary", "itineraries"), ("item", "items"), ("expense", "expenses")):
+            for row in self._stream(self._queries()[name]):
+                record = {"type": record_type}
+                record.update((key, _value(value)) for key, value in row._mapping.items())
+                yield json.dumps(record, ensure_ascii=False) + "\n"
+
+    def csv(self, resource: str) -> Iterator[str]:
+        """单个资源的CSV（带BOM，Excel可直接打开中文）"""
+        if resource not in CSV_RESOURCES:
+            raise ValueError(f"不支持的导出资源: {resource}")
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        header_written = False
+        yield "\ufeff"
+        for row in self._stream(self._queries()[resource]):
+            if not header_written:
+                writer.writerow(row._mapping.keys())
+                header_written = True
+            writer.writerow([
+                json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else _value(value)
+                for value in row
+            ])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    def ics(self) -> Iterator[str]:
+        """行程节点的iCalendar日历（当地时间，不带时区）"""
+        yield _ics_lines(
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            "PRODID:-//AI Travel Planner//Itinerary Export//ZH",
+            "CALSCALE:GREGORIAN",
+            f"X-WR-CALNAME:{_ics_text('行程')}",
+        )
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+        query = self._trips(
+            select(
+                ItineraryItem.id, ItineraryItem.name, ItineraryItem.address, ItineraryItem.description,
+                ItineraryItem.coordinates, ItineraryItem.start_time, ItineraryItem.end_time,
+                ItineraryItem.estimated_duration, Itinerary.date, Itinerary.day_number,
+                Trip.start_date, Trip.title.label("trip_title")
+            )
+            .join(Itinerary, Itinerary.id == ItineraryItem.itinerary_id)
+            .join(Trip, Trip.id == Itinerary.trip_id)
+        ).order_by(Trip.id, Itinerary.day_number, ItineraryItem.order_key.nulls_first(), ItineraryItem.order_index)
+        for row in self._stream(query):
+            event = _ics_event(row, stamp)
+            if event:
+                yield event
+        yield _ics_lines("END:VCALENDAR")
+
+
+def _item_day(row: Any) -> Optional[date]:
+    if row.date:
+        return row.date.date() if isinstance(row.date, datetime) else row.date
+    if row.start_date and row.day_number:
+        return (row.start_date + timedelta(days=row.day_number - 1)).date()
+    return None
+
+
+def _parse_time(value: Optional[str]) -> Optional[Tuple[int, int]]:
+    """"HH:MM" 解析为 (时, 分)；格式错误或超出范围（如LLM写入的 "24:00"）时返回None"""
+    try:
+        hour, minute = (int(part) for part in (value or "").split(":")[:2])
+    except ValueError:
+        return None
+    if not (0 <= hour <= 23 and 0 <= minute <= 59):
+        return None
+    return hour, minute
+
+
+def _ics_event(row: Any, stamp: str) -> Optional[str]:
+    """一个节点的VEVENT；没有日期的节点跳过，没有开始时间的作为全天事件"""
+    day = _item_day(row)
+    if day is None:
+        return None
+    lines = ["BEGIN:VEVENT", f"UID:{row.id}@ai-travel-planner", f"DTSTAMP:{stamp}"]
+    start = _parse_time(row.start_time)
+    if start:
+        begin = datetime.combine(day, datetime.min.time()).replace(hour=start[0], minute=start[1])
+        end_time = _parse_time(row.end_time)
+        if end_time:
+            end = begin.replace(hour=end_time[0], minute=end_time[1])
+            if end <= begin:
+                end += timedelta(days=1)
+        else:
+            end = begin + timedelta(minutes=row.estimated_duration or 60)
+        lines += [f"DTSTART:{begin:%Y%m%dT%H%M%S}", f"DTEND:{end:%Y%m%dT%H%M%S}"]
+    else:
+        lines += [f"DTSTART;VALUE=DATE:{day:%Y%m%d}", f"DTEND;VALUE=DATE:{day + timedelta(days=1):%Y%m%d}"]
+    lines.append(f"SUMMARY:{_ics_text(row.name)}")
+    if row.address:
+        lines.append(f"LOCATION:{_ics_text(row.address)}")
+    description = "\n".join(part for part in (row.trip_title, row.description) if part)
+    if description:
+        lines.append(f"DESCRIPTION:{_ics_text(description)}")
+    coordinates = row.coordinates if isinstance(row.coordinates, dict) else None
+    if coordinates and coordinates.get("lat") is not None and coordinates.get("lng") is not None:
+        lines.append(f"GEO:{coordinates['lat']};{coordinates['lng']}")
+    lines.append("END:VEVENT")
+    return _ics_lines(*lines)
+
+
+def _ics_text(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+        .replace("\r\n", "\\n").replace("\n", "\\n")
+    )
+
+
+def _ics_lines(*lines: str) -> str:
+    """RFC 5545：每行不超过75字节，续行以空格开头，行尾CRLF"""
+    folded = []
+    for line in lines:
+        encoded = line.encode("utf-8")
+        while len(encoded) > 75:
+            # 不在UTF-8多字节字符中间断开
+            cut = 75
+            while (encoded[cut] & 0xC0) == 0x80:
+                cut -= 1
+            folded.append(encoded[:cut].decode("utf-8"))
+            encoded = b" " + encoded[cut:]
+        folded.append(encoded.decode("utf-8"))
+    return "".join(line + "\r\n" for line in folded)
+
+
+def buffered(chunks: Iterable[str], size: int = FLUSH_BYTES) -> Iterator[bytes]:
+    """把逐行生成的文本攒到约 size 字节再输出，减少响应分块数"""
+    parts: List[bytes] = []
+    pending = 0
+    for chunk in chunks:
+        data = chunk.encode("utf-8")
+        parts.append(data)
+        pending += len(data)
+        if pending >= size:
+            yield b"".join(parts)
+            parts, pending = [], 0
+    if parts:
+        yield b"".join(parts)
@@ -0,0 +1,354 @@
+"""
+行程安排与节点的批量写入与排序
+
+id在应用侧生成（uuid4），每天的安排和所有节点各用一条 INSERT 写入（executemany），
+节点的 order_index 在内存中计算，不再逐条 add/flush/count。
+方法本身不提交事务，由调用方在全部写入后提交一次。
+
+节点在一天内的顺序由分数排序键 order_key 决定：插入到两个节点之间、移动到另一天
+都只改写被移动的那一行。键变长后由 rebalance_itineraries 在后台重新均匀分配。
+"""
+
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, event, func, insert, select, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session, object_session
+
+from ..core.config import settings
+from ..models.trip import Itinerary, ItineraryItem
+from ..utils.order_key import key_between, keys_between
+from .poi_store import collect_itinerary_items
+
+# 节点可写入的字段
+ITEM_FIELDS = (
+    "poi_id", "name", "description", "address", "coordinates", "category",
+    "start_time", "end_time", "estimated_duration", "rating", "price_level",
+    "phone", "website", "opening_hours", "images", "is_completed", "notes", "estimated_cost"
+)
+
+
+def new_id() -> str:
+    return str(uuid.uuid4())
+
+
+class ItineraryService:
+    """行程安排与节点的批量写入服务"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        # 本次操作中排序键超过阈值、需要在后台重新分配的天
+        self.needs_rebalance: Set[str] = set()
+
+    def insert_itineraries(self, trip_id: str, itineraries: Iterable[Dict[str, Any]]) -> List[str]:
+        """
+        为新行程批量写入多天安排及其节点
+
+        Args:
+            trip_id: 行程ID（行程行需已写入当前事务）
+            itineraries: 每天的安排，字段同 ItineraryCreate，items 为节点列表
+
+        Returns:
+            安排ID列表（与输入顺序一致）
+        """
+        itinerary_rows = []
+        item_rows = []
+        for data in itineraries:
+            itinerary_id = data.get("id") or new_id()
+            itinerary_rows.append({
+                "id": itinerary_id,
+                "trip_id": trip_id,
+                "day_number": data["day_number"],
+                "date": data.get("date"),
+                "title": data.get("title"),
+                "description": data.get("description")
+            })
+            # 未指定 order_index 的节点按列表位置排序，排序键按最终顺序均匀分配
+            rows = [
+                self._item_row(itinerary_id, item, position)
+                for position, item in enumerate(data.get("items") or [])
+            ]
+            ordered = sorted(rows, key=lambda row: row["order_index"])
+            for row, key in zip(ordered, keys_between(None, None, len(ordered))):
+                row["order_key"] = key
+            item_rows.extend(rows)
+
+        self._insert(itinerary_rows, item_rows)
+        return [row["id"] for row in itinerary_rows]
+
+    def add_items(self, trip_id: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        按天批量追加节点，缺少的天自动创建
+
+        Args:
+            trip_id: 行程ID（调用方已校验归属）
+            items: 节点列表，每项包含 day_number 及节点字段，可带客户端生成的 id
+
+        Returns:
+            写入的节点行（含 id、itinerary_id、day_number、order_index、order_key），与输入顺序一致
+        """
+        days = sorted({int(item["day_number"]) for item in items})
+        # 一次查询取得已有的天及每天当前最大的 order_index 与 order_key（旧节点的NULL键排在最前，不参与最大值）
+        existing = (
+            self.db.query(
+                Itinerary.id, Itinerary.day_number,
+                func.max(ItineraryItem.order_index), func.max(ItineraryItem.order_key)
+            )
+            .outerjoin(ItineraryItem, ItineraryItem.itinerary_id == Itinerary.id)
+            .filter(Itinerary.trip_id == trip_id, Itinerary.day_number.in_(days))
+            .group_by(Itinerary.id, Itinerary.day_number)
+            .all()
+        )
+        itinerary_ids: Dict[int, str] = {}
+        next_index: Dict[str, int] = {}
+        last_key: Dict[str, Optional[str]] = {}
+        for itinerary_id, day_number, max_order, max_key in existing:
+            # 同一天有多条安排时追加到第一条
+            if day_number not in itinerary_ids:
+                itinerary_ids[day_number] = itinerary_id
+                next_index[itinerary_id] = -1 if max_order is None else max_order
+                last_key[itinerary_id] = max_key
+
+        itinerary_rows = []
+        for day_number in days:
+            if day_number not in itinerary_ids:
+                itinerary_id = new_id()
+                itinerary_ids[day_number] = itinerary_id
+                next_index[itinerary_id] = -1
+                last_key[itinerary_id] = None
+                itinerary_rows.append({
+                    "id": itinerary_id,
+                    "trip_id": trip_id,
+                    "day_number": day_number,
+                    "title": f"第 {day_number} 天"
+                })
+
+        item_rows = []
+        for item in items:
+            day_number = int(item["day_number"])
+            itinerary_id = itinerary_ids[day_number]
+            next_index[itinerary_id] += 1
+            row = self._item_row(itinerary_id, item, next_index[itinerary_id])
+            row["order_key"] = last_key[itinerary_id] = self._new_key(itinerary_id, last_key[itinerary_id], None)
+            item_rows.append(row)
+
+        self._insert(itinerary_rows, item_rows)
+        day_of = {itinerary_id: day for day, itinerary_id in itinerary_ids.items()}
+        return [{**row, "day_number": day_of[row["itinerary_id"]]} for row in item_rows]
+
+    def key_at(self, itinerary_id: str, position: int, exclude_id: Optional[str] = None) -> str:
+        """
+        某天第 position 个位置（从0开始，超出范围时放到末尾）的新排序键
+
+        兼容按 order_index 指定位置的旧接口。
+
+        Args:
+            exclude_id: 计算位置时排除的节点（在同一天内移动自身时传入）
+        """
+        siblings = [
+            entry for entry in self._load_siblings([itinerary_id])[itinerary_id]
+            if entry[0] != exclude_id
+        ]
+        position = max(0, min(position, len(siblings)))
+        before = siblings[position - 1][1] if position > 0 else None
+        after = siblings[position][1] if position < len(siblings) else None
+        return self._new_key(itinerary_id, before, after)
+
+    def position_of(self, itinerary_id: str, item_id: str) -> Optional[int]:
+        """节点在当天的位置（从0开始），不在该天时返回None"""
+        ids = [entry[0] for entry in self._load_siblings([itinerary_id])[itinerary_id]]
+        return ids.index(item_id) if item_id in ids else None
+
+    def move_items(self, trip_id: str, moves: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        按顺序应用一组移动（拖拽排序），只改写被移动的节点
+
+        Args:
+            trip_id: 行程ID（调用方已校验归属）
+            moves: 每项包含 item_id，可选 itinerary_id（目标天，默认原来的天），
+                   after_id / before_id（放在某节点之后/之前，都不给时放到末尾）
+
+        Returns:
+            被移动节点的 {id, itinerary_id, order_key}，与输入顺序一致
+
+        Raises:
+            ValueError: 节点或目标天不属于该行程，或参照节点不在目标天
+        """
+        item_ids = {move["item_id"] for move in moves}
+        current = dict(
+            self.db.query(ItineraryItem.id, ItineraryItem.itinerary_id)
+            .join(Itinerary, Itinerary.id == ItineraryItem.itinerary_id)
+            .filter(Itinerary.trip_id == trip_id, ItineraryItem.id.in_(item_ids))
+            .all()
+        )
+        missing = item_ids - set(current)
+        if missing:
+            raise ValueError(f"节点不存在: {', '.join(sorted(missing))}")
+
+        targets = {move["itinerary_id"] for move in moves if move.get("itinerary_id")}
+        if targets:
+            found = {
+                row[0] for row in
+                self.db.query(Itinerary.id).filter(Itinerary.trip_id == trip_id, Itinerary.id.in_(targets))
+            }
+            if targets - found:
+                raise ValueError(f"行程安排不存在: {', '.join(sorted(targets - found))}")
+
+        # 一次查询加载涉及的各天，在内存中依次应用移动，最后一条批量UPDATE写回
+        siblings = self._load_siblings(set(current.values()) | targets)
+        changed: Dict[str, Dict[str, Any]] = {}
+        for move in moves:
+            item_id = move["item_id"]
+            target = move.get("itinerary_id") or current[item_id]
+            source_entries = siblings[current[item_id]]
+            siblings[current[item_id]] = [entry for entry in source_entries if entry[0] != item_id]
+            entries = siblings[target]
+            ids = [entry[0] for entry in entries]
+
+            anchor = move.get("after_id") or move.get("before_id")
+            if anchor and anchor not in ids:
+                raise ValueError(f"参照节点不在目标安排中: {anchor}")
+            if move.get("after_id"):
+                position = ids.index(move["after_id"]) + 1
+            elif move.get("before_id"):
+                position = ids.index(move["before_id"])
+            else:
+                position = len(entries)
+
+            before = entries[position - 1][1] if position > 0 else None
+            after = entries[position][1] if position < len(entries) else None
+            key = self._new_key(target, before, after)
+            entries.insert(position, (item_id, key))
+            current[item_id] = target
+            changed[item_id] = {"id": item_id, "itinerary_id": target, "order_key": key}
+
+        self.db.execute(update(ItineraryItem), list(changed.values()))
+        return [changed[move["item_id"]] for move in moves]
+
+    def _load_siblings(self, itinerary_ids: Iterable[str]) -> Dict[str, List[Tuple[str, str]]]:
+        """
+        各天节点的 (id, order_key)，按顺序排列
+
+        旧数据缺少排序键或有重复键（并发追加）时无法在其间插入，先为该天重新分配。
+        """
+        result: Dict[str, List[Tuple[str, Optional[str]]]] = {itinerary_id: [] for itinerary_id in itinerary_ids}
+        rows = (
+            self.db.query(ItineraryItem.itinerary_id, ItineraryItem.id, ItineraryItem.order_key)
+            .filter(ItineraryItem.itinerary_id.in_(list(result)))
+            .order_by(*ORDER_COLUMNS)
+            .all()
+        )
+        for itinerary_id, item_id, key in rows:
+            result[itinerary_id].append((item_id, key))
+        for itinerary_id, entries in result.items():
+            keys = [key for _, key in entries]
+            if None in keys or len(set(keys)) != len(keys):
+                result[itinerary_id] = assign_keys(self.db.connection(), itinerary_id)
+        return result
+
+    def _new_key(self, itinerary_id: str, before: Optional[str], after: Optional[str]) -> str:
+        key = key_between(before, after)
+        if len(key) > settings.ORDER_KEY_REBALANCE_LENGTH:
+            self.needs_rebalance.add(itinerary_id)
+        return key
+
+    @staticmethod
+    def _item_row(itinerary_id: str, item: Dict[str, Any], order_index: int) -> Dict[str, Any]:
+        row = {field: item.get(field) for field in ITEM_FIELDS}
+        coordinates = row["coordinates"]
+        row.update({
+            "id": item.get("id") or new_id(),
+            "itinerary_id": itinerary_id,
+            "coordinates": coordinates if isinstance(coordinates, dict) else None,
+            "images": row["images"] or [],
+            "is_completed": bool(row["is_completed"]),
+            "order_index": item["order_index"] if item.get("order_index") is not None else order_index
+        })
+        return row
+
+    def _insert(self, itinerary_rows: List[Dict[str, Any]], item_rows: List[Dict[str, Any]]):
+        if itinerary_rows:
+            self.db.execute(insert(Itinerary), itinerary_rows)
+        if item_rows:
+            self.db.execute(insert(ItineraryItem), item_rows)
+            # 批量INSERT不触发ORM事件，显式登记到POI库同步
+            collect_itinerary_items(self.db, item_rows)
+
+
+# 同一天内节点的顺序：排序键，其次是旧的 order_index。
+# 上线前的旧节点没有排序键，在所有数据库上都排在最前（PostgreSQL 升序默认把NULL排在最后），
+# 与 max(order_key) 忽略NULL、新节点追加在其后保持一致
+ORDER_COLUMNS = (
+    ItineraryItem.itinerary_id, ItineraryItem.order_key.nulls_first(), ItineraryItem.order_index, ItineraryItem.id
+)
+
+_items = ItineraryItem.__table__
+_reorder = (
+    _items.update()
+    .where(_items.c.id == bindparam("item_id"))
+    .values(order_key=bindparam("new_key"), order_index=bindparam("new_index"))
+)
+
+
+def assign_keys(connection: Connection, itinerary_id: str) -> List[Tuple[str, str]]:
+    """按当前顺序为某天的节点重新分配均匀的排序键，order_index 同步改写为位置"""
+    ids = [
+        row[0] for row in connection.execute(
+            select(_items.c.id).where(_items.c.itinerary_id == itinerary_id).order_by(*ORDER_COLUMNS[1:])
+        )
+    ]
+    keys = keys_between(None, None, len(ids))
+    if ids:
+        connection.execute(_reorder, [
+            {"item_id": item_id, "new_key": key, "new_index": index}
+            for index, (item_id, key) in enumerate(zip(ids, keys))
+        ])
+    return list(zip(ids, keys))
+
+
+def rebalance_itineraries(bind: Engine, itinerary_ids: Iterable[str]):
+    """后台任务：为排序键过长的天重新分配排序键（独立连接与事务）"""
+    try:
+        with bind.begin() as connection:
+            for itinerary_id in itinerary_ids:
+                assign_keys(connection, itinerary_id)
+    except Exception as e:
+        print(f"重新分配节点排序键失败: {e}")
+
+
+@event.listens_for(ItineraryItem, "before_insert")
+def _append_order_key(mapper, connection, target):
+    """逐个 add 的节点（智能体工具、旧接口）未指定排序键时追加到当天末尾"""
+    if target.order_key is not None or target.itinerary_id is None:
+        return
+    # 同一次flush中追加到同一天的多个节点只查一次最大键
+    last_keys = object_session(target).info.setdefault("order_key_last", {})
+    if target.itinerary_id not in last_keys:
+        last_keys[target.itinerary_id] = connection.execute(
+            select(func.max(_items.c.order_key)).where(_items.c.itinerary_id == target.itinerary_id)
+        ).scalar()
+    target.order_key = last_keys[target.itinerary_id] = key_between(last_keys[target.itinerary_id], None)
+
+
+@event.listens_for(Session, "after_flush")
+def _clear_order_key_cache(session, flush_context):
+    session.info.pop("order_key_last", None)
+
+
+def item_payload(item: Any, **extra: Any) -> Dict[str, Any]:
+    """
+    把请求中的节点模型转为 ItineraryService 使用的字典
+
+    客户端未显式给出 order_index 时不传，由服务按位置计算。
+    """
+    data = item.model_dump(exclude={"order_index"} if "order_index" not in item.model_fields_set else None)
+    data.update(extra)
+    return data
+
+
+def itinerary_payload(itinerary: Any) -> Dict[str, Any]:
+    """把 ItineraryCreate 转为 ItineraryService.insert_itineraries 使用的字典"""
+    data = itinerary.model_dump(exclude={"items"})
+    data["items"] = [item_payload(item) for item in itinerary.items or []]
+    return data
@@ -0,0 +1,340 @@
+"""
+多供应商LLM路由
+
+在 DeepSeek 与阿里云百炼之间按滚动首字延迟（TTFT）和错误率选择最健康的供应商；
+流式请求在收到第一个token之前失败会自动切换到下一个供应商。
+每个Agent可以配置路由策略：
+- pin:<provider>    固定使用某个供应商，不做切换
+- prefer:<provider> 优先使用某个供应商，不健康时切换
+- spread            按健康度加权随机分摊负载
+- best              总是选择当前评分最好的供应商
+
+每次调用返回的 usage 中的前缀缓存命中token数（DeepSeek 的 prompt_cache_hit_tokens，
+阿里云的 prompt_tokens_details.cached_tokens）计入指标和供应商统计，用于确认提示词前缀
+（见 app.core.prompts）确实命中了缓存。
+"""
+
+import json
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncGenerator, Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import observe_llm_stream, observe_llm_completion, observe_llm_usage
+from app.core.tracing import tracer
+from app.core.transcript import current_player, current_recorder
+from app.utils.aliyun_llm import llm_service as aliyun_llm_service
+from app.utils.deepseek_llm import deepseek_llm_service
+from app.utils.resilience import CircuitBreaker, LatencyTracker
+
+# 没有TTFT样本时使用的估计值（秒）
+DEFAULT_TTFT = 1.0
+# 错误率对评分的惩罚系数
+ERROR_PENALTY = 5.0
+
+
+def prompt_cache_tokens(usage: Optional[Dict[str, Any]]) -> Optional[Tuple[int, int]]:
+    """
+    从OpenAI兼容的usage中取出输入token的缓存命中数和未命中数
+
+    Returns:
+        (命中, 未命中)，usage中没有输入token信息时返回None
+    """
+    if not usage:
+        return None
+    if usage.get("prompt_cache_hit_tokens") is not None:
+        hit = usage["prompt_cache_hit_tokens"]
+        miss = usage.get("prompt_cache_miss_tokens")
+        if miss is None:
+            miss = max(0, (usage.get("prompt_tokens") or 0) - hit)
+        return hit, miss
+    if usage.get("prompt_tokens") is None:
+        return None
+    hit = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    return hit, max(0, usage["prompt_tokens"] - hit)
+
+
+class ProviderStats:
+    """供应商滚动统计：首字延迟与错误率"""
+
+    def __init__(self, window_size: int = 100):
+        self.ttft = LatencyTracker(window_size)
+        self._outcomes: Deque[bool] = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+        self.total_requests = 0
+        self.total_failovers = 0
+        self.prompt_tokens = 0
+        self.prompt_cache_hit_tokens = 0
+
+    def record_success(self, ttft: Optional[float] = None):
+        if ttft is not None:
+            self.ttft.record(ttft)
+        with self._lock:
+            self._outcomes.append(True)
+
+    def record_error(self):
+        with self._lock:
+            self._outcomes.append(False)
+
+    def record_usage(self, cache_hit_tokens: int, cache_miss_tokens: int):
+        with self._lock:
+            self.prompt_tokens += cache_hit_tokens + cache_miss_tokens
+            self.prompt_cache_hit_tokens += cache_hit_tokens
+
+    def cache_hit_ratio(self) -> Optional[float]:
+        with self._lock:
+            if not self.prompt_tokens:
+                return None
+            return self.prompt_cache_hit_tokens / self.prompt_tokens
+
+    def error_rate(self) -> float:
+        with self._lock:
+            if not self._outcomes:
+                return 0.0
+            return self._outcomes.count(False) / len(self._outcomes)
+
+    def score(self) -> float:
+        """评分越低越好：TTFT中位数 × 错误率惩罚"""
+        p50 = self.ttft.percentile(50)
+        ttft = p50 if p50 is not None else DEFAULT_TTFT
+        return ttft * (1.0 + ERROR_PENALTY * self.error_rate())
+
+
+class LLMProvider:
+    """一个OpenAI兼容的LLM供应商"""
+
+    def __init__(self, name: str, service: Any):
+        self.name = name
+        self.service = service
+        self.stats = ProviderStats()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.service.api_key)
+
+    @property
+    def healthy(self) -> bool:
+        breaker = getattr(self.service, "breaker", None)
+        return breaker is None or breaker.state != CircuitBreaker.OPEN
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50 = self.stats.ttft.percentile(50)
+        p95 = self.stats.ttft.percentile(95)
+        ratio = self.stats.cache_hit_ratio()
+        return {
+            "name": self.name,
+            "model": self.service.model,
+            "configured": self.configured,
+            "healthy": self.healthy,
+            "ttft_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "ttft_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "error_rate": round(self.stats.error_rate(), 3),
+            "score": round(self.stats.score(), 3),
+            "total_requests": self.stats.total_requests,
+            "total_failovers": self.stats.total_failovers,
+            "prompt_tokens": self.stats.prompt_tokens,
+            "prompt_cache_hit_tokens": self.stats.prompt_cache_hit_tokens,
+            "prompt_cache_hit_ratio": round(ratio, 3) if ratio is not None else None
+        }
+
+
+class LLMRouter:
+    """LLM路由器"""
+
+    def __init__(self, providers: List[LLMProvider]):
+        self.providers: Dict[str, LLMProvider] = {p.name: p for p in providers}
+
+    @staticmethod
+    def _record_usage(provider: LLMProvider, agent_id: Optional[str], usage: Optional[Dict[str, Any]], span=None):
+        tokens = prompt_cache_tokens(usage)
+        if tokens is None:
+            return
+        provider.stats.record_usage(*tokens)
+        observe_llm_usage(provider.name, agent_id, *tokens)
+        if span:
+            span.set_attribute("prompt_cache_hit_tokens", tokens[0])
+
+    @staticmethod
+    def _stream_usage(chunk: Optional[str]) -> Optional[Dict[str, Any]]:
+        if chunk is None:
+            return None
+        try:
+            return json.loads(chunk).get("usage")
+        except (ValueError, AttributeError):
+            return None
+
+    def get_policy(self, agent_id: Optional[str]) -> str:
+        """获取Agent的路由策略"""
+        if agent_id:
+            policy = settings.llm_agent_policies.get(agent_id)
+            if policy:
+                return policy
+        return settings.LLM_DEFAULT_POLICY
+
+    def select(self, agent_id: Optional[str] = None) -> List[LLMProvider]:
+        """
+        按策略返回本次请求的供应商尝试顺序
+
+        Args:
+            agent_id: 发起请求的Agent ID
+
+        Returns:
+            供应商列表，第一个为首选，其余为切换备选
+        """
+        # 回放的记录由DeepSeekLLMService提供
+        if current_player() is not None:
+            return [self.providers["deepseek"]]
+
+        mode, _, target = self.get_policy(agent_id).partition(":")
+        available = [p for p in self.providers.values() if p.configured]
+
+        if mode == "pin" and target in self.providers:
+            return [self.providers[target]]
+
+        healthy = sorted((p for p in available if p.healthy), key=lambda p: p.stats.score())
+        # 熔断中的供应商放在最后，所有供应商都不健康时仍有机会探测
+        unhealthy = [p for p in available if not p.healthy]
+
+        if mode == "spread" and len(healthy) > 1:
+            weights = [1.0 / max(p.stats.score(), 1e-3) for p in healthy]
+            first = random.choices(healthy, weights=weights, k=1)[0]
+            healthy = [first] + [p for p in healthy if p is not first]
+        elif mode == "prefer":
+            preferred = self.providers.get(target)
+            if preferred in healthy:
+                healthy = [preferred] + [p for p in healthy if p is not preferred]
+
+        ordered = healthy + unhealthy
+        if not ordered:
+            # 未配置任何API Key时仍走DeepSeek，保持原有报错信息
+            return [self.providers["deepseek"]]
+        return ordered
+
+    async def stream(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        agent_id: Optional[str] = None,
+        **kwargs
+    ) -> AsyncGenerator[str, None]:
+        """
+        流式调用，首个token之前失败时切换供应商
+
+        Yields:
+            原始的流式JSON数据
+        """
+        candidates = self.select(agent_id)
+        last_error: Optional[Exception] = None
+        # 记录调用方实际收到的chunk（不论来自哪个供应商），回放时不再经过切换
+        recorder = current_recorder()
+        record = recorder.begin_llm_stream(time.monotonic()) if recorder else None
+
+        for index, provider in enumerate(candidates):
+            provider.stats.total_requests += 1
+            start = time.monotonic()
+            ttft = None
+            # usage只在最后一个chunk中出现，先保留原始数据，结束时再解析
+            usage_chunk = None
+            # 流式调用跨越多次yield，使用不切换上下文的叶子span
+            span = tracer.start_span("llm.stream", kind="llm", provider=provider.name, agent=agent_id)
+            generator = provider.service.stream_chat_completion(messages, tools=tools, **kwargs)
+            try:
+                async for chunk in generator:
+                    if ttft is None:
+                        ttft = time.monotonic() - start
+                        if span:
+                            span.set_attribute("ttft_ms", round(ttft * 1000, 1))
+                    if record:
+                        record.add_chunk(provider.name, chunk)
+                    if '"usage"' in chunk:
+                        usage_chunk = chunk
+                    yield chunk
+                provider.stats.record_success(ttft)
+                self._record_usage(provider, agent_id, self._stream_usage(usage_chunk), span)
+                observe_llm_stream(provider.name, agent_id, ttft, time.monotonic() - start, failed=False)
+                return
+            except GeneratorExit:
+                # Agent收到finish_reason后直接break，生成器在此被关闭，视为成功
+                if ttft is not None:
+                    provider.stats.record_success(ttft)
+                    observe_llm_stream(provider.name, agent_id, ttft, time.monotonic() - start, failed=False)
+                    self._record_usage(provider, agent_id, self._stream_usage(usage_chunk), span)
+                raise
+            except Exception as e:
+                provider.stats.record_error()
+                observe_llm_stream(provider.name, agent_id, ttft, time.monotonic() - start, failed=True)
+                if span:
+                    span.set_error(e)
+                if ttft is not None:
+                    # 已经向调用方输出内容，不能再切换
+                    if record:
+                        record.set_error(provider.name, e)
+                    raise
+                last_error = e
+                if index + 1 < len(candidates):
+                    provider.stats.total_failovers += 1
+                    print(f"⚠️ LLM供应商 {provider.name} 首字前失败，切换到 {candidates[index + 1].name}: {e}")
+            finally:
+                if span:
+                    span.finish()
+                await generator.aclose()
+
+        if record:
+            record.set_error(candidates[-1].name, last_error)
+        raise last_error
+
+    async def complete(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        agent_id: Optional[str] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """非流式调用，失败时依次切换供应商"""
+        candidates = self.select(agent_id)
+        last_error: Optional[Exception] = None
+        recorder = current_recorder()
+        call_start = time.monotonic()
+
+        for index, provider in enumerate(candidates):
+            provider.stats.total_requests += 1
+            start = time.monotonic()
+            try:
+                with tracer.span("llm.complete", kind="llm", provider=provider.name, agent=agent_id) as span:
+                    result = await provider.service.chat_completion(messages, stream=False, tools=tools, **kwargs)
+                    self._record_usage(provider, agent_id, result.get("usage") if isinstance(result, dict) else None, span)
+                provider.stats.record_success()
+                observe_llm_completion(provider.name, agent_id, time.monotonic() - start, failed=False)
+                if recorder:
+                    recorder.record_llm_completion(provider.name, call_start, time.monotonic() - call_start, result)
+                return result
+            except Exception as e:
+                provider.stats.record_error()
+                observe_llm_completion(provider.name, agent_id, time.monotonic() - start, failed=True)
+                last_error = e
+                if index + 1 < len(candidates):
+                    provider.stats.total_failovers += 1
+                    print(f"⚠️ LLM供应商 {provider.name} 调用失败，切换到 {candidates[index + 1].name}: {e}")
+
+        if recorder:
+            recorder.record_llm_completion(
+                candidates[-1].name, call_start, time.monotonic() - call_start, None, error=str(last_error)
+            )
+        raise last_error
+
+    def stats(self) -> Dict[str, Any]:
+        """路由状态"""
+        return {
+            "default_policy": settings.LLM_DEFAULT_POLICY,
+            "agent_policies": settings.llm_agent_policies,
+            "providers": {name: p.snapshot() for name, p in self.providers.items()}
+        }
+
+
+# 全局路由实例
+llm_router = LLMRouter([
+    LLMProvider("deepseek", deepseek_llm_service),
+    LLMProvider("aliyun", aliyun_llm_service)
+])
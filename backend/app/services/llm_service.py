@@ -5,10 +5,15 @@ This module provides high-level LLM service functions with AG-UI protocol integr
 
 import json
 import asyncio
+import hashlib
 from typing import Dict, Any, List, Optional, AsyncGenerator
-from app.utils.deepseek_llm import deepseek_llm_service, stream_llm_response
+from app.core.transcript import current_recorder
+from app.utils.deepseek_llm import deepseek_llm_service
+from app.services.llm_router import llm_router
 from app.utils.agui_encoder import AGUIEventEncoder
 from app.utils.agui_utils import generate_run_id, generate_message_id
+from app.utils.single_flight import get_async_single_flight
+from app.utils.tool_registry import ToolList
 
 
 class LLMService:
@@ -16,35 +21,55 @@ class LLMService:
     
     def __init__(self):
         self.encoder = AGUIEventEncoder()
+        self._completion_flight = get_async_single_flight("llm_chat_completion")
     
     async def chat_completion(
         self,
         messages: List[Dict[str, str]],
-        tools: Optional[List[Dict[str, Any]]] = None
+        tools: Optional[List[Dict[str, Any]]] = None,
+        agent_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         简单的对话完成（非流式）
         
+        相同消息和工具的并发请求会合并为一次上游调用
+        
         Args:
             messages: 消息列表
             tools: 可用工具列表
+            agent_id: 调用方ID，用于选择LLM路由策略
             
         Returns:
             LLM响应
         """
+        # 记录transcript时不合并，保证本次运行的每次上游调用都被记录
+        if current_recorder() is not None:
+            return await self._chat_completion(messages, tools, agent_id)
+        # 注册表中的工具列表已预先序列化，不必每次重新序列化schema
+        tools_key = tools.json if isinstance(tools, ToolList) else tools
+        payload = json.dumps({"messages": messages, "tools": tools_key}, sort_keys=True, ensure_ascii=False, default=str)
+        key = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        return await self._completion_flight.do(key, lambda: self._chat_completion(messages, tools, agent_id))
+    
+    async def _chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        agent_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """非流式对话的实际上游调用"""
         try:
-            # 调用DeepSeek API
-            response = await deepseek_llm_service.chat_completion(
-                messages=messages,
-                model="deepseek-chat",
+            # 经路由选择供应商（DeepSeek/阿里云）
+            response = await llm_router.complete(
+                messages,
+                tools=tools,
+                agent_id=agent_id,
                 temperature=0.7,
-                max_tokens=8192,
-                stream=False,
-                tools=tools
+                max_tokens=8192
             )
             
-            # 解析DeepSeek API响应格式
-            # DeepSeek返回格式: {"choices": [{"message": {"content": "...", "tool_calls": [...]}}]}
+            # 解析OpenAI兼容响应格式
+            # 返回格式: {"choices": [{"message": {"content": "...", "tool_calls": [...]}}]}
             if "choices" in response and len(response["choices"]) > 0:
                 choice = response["choices"][0]
                 message = choice.get("message", {})
@@ -106,7 +131,7 @@ class LLMService:
             
             # 2. 流式调用LLM API
             full_response = ""
-            async for chunk_data in stream_llm_response(user_input, system_prompt, history):
+            async for chunk_data in self.stream_llm_response(user_input, system_prompt, history):
                 try:
                     # 解析阿里云API的流式响应
                     chunk = json.loads(chunk_data)
@@ -162,7 +187,7 @@ class LLMService:
         """
         try:
             messages = deepseek_llm_service.format_messages(user_input, system_prompt, history)
-            result = await deepseek_llm_service.chat_completion(messages, stream=False)
+            result = await llm_router.complete(messages)
             
             if "choices" in result and len(result["choices"]) > 0:
                 return result["choices"][0]["message"]["content"]
@@ -176,7 +201,8 @@ class LLMService:
         self,
         user_input: str,
         system_prompt: str = None,
-        history: List[Dict[str, str]] = None
+        history: List[Dict[str, str]] = None,
+        agent_id: str = None
     ) -> AsyncGenerator[str, None]:
         """
         流式调用LLM API
@@ -185,11 +211,13 @@ class LLMService:
             user_input: 用户输入
             system_prompt: 系统提示词
             history: 对话历史
+            agent_id: 调用方Agent ID，用于选择LLM路由策略
             
         Yields:
             LLM响应的JSON字符串
         """
-        async for chunk in stream_llm_response(user_input, system_prompt, history):
+        messages = deepseek_llm_service.format_messages(user_input, system_prompt, history)
+        async for chunk in llm_router.stream(messages, agent_id=agent_id):
             yield chunk
     
     async def stream_llm_response_with_tools(
@@ -197,7 +225,8 @@ class LLMService:
         user_input: str,
         system_prompt: str = None,
         history: List[Dict[str, str]] = None,
-        tools: List[Dict[str, Any]] = None
+        tools: List[Dict[str, Any]] = None,
+        agent_id: str = None
     ) -> AsyncGenerator[str, None]:
         """
         带工具的流式LLM响应
@@ -207,13 +236,14 @@ class LLMService:
             system_prompt: 系统提示词
             history: 对话历史
             tools: 工具定义列表
+            agent_id: 调用方Agent ID，用于选择LLM路由策略
             
         Yields:
             流式响应数据
         """
         try:
             messages = deepseek_llm_service.format_messages(user_input, system_prompt, history)
-            generator = deepseek_llm_service.stream_chat_completion(messages, tools=tools)
+            generator = llm_router.stream(messages, tools=tools, agent_id=agent_id)
             try:
                 async for chunk in generator:
                     yield chunk
@@ -0,0 +1,353 @@
+"""
+本地POI库
+
+保存百度地图搜索返回的POI和用户行程节点，按geohash建立空间索引。
+带 location/radius 的POI搜索先查本地：同一关键词和分类在覆盖该圆形区域的范围内
+近期已向百度查询过时，直接用本地数据返回，否则再请求百度。
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import math
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import and_, event, or_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, object_session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.metrics import POI_STORE_LOOKUPS
+from app.models.poi import Poi, PoiSearchCoverage
+from app.models.trip import ItineraryItem
+from app.utils.distance_matrix import haversine_matrix
+from app.utils.geohash import PREFIX_UPPER, covering_cells, encode
+
+# POI分类对应的百度搜索tag
+CATEGORY_TAGS = {
+    "attraction": "旅游景点",
+    "restaurant": "美食",
+    "hotel": "酒店",
+}
+# 单次检索最多取出的候选POI数（在数据库中按距离由近到远截取）
+MAX_CANDIDATES = 2000
+
+
+def _utcnow() -> datetime:
+    return datetime.utcnow()
+
+
+def _normalize(text: Optional[str]) -> str:
+    return (text or "").strip().lower()
+
+
+def _search_id(poi: Dict[str, Any]) -> str:
+    """百度POI的uid，缺失时用名称和坐标生成"""
+    return poi.get("id") or f"baidu:{poi.get('name', '')}:{poi['location']['lat']},{poi['location']['lng']}"
+
+
+def _float_or_none(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class PoiStore:
+    """本地POI库（线程安全，每次操作使用独立的数据库会话）"""
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal):
+        self.session_factory = session_factory
+
+    # ===== 写入 =====
+
+    def add_search_results(self, keyword: str, category: Optional[str], location: Optional[Dict[str, float]],
+                           radius: int, limit: int, pois: List[Dict[str, Any]]):
+        """
+        保存百度搜索结果；带location的搜索同时记录覆盖范围
+
+        Args:
+            keyword: 搜索关键词
+            category: POI分类
+            location: 搜索中心点，为空时只保存POI
+            radius: 搜索半径（米）
+            limit: 请求的数量上限
+            pois: search_poi 返回的POI列表
+        """
+        db = self.session_factory()
+        try:
+            self._upsert(db, [self._from_search(p) for p in pois if self._has_location(p.get("location"))])
+            if location:
+                db.add(PoiSearchCoverage(
+                    keyword=_normalize(keyword),
+                    category=category,
+                    lat=location["lat"],
+                    lng=location["lng"],
+                    radius=radius,
+                    page_size=limit,
+                    result_count=len(pois),
+                    poi_ids=[_search_id(p) for p in pois if self._has_location(p.get("location"))],
+                    searched_at=_utcnow()
+                ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"保存POI搜索结果失败: {e}")
+        finally:
+            db.close()
+
+    def add_itinerary_items(self, db: Session, items: Iterable[Dict[str, Any]]):
+        """保存行程节点中带坐标的地点（已有的百度POI不会被节点数据覆盖）"""
+        rows = []
+        for item in items:
+            coordinates = item.get("coordinates")
+            if not self._has_location(coordinates):
+                continue
+            rows.append({
+                "id": item.get("poi_id") or f"item:{item['id']}",
+                "name": item.get("name") or "",
+                "address": item.get("address"),
+                "category": item.get("category"),
+                "lat": float(coordinates["lat"]),
+                "lng": float(coordinates["lng"]),
+                "rating": item.get("rating"),
+                "phone": item.get("phone"),
+                "website": item.get("website"),
+                "opening_hours": item.get("opening_hours"),
+                "description": item.get("description"),
+                "source": "itinerary"
+            })
+        self._upsert(db, rows, overwrite_sources=("itinerary",))
+
+    def _upsert(self, db: Session, rows: List[Dict[str, Any]], overwrite_sources: Tuple[str, ...] = ("baidu", "itinerary")):
+        if not rows:
+            return
+        rows = list({row["id"]: row for row in rows}.values())
+        existing = {
+            poi.id: poi for poi in db.query(Poi).filter(Poi.id.in_([row["id"] for row in rows]))
+        }
+        for row in rows:
+            row["geohash"] = encode(row["lat"], row["lng"])
+            poi = existing.get(row["id"])
+            if poi is None:
+                db.add(Poi(**row))
+            elif poi.source in overwrite_sources:
+                for field, value in row.items():
+                    setattr(poi, field, value)
+
+    # ===== 查询 =====
+
+    def nearby(self, lat: float, lng: float, radius: float, keyword: Optional[str] = None,
+               category: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        查询附近的POI，按距离排序
+
+        Args:
+            lat, lng: 中心点
+            radius: 半径（米）
+            keyword: 名称、地址或分类包含的文本
+            category: POI分类（attraction/restaurant/hotel 或百度tag）
+            limit: 返回数量
+        """
+        db = self.session_factory()
+        try:
+            candidates, _ = self._candidates(db, lat, lng, radius)
+            return [
+                self._to_dict(poi) for poi, _ in candidates
+                if self._matches(poi, keyword, category)
+            ][:limit]
+        finally:
+            db.close()
+
+    def search_nearby(self, keyword: str, category: Optional[str], location: Dict[str, float],
+                      radius: int, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        用本地数据回答带location的POI搜索
+
+        Returns:
+            POI列表；本地覆盖不足（未查询过、已过期或结果可能不完整）时返回None
+        """
+        db = self.session_factory()
+        try:
+            lat, lng = location["lat"], location["lng"]
+            coverages = db.query(PoiSearchCoverage).filter(
+                PoiSearchCoverage.keyword == _normalize(keyword),
+                PoiSearchCoverage.category.is_(None) if category is None else PoiSearchCoverage.category == category,
+                PoiSearchCoverage.searched_at >= _utcnow() - timedelta(seconds=settings.POI_STORE_COVERAGE_TTL)
+            ).order_by(PoiSearchCoverage.searched_at.desc()).limit(50).all()
+            if not coverages:
+                POI_STORE_LOOKUPS.labels(result="miss").inc()
+                return None
+
+            # 覆盖记录的圆必须完整包含本次查询的圆
+            centers = np.array([[c.lat, c.lng] for c in coverages])
+            offsets = haversine_matrix(np.array([[lat, lng]]), centers)[0]
+            covering = [c for c, offset in zip(coverages, offsets) if offset + radius <= c.radius]
+            if not covering:
+                POI_STORE_LOOKUPS.labels(result="miss").inc()
+                return None
+
+            covered_ids = set()
+            for coverage in covering:
+                covered_ids.update(coverage.poi_ids or [])
+            candidates, truncated = self._candidates(db, lat, lng, radius)
+            matches = [
+                poi for poi, _ in candidates
+                if poi.id in covered_ids or self._matches(poi, keyword, category)
+            ]
+            # 百度返回的数量达到上限时，区域内可能还有未返回的POI；
+            # 候选被截断时，更远处的POI没有取出，匹配数不足也不能当作完整结果
+            complete = any(c.result_count < c.page_size for c in covering) and not truncated
+            if not complete and len(matches) < limit:
+                POI_STORE_LOOKUPS.labels(result="incomplete").inc()
+                return None
+            POI_STORE_LOOKUPS.labels(result="hit").inc()
+            return [self._to_dict(poi) for poi in matches[:limit]]
+        except Exception as e:
+            print(f"本地POI查询失败: {e}")
+            POI_STORE_LOOKUPS.labels(result="error").inc()
+            return None
+        finally:
+            db.close()
+
+    def _candidates(self, db: Session, lat: float, lng: float,
+                    radius: float) -> Tuple[List[Tuple[Poi, float]], bool]:
+        """
+        geohash网格范围查询后按实际距离过滤
+
+        数据库中按等距矩形近似距离排序后截取 MAX_CANDIDATES 个，保证取出的是离中心最近的POI。
+
+        Returns:
+            (按距离排序的 (POI, 距离) 列表, 候选是否被截断)
+        """
+        cells = covering_cells(lat, lng, radius)
+        # 小范围内与球面距离同序，只用加减乘，各数据库都能计算
+        d_lat = Poi.lat - lat
+        d_lng = (Poi.lng - lng) * math.cos(math.radians(lat))
+        pois = db.query(Poi).filter(or_(*[
+            and_(Poi.geohash >= cell, Poi.geohash < cell + PREFIX_UPPER) for cell in cells
+        ])).order_by(d_lat * d_lat + d_lng * d_lng, Poi.id).limit(MAX_CANDIDATES + 1).all()
+        truncated = len(pois) > MAX_CANDIDATES
+        pois = pois[:MAX_CANDIDATES]
+        if not pois:
+            return [], truncated
+        distances = haversine_matrix(np.array([[lat, lng]]), np.array([[p.lat, p.lng] for p in pois]))[0]
+        order = np.argsort(distances, kind="stable")
+        return [(pois[i], float(distances[i])) for i in order if distances[i] <= radius], truncated
+
+    @staticmethod
+    def _matches(poi: Poi, keyword: Optional[str], category: Optional[str]) -> bool:
+        if category:
+            tag = CATEGORY_TAGS.get(category, category)
+            if category != poi.category and tag not in (poi.category or ""):
+                return False
+        if keyword:
+            keyword = _normalize(keyword)
+            text = " ".join(filter(None, (poi.name, poi.address, poi.category))).lower()
+            return keyword in text
+        return True
+
+    # ===== 转换 =====
+
+    @staticmethod
+    def _has_location(location: Any) -> bool:
+        return isinstance(location, dict) and bool(location.get("lat")) and bool(location.get("lng"))
+
+    @staticmethod
+    def _from_search(poi: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": _search_id(poi),
+            "name": poi.get("name", ""),
+            "address": poi.get("address"),
+            "category": poi.get("category"),
+            "lat": float(poi["location"]["lat"]),
+            "lng": float(poi["location"]["lng"]),
+            "rating": _float_or_none(poi.get("rating")),
+            "price": str(poi.get("price") or ""),
+            "phone": poi.get("phone"),
+            "website": poi.get("website"),
+            "opening_hours": poi.get("opening_hours"),
+            "description": poi.get("description"),
+            "source": "baidu"
+        }
+
+    @staticmethod
+    def _to_dict(poi: Poi) -> Dict[str, Any]:
+        """与 search_poi 返回的POI格式一致"""
+        return {
+            "id": poi.id,
+            "name": poi.name,
+            "address": poi.address or "",
+            "location": {"lat": poi.lat, "lng": poi.lng},
+            "category": poi.category or "",
+            "rating": poi.rating or 0,
+            "price": poi.price or "",
+            "phone": poi.phone or "",
+            "website": poi.website or "",
+            "opening_hours": poi.opening_hours or "",
+            "description": poi.description or ""
+        }
+
+
+# 全局POI库实例
+poi_store = PoiStore()
+
+
+# ===== 行程节点同步 =====
+# 节点插入或更新时记录快照，所在事务提交后交给后台线程写入POI库，覆盖所有创建节点的入口。
+# 同步不占用请求的延迟，失败也只影响POI库，不会在用户的事务已经提交之后让请求报错。
+
+_ITEM_FIELDS = ("id", "poi_id", "name", "address", "coordinates", "category", "rating",
+                "phone", "website", "opening_hours", "description")
+
+
+def collect_itinerary_items(session: Session, rows: Iterable[Dict[str, Any]]):
+    """登记批量INSERT写入的节点（不经过ORM事件），事务提交后同步到POI库"""
+    if settings.POI_STORE_ENABLED:
+        session.info.setdefault("poi_store_items", []).extend(
+            {field: row.get(field) for field in _ITEM_FIELDS} for row in rows
+        )
+
+
+@event.listens_for(ItineraryItem, "after_insert")
+@event.listens_for(ItineraryItem, "after_update")
+def _collect_itinerary_item(mapper, connection, target):
+    session = object_session(target)
+    if session is not None and settings.POI_STORE_ENABLED:
+        session.info.setdefault("poi_store_items", []).append(
+            {field: getattr(target, field) for field in _ITEM_FIELDS}
+        )
+
+
+# 单线程按提交顺序写入（线程在第一次提交时才启动，多进程部署时位于fork之后）
+_sync_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="poi-store-sync")
+
+
+def _write_itinerary_items(bind: Engine, items: List[Dict[str, Any]]):
+    db = Session(bind=bind)
+    try:
+        poi_store.add_itinerary_items(db, items)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"同步行程节点到POI库失败: {e}")
+    finally:
+        db.close()
+
+
+def flush_itinerary_sync():
+    """等待已提交的节点同步完成"""
+    _sync_writer.submit(lambda: None).result()
+
+
+@event.listens_for(Session, "after_commit")
+def _sync_itinerary_items(session):
+    items = session.info.pop("poi_store_items", None)
+    if items:
+        _sync_writer.submit(_write_itinerary_items, session.get_bind(), items)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_itinerary_items(session):
+    session.info.pop("poi_store_items", None)
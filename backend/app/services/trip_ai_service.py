@@ -9,15 +9,87 @@ from datetime import datetime, date
 
 from ..models.trip import Trip
 from ..schemas.trip import TripCreate
+from ..utils.tool_registry import ToolDispatcher, ToolSet, ToolSpec, UnknownToolError
 from .llm_service import LLMService
 
 
+# 收集齐信息后创建行程，需要用户在前端确认
+CREATE_TRIP = ToolSpec(
+    name="create_trip",
+    description="创建新的旅行行程",
+    parameters={
+        "type": "object",
+        "properties": {
+            "title": {
+                "type": "string",
+                "description": "行程标题，必填，例如：'北京三日游'、'上海迪士尼之旅'"
+            },
+            "destination": {
+                "type": "string",
+                "description": "目的地，必填，例如：'北京'、'上海'"
+            },
+            "start_date": {
+                "type": "string",
+                "description": "开始日期，必填，格式：YYYY-MM-DD，例如：'2025-11-15'"
+            },
+            "end_date": {
+                "type": "string",
+                "description": "结束日期，必填，格式：YYYY-MM-DD，例如：'2025-11-17'"
+            },
+            "duration_days": {
+                "type": "integer",
+                "description": "行程天数，可选，如果提供了开始和结束日期会自动计算"
+            },
+            "budget_total": {
+                "type": "number",
+                "description": "总预算，可选，数字，例如：5000"
+            },
+            "currency": {
+                "type": "string",
+                "description": "货币单位，可选，默认：'CNY'"
+            },
+            "traveler_count": {
+                "type": "integer",
+                "description": "同行人数，可选，默认：1"
+            },
+            "status": {
+                "type": "string",
+                "enum": ["draft", "planned", "active", "completed", "cancelled"],
+                "description": "行程状态，可选，默认：'draft'"
+            },
+            "tags": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "标签，可选，字符串数组，例如：['休闲', '文化']"
+            },
+            "is_public": {
+                "type": "boolean",
+                "description": "是否公开，可选，默认：false"
+            },
+            "description": {
+                "type": "string",
+                "description": "行程描述，可选，可以根据收集到的信息自动生成"
+            }
+        },
+        "required": ["title", "destination", "start_date", "end_date"]
+    },
+    timeout=10
+)
+
+TRIP_CREATION_TOOLS = ToolSet("trip-creation", [
+    CREATE_TRIP
+])
+
+
 class TripAIService:
     """行程创建智能体服务"""
     
     def __init__(self, db: Session):
         self.db = db
         self.llm_service = LLMService()
+        self._tools = ToolDispatcher(TRIP_CREATION_TOOLS, {
+            "create_trip": self._create_trip,
+        }, source="trip-ai")
 
     async def process_natural_language_query(
         self, 
@@ -43,7 +115,8 @@ class TripAIService:
             # 调用LLM处理查询
             response = await self.llm_service.chat_completion(
                 messages=messages,
-                tools=self._get_available_tools()
+                tools=self._tools.tools,
+                agent_id="trip-ai"
             )
             
             # 检查响应是否有效
@@ -134,74 +207,6 @@ class TripAIService:
 """
         return prompt
 
-    def _get_available_tools(self) -> List[Dict[str, Any]]:
-        """获取可用工具列表"""
-        return [
-            {
-                "type": "function",
-                "function": {
-                    "name": "create_trip",
-                    "description": "创建新的旅行行程",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "title": {
-                                "type": "string",
-                                "description": "行程标题，必填，例如：'北京三日游'、'上海迪士尼之旅'"
-                            },
-                            "destination": {
-                                "type": "string",
-                                "description": "目的地，必填，例如：'北京'、'上海'"
-                            },
-                            "start_date": {
-                                "type": "string",
-                                "description": "开始日期，必填，格式：YYYY-MM-DD，例如：'2025-11-15'"
-                            },
-                            "end_date": {
-                                "type": "string",
-                                "description": "结束日期，必填，格式：YYYY-MM-DD，例如：'2025-11-17'"
-                            },
-                            "duration_days": {
-                                "type": "integer",
-                                "description": "行程天数，可选，如果提供了开始和结束日期会自动计算"
-                            },
-                            "budget_total": {
-                                "type": "number",
-                                "description": "总预算，可选，数字，例如：5000"
-                            },
-                            "currency": {
-                                "type": "string",
-                                "description": "货币单位，可选，默认：'CNY'"
-                            },
-                            "traveler_count": {
-                                "type": "integer",
-                                "description": "同行人数，可选，默认：1"
-                            },
-                            "status": {
-                                "type": "string",
-                                "enum": ["draft", "planned", "active", "completed", "cancelled"],
-                                "description": "行程状态，可选，默认：'draft'"
-                            },
-                            "tags": {
-                                "type": "array",
-                                "items": {"type": "string"},
-                                "description": "标签，可选，字符串数组，例如：['休闲', '文化']"
-                            },
-                            "is_public": {
-                                "type": "boolean",
-                                "description": "是否公开，可选，默认：false"
-                            },
-                            "description": {
-                                "type": "string",
-                                "description": "行程描述，可选，可以根据收集到的信息自动生成"
-                            }
-                        },
-                        "required": ["title", "destination", "start_date", "end_date"]
-                    }
-                }
-            }
-        ]
-    
     async def execute_tool_call(
         self,
         function_name: str,
@@ -210,15 +215,13 @@ class TripAIService:
     ) -> Dict[str, Any]:
         """执行工具调用"""
         try:
-            if function_name == "create_trip":
-                result = await self._create_trip(arguments, user_id)
-                return {
-                    "message": f"✅ 行程创建成功：{result.get('title', '')}",
-                    "data": result
-                }
-            else:
-                raise ValueError(f"未知功能：{function_name}")
-        
+            result = await self._tools.dispatch(function_name, arguments, user_id)
+            return {
+                "message": f"✅ 行程创建成功：{result.get('title', '')}",
+                "data": result
+            }
+        except UnknownToolError:
+            raise Exception(f"执行失败：未知功能：{function_name}")
         except Exception as e:
             raise Exception(f"执行失败：{str(e)}")
     
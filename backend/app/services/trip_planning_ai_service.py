@@ -9,8 +9,219 @@ from datetime import datetime, timedelta
 
 from ..models.trip import Trip, Itinerary, ItineraryItem
 from ..schemas.trip import ItineraryItemCreate, ItineraryItemUpdate, POICategory
+from ..core.prompts import register_prompt
+from ..utils.tool_registry import ToolDispatcher, ToolSet, ToolSpec, UnknownToolError
 from .llm_service import LLMService
 
+# 静态前缀（角色、字段说明、工具示例），行程数据作为动态后缀追加在后面
+TRIP_PLANNING_PROMPT = register_prompt("trip-planning", "2", """你是一名AI行程规划助手，帮助用户管理旅行行程中的节点（添加、修改、删除）。
+
+你的角色定位：
+- 帮助用户添加行程节点、删除行程节点、修改行程节点
+- 通过友好的对话，收集操作所需的信息
+- 确保收集足够的信息之后，再进行工具调用
+- 工具调用会在前端显示确认卡片，由用户确认后执行
+
+重要提示：
+1. 当用户要求执行操作（如添加、修改、删除节点）时，必须立即使用相应的工具函数
+2. 工具函数调用会在前端显示确认卡片，由用户确认后执行，所以你不需要询问用户确认，直接调用工具即可
+3. **关键**：itinerary_id和item_id必须从下方当前上下文中的"当前行程安排"信息中获取，不要询问用户这些ID。用户说"第1天"时，你应该从行程安排信息中找到第1天的itinerary_id；用户说节点名称时，你应该从节点列表中找到对应的item_id
+4. 如果用户提供了足够的信息（节点名称、时间、分类等），直接调用工具函数，使用从行程安排信息中获取的ID
+5. 如果缺少必要信息（如节点名称、时间等），可以询问用户补充，但不要询问ID
+6. 在回答用户问题时，要结合当前的行程信息和节点数据
+7. 提供清晰、准确的操作建议
+
+节点信息字段说明：
+- name: 节点名称（必填）
+- description: 节点描述（可选）
+- address: 地址（可选）
+- category: 分类，可选值：attraction（景点）、restaurant（餐厅）、hotel（酒店）、shopping（购物）、transport（交通）、other（其他）
+- start_time: 开始时间，格式：HH:MM，例如："09:00"（可选）
+- end_time: 结束时间，格式：HH:MM，例如："17:00"（可选）
+- estimated_duration: 预计停留时长（分钟，可选）
+- estimated_cost: 预计费用（可选）
+- order_index: 顺序索引，从0开始（可选，默认为0）
+- itinerary_id: 行程安排ID（可选），如果提供了day_number或date，可以省略
+- day_number: 第几天（可选），例如：1表示第1天。如果提供了itinerary_id，可以省略
+- date: 日期（可选），格式：YYYY-MM-DD。如果提供了itinerary_id或day_number，可以省略
+- 注意：必须提供itinerary_id、day_number或date中的至少一个
+
+工具使用示例：
+- 用户说"在第1天添加一个景点，名称是天安门，时间是上午9点到11点" 
+  -> 如果第1天的itinerary已存在，从行程安排信息中获取itinerary_id；如果不存在，使用day_number
+  -> 例如（itinerary存在）：{"itinerary_id": "从行程安排信息中获取的第1天的itinerary_id", "name": "天安门", "category": "attraction", "start_time": "09:00", "end_time": "11:00"}
+  -> 例如（itinerary不存在）：{"day_number": 1, "name": "天安门", "category": "attraction", "start_time": "09:00", "end_time": "11:00"}
+
+- 用户说"删除第1天的第一个节点"
+  -> 从当前上下文的行程安排信息中找到第1天的itinerary_id和第一个节点的item_id，然后调用delete_itinerary_item工具
+  -> 例如：{"itinerary_id": "从行程安排信息中获取的第1天的itinerary_id", "item_id": "从节点列表中获取的第一个节点的ID"}
+
+- 用户说"修改节点xxx的名称为xxx"
+  -> 从当前上下文的行程安排信息中找到节点所属的itinerary_id和节点ID，然后调用update_itinerary_item工具
+  -> 例如：{"itinerary_id": "节点所属的itinerary_id", "item_id": "节点ID", "name": "新名称"}
+
+重要：
+1. 你必须从下方当前上下文中的"当前行程安排"信息中获取itinerary_id和item_id，不要询问用户这些ID
+2. 如果用户说"第X天"，你可以：
+   - 如果该天的itinerary已存在，使用itinerary_id
+   - 如果该天的itinerary不存在，使用day_number（系统会自动创建itinerary）
+3. 用户只需要告诉你"第几天"或"节点名称"，你就能从行程安排信息中找到对应的ID，或者使用day_number让系统自动创建
+
+注意：你有可用的工具函数（tools），当用户要求执行操作时，必须调用相应的工具函数。不要只是回复文字，要实际调用工具！""")
+
+
+# 需要用户在前端确认后才执行的节点操作
+ADD_ITINERARY_ITEM = ToolSpec(
+    name="add_itinerary_item",
+    description="添加新的行程节点",
+    parameters={
+        "type": "object",
+        "properties": {
+            "itinerary_id": {
+                "type": "string",
+                "description": "行程安排ID（可选），如果提供了day_number或date，可以省略"
+            },
+            "day_number": {
+                "type": "integer",
+                "description": "第几天（可选），如果提供了itinerary_id，可以省略。如果既没有itinerary_id也没有day_number，必须提供date"
+            },
+            "date": {
+                "type": "string",
+                "description": "日期（可选），格式：YYYY-MM-DD，例如：'2025-01-21'。如果提供了itinerary_id或day_number，可以省略"
+            },
+            "name": {
+                "type": "string",
+                "description": "节点名称（必填），例如：'天安门'、'故宫博物院'"
+            },
+            "description": {
+                "type": "string",
+                "description": "节点描述（可选）"
+            },
+            "address": {
+                "type": "string",
+                "description": "地址（可选）"
+            },
+            "category": {
+                "type": "string",
+                "enum": ["attraction", "restaurant", "hotel", "shopping", "transport", "other"],
+                "description": "分类（可选），默认：other"
+            },
+            "start_time": {
+                "type": "string",
+                "description": "开始时间（可选），格式：HH:MM，例如：'09:00'"
+            },
+            "end_time": {
+                "type": "string",
+                "description": "结束时间（可选），格式：HH:MM，例如：'17:00'"
+            },
+            "estimated_duration": {
+                "type": "integer",
+                "description": "预计停留时长（分钟，可选）"
+            },
+            "estimated_cost": {
+                "type": "number",
+                "description": "预计费用（可选）"
+            },
+            "order_index": {
+                "type": "integer",
+                "description": "顺序索引（可选，默认为0）"
+            }
+        },
+        "required": ["name"]
+    },
+    timeout=10
+)
+
+UPDATE_ITINERARY_ITEM = ToolSpec(
+    name="update_itinerary_item",
+    description="更新现有的行程节点",
+    parameters={
+        "type": "object",
+        "properties": {
+            "itinerary_id": {
+                "type": "string",
+                "description": "行程安排ID（必填）"
+            },
+            "item_id": {
+                "type": "string",
+                "description": "节点ID（必填）"
+            },
+            "name": {
+                "type": "string",
+                "description": "节点名称（可选）"
+            },
+            "description": {
+                "type": "string",
+                "description": "节点描述（可选）"
+            },
+            "address": {
+                "type": "string",
+                "description": "地址（可选）"
+            },
+            "category": {
+                "type": "string",
+                "enum": ["ATTRACTION", "RESTAURANT", "HOTEL", "SHOPPING", "TRANSPORTATION", "ENTERTAINMENT", "OTHER"],
+                "description": "分类（可选）"
+            },
+            "start_time": {
+                "type": "string",
+                "description": "开始时间（可选），格式：HH:MM"
+            },
+            "end_time": {
+                "type": "string",
+                "description": "结束时间（可选），格式：HH:MM"
+            },
+            "estimated_duration": {
+                "type": "integer",
+                "description": "预计停留时长（分钟，可选）"
+            },
+            "estimated_cost": {
+                "type": "number",
+                "description": "预计费用（可选）"
+            },
+            "order_index": {
+                "type": "integer",
+                "description": "顺序索引（可选）"
+            }
+        },
+        "required": ["itinerary_id", "item_id"]
+    },
+    timeout=10
+)
+
+DELETE_ITINERARY_ITEM = ToolSpec(
+    name="delete_itinerary_item",
+    description="删除行程节点",
+    parameters={
+        "type": "object",
+        "properties": {
+            "itinerary_id": {
+                "type": "string",
+                "description": "行程安排ID（必填）"
+            },
+            "item_id": {
+                "type": "string",
+                "description": "节点ID（必填）"
+            }
+        },
+        "required": ["itinerary_id", "item_id"]
+    },
+    timeout=10
+)
+
+TRIP_PLANNING_TOOLS = ToolSet("trip-planning", [
+    ADD_ITINERARY_ITEM,
+    UPDATE_ITINERARY_ITEM,
+    DELETE_ITINERARY_ITEM
+])
+
+# 执行成功后展示给用户的消息
+_RESULT_MESSAGES = {
+    "add_itinerary_item": lambda result: f"✅ 节点添加成功：{result.get('name', '')}",
+    "update_itinerary_item": lambda result: f"✅ 节点更新成功：{result.get('name', '')}",
+    "delete_itinerary_item": lambda result: "✅ 节点删除成功",
+}
+
 
 class TripPlanningAIService:
     """行程规划智能体服务"""
@@ -18,6 +229,11 @@ class TripPlanningAIService:
     def __init__(self, db: Session):
         self.db = db
         self.llm_service = LLMService()
+        self._tools = ToolDispatcher(TRIP_PLANNING_TOOLS, {
+            "add_itinerary_item": self._add_itinerary_item,
+            "update_itinerary_item": self._update_itinerary_item,
+            "delete_itinerary_item": self._delete_itinerary_item,
+        }, source="trip-planning-ai")
 
     async def process_natural_language_query(
         self, 
@@ -53,7 +269,8 @@ class TripPlanningAIService:
             # 调用LLM处理查询
             response = await self.llm_service.chat_completion(
                 messages=messages,
-                tools=self._get_available_tools()
+                tools=self._tools.tools,
+                agent_id="trip-planning-ai"
             )
             
             # 检查响应是否有效
@@ -103,253 +320,53 @@ class TripPlanningAIService:
             raise
 
     def _build_system_prompt(self, trip: Trip) -> str:
-        """构建系统提示，包含行程的详细信息"""
-        prompt = f"""你是一名AI行程规划助手，帮助用户管理旅行行程中的节点（添加、修改、删除）。
-
-你的角色定位：
-- 帮助用户添加行程节点、删除行程节点、修改行程节点
-- 通过友好的对话，收集操作所需的信息
-- 确保收集足够的信息之后，再进行工具调用
-- 工具调用会在前端显示确认卡片，由用户确认后执行
-
-当前行程信息：
-- 行程ID：{trip.id}
-- 行程标题：{trip.title}
-- 目的地：{trip.destination or '未设置'}
-- 开始日期：{trip.start_date.strftime('%Y-%m-%d') if trip.start_date else '未设置'}
-- 结束日期：{trip.end_date.strftime('%Y-%m-%d') if trip.end_date else '未设置'}
-- 行程天数：{trip.duration_days}天
-- 总预算：{trip.budget_total or '未设置'}
-- 同行人数：{trip.traveler_count}人
-- 行程状态：{trip.status}
-"""
+        """构建系统提示：固定的静态前缀 + 行程的详细信息"""
+        lines = [
+            "当前行程信息：",
+            f"- 行程ID：{trip.id}",
+            f"- 行程标题：{trip.title}",
+            f"- 目的地：{trip.destination or '未设置'}",
+            f"- 开始日期：{trip.start_date.strftime('%Y-%m-%d') if trip.start_date else '未设置'}",
+            f"- 结束日期：{trip.end_date.strftime('%Y-%m-%d') if trip.end_date else '未设置'}",
+            f"- 行程天数：{trip.duration_days}天",
+            f"- 总预算：{trip.budget_total or '未设置'}",
+            f"- 同行人数：{trip.traveler_count}人",
+            f"- 行程状态：{trip.status}",
+        ]
+        dynamic = "\n".join(lines) + "\n"
 
         # 添加行程安排信息
         if trip.itineraries:
-            prompt += "\n当前行程安排（重要：每个行程安排的ID用于添加节点）：\n"
+            dynamic += "\n当前行程安排（重要：每个行程安排的ID用于添加节点）：\n"
             for itinerary in sorted(trip.itineraries, key=lambda x: x.day_number):
-                prompt += f"\n第{itinerary.day_number}天"
+                dynamic += f"\n第{itinerary.day_number}天"
                 if itinerary.date:
-                    prompt += f" ({itinerary.date.strftime('%Y-%m-%d')})"
+                    dynamic += f" ({itinerary.date.strftime('%Y-%m-%d')})"
                 if itinerary.title:
-                    prompt += f" - {itinerary.title}"
-                prompt += f"\n  行程安排ID：{itinerary.id}（用于添加节点到此天）\n"
-                
+                    dynamic += f" - {itinerary.title}"
+                dynamic += f"\n  行程安排ID：{itinerary.id}（用于添加节点到此天）\n"
+
                 if itinerary.items:
-                    for idx, item in enumerate(sorted(itinerary.items, key=lambda x: x.order_index or 0), 1):
-                        prompt += f"  {idx}. {item.name}"
+                    for idx, item in enumerate(itinerary.items, 1):
+                        dynamic += f"  {idx}. {item.name}"
                         if item.start_time:
-                            prompt += f" ({item.start_time}"
+                            dynamic += f" ({item.start_time}"
                             if item.end_time:
-                                prompt += f" - {item.end_time}"
-                            prompt += ")"
+                                dynamic += f" - {item.end_time}"
+                            dynamic += ")"
                         if item.address:
-                            prompt += f" - {item.address}"
+                            dynamic += f" - {item.address}"
                         if item.description:
-                            prompt += f"\n     描述：{item.description}"
-                        prompt += f"\n     节点ID：{item.id}\n"
+                            dynamic += f"\n     描述：{item.description}"
+                        dynamic += f"\n     节点ID：{item.id}\n"
                 else:
-                    prompt += "  暂无节点\n"
+                    dynamic += "  暂无节点\n"
         else:
-            prompt += "\n当前行程安排：暂无行程安排\n"
-            prompt += "\n注意：如果用户要添加节点，需要先创建行程安排（itinerary）。\n"
-
-        prompt += """
-重要提示：
-1. 当用户要求执行操作（如添加、修改、删除节点）时，必须立即使用相应的工具函数
-2. 工具函数调用会在前端显示确认卡片，由用户确认后执行，所以你不需要询问用户确认，直接调用工具即可
-3. **关键**：itinerary_id和item_id必须从上面提供的"当前行程安排"信息中获取，不要询问用户这些ID。用户说"第1天"时，你应该从行程安排信息中找到第1天的itinerary_id；用户说节点名称时，你应该从节点列表中找到对应的item_id
-4. 如果用户提供了足够的信息（节点名称、时间、分类等），直接调用工具函数，使用从行程安排信息中获取的ID
-5. 如果缺少必要信息（如节点名称、时间等），可以询问用户补充，但不要询问ID
-6. 在回答用户问题时，要结合当前的行程信息和节点数据
-7. 提供清晰、准确的操作建议
-
-节点信息字段说明：
-- name: 节点名称（必填）
-- description: 节点描述（可选）
-- address: 地址（可选）
-- category: 分类，可选值：attraction（景点）、restaurant（餐厅）、hotel（酒店）、shopping（购物）、transport（交通）、other（其他）
-- start_time: 开始时间，格式：HH:MM，例如："09:00"（可选）
-- end_time: 结束时间，格式：HH:MM，例如："17:00"（可选）
-- estimated_duration: 预计停留时长（分钟，可选）
-- estimated_cost: 预计费用（可选）
-- order_index: 顺序索引，从0开始（可选，默认为0）
-- itinerary_id: 行程安排ID（可选），如果提供了day_number或date，可以省略
-- day_number: 第几天（可选），例如：1表示第1天。如果提供了itinerary_id，可以省略
-- date: 日期（可选），格式：YYYY-MM-DD。如果提供了itinerary_id或day_number，可以省略
-- 注意：必须提供itinerary_id、day_number或date中的至少一个
-
-工具使用示例：
-- 用户说"在第1天添加一个景点，名称是天安门，时间是上午9点到11点" 
-  -> 如果第1天的itinerary已存在，从行程安排信息中获取itinerary_id；如果不存在，使用day_number
-  -> 例如（itinerary存在）：{"itinerary_id": "从行程安排信息中获取的第1天的itinerary_id", "name": "天安门", "category": "attraction", "start_time": "09:00", "end_time": "11:00"}
-  -> 例如（itinerary不存在）：{"day_number": 1, "name": "天安门", "category": "attraction", "start_time": "09:00", "end_time": "11:00"}
+            dynamic += "\n当前行程安排：暂无行程安排\n"
+            dynamic += "\n注意：如果用户要添加节点，需要先创建行程安排（itinerary）。\n"
 
-- 用户说"删除第1天的第一个节点"
-  -> 从上面的行程安排信息中找到第1天的itinerary_id和第一个节点的item_id，然后调用delete_itinerary_item工具
-  -> 例如：{"itinerary_id": "从行程安排信息中获取的第1天的itinerary_id", "item_id": "从节点列表中获取的第一个节点的ID"}
-
-- 用户说"修改节点xxx的名称为xxx"
-  -> 从上面的行程安排信息中找到节点所属的itinerary_id和节点ID，然后调用update_itinerary_item工具
-  -> 例如：{"itinerary_id": "节点所属的itinerary_id", "item_id": "节点ID", "name": "新名称"}
+        return TRIP_PLANNING_PROMPT.render(dynamic)
 
-重要：
-1. 你必须从上面提供的"当前行程安排"信息中获取itinerary_id和item_id，不要询问用户这些ID
-2. 如果用户说"第X天"，你可以：
-   - 如果该天的itinerary已存在，使用itinerary_id
-   - 如果该天的itinerary不存在，使用day_number（系统会自动创建itinerary）
-3. 用户只需要告诉你"第几天"或"节点名称"，你就能从行程安排信息中找到对应的ID，或者使用day_number让系统自动创建
-
-注意：你有可用的工具函数（tools），当用户要求执行操作时，必须调用相应的工具函数。不要只是回复文字，要实际调用工具！
-"""
-        return prompt
-
-    def _get_available_tools(self) -> List[Dict[str, Any]]:
-        """获取可用工具列表"""
-        return [
-            {
-                "type": "function",
-                "function": {
-                    "name": "add_itinerary_item",
-                    "description": "添加新的行程节点",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "itinerary_id": {
-                                "type": "string",
-                                "description": "行程安排ID（可选），如果提供了day_number或date，可以省略"
-                            },
-                            "day_number": {
-                                "type": "integer",
-                                "description": "第几天（可选），如果提供了itinerary_id，可以省略。如果既没有itinerary_id也没有day_number，必须提供date"
-                            },
-                            "date": {
-                                "type": "string",
-                                "description": "日期（可选），格式：YYYY-MM-DD，例如：'2025-01-21'。如果提供了itinerary_id或day_number，可以省略"
-                            },
-                            "name": {
-                                "type": "string",
-                                "description": "节点名称（必填），例如：'天安门'、'故宫博物院'"
-                            },
-                            "description": {
-                                "type": "string",
-                                "description": "节点描述（可选）"
-                            },
-                            "address": {
-                                "type": "string",
-                                "description": "地址（可选）"
-                            },
-                            "category": {
-                                "type": "string",
-                                "enum": ["attraction", "restaurant", "hotel", "shopping", "transport", "other"],
-                                "description": "分类（可选），默认：other"
-                            },
-                            "start_time": {
-                                "type": "string",
-                                "description": "开始时间（可选），格式：HH:MM，例如：'09:00'"
-                            },
-                            "end_time": {
-                                "type": "string",
-                                "description": "结束时间（可选），格式：HH:MM，例如：'17:00'"
-                            },
-                            "estimated_duration": {
-                                "type": "integer",
-                                "description": "预计停留时长（分钟，可选）"
-                            },
-                            "estimated_cost": {
-                                "type": "number",
-                                "description": "预计费用（可选）"
-                            },
-                            "order_index": {
-                                "type": "integer",
-                                "description": "顺序索引（可选，默认为0）"
-                            }
-                        },
-                        "required": ["name"]
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "update_itinerary_item",
-                    "description": "更新现有的行程节点",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "itinerary_id": {
-                                "type": "string",
-                                "description": "行程安排ID（必填）"
-                            },
-                            "item_id": {
-                                "type": "string",
-                                "description": "节点ID（必填）"
-                            },
-                            "name": {
-                                "type": "string",
-                                "description": "节点名称（可选）"
-                            },
-                            "description": {
-                                "type": "string",
-                                "description": "节点描述（可选）"
-                            },
-                            "address": {
-                                "type": "string",
-                                "description": "地址（可选）"
-                            },
-                            "category": {
-                                "type": "string",
-                                "enum": ["ATTRACTION", "RESTAURANT", "HOTEL", "SHOPPING", "TRANSPORTATION", "ENTERTAINMENT", "OTHER"],
-                                "description": "分类（可选）"
-                            },
-                            "start_time": {
-                                "type": "string",
-                                "description": "开始时间（可选），格式：HH:MM"
-                            },
-                            "end_time": {
-                                "type": "string",
-                                "description": "结束时间（可选），格式：HH:MM"
-                            },
-                            "estimated_duration": {
-                                "type": "integer",
-                                "description": "预计停留时长（分钟，可选）"
-                            },
-                            "estimated_cost": {
-                                "type": "number",
-                                "description": "预计费用（可选）"
-                            },
-                            "order_index": {
-                                "type": "integer",
-                                "description": "顺序索引（可选）"
-                            }
-                        },
-                        "required": ["itinerary_id", "item_id"]
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "delete_itinerary_item",
-                    "description": "删除行程节点",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "itinerary_id": {
-                                "type": "string",
-                                "description": "行程安排ID（必填）"
-                            },
-                            "item_id": {
-                                "type": "string",
-                                "description": "节点ID（必填）"
-                            }
-                        },
-                        "required": ["itinerary_id", "item_id"]
-                    }
-                }
-            }
-        ]
-    
     async def execute_tool_call(
         self,
         function_name: str,
@@ -359,27 +376,13 @@ class TripPlanningAIService:
     ) -> Dict[str, Any]:
         """执行工具调用"""
         try:
-            if function_name == "add_itinerary_item":
-                result = await self._add_itinerary_item(arguments, user_id, trip_id)
-                return {
-                    "message": f"✅ 节点添加成功：{result.get('name', '')}",
-                    "data": result
-                }
-            elif function_name == "update_itinerary_item":
-                result = await self._update_itinerary_item(arguments, user_id, trip_id)
-                return {
-                    "message": f"✅ 节点更新成功：{result.get('name', '')}",
-                    "data": result
-                }
-            elif function_name == "delete_itinerary_item":
-                result = await self._delete_itinerary_item(arguments, user_id, trip_id)
-                return {
-                    "message": "✅ 节点删除成功",
-                    "data": result
-                }
-            else:
-                raise ValueError(f"未知功能：{function_name}")
-        
+            result = await self._tools.dispatch(function_name, arguments, user_id, trip_id)
+            return {
+                "message": _RESULT_MESSAGES[function_name](result),
+                "data": result
+            }
+        except UnknownToolError:
+            raise Exception(f"执行失败：未知功能：{function_name}")
         except Exception as e:
             raise Exception(f"执行失败：{str(e)}")
     
@@ -8,6 +8,7 @@ import json
 import asyncio
 from typing import Dict, Any, List, Optional, AsyncGenerator
 from app.core.config import settings
+from app.utils.resilience import get_circuit_breaker, is_upstream_http_failure, CircuitOpenError
 
 
 class AliyunLLMService:
@@ -16,7 +17,8 @@ class AliyunLLMService:
     def __init__(self):
         self.api_key = settings.ALIYUN_LLM_API_KEY
         self.base_url = settings.ALIYUN_LLM_ENDPOINT
-        self.model = "deepseek-chat"  # 默认模型
+        self.model = settings.ALIYUN_LLM_MODEL
+        self.breaker = get_circuit_breaker("aliyun")
         
     async def chat_completion(
         self,
@@ -65,19 +67,31 @@ class AliyunLLMService:
             payload["tools"] = tools
             payload["tool_choice"] = "auto"  # 让模型自动决定是否使用工具
         
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(self.breaker.name, self.breaker.retry_after())
+        
         try:
             async with httpx.AsyncClient(timeout=30.0) as client:
                 response = await client.post(url, headers=headers, json=payload)
                 response.raise_for_status()
+                self.breaker.record_success()
                 
                 if stream:
                     return response  # 返回响应对象用于流式处理
                 else:
                     return response.json()
                     
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
         except httpx.HTTPStatusError as e:
+            if is_upstream_http_failure(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.release()
             raise Exception(f"阿里云LLM API调用失败: {e.response.status_code} - {e.response.text}")
         except Exception as e:
+            self.breaker.record_failure()
             raise Exception(f"阿里云LLM API调用异常: {str(e)}")
     
     async def stream_chat_completion(
@@ -125,10 +139,17 @@ class AliyunLLMService:
             payload["tools"] = tools
             payload["tool_choice"] = "auto"  # 让模型自动决定是否使用工具
         
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(self.breaker.name, self.breaker.retry_after())
+        
+        # 收到响应头即视为上游健康；之后的中断仍计为失败
+        settled = False
         try:
             async with httpx.AsyncClient(timeout=60.0) as client:
                 async with client.stream("POST", url, headers=headers, json=payload) as response:
                     response.raise_for_status()
+                    self.breaker.record_success()
+                    settled = True
                     
                     async for line in response.aiter_lines():
                         if line.startswith("data: "):
@@ -144,9 +165,18 @@ class AliyunLLMService:
                                 continue
                                 
         except httpx.HTTPStatusError as e:
+            if is_upstream_http_failure(e):
+                self.breaker.record_failure()
+                settled = True
             raise Exception(f"阿里云LLM流式API调用失败: {e.response.status_code} - {e.response.text}")
         except Exception as e:
+            self.breaker.record_failure()
+            settled = True
             raise Exception(f"阿里云LLM流式API调用异常: {str(e)}")
+        finally:
+            # 调用方提前关闭生成器等情况，释放半开探测名额
+            if not settled:
+                self.breaker.release()
     
     def format_messages(self, user_input: str, system_prompt: str = None, history: List[Dict[str, str]] = None) -> List[Dict[str, str]]:
         """
@@ -5,8 +5,40 @@
 
 import requests
 import json
-from typing import Dict, List, Optional, Any
+import time
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, Iterator, List, Optional, Any, Tuple
 from app.core.config import settings
+from app.utils.single_flight import get_single_flight
+from app.utils.resilience import get_circuit_breaker, get_hedger
+from app.core.tracing import tracer
+from app.core.transcript import current_player, current_recorder
+from app.core.metrics import DISTANCE_MATRIX_PAIRS, GEOCODE_LOOKUPS, REVERSE_GEOCODE_LOOKUPS
+from app.services.poi_store import CATEGORY_TAGS, poi_store
+from app.utils.distance_matrix import (
+    UPSTREAM_MODES,
+    PairCache,
+    batch_pairs,
+    distance_cache,
+    durations_for_distance,
+    estimate_pairs,
+    format_duration,
+    normalize_mode,
+    pair_key,
+    to_array,
+)
+from app.utils.gazetteer import gazetteer
+from app.utils.polyline import compute_bounds, encode_polyline, format_lnglat, parse_paths, simplify, zoom_to_tolerance
+
+# 地理编码结果缓存（键为地址），逆地理编码缓存（键为保留6位小数的坐标）
+geocode_cache = PairCache(settings.GEOCODE_CACHE_SIZE, settings.GEOCODE_CACHE_TTL)
+reverse_geocode_cache = PairCache(settings.GEOCODE_CACHE_SIZE, settings.GEOCODE_CACHE_TTL)
+
+
+def _use_cache() -> bool:
+    """记录或回放transcript时不使用缓存，保证上游调用序列一致"""
+    return current_recorder() is None and current_player() is None
 
 
 class BaiduMapTools:
@@ -15,7 +47,73 @@ class BaiduMapTools:
     def __init__(self):
         self.api_key = settings.BAIDU_MAP_AK
         self.sk = settings.BAIDU_MAP_SK
-        self.base_url = "https://api.map.baidu.com"
+        self.base_url = settings.BAIDU_MAP_BASE_URL.rstrip("/")
+        # 并发的相同请求只调用一次百度接口
+        self._geocode_flight = get_single_flight("baidu_geocode")
+        self._search_poi_flight = get_single_flight("baidu_search_poi")
+        # 熔断与对冲：百度接口变慢或不可用时快速失败
+        self._breaker = get_circuit_breaker("baidu_map")
+        self._geocode_hedger = get_hedger("baidu_geocode")
+        self._search_poi_hedger = get_hedger("baidu_search_poi")
+        # 批量地理编码的上游调用共享该线程池，线程数即对百度的最大并发
+        self._batch_executor = ThreadPoolExecutor(
+            max_workers=settings.GEOCODE_BATCH_CONCURRENCY, thread_name_prefix="baidu-batch"
+        )
+    
+    def _request(self, url: str, params: Dict[str, Any], hedger=None) -> requests.Response:
+        """
+        通过熔断器发起GET请求
+        
+        Args:
+            url: 请求地址
+            params: 查询参数
+            hedger: 对冲器，仅幂等查询传入
+        """
+        endpoint = url.replace(self.base_url, "")
+
+        # 回放模式：返回transcript中记录的响应，不访问上游
+        player = current_player()
+        if player is not None:
+            return self._replayed_response(url, player.replay_http("baidu_map", endpoint, params))
+
+        def do_get() -> requests.Response:
+            with tracer.span("http.baidu", kind="http", endpoint=endpoint) as span:
+                response = requests.get(url, params=params, timeout=10)
+                if span:
+                    span.set_attribute("status_code", response.status_code)
+                response.raise_for_status()
+                return response
+
+        recorder = current_recorder()
+        started = time.monotonic()
+        try:
+            if hedger is not None and settings.HEDGE_ENABLED:
+                response = self._breaker.call(hedger.call, do_get)
+            else:
+                response = self._breaker.call(do_get)
+        except Exception as e:
+            if recorder:
+                recorder.record_http("baidu_map", endpoint, params, started, time.monotonic() - started, error=str(e))
+            raise
+        if recorder:
+            recorder.record_http(
+                "baidu_map", endpoint, params, started, time.monotonic() - started,
+                status_code=response.status_code,
+                content_type=response.headers.get("content-type", ""),
+                body=response.text
+            )
+        return response
+
+    @staticmethod
+    def _replayed_response(url: str, record: Dict[str, Any]) -> requests.Response:
+        """把transcript中的记录还原为requests.Response"""
+        response = requests.Response()
+        response.url = url
+        response.status_code = record["status_code"]
+        response.headers["content-type"] = record["content_type"]
+        response._content = record["body"].encode("utf-8")
+        response.encoding = "utf-8"
+        return response
     
     def geocode(self, address: str) -> Optional[Dict[str, float]]:
         """
@@ -27,6 +125,39 @@ class BaiduMapTools:
         Returns:
             坐标字典 {"lat": 39.9042, "lng": 116.4074} 或 None
         """
+        source, location = self._geocode_local(address)
+        if source is not None:
+            GEOCODE_LOOKUPS.labels(source=source).inc()
+            return location
+        GEOCODE_LOOKUPS.labels(source="upstream").inc()
+        # 记录transcript时不合并，保证本次运行的每次上游调用都被记录
+        if current_recorder() is not None:
+            return self._geocode(address)
+        location = self._geocode_flight.do(address, self._geocode, address)
+        if location is not None and _use_cache():
+            geocode_cache.set(address, dict(location))
+        return location
+
+    def _geocode_local(self, address: str) -> Tuple[Optional[str], Optional[Dict[str, float]]]:
+        """
+        不访问网络的地理编码
+
+        Returns:
+            (来源, 坐标)，来源为 gazetteer/cache，未命中时为 (None, None)
+        """
+        # 城市、城区和热门地标直接用离线地名库
+        if settings.GAZETTEER_ENABLED:
+            entry = gazetteer.lookup(address)
+            if entry is not None:
+                return "gazetteer", {"lat": entry["lat"], "lng": entry["lng"]}
+        if _use_cache():
+            cached = geocode_cache.get(address)
+            if cached is not None:
+                return "cache", dict(cached)
+        return None, None
+    
+    def _geocode(self, address: str) -> Optional[Dict[str, float]]:
+        """地理编码的实际上游调用"""
         try:
             # 使用百度地图Web服务API的地理编码服务 v3
             url = f"{self.base_url}/geocoding/v3/"
@@ -39,8 +170,7 @@ class BaiduMapTools:
             print(f"DEBUG: 地理编码API调用 - URL: {url}")
             print(f"参数: {params}")
             
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
+            response = self._request(url, params, hedger=self._geocode_hedger)
             
             # 检查响应内容类型
             content_type = response.headers.get('content-type', '')
@@ -83,6 +213,32 @@ class BaiduMapTools:
         Returns:
             POI搜索结果
         """
+        if current_recorder() is not None:
+            return self._search_poi(keyword, city, category, location, radius, limit)
+        # 附近搜索优先使用本地POI库（回放时不使用，保证与记录一致）
+        if location and settings.POI_STORE_ENABLED and current_player() is None:
+            pois = poi_store.search_nearby(keyword, category, location, radius, limit)
+            if pois is not None:
+                return {
+                    "success": True,
+                    "data": {
+                        "pois": pois,
+                        "total": len(pois),
+                        "keyword": keyword,
+                        "city": city,
+                        "source": "local"
+                    }
+                }
+        location_key = (location.get("lat"), location.get("lng")) if location else None
+        key = (keyword, city, category, location_key, radius, limit)
+        return self._search_poi_flight.do(
+            key, self._search_poi, keyword, city, category, location, radius, limit
+        )
+    
+    def _search_poi(self, keyword: str, city: str, category: Optional[str],
+                    location: Optional[Dict[str, float]], radius: int,
+                    limit: int) -> Dict[str, Any]:
+        """POI搜索的实际上游调用"""
         try:
             # 构建搜索参数
             params = {
@@ -100,22 +256,14 @@ class BaiduMapTools:
             
             # 根据category设置合适的tag参数
             if category:
-                if category == "attraction":
-                    params["tag"] = "旅游景点"
-                elif category == "restaurant":
-                    params["tag"] = "美食"
-                elif category == "hotel":
-                    params["tag"] = "酒店"
-                else:
-                    params["tag"] = category
+                params["tag"] = CATEGORY_TAGS.get(category, category)
             
             # 调用百度地图POI搜索API
             url = f"{self.base_url}/place/v2/search"
             print(f"DEBUG: 百度地图API调用 - URL: {url}")
             print(f"DEBUG: 参数: {params}")
             
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
+            response = self._request(url, params, hedger=self._search_poi_hedger)
             
             data = response.json()
             print(f"DEBUG: API响应: {data}")
@@ -143,6 +291,9 @@ class BaiduMapTools:
                     }
                     pois.append(poi)
                 
+                if settings.POI_STORE_ENABLED and current_player() is None:
+                    poi_store.add_search_results(keyword, category, location, radius, limit, pois)
+                
                 return {
                     "success": True,
                     "data": {
@@ -164,8 +315,29 @@ class BaiduMapTools:
                 "error": f"POI搜索异常: {str(e)}"
             }
     
+    @staticmethod
+    def _as_coords(point: Any) -> Dict[str, float]:
+        """坐标参数既可以是 {"lat", "lng"} 字典，也可以是 "lat,lng" 字符串"""
+        if isinstance(point, str):
+            lat, lng = point.split(",")
+            return {"lat": float(lat), "lng": float(lng)}
+        return {"lat": float(point.get("lat", 0)), "lng": float(point.get("lng", 0))}
+
+    @staticmethod
+    def _step_dicts(steps: List[Any]) -> List[Dict[str, Any]]:
+        """展开步骤列表（公交路线的steps是二维列表）"""
+        flat = []
+        for step in steps:
+            if isinstance(step, dict):
+                flat.append(step)
+            elif isinstance(step, list):
+                flat.extend(item for item in step if isinstance(item, dict))
+        return flat
+
     def calculate_route(self, origin: Dict[str, float], destination: Dict[str, float], 
-                       mode: str = "driving") -> Dict[str, Any]:
+                       mode: str = "driving", simplify_tolerance: Optional[float] = None,
+                       zoom: Optional[float] = None, polyline_format: str = "lnglat",
+                       include_steps: bool = False) -> Dict[str, Any]:
         """
         计算路线
         
@@ -173,14 +345,20 @@ class BaiduMapTools:
             origin: 起点坐标 {"lat": 39.9042, "lng": 116.4074}
             destination: 终点坐标 {"lat": 39.9042, "lng": 116.4074}
             mode: 交通方式 (driving, transit, walking, bicycling)
+            simplify_tolerance: Douglas–Peucker抽稀容差（米），为空则不抽稀
+            zoom: 目标地图缩放级别，未指定容差时按该级别一个像素的距离抽稀
+            polyline_format: lnglat（"lng,lat;lng,lat"）或 encoded（Google Encoded Polyline，lat,lng顺序）
+            include_steps: 是否返回步骤的原始几何（path），默认只返回步骤的文字与距离
             
         Returns:
-            路线计算结果，包含overview_polyline和bounds
+            路线计算结果，包含折线和bounds
         """
         try:
+            origin = self._as_coords(origin)
+            destination = self._as_coords(destination)
             # 转换坐标为字符串格式
-            origin_str = f"{origin.get('lat', 0)},{origin.get('lng', 0)}"
-            destination_str = f"{destination.get('lat', 0)},{destination.get('lng', 0)}"
+            origin_str = f"{origin['lat']},{origin['lng']}"
+            destination_str = f"{destination['lat']},{destination['lng']}"
             
             # 构建路线规划参数
             params = {
@@ -205,76 +383,59 @@ class BaiduMapTools:
             print(f"DEBUG: 路线规划API调用 - URL: {url}")
             print(f"DEBUG: 参数: {params}")
             
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
+            response = self._request(url, params)
             
             data = response.json()
-            print(f"DEBUG: 路线规划API响应: {data}")
+            # 长路线的响应有数万个坐标点，不打印完整内容
+            print(f"DEBUG: 路线规划API响应: status={data.get('status')}")
             
-            if data.get("status") == 0:
-                result = data.get("result", {})
-                routes = result.get("routes", [])
-                
-                if routes and len(routes) > 0:
-                    route = routes[0]
-                    
-                    # 提取路径点和边界
-                    steps = route.get("steps", [])
-                    points = []
-                    bounds = {
-                        "southwest": {"lat": float('inf'), "lng": float('inf')},
-                        "northeast": {"lat": float('-inf'), "lng": float('-inf')}
-                    }
-                    
-                    # 构建路径折线
-                    # 注意：百度地图API返回的path格式是 lng,lat;lng,lat;...（经度在前，纬度在后）
-                    for step in steps:
-                        path = step.get("path", "")
-                        if path:
-                            # path格式：lng1,lat1;lng2,lat2;...
-                            step_points = path.split(';')
-                            for point_str in step_points:
-                                if point_str and point_str.strip():
-                                    coords = point_str.split(',')
-                                    if len(coords) == 2:
-                                        lng = float(coords[0].strip())  # 第一个是经度
-                                        lat = float(coords[1].strip())  # 第二个是纬度
-                                        points.append(f"{lng},{lat}")  # 保持 lng,lat 格式
-                                        
-                                        # 更新边界
-                                        bounds["southwest"]["lat"] = min(bounds["southwest"]["lat"], lat)
-                                        bounds["southwest"]["lng"] = min(bounds["southwest"]["lng"], lng)
-                                        bounds["northeast"]["lat"] = max(bounds["northeast"]["lat"], lat)
-                                        bounds["northeast"]["lng"] = max(bounds["northeast"]["lng"], lng)
-                    
-                    # 生成overview_polyline（分号分隔的点字符串）
-                    overview_polyline = ";".join(points)
-                
-                return {
-                    "success": True,
-                    "data": {
-                        "distance": route.get("distance", 0),
-                        "duration": route.get("duration", 0),
-                            "overview_polyline": overview_polyline,
-                            "bounds": bounds,
-                            "steps": steps,
-                        "mode": mode,
-                        "origin": {
-                            "lat": float(origin.get("lat", 0)),
-                            "lng": float(origin.get("lng", 0))
-                        },
-                        "destination": {
-                            "lat": float(destination.get("lat", 0)),
-                            "lng": float(destination.get("lng", 0))
-                        }
-                        }
-                    }
-            else:
+            if data.get("status") != 0:
                 return {
                     "success": False,
                     "error": f"路线计算失败: {data.get('message', '未知错误')}",
                     "status": data.get("status")
                 }
+            
+            routes = data.get("result", {}).get("routes", [])
+            if not routes:
+                return {"success": False, "error": "路线计算失败: 未找到可用路线"}
+            route = routes[0]
+            steps = self._step_dicts(route.get("steps", []))
+            
+            # 注意：百度地图API返回的path格式是 lng,lat;lng,lat;...（经度在前，纬度在后）
+            points = parse_paths(step.get("path", "") for step in steps)
+            original_count = len(points)
+            bounds = compute_bounds(points)
+            
+            tolerance = simplify_tolerance
+            if tolerance is None and zoom is not None and original_count:
+                tolerance = zoom_to_tolerance(zoom, float(points[:, 1].mean()))
+            if tolerance:
+                points = simplify(points, tolerance)
+            
+            route_data = {
+                "distance": route.get("distance", 0),
+                "duration": route.get("duration", 0),
+                "polyline_format": polyline_format,
+                "point_count": len(points),
+                "original_point_count": original_count,
+                "simplify_tolerance": round(tolerance, 2) if tolerance else None,
+                "bounds": bounds,
+                # 步骤几何已包含在折线中，默认去掉path以减小响应和SSE事件体积
+                "steps": steps if include_steps else [
+                    {k: v for k, v in step.items() if k != "path"} for step in steps
+                ],
+                "mode": mode,
+                "origin": origin,
+                "destination": destination
+            }
+            if polyline_format == "encoded":
+                route_data["encoded_polyline"] = encode_polyline(points)
+            else:
+                # 生成overview_polyline（分号分隔的点字符串）
+                route_data["overview_polyline"] = format_lnglat(points)
+            
+            return {"success": True, "data": route_data}
                 
         except Exception as e:
             print(f"路线计算异常: {e}")
@@ -286,6 +447,149 @@ class BaiduMapTools:
             }
     
     
+    def distance_matrix(self, origins: List[Any], destinations: List[Any],
+                        mode: str = "driving", precise: bool = True) -> Dict[str, Any]:
+        """
+        批量计算距离矩阵
+        
+        Args:
+            origins: 起点列表，元素为 {"lat", "lng"} 或 "lat,lng"
+            destinations: 终点列表
+            mode: 交通方式 (driving, walking, riding, transit, mixed)
+            precise: False时只用本地估算，不访问百度接口
+            
+        Returns:
+            rows[i][j] 为第i个起点到第j个终点的 distance（米）、duration（秒）、source
+        """
+        try:
+            origins = [self._as_coords(p) for p in origins]
+            destinations = [self._as_coords(p) for p in destinations]
+            pairs = [(o, d) for o in origins for d in destinations]
+            flat = self.pair_distances(pairs, mode, precise)
+            width = len(destinations)
+            return {
+                "success": True,
+                "data": {
+                    "mode": normalize_mode(mode),
+                    "rows": [flat[i * width:(i + 1) * width] for i in range(len(origins))]
+                }
+            }
+        except Exception as e:
+            print(f"距离矩阵计算异常: {e}")
+            return {"success": False, "error": f"距离矩阵计算异常: {str(e)}"}
+    
+    def pair_distances(self, pairs: List[Any], mode: str = "driving",
+                       precise: bool = True) -> List[Dict[str, Any]]:
+        """
+        计算若干起终点对的距离与耗时（例如行程中相邻地点的路段）
+        
+        先查点对缓存，未命中的点对按 routematrix 元素数上限分批请求；
+        上游失败或 precise=False 时使用本地估算。
+        
+        Args:
+            pairs: [(起点, 终点), ...]
+            mode: 交通方式
+            precise: 是否请求百度接口
+            
+        Returns:
+            与pairs一一对应的 {"distance", "duration", "duration_text", "source"}
+        """
+        mode = normalize_mode(mode)
+        upstream_mode = UPSTREAM_MODES[mode]
+        pairs = [(self._as_coords(o), self._as_coords(d)) for o, d in pairs]
+        if not pairs:
+            return []
+        # 本地估算一次算出全部点对，作为未命中和失败时的结果
+        est_distance, est_duration = estimate_pairs(
+            to_array([o for o, _ in pairs]), to_array([d for _, d in pairs]), mode
+        )
+        road = [None] * len(pairs)
+        sources = ["estimate"] * len(pairs)
+        
+        if precise:
+            # 记录或回放transcript时不使用缓存，保证上游调用与记录一致
+            use_cache = current_recorder() is None and current_player() is None
+            keys = [pair_key(upstream_mode, o, d) for o, d in pairs]
+            missing = []
+            for i, key in enumerate(keys):
+                cached = distance_cache.get(key) if use_cache else None
+                if cached is not None:
+                    road[i], sources[i] = cached, "cache"
+                else:
+                    missing.append(i)
+            
+            batches = batch_pairs([(keys[i][1:3], keys[i][3:]) for i in missing])
+            for batch in batches:
+                indexes = [missing[b] for b in batch]
+                fetched = self._fetch_matrix([pairs[i] for i in indexes], upstream_mode)
+                for i, value in zip(indexes, fetched):
+                    if value is not None:
+                        road[i], sources[i] = value, "baidu"
+        
+        results = []
+        for i, source in enumerate(sources):
+            if road[i] is not None:
+                distance, duration = road[i]
+                if mode != upstream_mode:
+                    # 公交/混合方式只取驾车道路距离，耗时按方式换算
+                    duration = float(durations_for_distance(distance, mode))
+            else:
+                distance, duration = float(est_distance[i]), float(est_duration[i])
+            DISTANCE_MATRIX_PAIRS.labels(mode=mode, source=source).inc()
+            results.append({
+                "distance": int(round(distance)),
+                "duration": int(round(duration)),
+                "duration_text": format_duration(duration),
+                "source": source
+            })
+        return results
+    
+    def _fetch_matrix(self, pairs: List[Any], upstream_mode: str) -> List[Optional[Any]]:
+        """
+        一次 routematrix 请求，返回每个点对的 (距离米, 耗时秒)，失败的点对为None
+        
+        请求的是不同起点×不同终点的完整矩阵，其余单元格的结果同时写入缓存。
+        """
+        origins = list(dict.fromkeys((o["lat"], o["lng"]) for o, _ in pairs))
+        destinations = list(dict.fromkeys((d["lat"], d["lng"]) for _, d in pairs))
+        params = {
+            "origins": "|".join(f"{lat},{lng}" for lat, lng in origins),
+            "destinations": "|".join(f"{lat},{lng}" for lat, lng in destinations),
+            "output": "json",
+            "ak": self.api_key
+        }
+        try:
+            response = self._request(f"{self.base_url}/routematrix/v2/{upstream_mode}", params)
+            data = response.json()
+            if data.get("status") != 0:
+                print(f"距离矩阵请求失败: {data.get('message', '未知错误')}")
+                return [None] * len(pairs)
+            cells = data.get("result", [])
+        except Exception as e:
+            print(f"距离矩阵API调用异常: {e}")
+            return [None] * len(pairs)
+        
+        matrix = {}
+        for index, cell in enumerate(cells):
+            row, col = divmod(index, len(destinations))
+            if row >= len(origins):
+                break
+            try:
+                value = (float(cell["distance"]["value"]), float(cell["duration"]["value"]))
+            except (KeyError, TypeError, ValueError):
+                continue
+            matrix[(origins[row], destinations[col])] = value
+            distance_cache.set(pair_key(
+                upstream_mode,
+                {"lat": origins[row][0], "lng": origins[row][1]},
+                {"lat": destinations[col][0], "lng": destinations[col][1]}
+            ), value)
+        return [matrix.get(((o["lat"], o["lng"]), (d["lat"], d["lng"]))) for o, d in pairs]
+    
+    @staticmethod
+    def _reverse_key(lat: float, lng: float) -> Tuple[float, float]:
+        return round(lat, 6), round(lng, 6)
+
     def reverse_geocode(self, lat: float, lng: float) -> Dict[str, Any]:
         """
         逆地理编码（坐标转地址）
@@ -297,6 +601,21 @@ class BaiduMapTools:
         Returns:
             逆地理编码结果
         """
+        use_cache = _use_cache()
+        key = self._reverse_key(lat, lng)
+        cached = reverse_geocode_cache.get(key) if use_cache else None
+        if cached is not None:
+            REVERSE_GEOCODE_LOOKUPS.labels(source="cache").inc()
+            return json.loads(cached)
+        REVERSE_GEOCODE_LOOKUPS.labels(source="upstream").inc()
+        result = self._reverse_geocode(lat, lng)
+        if use_cache and result.get("success"):
+            # 以JSON字符串缓存，每次返回独立的副本
+            reverse_geocode_cache.set(key, json.dumps(result, ensure_ascii=False))
+        return result
+
+    def _reverse_geocode(self, lat: float, lng: float) -> Dict[str, Any]:
+        """逆地理编码的实际上游调用"""
         try:
             params = {
                 "location": f"{lat},{lng}",
@@ -305,8 +624,7 @@ class BaiduMapTools:
             }
             
             url = f"{self.base_url}/geocoding/v2/"
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
+            response = self._request(url, params)
             
             data = response.json()
             
@@ -334,6 +652,73 @@ class BaiduMapTools:
                 "error": f"逆地理编码异常: {str(e)}"
             }
 
+    def geocode_batch(self, addresses: List[str]) -> Iterator[Tuple[int, Optional[Dict[str, float]]]]:
+        """
+        批量地理编码
+
+        相同地址只查询一次；离线地名库和缓存命中的地址直接返回，
+        其余地址通过共享线程池并发请求百度（并发上限 GEOCODE_BATCH_CONCURRENCY）。
+
+        Returns:
+            按输入顺序逐个产出 (下标, 坐标或None)，前面的结果就绪即可产出，不必等待整批完成
+        """
+        keys = [(address or "").strip() for address in addresses]
+        local: Dict[Hashable, Optional[Dict[str, float]]] = {}
+        misses = []
+        for key in dict.fromkeys(keys):
+            source, location = self._geocode_local(key)
+            if source is None:
+                misses.append(key)
+            else:
+                GEOCODE_LOOKUPS.labels(source=source).inc()
+                local[key] = location
+        return self._run_batch(keys, local, misses, self.geocode)
+
+    def reverse_geocode_batch(self, locations: List[Dict[str, float]]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        批量逆地理编码（去重、缓存与并发方式同 geocode_batch）
+
+        Returns:
+            按输入顺序逐个产出 (下标, 逆地理编码结果)
+        """
+        keys = [self._reverse_key(float(loc["lat"]), float(loc["lng"])) for loc in locations]
+        local: Dict[Hashable, Dict[str, Any]] = {}
+        misses = []
+        use_cache = _use_cache()
+        for key in dict.fromkeys(keys):
+            cached = reverse_geocode_cache.get(key) if use_cache else None
+            if cached is None:
+                misses.append(key)
+            else:
+                REVERSE_GEOCODE_LOOKUPS.labels(source="cache").inc()
+                local[key] = json.loads(cached)
+        return self._run_batch(keys, local, misses, lambda key: self.reverse_geocode(*key))
+
+    def _run_batch(self, keys: List[Hashable], local: Dict[Hashable, Any], misses: List[Hashable],
+                   fetch: Callable[[Any], Any]) -> Iterator[Tuple[int, Any]]:
+        """并发获取未命中的键，按输入顺序产出结果"""
+        # 记录或回放transcript时顺序执行，保证上游调用序列确定
+        if current_recorder() is not None or current_player() is not None:
+            for key in misses:
+                local[key] = fetch(key)
+            futures: Dict[Hashable, Future] = {}
+        else:
+            futures = {
+                key: self._batch_executor.submit(contextvars.copy_context().run, fetch, key)
+                for key in misses
+            }
+
+        def results() -> Iterator[Tuple[int, Any]]:
+            try:
+                for index, key in enumerate(keys):
+                    yield index, futures[key].result() if key in futures else local[key]
+            finally:
+                # 调用方提前停止读取（例如客户端断开）时取消尚未开始的请求
+                for future in futures.values():
+                    future.cancel()
+
+        return results()
+
 
 # 创建全局实例
 baidu_map_tools = BaiduMapTools()
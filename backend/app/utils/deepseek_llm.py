@@ -8,6 +8,8 @@ import json
 import asyncio
 from typing import Dict, Any, List, Optional, AsyncGenerator
 from app.core.config import settings
+from app.core.transcript import current_player
+from app.utils.resilience import get_circuit_breaker, is_upstream_http_failure, CircuitOpenError
 
 
 class DeepSeekLLMService:
@@ -15,8 +17,9 @@ class DeepSeekLLMService:
     
     def __init__(self):
         self.api_key = settings.DEEPSEEK_API_KEY
-        self.base_url = "https://api.deepseek.com"
+        self.base_url = settings.DEEPSEEK_ENDPOINT.rstrip("/")
         self.model = "deepseek-chat"
+        self.breaker = get_circuit_breaker("deepseek")
         
     async def chat_completion(
         self,
@@ -41,11 +44,16 @@ class DeepSeekLLMService:
         Returns:
             API响应结果
         """
+        # 回放模式：返回transcript中记录的结果，不访问上游
+        player = current_player()
+        if player is not None and not stream:
+            return await player.replay_llm_completion()
+        
         if not self.api_key:
             raise ValueError("DeepSeek API Key未配置")
         
         model = model or self.model
-        url = f"{self.base_url}/v1/chat/completions"
+        url = f"{self.base_url}/chat/completions"
         
         headers = {
             "Authorization": f"Bearer {self.api_key}",
@@ -65,20 +73,32 @@ class DeepSeekLLMService:
             payload["tools"] = tools
             payload["tool_choice"] = "auto"  # 让模型自动决定是否使用工具
         
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(self.breaker.name, self.breaker.retry_after())
+        
         try:
             # 增加超时时间到60秒，因为AI响应可能需要更长时间
             async with httpx.AsyncClient(timeout=60.0) as client:
                 response = await client.post(url, headers=headers, json=payload)
                 response.raise_for_status()
+                self.breaker.record_success()
                 
                 if stream:
                     return response  # 返回响应对象用于流式处理
                 else:
                     return response.json()
                     
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
         except httpx.HTTPStatusError as e:
+            if is_upstream_http_failure(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.release()
             raise Exception(f"DeepSeek API调用失败: {e.response.status_code} - {e.response.text}")
         except Exception as e:
+            self.breaker.record_failure()
             raise Exception(f"DeepSeek API调用异常: {str(e)}")
     
     async def stream_chat_completion(
@@ -102,11 +122,17 @@ class DeepSeekLLMService:
         Yields:
             流式响应数据
         """
+        player = current_player()
+        if player is not None:
+            async for data in player.replay_llm_stream():
+                yield data
+            return
+        
         if not self.api_key:
             raise ValueError("DeepSeek API Key未配置")
         
         model = model or self.model
-        url = f"{self.base_url}/v1/chat/completions"
+        url = f"{self.base_url}/chat/completions"
         
         headers = {
             "Authorization": f"Bearer {self.api_key}",
@@ -126,10 +152,17 @@ class DeepSeekLLMService:
             payload["tools"] = tools
             payload["tool_choice"] = "auto"  # 让模型自动决定是否使用工具
         
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(self.breaker.name, self.breaker.retry_after())
+        
+        # 收到响应头即视为上游健康；之后的中断仍计为失败
+        settled = False
         try:
             async with httpx.AsyncClient(timeout=60.0) as client:
                 async with client.stream("POST", url, headers=headers, json=payload) as response:
                     response.raise_for_status()
+                    self.breaker.record_success()
+                    settled = True
                     
                     async for line in response.aiter_lines():
                         if line.startswith("data: "):
@@ -145,9 +178,18 @@ class DeepSeekLLMService:
                                 continue
                                 
         except httpx.HTTPStatusError as e:
+            if is_upstream_http_failure(e):
+                self.breaker.record_failure()
+                settled = True
             raise Exception(f"DeepSeek流式API调用失败: {e.response.status_code} - {e.response.text}")
         except Exception as e:
+            self.breaker.record_failure()
+            settled = True
             raise Exception(f"DeepSeek流式API调用异常: {str(e)}")
+        finally:
+            # 调用方提前关闭生成器等情况，释放半开探测名额
+            if not settled:
+                self.breaker.release()
     
     def format_messages(self, user_input: str, system_prompt: str = None, history: List[Dict[str, str]] = None) -> List[Dict[str, str]]:
         """
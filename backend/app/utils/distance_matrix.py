@@ -0,0 +1,183 @@
+"""
+距离矩阵辅助工具
+
+- 基于NumPy的球面距离（haversine）与按交通方式的耗时估算，不访问网络
+- 按起终点对缓存上游结果，并把待查询的点对分批以符合百度 routematrix 的元素数限制
+坐标统一为 {"lat", "lng"} 字典，数组形式为 shape=(N, 2)，列顺序为 (lat, lng)。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.utils.polyline import EARTH_RADIUS_M
+
+# 交通方式参数：(绕路系数, 平均速度 m/s, 固定耗时 s)
+# 绕路系数把直线距离换算为道路距离；固定耗时覆盖停车、候车与换乘
+MODE_PROFILES: Dict[str, Tuple[float, float, float]] = {
+    "walking": (1.3, 1.2, 0),
+    "riding": (1.3, 4.0, 0),
+    "driving": (1.4, 8.0, 120),
+    "transit": (1.4, 5.5, 480),
+}
+# mixed：短距离步行，否则乘坐公共交通
+MIXED_WALK_LIMIT_M = 1500
+# 请求百度 routematrix 时使用的方式（公交没有矩阵接口，用驾车的道路距离换算耗时）
+UPSTREAM_MODES = {
+    "driving": "driving",
+    "walking": "walking",
+    "riding": "riding",
+    "bicycling": "riding",
+    "transit": "driving",
+    "mixed": "driving",
+}
+# 百度 routematrix 单次请求 起点数×终点数 的上限
+MATRIX_ELEMENT_LIMIT = 50
+
+
+def normalize_mode(mode: Optional[str]) -> str:
+    """统一交通方式名称，未知方式按mixed处理"""
+    mode = (mode or "mixed").lower()
+    if mode == "bicycling":
+        return "riding"
+    return mode if mode in MODE_PROFILES or mode == "mixed" else "mixed"
+
+
+def to_array(points: Sequence[Dict[str, float]]) -> np.ndarray:
+    """坐标字典列表转换为 (N, 2) 的 (lat, lng) 数组"""
+    return np.array([[p["lat"], p["lng"]] for p in points], dtype=np.float64).reshape(-1, 2)
+
+
+def haversine_matrix(origins: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+    """所有起点到所有终点的球面距离（米），shape=(M, K)"""
+    lat1, lng1 = np.radians(origins[:, 0])[:, None], np.radians(origins[:, 1])[:, None]
+    lat2, lng2 = np.radians(destinations[:, 0])[None, :], np.radians(destinations[:, 1])[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def haversine_pairs(origins: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+    """逐对（第i个起点到第i个终点）的球面距离（米），shape=(N,)"""
+    lat1, lng1 = np.radians(origins[:, 0]), np.radians(origins[:, 1])
+    lat2, lng2 = np.radians(destinations[:, 0]), np.radians(destinations[:, 1])
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _travel_seconds(road_distance: np.ndarray, mode: str) -> np.ndarray:
+    _, speed, overhead = MODE_PROFILES[mode]
+    return road_distance / speed + np.where(road_distance > 0, overhead, 0)
+
+
+def durations_for_distance(road_distance: np.ndarray, mode: str) -> np.ndarray:
+    """按交通方式把道路距离（米）换算为耗时（秒）"""
+    mode = normalize_mode(mode)
+    road_distance = np.asarray(road_distance, dtype=np.float64)
+    if mode == "mixed":
+        return np.where(
+            road_distance < MIXED_WALK_LIMIT_M,
+            _travel_seconds(road_distance, "walking"),
+            _travel_seconds(road_distance, "transit")
+        )
+    return _travel_seconds(road_distance, mode)
+
+
+def estimate_pairs(origins: np.ndarray, destinations: np.ndarray, mode: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    估算逐对的道路距离与耗时
+
+    Returns:
+        (距离米, 耗时秒) 两个 shape=(N,) 的数组
+    """
+    mode = normalize_mode(mode)
+    detour = MODE_PROFILES["walking" if mode == "mixed" else mode][0]
+    distance = haversine_pairs(origins, destinations) * detour
+    return distance, durations_for_distance(distance, mode)
+
+
+def format_duration(seconds: float) -> str:
+    """耗时转为中文描述，如 "约25分钟"、"约1小时10分钟" """
+    minutes = max(1, int(round(seconds / 60)))
+    if minutes < 60:
+        return f"约{minutes}分钟"
+    hours, minutes = divmod(minutes, 60)
+    return f"约{hours}小时{minutes}分钟" if minutes else f"约{hours}小时"
+
+
+def pair_key(mode: str, origin: Dict[str, float], destination: Dict[str, float]) -> Tuple:
+    """点对缓存键，坐标保留5位小数（约1米）"""
+    return (
+        mode,
+        round(origin["lat"], 5), round(origin["lng"], 5),
+        round(destination["lat"], 5), round(destination["lng"], 5)
+    )
+
+
+def batch_pairs(pairs: Sequence[Tuple[Hashable, Hashable]], limit: int = MATRIX_ELEMENT_LIMIT) -> List[List[int]]:
+    """
+    把点对按顺序贪心分组，使每组 不同起点数×不同终点数 不超过limit
+
+    行程中相邻地点的路段（A→B, B→C, ...）每组可容纳7段，即8个地点只需一次请求。
+
+    Returns:
+        每组点对在输入中的下标
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    origins: set = set()
+    destinations: set = set()
+    for index, (origin, destination) in enumerate(pairs):
+        new_origins = origins | {origin}
+        new_destinations = destinations | {destination}
+        if current and len(new_origins) * len(new_destinations) > limit:
+            batches.append(current)
+            current, new_origins, new_destinations = [], {origin}, {destination}
+        current.append(index)
+        origins, destinations = new_origins, new_destinations
+    if current:
+        batches.append(current)
+    return batches
+
+
+class PairCache:
+    """线程安全的点对结果缓存（LRU + TTL）"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+# 全局点对缓存
+distance_cache = PairCache(settings.DISTANCE_MATRIX_CACHE_SIZE, settings.DISTANCE_MATRIX_CACHE_TTL)
@@ -0,0 +1,196 @@
+"""
+离线地名库
+
+内置地级及以上城市、主要城区和热门地标的近似坐标（app/data/gazetteer_cn.tsv），
+用于不调用百度地图接口即可解析最常见的地名输入：
+- lookup: 名称或别名精确匹配（geocode 先查这里）
+- complete: 前缀补全
+- find_in_text / find_city: 在自由文本中找出第一个地名（最长匹配），地标和城区映射到所属城市
+
+首次使用时加载。条目属性保存在并列的数组中，名称和别名建立字符Trie，值为条目下标。
+"""
+
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "gazetteer_cn.tsv")
+
+# 条目类型及同名时的优先级（数值越小越优先）
+KINDS = ("city", "district", "landmark")
+
+
+class _TrieNode:
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.ids: List[int] = []
+
+
+class Gazetteer:
+    """离线地名库（线程安全的懒加载）"""
+
+    def __init__(self, path: str = DATA_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.names: List[str] = []
+        self.aliases: List[List[str]] = []
+        self.parents: List[str] = []
+        self.kinds = np.empty(0, dtype=np.int8)
+        self.coords = np.empty((0, 2), dtype=np.float64)
+        self._root = _TrieNode()
+        self._city_ids: Dict[str, int] = {}
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            names, parents, kinds, coords, aliases = [], [], [], [], []
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip() or line.startswith("#"):
+                        continue
+                    kind, name, parent, lat, lng, alias_text = line.rstrip("\n").split("\t")
+                    names.append(name)
+                    parents.append(parent)
+                    kinds.append(KINDS.index(kind))
+                    coords.append((float(lat), float(lng)))
+                    extra = [a for a in alias_text.split(",") if a]
+                    if kind == "city":
+                        extra.append(f"{name}市")
+                    aliases.append(extra)
+
+            root = _TrieNode()
+            for index, (name, extra) in enumerate(zip(names, aliases)):
+                for key in dict.fromkeys([name, *extra]):
+                    node = root
+                    for char in key:
+                        node = node.children.setdefault(char, _TrieNode())
+                    node.ids.append(index)
+            kind_array = np.array(kinds, dtype=np.int8)
+            for node in self._iter_nodes(root):
+                # 同名条目按类型优先级排序，lookup取第一个
+                node.ids.sort(key=lambda i: kind_array[i])
+
+            self.names = names
+            self.aliases = aliases
+            self.parents = parents
+            self.kinds = kind_array
+            self.coords = np.array(coords, dtype=np.float64).reshape(-1, 2)
+            self._city_ids = {name: i for i, name in enumerate(names) if kinds[i] == 0}
+            self._root = root
+            self._loaded = True
+            print(f"离线地名库已加载: {len(names)} 个条目")
+
+    @staticmethod
+    def _iter_nodes(root: _TrieNode):
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(node.children.values())
+
+    def _entry(self, index: int) -> Dict[str, object]:
+        kind = KINDS[self.kinds[index]]
+        name = self.names[index]
+        return {
+            "name": name,
+            "kind": kind,
+            # 城市条目的parent是省份，其余条目的parent是所属城市
+            "city": name if kind == "city" else self.parents[index],
+            "province": self.parents[index] if kind == "city" else self._province_of(self.parents[index]),
+            "lat": float(self.coords[index, 0]),
+            "lng": float(self.coords[index, 1])
+        }
+
+    def _province_of(self, city: str) -> Optional[str]:
+        index = self._city_ids.get(city)
+        return self.parents[index] if index is not None else None
+
+    def _node(self, key: str) -> Optional[_TrieNode]:
+        node = self._root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self.names)
+
+    def lookup(self, name: str) -> Optional[Dict[str, object]]:
+        """名称或别名精确匹配，未收录时返回None"""
+        self._ensure_loaded()
+        node = self._node((name or "").strip())
+        if node is None or not node.ids:
+            return None
+        return self._entry(node.ids[0])
+
+    def complete(self, prefix: str, limit: int = 10) -> List[Dict[str, object]]:
+        """按前缀补全，城市优先，名称短的优先"""
+        self._ensure_loaded()
+        prefix = (prefix or "").strip()
+        node = self._node(prefix) if prefix else None
+        if node is None:
+            return []
+        ids = {i for n in self._iter_nodes(node) for i in n.ids}
+        ordered = sorted(ids, key=lambda i: (self.kinds[i], len(self.names[i]), self.names[i]))
+        return [self._entry(i) for i in ordered[:limit]]
+
+    def find_in_text(self, text: str) -> Optional[Dict[str, object]]:
+        """
+        找出文本中第一个出现的地名
+
+        同一位置取最长匹配（例如"北海公园"优先于"北海"，"朝阳区"优先于"朝阳"）
+        """
+        self._ensure_loaded()
+        if not text:
+            return None
+        for start in range(len(text)):
+            match: Optional[Tuple[int, int]] = None
+            node = self._root
+            for end in range(start, len(text)):
+                node = node.children.get(text[end])
+                if node is None:
+                    break
+                if node.ids:
+                    match = (end, node.ids[0])
+            if match is not None:
+                return self._entry(match[1])
+        return None
+
+    def find_city(self, text: str) -> Optional[str]:
+        """文本中提到的城市名（城区和地标返回所属城市）"""
+        entry = self.find_in_text(text)
+        return entry["city"] if entry else None
+
+    def city_names(self) -> List[Tuple[str, str]]:
+        """所有城市的 (名称或别名, 城市名)"""
+        self._ensure_loaded()
+        return [
+            (key, name)
+            for name, extra, kind in zip(self.names, self.aliases, self.kinds) if kind == 0
+            for key in dict.fromkeys([name, *extra])
+        ]
+
+    def city_center(self, city: str) -> Optional[Dict[str, float]]:
+        """城市中心坐标"""
+        self._ensure_loaded()
+        node = self._node((city or "").strip())
+        if node is None:
+            return None
+        for index in node.ids:
+            if self.kinds[index] == 0:
+                return {"lat": float(self.coords[index, 0]), "lng": float(self.coords[index, 1])}
+        return None
+
+
+# 全局地名库实例
+gazetteer = Gazetteer()
@@ -0,0 +1,86 @@
+"""
+Geohash 编码
+
+用于本地POI库的空间索引：同一网格内的点共享geohash前缀，
+按前缀范围查询即可利用普通的B-tree索引完成"附近"检索。
+"""
+
+import math
+from typing import List
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+# 字典序大于所有base32字符，用作前缀范围查询的上界
+PREFIX_UPPER = "{"
+# 每纬度约对应的米数
+_METERS_PER_DEGREE = 111320.0
+
+
+def encode(lat: float, lng: float, precision: int = 8) -> str:
+    """经纬度编码为geohash字符串"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if lng >= mid:
+                value = (value << 1) | 1
+                lng_range[0] = mid
+            else:
+                value <<= 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if lat >= mid:
+                value = (value << 1) | 1
+                lat_range[0] = mid
+            else:
+                value <<= 1
+                lat_range[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = value = 0
+    return "".join(chars)
+
+
+def cell_size(precision: int) -> tuple:
+    """指定精度下网格的 (纬度跨度, 经度跨度)，单位为度"""
+    total = 5 * precision
+    lng_bits = (total + 1) // 2
+    lat_bits = total // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def precision_for_radius(lat: float, radius: float, max_precision: int = 8) -> int:
+    """网格宽高都不小于半径的最大精度，此时中心网格及其8个邻居可以覆盖整个圆"""
+    scale = max(math.cos(math.radians(lat)), 0.01)
+    for precision in range(max_precision, 0, -1):
+        lat_span, lng_span = cell_size(precision)
+        if lat_span * _METERS_PER_DEGREE >= radius and lng_span * _METERS_PER_DEGREE * scale >= radius:
+            return precision
+    return 1
+
+
+def covering_cells(lat: float, lng: float, radius: float, max_precision: int = 8) -> List[str]:
+    """
+    覆盖以(lat, lng)为圆心、radius米为半径的圆的geohash网格
+
+    Returns:
+        去重后的网格前缀（最多9个）
+    """
+    precision = precision_for_radius(lat, radius, max_precision)
+    lat_span, lng_span = cell_size(precision)
+    cells = []
+    for dlat in (-lat_span, 0.0, lat_span):
+        for dlng in (-lng_span, 0.0, lng_span):
+            cell_lat = max(-90.0, min(90.0, lat + dlat))
+            cell_lng = (lng + dlng + 180.0) % 360.0 - 180.0
+            cell = encode(cell_lat, cell_lng, precision)
+            if cell not in cells:
+                cells.append(cell)
+    return cells
@@ -0,0 +1,179 @@
+"""
+意图与实体匹配
+
+Agent需要判断用户输入和AI回复中是否出现若干组关键词（工具意图、价格类型、城市、POI分类）。
+所有关键词编译进一个 Aho–Corasick 自动机，一次扫描返回全部命中及其位置，
+代替对每组关键词分别执行 any(keyword in text) 的多次扫描。
+"""
+
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Tuple
+
+from app.utils.gazetteer import gazetteer
+
+# 意图关键词
+INTENT_KEYWORDS: Dict[str, List[str]] = {
+    # 需要调用工具（TripPlannerAgent）
+    "tool": [
+        "搜索", "查找", "推荐", "附近", "价格", "费用", "路线", "距离",
+        "天气", "酒店", "餐厅", "景点", "门票", "交通", "北京", "上海", "广州"
+    ],
+    "poi": ["景点", "餐厅", "酒店", "推荐", "附近"],
+    "route": ["路线", "距离", "时间", "怎么去"],
+    "sightseeing": ["景点", "旅游", "游玩", "观光"],
+    # 需要查询价格（BudgetAnalyzerAgent）
+    "price": [
+        "价格", "费用", "预算", "花费", "成本", "多少钱", "贵不贵",
+        "酒店", "机票", "门票", "交通费", "餐饮费"
+    ],
+    "hotel_price": ["酒店", "住宿"],
+    "flight_price": ["机票", "航班", "交通"],
+    "ticket_price": ["门票", "景点", "游玩"],
+}
+
+# POI分类关键词（分类名与 search_poi 的 category 参数一致）
+CATEGORY_KEYWORDS: Dict[str, List[str]] = {
+    "restaurant": ["餐厅", "美食", "饭店", "小吃", "餐馆"],
+    "hotel": ["酒店", "住宿", "宾馆", "民宿"],
+    "attraction": ["景点", "景区", "博物馆", "名胜"],
+}
+
+
+class AhoCorasick:
+    """
+    多模式字符串匹配自动机
+
+    构建后只读，可在多线程中共享。转移表只保存与根节点不同的转移，
+    其余字符回落到根节点的转移，避免为每个状态复制整张字母表。
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]]):
+        """
+        Args:
+            patterns: (关键词, 附带值)，同一关键词可以出现多次并附带不同的值
+        """
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[Tuple[str, Any]]] = [[]]
+        for pattern, value in patterns:
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                nxt = goto[state].get(char)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][char] = nxt
+                    goto.append({})
+                    outputs.append([])
+                state = nxt
+            outputs[state].append((pattern, value))
+
+        # 广度优先计算失败指针，并把失败链上的转移与输出合并进每个状态
+        root = goto[0]
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [dict() for _ in goto]
+        queue = deque(root.values())
+        while queue:
+            state = queue.popleft()
+            link = fail[state]
+            outputs[state] = outputs[state] + outputs[link]
+            merged = dict(delta[link])
+            merged.update(goto[state])
+            # 与根节点相同的转移不需要保存
+            delta[state] = {c: n for c, n in merged.items() if root.get(c, 0) != n}
+            for char, nxt in goto[state].items():
+                # 子节点的失败指针 = 父节点失败状态在该字符上的转移
+                fail[nxt] = delta[link].get(char, root.get(char, 0)) if link else root.get(char, 0)
+                queue.append(nxt)
+        self._root = root
+        self._delta = delta
+        self._outputs = [tuple(o) for o in outputs]
+        self.state_count = len(goto)
+
+    def iter(self, text: str) -> Iterator[Tuple[int, int, str, Any]]:
+        """逐个返回命中 (起始位置, 结束位置, 关键词, 附带值)，包括相互重叠的命中"""
+        root_get = self._root.get
+        delta = self._delta
+        outputs = self._outputs
+        state = 0
+        for index, char in enumerate(text):
+            # delta中不保存指向根节点(0)的转移，未命中时回落到根节点的转移
+            state = delta[state].get(char) or root_get(char, 0)
+            if outputs[state]:
+                end = index + 1
+                for pattern, value in outputs[state]:
+                    yield end - len(pattern), end, pattern, value
+
+
+@dataclass(frozen=True)
+class Match:
+    """一次命中"""
+    start: int
+    end: int
+    text: str
+    kind: str  # intent, category, city
+    value: str
+
+
+@dataclass(frozen=True)
+class ScanResult:
+    """一段文本的全部命中"""
+    text: str
+    matches: Tuple[Match, ...]
+
+    @property
+    def intents(self) -> FrozenSet[str]:
+        return frozenset(m.value for m in self.matches if m.kind == "intent")
+
+    @property
+    def categories(self) -> List[str]:
+        """按出现顺序去重的POI分类"""
+        return list(dict.fromkeys(m.value for m in self.matches if m.kind == "category"))
+
+    @property
+    def cities(self) -> List[str]:
+        """按出现顺序去重的城市"""
+        return list(dict.fromkeys(m.value for m in self.matches if m.kind == "city"))
+
+    def has(self, intent: str) -> bool:
+        return any(m.kind == "intent" and m.value == intent for m in self.matches)
+
+    def without(self, kind: str) -> str:
+        """去掉某类命中后的文本（重叠的命中合并处理）"""
+        pieces = []
+        position = 0
+        for match in sorted((m for m in self.matches if m.kind == kind), key=lambda m: m.start):
+            if match.start > position:
+                pieces.append(self.text[position:match.start])
+            position = max(position, match.end)
+        pieces.append(self.text[position:])
+        return "".join(pieces)
+
+
+class IntentMatcher:
+    """意图、POI分类和城市的一次扫描匹配器"""
+
+    def __init__(self):
+        patterns: List[Tuple[str, Tuple[str, str]]] = []
+        for intent, keywords in INTENT_KEYWORDS.items():
+            patterns.extend((keyword, ("intent", intent)) for keyword in keywords)
+        for category, keywords in CATEGORY_KEYWORDS.items():
+            patterns.extend((keyword, ("category", category)) for keyword in keywords)
+        patterns.extend((alias, ("city", city)) for alias, city in gazetteer.city_names())
+        self.patterns = patterns
+        self.automaton = AhoCorasick(patterns)
+        # 同一段文本（例如用户输入）会被多个判断复用，缓存最近的扫描结果
+        self.scan = lru_cache(maxsize=64)(self._scan)
+
+    def _scan(self, text: str) -> ScanResult:
+        matches = tuple(
+            Match(start, end, pattern, kind, value)
+            for start, end, pattern, (kind, value) in self.automaton.iter(text or "")
+        )
+        return ScanResult(text or "", matches)
+
+
+# 全局匹配器，导入时构建
+intent_matcher = IntentMatcher()
@@ -0,0 +1,81 @@
+"""
+分数排序键（fractional indexing）
+
+排序键是base36数字串，按字典序比较，表示 (0, 1) 区间内的小数，末位不为"0"。
+任意两个键之间总能生成新键，因此插入和移动只需改写被移动的那一行。
+反复在同一位置插入会使键变长，超过阈值后由 rebalance 重新均匀分配。
+"""
+
+from typing import List, Optional
+
+# 只用数字和小写字母：数据库按非C排序规则（如en_US）比较时大小写不区分先后，
+# 混用大小写会使 ORDER BY 的结果与字符串比较不一致
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+_VALUE = {char: index for index, char in enumerate(DIGITS)}
+
+
+def _midpoint(a: str, b: Optional[str]) -> str:
+    """a < b（b为None表示上界1），a可以为空串（表示0），均不以"0"结尾"""
+    if b is not None:
+        # 跳过公共前缀（a较短时视为补"0"）
+        n = 0
+        while n < len(b) and (a[n] if n < len(a) else "0") == b[n]:
+            n += 1
+        if n > 0:
+            return b[:n] + _midpoint(a[n:], b[n:])
+    digit_a = _VALUE[a[0]] if a else 0
+    digit_b = _VALUE[b[0]] if b is not None else BASE
+    if digit_b - digit_a > 1:
+        return DIGITS[(digit_a + digit_b + 1) // 2]
+    # 首位相邻：b多于一位时取b的首位即可，否则在a的首位之后继续取中点
+    if b is not None and len(b) > 1:
+        return b[:1]
+    return DIGITS[digit_a] + _midpoint(a[1:], None)
+
+
+def validate(key: str) -> bool:
+    return bool(key) and key[-1] != "0" and all(char in _VALUE for char in key)
+
+
+def _check(a: Optional[str], b: Optional[str]):
+    for key in (a, b):
+        if key is not None and not validate(key):
+            raise ValueError(f"无效的排序键: {key!r}")
+    if a is not None and b is not None and a >= b:
+        raise ValueError(f"排序键顺序错误: {a!r} >= {b!r}")
+
+
+def key_between(a: Optional[str], b: Optional[str]) -> str:
+    """
+    生成位于a和b之间的排序键
+
+    追加到末尾（或插到开头）时只把第一位未到上限（下限）的数字加一（减一），
+    连续追加约35次才增加一位，而不是每次取中点使键迅速变长。
+
+    Args:
+        a: 前一个键，None表示开头
+        b: 后一个键，None表示末尾
+
+    Raises:
+        ValueError: a >= b 或键格式不合法
+    """
+    _check(a, b)
+    if a is not None and b is None:
+        for i, char in enumerate(a):
+            if _VALUE[char] + 1 < BASE:
+                return a[:i] + DIGITS[_VALUE[char] + 1]
+    elif a is None and b is not None:
+        for i, char in enumerate(b):
+            if _VALUE[char] > 1:
+                return b[:i] + DIGITS[_VALUE[char] - 1]
+    return _midpoint(a or "", b)
+
+
+def keys_between(a: Optional[str], b: Optional[str], n: int) -> List[str]:
+    """生成a和b之间均匀分布、递增的n个键（二分分配，键长约为log36(n)）"""
+    _check(a, b)
+    if n <= 0:
+        return []
+    middle = _midpoint(a or "", b)
+    return keys_between(a, middle, n // 2) + [middle] + keys_between(middle, b, n - n // 2 - 1)
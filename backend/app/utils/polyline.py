@@ -0,0 +1,169 @@
+"""
+路线几何处理
+
+基于NumPy解析百度路线的 path 字符串、计算边界、Douglas–Peucker 抽稀，
+并输出 "lng,lat;lng,lat" 折线或 Google Encoded Polyline 紧凑格式。
+坐标数组统一为 shape=(N, 2)，列顺序为 (lng, lat)。
+"""
+
+import math
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+# 地球平均半径（米）
+EARTH_RADIUS_M = 6371008.8
+# 256像素瓦片下，zoom=0 时赤道处每像素对应的米数
+_METERS_PER_PIXEL_Z0 = 2 * math.pi * 6378137.0 / 256
+
+
+def parse_paths(paths: Iterable[str]) -> np.ndarray:
+    """
+    解析百度路线各step的path并拼接
+
+    Args:
+        paths: "lng1,lat1;lng2,lat2;..." 格式的字符串
+
+    Returns:
+        (N, 2) 的 (lng, lat) 数组，已去除相邻重复点（相邻step首尾相接）
+    """
+    text = ";".join(p.strip().strip(";") for p in paths if p and p.strip())
+    if not text:
+        return np.empty((0, 2))
+    try:
+        flat = np.fromstring(text.replace(";", ","), dtype=np.float64, sep=",")
+        if flat.size % 2:
+            raise ValueError("坐标数量不是偶数")
+    except ValueError:
+        # 存在空点或格式异常时逐点容错解析
+        values = []
+        for point in text.split(";"):
+            coords = point.split(",")
+            if len(coords) == 2:
+                try:
+                    values.extend((float(coords[0]), float(coords[1])))
+                except ValueError:
+                    continue
+        flat = np.array(values, dtype=np.float64)
+    points = flat.reshape(-1, 2)
+    if len(points) > 1:
+        keep = np.ones(len(points), dtype=bool)
+        keep[1:] = np.any(points[1:] != points[:-1], axis=1)
+        points = points[keep]
+    return points
+
+
+def compute_bounds(points: np.ndarray) -> Optional[Dict[str, Dict[str, float]]]:
+    """计算外接矩形，无坐标时返回None"""
+    if len(points) == 0:
+        return None
+    lng_min, lat_min = points.min(axis=0)
+    lng_max, lat_max = points.max(axis=0)
+    return {
+        "southwest": {"lat": float(lat_min), "lng": float(lng_min)},
+        "northeast": {"lat": float(lat_max), "lng": float(lng_max)}
+    }
+
+
+def zoom_to_tolerance(zoom: float, latitude: float = 0.0) -> float:
+    """
+    地图缩放级别对应的抽稀容差（米），约等于该级别下一个像素的地面距离
+
+    Args:
+        zoom: 地图缩放级别（3-19）
+        latitude: 参考纬度
+    """
+    return _METERS_PER_PIXEL_Z0 * math.cos(math.radians(latitude)) / (2 ** zoom)
+
+
+def _to_meters(points: np.ndarray) -> np.ndarray:
+    """以中心纬度做等距投影，将经纬度转换为平面米坐标（城市级路线误差可忽略）"""
+    lat0 = math.radians(float(points[:, 1].mean()))
+    radians = np.radians(points)
+    return np.column_stack((radians[:, 0] * math.cos(lat0), radians[:, 1])) * EARTH_RADIUS_M
+
+
+def simplify(points: np.ndarray, tolerance_m: float) -> np.ndarray:
+    """
+    Douglas–Peucker 抽稀
+
+    Args:
+        points: (N, 2) 的 (lng, lat) 数组
+        tolerance_m: 容差（米），偏离简化线段小于该值的点被移除
+
+    Returns:
+        保留首尾点的简化结果
+    """
+    n = len(points)
+    if n < 3 or tolerance_m <= 0:
+        return points
+    xy = _to_meters(points)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    # 用显式栈代替递归，长路线不会触发递归深度限制
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = xy[end] - xy[start]
+        inner = xy[start + 1:end] - xy[start]
+        length = math.hypot(segment[0], segment[1])
+        if length == 0:
+            distances = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            distances = np.abs(segment[0] * inner[:, 1] - segment[1] * inner[:, 0]) / length
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance_m:
+            split = start + 1 + index
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return points[keep]
+
+
+def format_lnglat(points: np.ndarray, precision: int = 6) -> str:
+    """输出 "lng,lat;lng,lat" 字符串（与前端及百度path格式一致）"""
+    if len(points) == 0:
+        return ""
+    template = f"%.{precision}f,%.{precision}f;"
+    return ((template * len(points)) % tuple(points.ravel().tolist()))[:-1]
+
+
+def encode_polyline(points: np.ndarray, precision: int = 5) -> str:
+    """
+    Google Encoded Polyline 编码（点顺序为 lat,lng）
+
+    Args:
+        points: (N, 2) 的 (lng, lat) 数组
+        precision: 小数位数，5为标准精度
+    """
+    if len(points) == 0:
+        return ""
+    scaled = np.round(points[:, ::-1] * (10 ** precision)).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    # zigzag：负数映射为奇数
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+    # 每个值拆分为若干5位分组，低位在前，除最后一组外都带0x20延续位
+    shifts = np.arange(0, 35, 5, dtype=np.int64)
+    chunks = (values[:, None] >> shifts) & 0x1F
+    counts = np.maximum(1, (np.floor(np.log2(np.maximum(values, 1))).astype(np.int64) // 5) + 1)
+    used = np.arange(len(shifts))[None, :] < counts[:, None]
+    more = np.arange(len(shifts))[None, :] < (counts - 1)[:, None]
+    encoded = (chunks | np.where(more, 0x20, 0)) + 63
+    return encoded[used].astype(np.uint8).tobytes().decode("ascii")
+
+
+def decode_polyline(encoded: str, precision: int = 5) -> np.ndarray:
+    """解码 Google Encoded Polyline，返回 (N, 2) 的 (lng, lat) 数组"""
+    values = []
+    result = shift = 0
+    for char in encoded.encode("ascii"):
+        byte = char - 63
+        result |= (byte & 0x1F) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(result >> 1) if result & 1 else result >> 1)
+            result = shift = 0
+    coords = np.cumsum(np.array(values, dtype=np.int64).reshape(-1, 2), axis=0) / (10 ** precision)
+    return coords[:, ::-1]
@@ -0,0 +1,77 @@
+"""
+推测性工具预取
+
+请求到达时根据用户输入的关键词推测很可能需要的查询（如 search_poi），
+在线程池中与第一次LLM调用并行执行。工具步骤需要同样参数的结果时直接复用；
+请求结束时仍未被使用的预取结果丢弃（线程中的上游调用无法中断，结果被忽略）。
+
+命中与浪费记录在 tool_prefetch_total{outcome} 中：
+命中率 = hit / started，浪费率 = waste / started。
+"""
+
+import asyncio
+import json
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import TOOL_PREFETCH
+from app.core.transcript import current_player, current_recorder
+
+
+def _retrieve_exception(task: asyncio.Task):
+    # 被丢弃的预取失败时不输出 "Task exception was never retrieved"
+    if not task.cancelled():
+        task.exception()
+
+
+class SpeculativePrefetch:
+    """一次Agent运行中的预取"""
+
+    def __init__(self, agent: str):
+        self.agent = agent
+        self._pending: Dict[str, Tuple[str, asyncio.Task]] = {}
+
+    @staticmethod
+    def _key(tool: str, arguments: Dict[str, Any]) -> str:
+        return f"{tool}:{json.dumps(arguments, ensure_ascii=False, sort_keys=True)}"
+
+    def start(self, tool: str, arguments: Dict[str, Any], fn: Callable[[Dict[str, Any]], Any]) -> bool:
+        """
+        在线程池中开始一次同步查询
+
+        记录或回放transcript时不预取，保证上游调用的顺序与实际运行一致。
+
+        Returns:
+            是否开始了预取
+        """
+        if not settings.TOOL_PREFETCH_ENABLED or current_recorder() is not None or current_player() is not None:
+            return False
+        key = self._key(tool, arguments)
+        if key in self._pending:
+            return False
+        task = asyncio.create_task(asyncio.to_thread(fn, arguments))
+        task.add_done_callback(_retrieve_exception)
+        self._pending[key] = (tool, task)
+        TOOL_PREFETCH.labels(agent=self.agent, tool=tool, outcome="started").inc()
+        return True
+
+    async def take(self, tool: str, arguments: Dict[str, Any]) -> Optional[Any]:
+        """取出参数完全一致的预取结果；没有预取或预取失败时返回None，由调用方正常执行"""
+        entry = self._pending.pop(self._key(tool, arguments), None)
+        if entry is None:
+            return None
+        try:
+            result = await entry[1]
+        except Exception as e:
+            print(f"预取 {tool} 失败，改为正常调用: {e}")
+            TOOL_PREFETCH.labels(agent=self.agent, tool=tool, outcome="error").inc()
+            return None
+        TOOL_PREFETCH.labels(agent=self.agent, tool=tool, outcome="hit").inc()
+        return result
+
+    def discard(self):
+        """丢弃未被使用的预取（运行结束时调用）"""
+        for tool, task in self._pending.values():
+            task.cancel()
+            TOOL_PREFETCH.labels(agent=self.agent, tool=tool, outcome="waste").inc()
+        self._pending.clear()
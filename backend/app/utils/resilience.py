@@ -0,0 +1,332 @@
+"""
+上游调用弹性层
+
+提供按上游划分的熔断器（百度地图、DeepSeek、科大讯飞）和
+针对幂等GET请求（geocode、search_poi）的延迟感知对冲请求：
+上游不健康时快速失败，而不是每个请求都等满超时时间。
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, TimeoutError as FuturesTimeoutError, wait
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from app.core.config import settings
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求被快速拒绝"""
+
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"上游服务 {name} 暂时不可用（熔断中），请 {retry_after:.0f} 秒后重试")
+
+
+def is_upstream_http_failure(error: Exception) -> bool:
+    """判断HTTP异常是否说明上游不健康（4xx请求错误不计入熔断，429除外）"""
+    response = getattr(error, "response", None)
+    status_code = getattr(response, "status_code", None)
+    if status_code is not None:
+        return status_code >= 500 or status_code == 429
+    return True
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    closed: 正常放行，连续失败达到阈值后打开
+    open: 直接拒绝，冷却时间过后进入半开
+    half_open: 放行少量探测请求，成功则关闭，失败则重新打开
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        half_open_max_calls: int = 1
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._consecutive_failures = 0
+        self._half_open_in_flight = 0
+        # 统计
+        self.total_successes = 0
+        self.total_failures = 0
+        self.total_rejected = 0
+        self.times_opened = 0
+
+    def _current_state(self) -> str:
+        """计算当前状态（需持有锁）"""
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_in_flight = 0
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _open(self):
+        """打开熔断器（需持有锁）"""
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._half_open_in_flight = 0
+        self.times_opened += 1
+        print(f"⚠️ 熔断器 {self.name} 已打开，连续失败 {self._consecutive_failures} 次")
+
+    def allow_request(self) -> bool:
+        """判断是否放行请求，放行的请求必须随后调用 record_success/record_failure/release"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and self._half_open_in_flight < self.half_open_max_calls:
+                self._half_open_in_flight += 1
+                return True
+            self.total_rejected += 1
+            return False
+
+    def record_success(self):
+        """记录一次成功"""
+        with self._lock:
+            self.total_successes += 1
+            self._consecutive_failures = 0
+            if self._current_state() == self.HALF_OPEN:
+                self._state = self.CLOSED
+                self._half_open_in_flight = 0
+                print(f"✅ 熔断器 {self.name} 已恢复")
+
+    def record_failure(self):
+        """记录一次失败"""
+        with self._lock:
+            self.total_failures += 1
+            self._consecutive_failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or (
+                state == self.CLOSED and self._consecutive_failures >= self.failure_threshold
+            ):
+                self._open()
+
+    def release(self):
+        """放弃一次已放行但没有结论的请求（例如调用方中途取消）"""
+        with self._lock:
+            if self._current_state() == self.HALF_OPEN and self._half_open_in_flight > 0:
+                self._half_open_in_flight -= 1
+
+    def retry_after(self) -> float:
+        """距离进入半开状态的剩余秒数"""
+        with self._lock:
+            if self._current_state() != self.OPEN:
+                return 0.0
+            return max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at))
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """通过熔断器执行同步调用"""
+        if not self.allow_request():
+            raise CircuitOpenError(self.name, self.retry_after())
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    async def call_async(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """通过熔断器执行异步调用"""
+        if not self.allow_request():
+            raise CircuitOpenError(self.name, self.retry_after())
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            self.release()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    def reset(self):
+        """手动关闭熔断器"""
+        with self._lock:
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._half_open_in_flight = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """熔断器状态快照"""
+        with self._lock:
+            state = self._current_state()
+            retry_after = 0.0
+            if state == self.OPEN:
+                retry_after = max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at))
+            return {
+                "name": self.name,
+                "state": state,
+                "consecutive_failures": self._consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "recovery_timeout": self.recovery_timeout,
+                "retry_after": round(retry_after, 2),
+                "total_successes": self.total_successes,
+                "total_failures": self.total_failures,
+                "total_rejected": self.total_rejected,
+                "times_opened": self.times_opened
+            }
+
+
+class LatencyTracker:
+    """滚动窗口延迟统计"""
+
+    def __init__(self, window_size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """计算百分位延迟（秒），无样本时返回None"""
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * (len(ordered) - 1)))))
+        return ordered[index]
+
+
+# 对冲请求使用的线程池
+_hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedge")
+
+
+class Hedger:
+    """
+    对冲请求
+
+    主请求超过 p95 延迟仍未返回时，再发一个相同的备份请求，取先成功的结果。
+    只能用于幂等请求。
+    """
+
+    def __init__(self, name: str, min_delay: float, max_delay: float, min_samples: int = 20):
+        self.name = name
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.latency = LatencyTracker()
+        self.total_calls = 0
+        self.hedges_sent = 0
+        self.hedge_wins = 0
+
+    def hedge_delay(self) -> float:
+        """基于 p95 计算对冲延迟，样本不足时使用上限"""
+        if self.latency.count() < self.min_samples:
+            return self.max_delay
+        p95 = self.latency.percentile(95)
+        return min(self.max_delay, max(self.min_delay, p95))
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        """执行对冲调用"""
+        self.total_calls += 1
+        start = time.monotonic()
+        # 复制上下文，使对冲线程中的请求仍归属当前trace
+        primary = _hedge_executor.submit(contextvars.copy_context().run, fn)
+        try:
+            # 主请求在对冲延迟内返回（或失败）时直接使用其结果
+            result = primary.result(timeout=self.hedge_delay())
+            self.latency.record(time.monotonic() - start)
+            return result
+        except FuturesTimeoutError:
+            pass
+
+        self.hedges_sent += 1
+        backup = _hedge_executor.submit(contextvars.copy_context().run, fn)
+        pending = {primary, backup}
+        first_error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    self.latency.record(time.monotonic() - start)
+                    if future is backup:
+                        self.hedge_wins += 1
+                    return future.result()
+                first_error = first_error or error
+        raise first_error
+
+    def stats(self) -> Dict[str, Any]:
+        p50 = self.latency.percentile(50)
+        p95 = self.latency.percentile(95)
+        return {
+            "name": self.name,
+            "total_calls": self.total_calls,
+            "hedges_sent": self.hedges_sent,
+            "hedge_wins": self.hedge_wins,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "current_delay_ms": round(self.hedge_delay() * 1000, 1)
+        }
+
+
+# 全局注册表
+_breakers: Dict[str, CircuitBreaker] = {}
+_hedgers: Dict[str, Hedger] = {}
+_registry_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """获取（或创建）指定上游的熔断器"""
+    with _registry_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(
+                name,
+                failure_threshold=settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+                recovery_timeout=settings.CIRCUIT_BREAKER_RECOVERY_SECONDS
+            )
+        return _breakers[name]
+
+
+def find_circuit_breaker(name: str) -> Optional[CircuitBreaker]:
+    """查找已存在的熔断器，不存在时返回None"""
+    return _breakers.get(name)
+
+
+def get_hedger(name: str) -> Hedger:
+    """获取（或创建）指定请求类型的对冲器"""
+    with _registry_lock:
+        if name not in _hedgers:
+            _hedgers[name] = Hedger(
+                name,
+                min_delay=settings.HEDGE_MIN_DELAY_MS / 1000.0,
+                max_delay=settings.HEDGE_MAX_DELAY_MS / 1000.0
+            )
+        return _hedgers[name]
+
+
+def get_resilience_stats() -> Dict[str, Any]:
+    """所有熔断器与对冲器的状态"""
+    return {
+        "breakers": {name: breaker.snapshot() for name, breaker in _breakers.items()},
+        "hedging": {name: hedger.stats() for name, hedger in _hedgers.items()}
+    }
@@ -0,0 +1,193 @@
+"""
+单飞（Single-flight）请求合并
+
+同一时刻多个完全相同的上游请求（例如多个用户同时规划去同一城市的行程，
+触发相同的 search_poi / geocode）只会真正调用一次上游，其余调用方等待并共享结果。
+"""
+
+import asyncio
+import copy
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from app.core.metrics import SINGLE_FLIGHT_COALESCED
+
+
+class _Call:
+    """一次进行中的上游调用"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    线程安全的单飞合并器
+
+    适用于同步上游调用（如基于 requests 的百度地图接口），
+    调用方通常运行在线程池中。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.total_calls = 0
+        self.upstream_calls = 0
+        self.coalesced_calls = 0
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        执行 fn，若相同 key 的调用正在进行中则等待其结果
+
+        Args:
+            key: 合并键，相同键的并发调用会被合并
+            fn: 实际的上游调用
+
+        Returns:
+            上游调用结果（有跟随者时每个调用方各拿一份深拷贝，避免共享可变对象）
+        """
+        with self._lock:
+            self.total_calls += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced_calls += 1
+                SINGLE_FLIGHT_COALESCED.labels(name=self.name).inc()
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.upstream_calls += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+        # 调用已移出 _calls，waiters 不会再增加；有跟随者时领导者也拿拷贝，
+        # 否则调用方修改结果时可能与跟随者的深拷贝同时进行
+        return copy.deepcopy(call.result) if call.waiters else call.result
+
+    def in_flight(self) -> int:
+        """当前进行中的上游调用数"""
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> Dict[str, Any]:
+        """合并统计"""
+        return {
+            "name": self.name,
+            "total_calls": self.total_calls,
+            "upstream_calls": self.upstream_calls,
+            "coalesced_calls": self.coalesced_calls,
+            "in_flight": self.in_flight()
+        }
+
+
+class _AsyncCall:
+    """一次进行中的协程上游调用"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.callers = 1
+
+
+def _retrieve_exception(task: asyncio.Task):
+    # 所有调用方都已取消时，上游异常不再有人读取，避免事件循环打印警告
+    if not task.cancelled():
+        task.exception()
+
+
+class AsyncSingleFlight:
+    """
+    协程版单飞合并器
+
+    适用于运行在同一事件循环内的异步上游调用（如非流式 LLM 请求）。
+    上游调用在独立的任务中执行，任何一个调用方被取消（如客户端断开）都不影响其他调用方。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _AsyncCall] = {}
+        self.total_calls = 0
+        self.upstream_calls = 0
+        self.coalesced_calls = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        执行协程工厂 fn，若相同 key 的调用正在进行中则等待其结果
+
+        Args:
+            key: 合并键
+            fn: 无参协程工厂，返回上游调用的 awaitable
+        """
+        self.total_calls += 1
+        call = self._calls.get(key)
+        if call is not None:
+            call.callers += 1
+            self.coalesced_calls += 1
+            SINGLE_FLIGHT_COALESCED.labels(name=self.name).inc()
+        else:
+            call = _AsyncCall(asyncio.create_task(self._run(key, fn)))
+            call.task.add_done_callback(_retrieve_exception)
+            self._calls[key] = call
+            self.upstream_calls += 1
+
+        # shield：调用方被取消时上游任务继续执行，其他调用方照常拿到结果
+        result = await asyncio.shield(call.task)
+        # 任务结束时已移出 _calls，callers 不会再增加；共享时每个调用方各拿一份拷贝
+        return copy.deepcopy(result) if call.callers > 1 else result
+
+    async def _run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            return await fn()
+        finally:
+            self._calls.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """合并统计"""
+        return {
+            "name": self.name,
+            "total_calls": self.total_calls,
+            "upstream_calls": self.upstream_calls,
+            "coalesced_calls": self.coalesced_calls,
+            "in_flight": len(self._calls)
+        }
+
+
+# 全局合并器注册表，便于统一上报指标
+_registry: Dict[str, Any] = {}
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """获取（或创建）指定名称的线程版合并器"""
+    if name not in _registry:
+        _registry[name] = SingleFlight(name)
+    return _registry[name]
+
+
+def get_async_single_flight(name: str) -> AsyncSingleFlight:
+    """获取（或创建）指定名称的协程版合并器"""
+    if name not in _registry:
+        _registry[name] = AsyncSingleFlight(name)
+    return _registry[name]
+
+
+def get_single_flight_stats() -> Dict[str, Dict[str, Any]]:
+    """所有合并器的统计信息"""
+    return {name: flight.stats() for name, flight in _registry.items()}
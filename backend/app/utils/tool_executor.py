@@ -3,13 +3,19 @@
 负责执行LLM调用的工具函数
 """
 
+import asyncio
 import uuid
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 from sqlalchemy.orm import Session
 
-from app.models.trip import Trip, Itinerary, ItineraryItem, Expense
+from app.models.trip import Trip, Expense
+from app.core.config import settings
 from app.utils.baidu_map_tools import baidu_map_tools
+from app.core.metrics import observe_tool
+from app.services.itinerary_service import ItineraryService
+from app.utils.tool_definitions import AGENT_TOOLS
+from app.utils.tool_registry import ToolDispatcher, UnknownToolError
 
 
 class ToolExecutor:
@@ -18,6 +24,21 @@ class ToolExecutor:
     def __init__(self, db: Session, user_id: str):
         self.db = db
         self.user_id = user_id
+        self._tools = ToolDispatcher(AGENT_TOOLS, {
+            # 地图相关工具
+            "search_poi": self._search_poi,
+            "calculate_route": self._calculate_route,
+            "mark_location": self._mark_location,
+            # 行程管理工具
+            "create_trip": self._create_trip,
+            "add_itinerary_item": self._add_itinerary_item,
+            "add_itinerary_items": self._add_itinerary_items,
+            "plan_trip": self._plan_trip,
+            "list_trips": self._list_trips,
+            # 费用管理工具
+            "add_expense": self._add_expense,
+            "query_trip_budget": self._query_trip_budget,
+        }, source="tool_executor")
     
     async def execute_tool(self, tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
         """执行工具调用
@@ -29,37 +50,17 @@ class ToolExecutor:
         Returns:
             工具执行结果
         """
+        return await observe_tool(tool_name, "tool_executor", self._dispatch_tool(tool_name, parameters))
+    
+    async def _dispatch_tool(self, tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """按工具名称分发到具体实现"""
         try:
-            # 地图相关工具
-            if tool_name == "search_poi":
-                return await self._search_poi(parameters)
-            elif tool_name == "calculate_route":
-                return await self._calculate_route(parameters)
-            elif tool_name == "mark_location":
-                return await self._mark_location(parameters)
-            
-            # 行程管理工具
-            elif tool_name == "create_trip":
-                return await self._create_trip(parameters)
-            elif tool_name == "add_itinerary_item":
-                return await self._add_itinerary_item(parameters)
-            elif tool_name == "plan_trip":
-                return await self._plan_trip(parameters)
-            elif tool_name == "list_trips":
-                return await self._list_trips(parameters)
-            
-            # 费用管理工具
-            elif tool_name == "add_expense":
-                return await self._add_expense(parameters)
-            elif tool_name == "query_trip_budget":
-                return await self._query_trip_budget(parameters)
-            
-            else:
-                return {
-                    "success": False,
-                    "error": f"未知的工具: {tool_name}"
-                }
-                
+            return await self._tools.dispatch(tool_name, parameters)
+        except UnknownToolError:
+            return {
+                "success": False,
+                "error": f"未知的工具: {tool_name}"
+            }
         except Exception as e:
             return {
                 "success": False,
@@ -75,7 +76,9 @@ class ToolExecutor:
             city = params.get("city", "北京")
             category = params.get("category", "attraction")
             
-            result = baidu_map_tools.search_poi(
+            # 百度地图接口是同步请求，在线程池中执行，工具的超时和并发限制才能生效
+            result = await asyncio.to_thread(
+                baidu_map_tools.search_poi,
                 keyword=keyword,
                 city=city,
                 category=category
@@ -96,10 +99,12 @@ class ToolExecutor:
             destination = params.get("destination")
             mode = params.get("mode", "driving")
             
-            result = baidu_map_tools.calculate_route(
+            result = await asyncio.to_thread(
+                baidu_map_tools.calculate_route,
                 origin=origin,
                 destination=destination,
-                mode=mode
+                mode=mode,
+                zoom=settings.ROUTE_TOOL_SIMPLIFY_ZOOM
             )
             
             return result
@@ -118,7 +123,7 @@ class ToolExecutor:
             category = params.get("category", "attraction")
             
             # 使用地理编码获取坐标
-            result = baidu_map_tools.geocode(location)
+            result = await asyncio.to_thread(baidu_map_tools.geocode, location)
             
             if result.get("success"):
                 coordinates = result.get("data", {}).get("coordinates")
@@ -184,88 +189,96 @@ class ToolExecutor:
                 "error": f"创建行程失败: {str(e)}"
             }
     
+    def _write_itinerary_items(self, trip_id: str, items: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """
+        写入行程节点并提交（一次查询当天安排和排序位置，一条INSERT写入）
+        
+        Returns:
+            写入的节点行，行程不存在时返回None
+        """
+        trip = self.db.query(Trip.id).filter(
+            Trip.id == trip_id,
+            Trip.user_id == self.user_id
+        ).first()
+        
+        if not trip:
+            return None
+        
+        rows = ItineraryService(self.db).add_items(trip_id, items)
+        self.db.commit()
+        return rows
+    
+    @staticmethod
+    def _item_summary(trip_id: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "item_id": row["id"],
+            "trip_id": trip_id,
+            "day_number": row["day_number"],
+            "name": row["name"],
+            "category": row["category"],
+            "address": row["address"],
+            "coordinates": row["coordinates"]
+        }
+    
     async def _add_itinerary_item(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """添加行程节点"""
         try:
             trip_id = params.get("trip_id")
-            day_number = params.get("day_number")
+            rows = self._write_itinerary_items(trip_id, [params])
             
-            # 检查行程是否存在
-            trip = self.db.query(Trip).filter(
-                Trip.id == trip_id,
-                Trip.user_id == self.user_id
-            ).first()
-            
-            if not trip:
+            if rows is None:
                 return {
                     "success": False,
                     "error": "行程不存在"
                 }
             
-            # 查找或创建当天的Itinerary
-            itinerary = self.db.query(Itinerary).filter(
-                Itinerary.trip_id == trip_id,
-                Itinerary.day_number == day_number
-            ).first()
+            return {
+                "success": True,
+                "data": self._item_summary(trip_id, rows[0]),
+                "message": f"成功添加行程节点：{rows[0]['name']}"
+            }
             
-            if not itinerary:
-                itinerary = Itinerary(
-                    id=str(uuid.uuid4()),
-                    trip_id=trip_id,
-                    day_number=day_number,
-                    title=f"第 {day_number} 天"
-                )
-                self.db.add(itinerary)
-                self.db.flush()
-            
-            # 创建行程节点
-            coordinates = params.get("coordinates")
-            if coordinates and isinstance(coordinates, dict):
-                coordinates_json = coordinates
-            else:
-                coordinates_json = None
+        except Exception as e:
+            self.db.rollback()
+            return {
+                "success": False,
+                "error": f"添加行程节点失败: {str(e)}"
+            }
+    
+    async def _add_itinerary_items(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """批量添加行程节点"""
+        try:
+            trip_id = params.get("trip_id")
+            items = params.get("items") or []
             
-            # 获取当前最大的order_index
-            max_order = self.db.query(ItineraryItem).filter(
-                ItineraryItem.itinerary_id == itinerary.id
-            ).count()
+            if not items or any(not item.get("name") or not item.get("day_number") for item in items):
+                return {
+                    "success": False,
+                    "error": "items不能为空，且每个节点都需要name和day_number"
+                }
             
-            item = ItineraryItem(
-                id=str(uuid.uuid4()),
-                itinerary_id=itinerary.id,
-                name=params.get("name"),
-                category=params.get("category"),
-                address=params.get("address"),
-                coordinates=coordinates_json,
-                start_time=params.get("start_time"),
-                estimated_duration=params.get("estimated_duration"),
-                estimated_cost=params.get("estimated_cost"),
-                order_index=max_order
-            )
+            rows = self._write_itinerary_items(trip_id, items)
             
-            self.db.add(item)
-            self.db.commit()
-            self.db.refresh(item)
+            if rows is None:
+                return {
+                    "success": False,
+                    "error": "行程不存在"
+                }
             
             return {
                 "success": True,
                 "data": {
-                    "item_id": item.id,
                     "trip_id": trip_id,
-                    "day_number": day_number,
-                    "name": item.name,
-                    "category": item.category,
-                    "address": item.address,
-                    "coordinates": item.coordinates
+                    "items": [self._item_summary(trip_id, row) for row in rows]
                 },
-                "message": f"成功添加行程节点：{item.name}"
+                "message": f"成功添加{len(rows)}个行程节点"
             }
             
         except Exception as e:
             self.db.rollback()
             return {
                 "success": False,
-                "error": f"添加行程节点失败: {str(e)}"
+                "error": f"批量添加行程节点失败: {str(e)}"
             }
     
     async def _plan_trip(self, params: Dict[str, Any]) -> Dict[str, Any]:
@@ -0,0 +1,213 @@
+"""
+声明式工具注册表
+
+每个工具用 ToolSpec 声明一次：名称、说明、参数schema，以及执行策略
+（超时、并发上限、是否幂等、结果缓存时间）。同一组提供给LLM的工具组成一个 ToolSet，
+schema 在导入时校验并只构建、序列化一次，之后每次LLM请求都复用同一个列表。
+
+同名工具在不同 ToolSet 中的参数和实现可以不同（例如Agent直接执行的 add_expense
+与费用助手需要用户确认的 add_expense），处理函数由调用方通过 ToolDispatcher 绑定：
+
+    dispatcher = ToolDispatcher(AGENT_TOOLS, {"search_poi": self._search_poi}, source="tool_executor")
+    result = await dispatcher.dispatch("search_poi", {"keyword": "故宫", "city": "北京"})
+
+分发是一次字典查找；执行时按声明施加超时和并发限制，幂等工具的并发相同调用会合并，
+cache_ttl 大于0的幂等工具在TTL内直接返回缓存结果（记录或回放transcript时不使用缓存和合并）。
+"""
+
+import asyncio
+import copy
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import register_tool_names
+from app.core.transcript import current_player, current_recorder
+from app.utils.distance_matrix import PairCache
+from app.utils.single_flight import get_async_single_flight
+
+# OpenAI兼容接口对函数名的限制
+_NAME_PATTERN = re.compile(r"^[a-zA-Z0-9_-]{1,64}$")
+_JSON_TYPES = {"string", "number", "integer", "boolean", "array", "object"}
+
+
+class UnknownToolError(KeyError):
+    """ToolSet中不存在该工具，或调用方没有为它绑定处理函数"""
+
+
+class ToolTimeoutError(Exception):
+    """工具执行超过声明的超时时间"""
+
+
+@dataclass(frozen=True)
+class ToolSpec:
+    """一个工具的声明"""
+
+    name: str
+    description: str
+    parameters: Dict[str, Any]
+    # 超时（秒），None 使用 TOOL_DEFAULT_TIMEOUT
+    timeout: Optional[float] = None
+    # 同时执行的最大数量（每个进程），0 表示不限制
+    max_concurrency: int = 0
+    # 结果只取决于参数的只读工具（不依赖当前用户），并发的相同调用可以合并
+    idempotent: bool = False
+    # 结果缓存时间（秒），0 表示不缓存，只允许用于幂等工具
+    cache_ttl: float = 0
+    schema: Dict[str, Any] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        validate_spec(self)
+        object.__setattr__(self, "schema", {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": self.parameters
+            }
+        })
+
+
+def validate_spec(spec: ToolSpec):
+    """校验工具声明，错误在导入时暴露，而不是在LLM调用时才被上游拒绝"""
+    if not _NAME_PATTERN.match(spec.name):
+        raise ValueError(f"工具名称不合法: {spec.name!r}")
+    params = spec.parameters
+    if params.get("type") != "object" or not isinstance(params.get("properties"), dict):
+        raise ValueError(f"工具 {spec.name} 的参数必须是包含 properties 的 object")
+    for prop, schema in params["properties"].items():
+        if schema.get("type") not in _JSON_TYPES:
+            raise ValueError(f"工具 {spec.name} 的参数 {prop} 类型不合法: {schema.get('type')!r}")
+        if "enum" in schema and not isinstance(schema["enum"], list):
+            raise ValueError(f"工具 {spec.name} 的参数 {prop} 的 enum 必须是列表")
+    missing = set(params.get("required", [])) - set(params["properties"])
+    if missing:
+        raise ValueError(f"工具 {spec.name} 的必填参数未定义: {sorted(missing)}")
+    if spec.cache_ttl and not spec.idempotent:
+        raise ValueError(f"工具 {spec.name} 不是幂等的，不能缓存结果")
+    if spec.timeout is not None and spec.timeout <= 0:
+        raise ValueError(f"工具 {spec.name} 的超时必须大于0")
+
+
+class ToolList(list):
+    """提供给LLM的工具列表，附带预先序列化的JSON（用作请求合并的键等）"""
+
+    def __init__(self, schemas: Iterable[Dict[str, Any]]):
+        super().__init__(schemas)
+        self.json = json.dumps(self, ensure_ascii=False, sort_keys=True)
+
+
+class ToolSet:
+    """一组提供给LLM的工具"""
+
+    def __init__(self, name: str, specs: Iterable[ToolSpec]):
+        self.name = name
+        self.specs: Dict[str, ToolSpec] = {}
+        for spec in specs:
+            if spec.name in self.specs:
+                raise ValueError(f"工具集 {name} 中重复的工具: {spec.name}")
+            self.specs[spec.name] = spec
+        # 所有LLM请求共用，调用方不要修改
+        self.tools = ToolList(spec.schema for spec in self.specs.values())
+        register_tool_names(self.specs)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.specs
+
+    def get(self, name: str) -> ToolSpec:
+        try:
+            return self.specs[name]
+        except KeyError:
+            raise UnknownToolError(name) from None
+
+
+# 按 (工具集, 工具名) 共享的并发限制和结果缓存，同一工具的多个调用方共用
+_semaphores: Dict[str, Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = {}
+_caches: Dict[str, PairCache] = {}
+
+
+def _semaphore(key: str, spec: ToolSpec) -> asyncio.Semaphore:
+    # 信号量绑定到首次等待时的事件循环，换了事件循环（如多次 asyncio.run）时重新创建
+    loop = asyncio.get_running_loop()
+    entry = _semaphores.get(key)
+    if entry is None or entry[0] is not loop:
+        entry = _semaphores[key] = (loop, asyncio.Semaphore(spec.max_concurrency))
+    return entry[1]
+
+
+def _cache(key: str, spec: ToolSpec) -> PairCache:
+    if key not in _caches:
+        _caches[key] = PairCache(settings.TOOL_RESULT_CACHE_SIZE, spec.cache_ttl)
+    return _caches[key]
+
+
+def clear_tool_caches():
+    for cache in _caches.values():
+        cache.clear()
+
+
+class ToolDispatcher:
+    """把工具集中的工具绑定到处理函数，并按声明执行"""
+
+    def __init__(self, toolset: ToolSet, handlers: Dict[str, Callable[..., Awaitable[Any]]], source: str):
+        unknown = set(handlers) - set(toolset.specs)
+        if unknown:
+            raise ValueError(f"工具集 {toolset.name} 中没有这些工具: {sorted(unknown)}")
+        self.toolset = toolset
+        self.handlers = handlers
+        self.source = source
+
+    @property
+    def tools(self) -> ToolList:
+        return self.toolset.tools
+
+    async def dispatch(self, name: str, arguments: Dict[str, Any], *context) -> Any:
+        """
+        执行工具
+
+        Args:
+            name: 工具名称
+            arguments: LLM给出的参数
+            context: 透传给处理函数的额外参数（如用户ID、行程ID）
+
+        Raises:
+            UnknownToolError: 未知工具
+            ToolTimeoutError: 执行超时
+        """
+        handler = self.handlers.get(name)
+        if handler is None:
+            raise UnknownToolError(name)
+        spec = self.toolset.specs[name]
+        key = f"{self.toolset.name}.{name}"
+
+        if not spec.idempotent or current_recorder() is not None or current_player() is not None:
+            return await self._run(spec, key, handler, arguments, context)
+
+        # 幂等工具的结果只取决于参数，透传的上下文不参与合并和缓存的键
+        call_key = json.dumps([self.source, arguments], ensure_ascii=False, sort_keys=True, default=str)
+        cache = _cache(key, spec) if spec.cache_ttl else None
+        if cache is not None:
+            cached = cache.get(call_key)
+            if cached is not None:
+                return copy.deepcopy(cached)
+
+        async def call():
+            result = await self._run(spec, key, handler, arguments, context)
+            if cache is not None and not (isinstance(result, dict) and result.get("success") is False):
+                cache.set(call_key, copy.deepcopy(result))
+            return result
+
+        return await get_async_single_flight(f"tool.{key}").do(call_key, call)
+
+    async def _run(self, spec: ToolSpec, key: str, handler, arguments: Dict[str, Any], context: tuple) -> Any:
+        timeout = spec.timeout or settings.TOOL_DEFAULT_TIMEOUT
+        try:
+            if spec.max_concurrency:
+                async with _semaphore(key, spec):
+                    return await asyncio.wait_for(handler(arguments, *context), timeout)
+            return await asyncio.wait_for(handler(arguments, *context), timeout)
+        except asyncio.TimeoutError:
+            raise ToolTimeoutError(f"工具 {spec.name} 执行超时（{timeout:.0f}秒）") from None
+
@@ -0,0 +1,6 @@
+"""
+性能基准测试
+
+- fake_upstreams: DeepSeek / 百度地图 / 科大讯飞 的本地替身服务
+- load_test: 压测脚本，输出可用于回归对比的JSON结果
+"""
@@ -0,0 +1,354 @@
+"""
+上游服务的本地替身
+
+- OpenAI兼容的LLM服务（DeepSeek）：SSE流式输出，可配置首字延迟（TTFT）和每秒token数
+- 百度地图：place/v2/search、geocoding/v3、geocoding/v2（逆地理编码）、direction/v2，可配置延迟
+- 科大讯飞语音听写：WebSocket，收到最后一帧后返回固定识别结果
+
+通过 FakeUpstreams.env() 得到的环境变量把应用指向这些替身服务。
+
+单独运行（便于手工调试）：
+    python -m benchmarks.fake_upstreams --ttft-ms 300 --tokens-per-second 50 --map-latency-ms 80
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+import websockets
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class FakeUpstreamConfig:
+    """替身服务的延迟配置"""
+    ttft_ms: float = 300.0
+    tokens_per_second: float = 50.0
+    completion_tokens: int = 60
+    map_latency_ms: float = 80.0
+    # 额外的指数分布抖动均值，用于制造长尾
+    map_jitter_ms: float = 20.0
+    asr_latency_ms: float = 200.0
+    # 带tools的请求先返回一次search_poi调用，覆盖Agent的工具调用路径
+    emit_tool_calls: bool = True
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# 中文回复拆成的"token"
+_REPLY_TOKENS = ["根据", "您的", "需求", "，", "推荐", "游览", "故宫", "、", "天坛", "和", "颐和园", "。"]
+
+_TOOL_ARGUMENTS = {"keyword": "景点", "city": "北京", "category": "attraction"}
+
+
+def _chunk(model: str, delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+    payload = {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    }
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def _reply_tokens(config: FakeUpstreamConfig, messages: List[Dict[str, Any]]) -> List[str]:
+    tokens = [_REPLY_TOKENS[i % len(_REPLY_TOKENS)] for i in range(config.completion_tokens)]
+    system_prompt = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "")
+    # SimpleTripAgent通过文本标记调用工具
+    if config.emit_tool_calls and "[TOOL_CALL:" in system_prompt:
+        tokens.append(f"[TOOL_CALL:search_poi:{json.dumps(_TOOL_ARGUMENTS, ensure_ascii=False)}]")
+    return tokens
+
+
+def create_llm_app(config: FakeUpstreamConfig) -> FastAPI:
+    """OpenAI兼容的 /v1/chat/completions"""
+    app = FastAPI(title="fake-llm")
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "fake-model")
+        messages = body.get("messages", [])
+        tokens = _reply_tokens(config, messages)
+        with_tools = config.emit_tool_calls and bool(body.get("tools"))
+
+        if not body.get("stream"):
+            await asyncio.sleep(config.ttft_ms / 1000.0 + len(tokens) / config.tokens_per_second)
+            return {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 100, "completion_tokens": len(tokens), "total_tokens": 100 + len(tokens)}
+            }
+
+        async def stream():
+            await asyncio.sleep(config.ttft_ms / 1000.0)
+            if with_tools:
+                yield _chunk(model, {"tool_calls": [{
+                    "index": 0,
+                    "id": "call_fake",
+                    "type": "function",
+                    "function": {"name": "search_poi", "arguments": json.dumps(_TOOL_ARGUMENTS, ensure_ascii=False)}
+                }]})
+            interval = 1.0 / config.tokens_per_second
+            for token in tokens:
+                yield _chunk(model, {"content": token})
+                await asyncio.sleep(interval)
+            yield _chunk(model, {}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+def _fake_pois(keyword: str, region: str, count: int = 10) -> List[Dict[str, Any]]:
+    return [
+        {
+            "uid": f"fake-{keyword}-{i}",
+            "name": f"{region}{keyword}{i + 1}",
+            "address": f"{region}测试路{i + 1}号",
+            "location": {"lat": 39.90 + i * 0.01, "lng": 116.39 + i * 0.01},
+            "telephone": "010-00000000",
+            "detail_info": {"overall_rating": "4.5", "tag": "旅游景点"}
+        }
+        for i in range(count)
+    ]
+
+
+def create_baidu_app(config: FakeUpstreamConfig) -> FastAPI:
+    """百度地图Web服务API替身"""
+    app = FastAPI(title="fake-baidu-map")
+
+    async def delay():
+        jitter = random.expovariate(1.0 / config.map_jitter_ms) if config.map_jitter_ms > 0 else 0.0
+        await asyncio.sleep((config.map_latency_ms + jitter) / 1000.0)
+
+    @app.get("/place/v2/search")
+    async def place_search(query: str = "", region: str = "", page_size: int = 10):
+        await delay()
+        return {"status": 0, "message": "ok", "results": _fake_pois(query, region, min(page_size, 20))}
+
+    @app.get("/geocoding/v3/")
+    async def geocoding(address: str = ""):
+        await delay()
+        # 同一地址返回稳定坐标
+        offset = (sum(map(ord, address)) % 100) / 1000.0
+        return JSONResponse({
+            "status": 0,
+            "result": {
+                "location": {"lng": 116.397 + offset, "lat": 39.909 + offset},
+                "precise": 1,
+                "confidence": 80,
+                "level": "城市"
+            }
+        })
+
+    @app.get("/geocoding/v2/")
+    async def reverse_geocoding(location: str = ""):
+        await delay()
+        return {
+            "status": 0,
+            "result": {
+                "formatted_address": "北京市东城区测试路1号",
+                "addressComponent": {"province": "北京市", "city": "北京市", "district": "东城区"}
+            }
+        }
+
+    @app.get("/direction/v2/{mode}")
+    async def direction(mode: str, origin: str = "", destination: str = ""):
+        await delay()
+        try:
+            o_lat, o_lng = (float(v) for v in origin.split(","))
+            d_lat, d_lng = (float(v) for v in destination.split(","))
+        except ValueError:
+            return {"status": 2, "message": "参数错误"}
+        # 起终点之间插值出一条折线
+        points = [
+            f"{o_lng + (d_lng - o_lng) * t / 50:.6f},{o_lat + (d_lat - o_lat) * t / 50:.6f}"
+            for t in range(51)
+        ]
+        steps = [
+            {
+                "instruction": f"沿测试路行驶第{i + 1}段",
+                "distance": 1000,
+                "duration": 180,
+                "path": ";".join(points[i * 10:(i + 1) * 10 + 1])
+            }
+            for i in range(5)
+        ]
+        return {
+            "status": 0,
+            "result": {"routes": [{"distance": 5000, "duration": 900, "steps": steps}]}
+        }
+
+    return app
+
+
+async def _xunfei_handler(websocket, config: FakeUpstreamConfig):
+    """读取音频帧直到最后一帧（status=2），返回讯飞格式的识别结果"""
+    async for raw in websocket:
+        try:
+            frame = json.loads(raw)
+        except (TypeError, ValueError):
+            continue
+        if frame.get("data", {}).get("status") == 2:
+            await asyncio.sleep(config.asr_latency_ms / 1000.0)
+            await websocket.send(json.dumps({
+                "code": 0,
+                "message": "success",
+                "sid": "fake-sid",
+                "data": {
+                    "status": 2,
+                    "result": {"sn": 1, "ls": True, "ws": [{"bg": 0, "cw": [{"w": "我想去北京旅游", "sc": 0}]}]}
+                }
+            }, ensure_ascii=False))
+            return
+
+
+class _ServerThread:
+    """在后台线程中运行的uvicorn服务"""
+
+    def __init__(self, app: FastAPI, port: int):
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"替身服务启动超时（端口 {self.port}）")
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+class _WebSocketThread:
+    """在后台线程的事件循环中运行讯飞WebSocket替身"""
+
+    def __init__(self, config: FakeUpstreamConfig, port: int):
+        self.config = config
+        self.port = port
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._server = None
+
+    def start(self):
+        self.thread.start()
+
+        async def serve():
+            return await websockets.serve(
+                lambda ws, *args: _xunfei_handler(ws, self.config), "127.0.0.1", self.port
+            )
+
+        self._server = asyncio.run_coroutine_threadsafe(serve(), self.loop).result(timeout=10)
+
+    def stop(self):
+        async def close():
+            self._server.close()
+            await self._server.wait_closed()
+
+        if self._server is not None:
+            asyncio.run_coroutine_threadsafe(close(), self.loop).result(timeout=5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+
+
+class FakeUpstreams:
+    """
+    启动全部替身服务
+
+    用法：
+        with FakeUpstreams(FakeUpstreamConfig(ttft_ms=200)) as upstreams:
+            env = upstreams.env()
+    """
+
+    def __init__(self, config: Optional[FakeUpstreamConfig] = None):
+        self.config = config or FakeUpstreamConfig()
+        self.llm_port = _free_port()
+        self.map_port = _free_port()
+        self.asr_port = _free_port()
+        self._llm = _ServerThread(create_llm_app(self.config), self.llm_port)
+        self._map = _ServerThread(create_baidu_app(self.config), self.map_port)
+        self._asr = _WebSocketThread(self.config, self.asr_port)
+
+    def start(self) -> "FakeUpstreams":
+        self._llm.start()
+        self._map.start()
+        self._asr.start()
+        return self
+
+    def stop(self):
+        self._llm.stop()
+        self._map.stop()
+        self._asr.stop()
+
+    def __enter__(self) -> "FakeUpstreams":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def env(self) -> Dict[str, str]:
+        """把应用指向替身服务的环境变量（覆盖 app.core.config 中的同名配置）"""
+        return {
+            "DEEPSEEK_API_KEY": "fake-key",
+            "DEEPSEEK_ENDPOINT": f"http://127.0.0.1:{self.llm_port}/v1",
+            # 不配置阿里云Key，路由只会选择DeepSeek（即替身）
+            "ALIYUN_LLM_API_KEY": "",
+            "BAIDU_MAP_AK": "fake-ak",
+            "BAIDU_MAP_BASE_URL": f"http://127.0.0.1:{self.map_port}",
+            "XFYUN_APP_ID": "fake-appid",
+            "XFYUN_API_KEY": "fake-key",
+            "XFYUN_API_SECRET": "fake-secret",
+            "XFYUN_ASR_URL": f"ws://127.0.0.1:{self.asr_port}/v2/iat",
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动DeepSeek/百度地图/讯飞的本地替身服务")
+    parser.add_argument("--ttft-ms", type=float, default=300.0)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--map-latency-ms", type=float, default=80.0)
+    args = parser.parse_args()
+
+    config = FakeUpstreamConfig(
+        ttft_ms=args.ttft_ms,
+        tokens_per_second=args.tokens_per_second,
+        map_latency_ms=args.map_latency_ms
+    )
+    with FakeUpstreams(config) as upstreams:
+        for key, value in upstreams.env().items():
+            print(f"{key}={value}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
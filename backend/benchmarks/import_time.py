@@ -0,0 +1,101 @@
+"""
+启动导入耗时检查
+
+在新的解释器中用 `python -X importtime -c "import app.main"` 导入应用，重复多次取最快的一次
+（排除磁盘缓存和机器抖动），输出 app.main 的总导入耗时、累计耗时最高的模块，并检查：
+- 总耗时不超过预算（默认 IMPORT_BUDGET_MS）
+- LAZY_MODULES 中的模块没有在启动时被导入（Agent、百度地图工具、Pillow等应在首次使用时加载）
+
+任一项不满足时退出码为1，可以在CI中运行。
+
+    cd backend
+    python -m benchmarks.import_time --runs 5 --top 20
+    python -m benchmarks.import_time --budget-ms 2500
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# 导入 app.main 的耗时预算（毫秒）。在开发机上约为1.8秒，主要是 FastAPI/pydantic 模型与
+# SQLAlchemy；留出余量以容纳CI机器的波动，新增的重量级依赖应在首次使用时再导入
+IMPORT_BUDGET_MS = 3000
+
+# 不应在启动时导入的模块
+LAZY_MODULES = (
+    "app.agents.trip_planner_agent",
+    "app.agents.simple_trip_agent",
+    "app.agents.budget_analyzer_agent",
+    "app.agents.chat_assistant_agent",
+    "app.utils.baidu_map_tools",
+    "app.utils.intent_matcher",
+    "requests",
+    "PIL",
+    "pydub",
+)
+
+
+def parse_importtime(stderr: str) -> Dict[str, Tuple[int, int]]:
+    """解析 -X importtime 的输出，返回 {模块: (自身耗时us, 累计耗时us)}"""
+    modules: Dict[str, Tuple[int, int]] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def measure(runs: int) -> Dict[str, Tuple[int, int]]:
+    """在子进程中导入 app.main，返回最快一次的模块耗时"""
+    best: Dict[str, Tuple[int, int]] = {}
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import app.main"],
+            capture_output=True, text=True, env=env, check=True
+        )
+        modules = parse_importtime(result.stderr)
+        if not best or modules["app.main"][1] < best["app.main"][1]:
+            best = modules
+    return best
+
+
+def report(modules: Dict[str, Tuple[int, int]], budget_ms: float, top: int) -> Dict[str, object]:
+    total_ms = modules["app.main"][1] / 1000
+    slowest: List[Tuple[str, Tuple[int, int]]] = sorted(
+        modules.items(), key=lambda item: item[1][0], reverse=True
+    )[:top]
+    eager = [name for name in LAZY_MODULES if name in modules]
+    return {
+        "total_ms": round(total_ms, 1),
+        "budget_ms": budget_ms,
+        "within_budget": total_ms <= budget_ms,
+        "eager_lazy_modules": eager,
+        "slowest_self_ms": {name: round(self_us / 1000, 1) for name, (self_us, _) in slowest},
+        "app_modules_ms": {
+            name: round(cumulative_us / 1000, 1)
+            for name, (_, cumulative_us) in sorted(modules.items(), key=lambda item: item[1][1], reverse=True)
+            if name.startswith("app.") and cumulative_us >= 20000
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动导入耗时检查")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15, help="列出自身耗时最高的模块数")
+    args = parser.parse_args()
+
+    result = report(measure(args.runs), args.budget_ms, args.top)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if not result["within_budget"] or result["eager_lazy_modules"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+意图匹配微基准
+
+比较三种方式在不同长度AI回复上的耗时：
+- legacy: 改造前 TripPlannerAgent/BudgetAnalyzerAgent 中逐组 any(keyword in text) 的判断
+- naive_all: 用 in 逐个检查匹配器中的全部关键词（意图、分类和所有城市）
+- matcher: intent_matcher 一次扫描得到全部命中及位置
+
+    cd backend
+    python -m benchmarks.intent_matcher_bench --sizes 1000,5000,20000,100000
+"""
+
+import argparse
+import json
+import random
+import time
+from typing import Callable, Dict, List
+
+from app.utils.intent_matcher import intent_matcher
+from benchmarks.load_test import _ms
+
+LEGACY_TOOL_KEYWORDS = [
+    "搜索", "查找", "推荐", "附近", "价格", "费用", "路线", "距离",
+    "天气", "酒店", "餐厅", "景点", "门票", "交通", "北京", "上海", "广州"
+]
+LEGACY_GROUPS = [
+    ["景点", "餐厅", "酒店", "推荐", "附近"],
+    ["路线", "距离", "时间", "怎么去"],
+    ["景点", "旅游", "游玩", "观光"],
+    ["价格", "费用", "预算", "花费", "成本", "多少钱", "贵不贵", "酒店", "机票", "门票", "交通费", "餐饮费"],
+    ["酒店", "住宿"],
+    ["机票", "航班", "交通"],
+    ["门票", "景点", "游玩"],
+]
+LEGACY_CITIES = ["北京", "上海", "广州", "深圳", "杭州", "南京", "成都", "西安", "武汉", "重庆"]
+
+# 不包含任何关键词的填充文本，模拟最坏情况（any()需要扫描全文）
+FILLER = "第一天上午出发中午吃饭下午散步晚上休息第二天早起看日出然后慢慢往回走沿途拍照留念"
+
+
+def make_response(size: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    chars = list(FILLER)
+    text = "".join(rng.choice(chars) for _ in range(size - 10))
+    # 关键词放在末尾
+    return text + "推荐附近的景点餐厅"
+
+
+def legacy(user_input: str, response: str) -> bool:
+    hit = any(k in user_input for k in LEGACY_TOOL_KEYWORDS) or any(k in response for k in LEGACY_TOOL_KEYWORDS)
+    for group in LEGACY_GROUPS:
+        any(k in user_input for k in group)
+    keyword = user_input
+    for city in LEGACY_CITIES:
+        keyword = keyword.replace(city, "")
+    return hit
+
+
+def naive_all(patterns: List[str]) -> Callable[[str, str], bool]:
+    def run(user_input: str, response: str) -> bool:
+        hits = [p for p in patterns if p in user_input]
+        hits += [p for p in patterns if p in response]
+        return bool(hits)
+    return run
+
+
+def matcher(user_input: str, response: str) -> bool:
+    # 与Agent中相同的调用方式，但绕过缓存以测量真实扫描耗时
+    user = intent_matcher._scan(user_input)
+    return user.has("tool") or intent_matcher._scan(response).has("tool")
+
+
+def measure(func: Callable[[str, str], bool], user_input: str, response: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func(user_input, response)
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best
+
+
+def run(sizes: List[int], repeat: int) -> List[Dict[str, object]]:
+    patterns = sorted({pattern for pattern, _ in intent_matcher.patterns})
+    candidates = {"legacy": legacy, "naive_all": naive_all(patterns), "matcher": matcher}
+    # 用户输入不含关键词，各方式都需要扫描整段回复
+    user_input = "帮我安排一下周末"
+    rows = []
+    for size in sizes:
+        response = make_response(size)
+        row: Dict[str, object] = {"response_chars": size, "patterns": len(patterns)}
+        for name, func in candidates.items():
+            assert func(user_input, response)
+            row[f"{name}_ms"] = _ms(measure(func, user_input, response, repeat))
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="意图匹配微基准")
+    parser.add_argument("--sizes", default="1000,5000,20000,100000", help="AI回复长度（字符），逗号分隔")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    print(json.dumps(run(sizes, args.repeat), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
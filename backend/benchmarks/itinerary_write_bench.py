@@ -0,0 +1,176 @@
+"""
+行程批量写入基准
+
+对比 7 天 × 8 个节点的两种写入方式：
+- 创建行程：逐天 add/flush + 逐个 add（改造前的 create_trip）vs ItineraryService.insert_itineraries
+- 智能体逐个添加节点：每个节点查行程、查当天安排、count、提交（改造前的 add_itinerary_item）
+  vs 一次 add_itinerary_items
+
+统计耗时与发往数据库的语句数（含 COMMIT）。默认使用临时 SQLite 文件，
+可通过 --database-url 指向 PostgreSQL 以观察网络往返的影响。
+
+    cd backend
+    python -m benchmarks.itinerary_write_bench --days 7 --items 8 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import uuid
+from typing import Any, Callable, Dict, List
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.models import Base
+from app.models.trip import Itinerary, ItineraryItem, Trip
+from app.models.user import User
+from app.services.itinerary_service import ItineraryService
+from benchmarks.load_test import _ms
+
+
+def make_days(days: int, items: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "day_number": day,
+            "title": f"第 {day} 天",
+            "items": [
+                {
+                    "name": f"地点{day}-{index}",
+                    "category": "attraction",
+                    "address": f"测试路{index}号",
+                    "coordinates": {"lat": 30.0 + index / 100, "lng": 120.0 + day / 100},
+                    "start_time": f"{8 + index:02d}:00",
+                    "estimated_duration": 60,
+                    "estimated_cost": 50.0
+                }
+                for index in range(items)
+            ]
+        }
+        for day in range(1, days + 1)
+    ]
+
+
+def new_trip(db: Session, user_id: str) -> Trip:
+    trip = Trip(id=str(uuid.uuid4()), user_id=user_id, title="基准行程", destination="杭州")
+    db.add(trip)
+    db.flush()
+    return trip
+
+
+def legacy_create(db: Session, user_id: str, days: List[Dict[str, Any]]):
+    trip = new_trip(db, user_id)
+    for data in days:
+        itinerary = Itinerary(trip_id=trip.id, day_number=data["day_number"], title=data["title"])
+        db.add(itinerary)
+        db.flush()
+        for index, item in enumerate(data["items"]):
+            db.add(ItineraryItem(itinerary_id=itinerary.id, order_index=index, **item))
+    db.commit()
+
+
+def bulk_create(db: Session, user_id: str, days: List[Dict[str, Any]]):
+    trip = new_trip(db, user_id)
+    ItineraryService(db).insert_itineraries(trip.id, days)
+    db.commit()
+
+
+def legacy_tool(db: Session, user_id: str, days: List[Dict[str, Any]]):
+    trip_id = new_trip(db, user_id).id
+    db.commit()
+    for data in days:
+        for item in data["items"]:
+            db.query(Trip).filter(Trip.id == trip_id, Trip.user_id == user_id).first()
+            itinerary = db.query(Itinerary).filter(
+                Itinerary.trip_id == trip_id, Itinerary.day_number == data["day_number"]
+            ).first()
+            if not itinerary:
+                itinerary = Itinerary(id=str(uuid.uuid4()), trip_id=trip_id, day_number=data["day_number"])
+                db.add(itinerary)
+                db.flush()
+            count = db.query(ItineraryItem).filter(ItineraryItem.itinerary_id == itinerary.id).count()
+            db.add(ItineraryItem(id=str(uuid.uuid4()), itinerary_id=itinerary.id, order_index=count, **item))
+            db.commit()
+
+
+def bulk_tool(db: Session, user_id: str, days: List[Dict[str, Any]]):
+    trip_id = new_trip(db, user_id).id
+    db.commit()
+    items = [{**item, "day_number": data["day_number"]} for data in days for item in data["items"]]
+    db.query(Trip.id).filter(Trip.id == trip_id, Trip.user_id == user_id).first()
+    ItineraryService(db).add_items(trip_id, items)
+    db.commit()
+
+
+SCENARIOS: Dict[str, Callable[[Session, str, List[Dict[str, Any]]], None]] = {
+    "create_trip_legacy": legacy_create,
+    "create_trip_bulk": bulk_create,
+    "agent_items_legacy": legacy_tool,
+    "agent_items_bulk": bulk_tool,
+}
+
+
+def run(database_url: str, days: int, items: int, repeat: int) -> List[Dict[str, Any]]:
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    statements = {"count": 0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_statement(*args):
+        statements["count"] += 1
+
+    @event.listens_for(engine, "commit")
+    def count_commit(*args):
+        statements["count"] += 1
+
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        user = User(id=str(uuid.uuid4()), email=f"bench_{uuid.uuid4().hex[:8]}@example.com",
+                    name="bench", password_hash="x")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+
+    payload = make_days(days, items)
+    rows = []
+    for name, scenario in SCENARIOS.items():
+        durations = []
+        for _ in range(repeat):
+            with factory() as db:
+                # 预热连接，不计入语句数
+                db.connection()
+                statements["count"] = 0
+                start = time.perf_counter()
+                scenario(db, user_id, payload)
+                durations.append(time.perf_counter() - start)
+        rows.append({
+            "scenario": name,
+            "items": days * items,
+            "statements": statements["count"],
+            "best_ms": _ms(min(durations)),
+            "mean_ms": _ms(sum(durations) / len(durations))
+        })
+    engine.dispose()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="行程批量写入基准")
+    parser.add_argument("--database-url", default=None, help="默认使用临时SQLite文件")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--items", type=int, default=8, help="每天的节点数")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.database_url:
+        print(json.dumps(run(args.database_url, args.days, args.items, args.repeat), ensure_ascii=False, indent=2))
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        print(json.dumps(run(url, args.days, args.items, args.repeat), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,481 @@
+"""
+压测脚本
+
+启动上游替身服务和一个独立的应用进程（临时SQLite数据库），按递增并发度压测
+Agent流式对话、地图、行程和预算接口，输出 RPS、p50/p95/p99 延迟和事件循环延迟。
+
+结果写入 JSON 文件，可与历史结果对比发现性能回退：
+
+    cd backend
+    python -m benchmarks.load_test --concurrency 1,5,10,25 --duration 15
+    python -m benchmarks.load_test --compare benchmarks/results/baseline.json --fail-on-regression
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.fake_upstreams import FakeUpstreamConfig, FakeUpstreams, _free_port
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+
+@dataclass
+class Scenario:
+    """一个压测场景"""
+    name: str
+    method: str
+    path: str
+    body: Optional[Callable[[int], Dict[str, Any]]] = None
+    files: Optional[Callable[[int], Dict[str, Any]]] = None
+    stream: bool = False
+
+
+@dataclass
+class ScenarioResult:
+    """一个场景在某个并发度下的统计"""
+    latencies: List[float] = field(default_factory=list)
+    first_event: List[float] = field(default_factory=list)
+    errors: int = 0
+    error_samples: List[str] = field(default_factory=list)
+
+    def record_error(self, message: str):
+        self.errors += 1
+        if len(self.error_samples) < 5:
+            self.error_samples.append(message[:200])
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """最近秩百分位"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+# ===== 事件循环延迟（从 /metrics 抓取直方图） =====
+
+_BUCKET_RE = re.compile(r'^event_loop_lag_seconds_bucket\{le="([^"]+)"\} ([0-9.e+-]+)$')
+_SUM_RE = re.compile(r'^event_loop_lag_seconds_(sum|count) ([0-9.e+-]+)$')
+
+
+def parse_loop_lag(metrics_text: str) -> Dict[str, Any]:
+    """解析 event_loop_lag_seconds 直方图的累计桶"""
+    buckets: Dict[float, float] = {}
+    totals = {"sum": 0.0, "count": 0.0}
+    for line in metrics_text.splitlines():
+        match = _BUCKET_RE.match(line)
+        if match:
+            buckets[float(match.group(1))] = float(match.group(2))
+            continue
+        match = _SUM_RE.match(line)
+        if match:
+            totals[match.group(1)] = float(match.group(2))
+    return {"buckets": buckets, **totals}
+
+
+def loop_lag_delta(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """两次抓取之间的事件循环延迟分布（百分位取所在桶的上界）"""
+    count = after["count"] - before["count"]
+    if count <= 0:
+        return {"samples": 0, "mean_ms": None, "p50_ms": None, "p95_ms": None, "p99_ms": None}
+    bounds = sorted(after["buckets"])
+    cumulative = [(le, after["buckets"][le] - before["buckets"].get(le, 0.0)) for le in bounds]
+
+    def bucket_upper(p: float) -> Optional[float]:
+        target = count * p / 100.0
+        for le, seen in cumulative:
+            if seen >= target:
+                return le
+        return None
+
+    result = {"samples": int(count), "mean_ms": _ms((after["sum"] - before["sum"]) / count)}
+    for p in (50, 95, 99):
+        upper = bucket_upper(p)
+        result[f"p{p}_ms"] = _ms(upper) if upper not in (None, float("inf")) else "inf"
+    return result
+
+
+# ===== 应用进程 =====
+
+class AppProcess:
+    """在子进程中运行应用，环境变量指向替身服务与临时数据库"""
+
+    def __init__(self, upstream_env: Dict[str, str], workdir: str):
+        self.port = _free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.workdir = workdir
+        self.env = {
+            **os.environ,
+            **upstream_env,
+            "PYTHONPATH": BACKEND_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""),
+            "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+            "REDIS_URL": "redis://localhost:6379/0",
+            "SECRET_KEY": "benchmark-secret",
+            "DEBUG": "false",
+            "ENVIRONMENT": "benchmark",
+            "EVENT_LOOP_LAG_MONITOR": "true",
+            "EVENT_LOOP_LAG_INTERVAL": "0.1",
+            "TRACE_EXPORT_FILE": "",
+        }
+        self.log_path = os.path.join(workdir, "app.log")
+        self.process: Optional[subprocess.Popen] = None
+
+    def start(self):
+        # 应用启动时不建表，先在独立进程中用模型元数据建表
+        subprocess.run(
+            [sys.executable, "-c",
+             "from app.core.database import engine; from app.models import Base; "
+             "Base.metadata.create_all(bind=engine)"],
+            cwd=self.workdir, env=self.env, check=True, stdout=subprocess.DEVNULL
+        )
+        log = open(self.log_path, "w")
+        # 工作目录设为临时目录，避免读取开发环境的 .env 和写入 uploads/
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app",
+             "--host", "127.0.0.1", "--port", str(self.port), "--log-level", "warning"],
+            cwd=self.workdir, env=self.env, stdout=log, stderr=subprocess.STDOUT
+        )
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"应用进程启动失败，日志见 {self.log_path}")
+            try:
+                if httpx.get(f"{self.base_url}/health", timeout=1).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"应用进程启动超时，日志见 {self.log_path}")
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+# ===== 场景 =====
+
+_KEYWORDS = ["故宫", "天坛", "颐和园", "长城", "南锣鼓巷", "798艺术区", "北海公园", "景山公园"]
+
+
+def _silence_wav(path: str, seconds: float = 1.0):
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(16000)
+        f.writeframes(b"\x00\x00" * int(16000 * seconds))
+
+
+def build_scenarios(trip_id: str, workdir: str, names: Optional[List[str]]) -> List[Scenario]:
+    scenarios = [
+        Scenario("agent_chat_stream", "POST", "/api/v1/chat/agents/chat-assistant/stream",
+                 body=lambda i: {"message": "推荐几个北京的景点"}, stream=True),
+        Scenario("agent_trip_planner_stream", "POST", "/api/v1/chat/agents/trip-planner/stream",
+                 body=lambda i: {"message": "帮我规划北京三日游", "context": {"tripId": trip_id}}, stream=True),
+        Scenario("agent_simple_trip_stream", "POST", "/api/v1/chat/agents/simple-trip-planner/stream",
+                 body=lambda i: {"message": "北京有什么好玩的景点"}, stream=True),
+        Scenario("map_poi_search", "POST", "/api/v1/map/poi/search",
+                 body=lambda i: {"keyword": _KEYWORDS[i % len(_KEYWORDS)], "city": "北京"}),
+        Scenario("map_geocode", "POST", "/api/v1/map/geocode",
+                 body=lambda i: {"address": _KEYWORDS[i % len(_KEYWORDS)], "city": "北京"}),
+        Scenario("map_route", "POST", "/api/v1/map/route",
+                 body=lambda i: {
+                     "origin": {"lat": 39.9163, "lng": 116.3972},
+                     "destination": {"lat": 39.8822 + (i % 10) * 0.001, "lng": 116.4066},
+                     "mode": "driving"
+                 }),
+        Scenario("trips_list", "GET", "/api/v1/trips/"),
+        Scenario("trip_detail", "GET", f"/api/v1/trips/{trip_id}"),
+        Scenario("budget_summary", "GET", f"/api/v1/budgets/trips/{trip_id}/budget"),
+        Scenario("budget_expenses", "GET", f"/api/v1/budgets/trips/{trip_id}/expenses"),
+        Scenario("budget_expense_stats", "GET", f"/api/v1/budgets/trips/{trip_id}/expenses/stats"),
+    ]
+    # 语音识别需要ffmpeg转码
+    if shutil.which("ffmpeg"):
+        wav_path = os.path.join(workdir, "silence.wav")
+        _silence_wav(wav_path)
+        with open(wav_path, "rb") as f:
+            audio = f.read()
+        scenarios.append(Scenario(
+            "voice_asr", "POST", "/api/v1/voice/asr",
+            files=lambda i: {"audio_file": ("silence.wav", audio, "audio/wav")}
+        ))
+    if names:
+        scenarios = [s for s in scenarios if s.name in names]
+    return scenarios
+
+
+async def seed_data(client: httpx.AsyncClient) -> Dict[str, str]:
+    """注册压测用户并创建一个带行程和费用的旅行"""
+    email = f"bench_{int(time.time())}@example.com"
+    response = await client.post("/api/v1/auth/register", json={
+        "email": email, "password": "benchmark123", "name": "Benchmark"
+    })
+    response.raise_for_status()
+    token = response.json()["access_token"]
+    client.headers["Authorization"] = f"Bearer {token}"
+
+    response = await client.post("/api/v1/trips/", json={
+        "title": "北京三日游",
+        "destination": "北京",
+        "duration_days": 3,
+        "budget_total": 5000,
+        "itineraries": [
+            {
+                "day_number": day,
+                "title": f"第{day}天",
+                "items": [
+                    {"name": _KEYWORDS[(day * 3 + i) % len(_KEYWORDS)], "category": "attraction",
+                     "coordinates": {"lat": 39.9 + i * 0.01, "lng": 116.4 + i * 0.01}}
+                    for i in range(4)
+                ]
+            }
+            for day in range(1, 4)
+        ]
+    })
+    response.raise_for_status()
+    trip_id = response.json()["id"]
+
+    for i, category in enumerate(["food", "transportation", "attraction", "shopping"] * 5):
+        response = await client.post(f"/api/v1/budgets/trips/{trip_id}/expenses", json={
+            "amount": 50 + i * 10, "category": category, "description": f"压测费用{i}"
+        })
+        response.raise_for_status()
+    return {"token": token, "trip_id": trip_id}
+
+
+async def _one_request(client: httpx.AsyncClient, scenario: Scenario, index: int, result: ScenarioResult):
+    kwargs: Dict[str, Any] = {}
+    if scenario.body:
+        kwargs["json"] = scenario.body(index)
+    if scenario.files:
+        kwargs["files"] = scenario.files(index)
+    start = time.perf_counter()
+    try:
+        if scenario.stream:
+            async with client.stream(scenario.method, scenario.path, **kwargs) as response:
+                first = None
+                run_error = None
+                async for chunk in response.aiter_bytes():
+                    if first is None:
+                        first = time.perf_counter() - start
+                    # Agent内部异常以RUN_ERROR事件返回，HTTP状态仍是200
+                    if run_error is None and b'"RUN_ERROR"' in chunk:
+                        run_error = chunk.decode("utf-8", errors="replace")
+                if response.status_code != 200:
+                    result.record_error(f"HTTP {response.status_code}")
+                    return
+                if run_error is not None:
+                    result.record_error(f"RUN_ERROR: {run_error}")
+                    return
+                if first is not None:
+                    result.first_event.append(first)
+        else:
+            response = await client.request(scenario.method, scenario.path, **kwargs)
+            if response.status_code >= 400:
+                result.record_error(f"HTTP {response.status_code}: {response.text}")
+                return
+    except httpx.HTTPError as e:
+        result.record_error(f"{type(e).__name__}: {e}")
+        return
+    result.latencies.append(time.perf_counter() - start)
+
+
+async def run_level(
+    client: httpx.AsyncClient, scenario: Scenario, concurrency: int, duration: float
+) -> Dict[str, Any]:
+    """在固定并发度下持续压测 duration 秒（闭环：每个worker完成一个请求后立即发下一个）"""
+    result = ScenarioResult()
+    lag_before = parse_loop_lag((await client.get("/metrics")).text)
+    deadline = time.perf_counter() + duration
+    counter = iter(range(10 ** 9))
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            await _one_request(client, scenario, next(counter), result)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    lag_after = parse_loop_lag((await client.get("/metrics")).text)
+
+    total = len(result.latencies) + result.errors
+    return {
+        "scenario": scenario.name,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": total,
+        "errors": result.errors,
+        "error_rate": round(result.errors / total, 4) if total else 0.0,
+        "rps": round(len(result.latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": _ms(percentile(result.latencies, 50)),
+        "p95_ms": _ms(percentile(result.latencies, 95)),
+        "p99_ms": _ms(percentile(result.latencies, 99)),
+        "first_event_p50_ms": _ms(percentile(result.first_event, 50)),
+        "first_event_p95_ms": _ms(percentile(result.first_event, 95)),
+        "event_loop_lag": loop_lag_delta(lag_before, lag_after),
+        "error_samples": result.error_samples,
+    }
+
+
+# ===== 回归对比 =====
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    与基线结果对比，返回回退描述列表
+
+    p95 延迟上升或 RPS 下降超过 threshold（百分比）视为回退。
+    """
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline.get("results", [])}
+    regressions = []
+    print(f"\n{'场景':<28}{'并发':>6}{'p95(ms)':>12}{'基线':>10}{'变化':>9}{'RPS':>10}{'基线':>10}{'变化':>9}")
+    for row in current["results"]:
+        old = previous.get((row["scenario"], row["concurrency"]))
+        if not old:
+            continue
+        p95_change = _change(row["p95_ms"], old["p95_ms"])
+        rps_change = _change(row["rps"], old["rps"])
+        print(f"{row['scenario']:<28}{row['concurrency']:>6}"
+              f"{_fmt(row['p95_ms']):>12}{_fmt(old['p95_ms']):>10}{_fmt_pct(p95_change):>9}"
+              f"{_fmt(row['rps']):>10}{_fmt(old['rps']):>10}{_fmt_pct(rps_change):>9}")
+        if p95_change is not None and p95_change > threshold:
+            regressions.append(f"{row['scenario']}@{row['concurrency']}: p95 +{p95_change:.1f}%")
+        if rps_change is not None and rps_change < -threshold:
+            regressions.append(f"{row['scenario']}@{row['concurrency']}: RPS {rps_change:.1f}%")
+    return regressions
+
+
+def _change(new: Optional[float], old: Optional[float]) -> Optional[float]:
+    if new is None or not old:
+        return None
+    return (new - old) / old * 100
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+def _fmt_pct(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:+.1f}%"
+
+
+def print_summary(results: List[Dict[str, Any]]):
+    print(f"\n{'场景':<28}{'并发':>6}{'请求':>8}{'错误':>6}{'RPS':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'loop p95':>10}")
+    for row in results:
+        print(f"{row['scenario']:<28}{row['concurrency']:>6}{row['requests']:>8}{row['errors']:>6}"
+              f"{_fmt(row['rps']):>9}{_fmt(row['p50_ms']):>9}{_fmt(row['p95_ms']):>9}{_fmt(row['p99_ms']):>9}"
+              f"{str(row['event_loop_lag']['p95_ms']):>10}")
+
+
+async def run(args) -> Dict[str, Any]:
+    config = FakeUpstreamConfig(
+        ttft_ms=args.ttft_ms,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        map_latency_ms=args.map_latency_ms,
+        map_jitter_ms=args.map_jitter_ms,
+    )
+    levels = [int(v) for v in args.concurrency.split(",") if v.strip()]
+    names = [v.strip() for v in args.scenarios.split(",")] if args.scenarios else None
+
+    with tempfile.TemporaryDirectory(prefix="bench_") as workdir, FakeUpstreams(config) as upstreams:
+        app = AppProcess(upstreams.env(), workdir)
+        app.start()
+        try:
+            limits = httpx.Limits(max_connections=max(levels) + 10, max_keepalive_connections=max(levels) + 10)
+            async with httpx.AsyncClient(base_url=app.base_url, timeout=args.timeout, limits=limits) as client:
+                seeded = await seed_data(client)
+                scenarios = build_scenarios(seeded["trip_id"], workdir, names)
+                results = []
+                for scenario in scenarios:
+                    for level in levels:
+                        print(f"▶ {scenario.name} 并发 {level} ...", flush=True)
+                        results.append(await run_level(client, scenario, level, args.duration))
+        finally:
+            app.stop()
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "concurrency_levels": levels,
+            "duration_s": args.duration,
+            "upstream": {
+                "ttft_ms": config.ttft_ms,
+                "tokens_per_second": config.tokens_per_second,
+                "completion_tokens": config.completion_tokens,
+                "map_latency_ms": config.map_latency_ms,
+                "map_jitter_ms": config.map_jitter_ms,
+            },
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后端压测")
+    parser.add_argument("--concurrency", default="1,5,10,25", help="逗号分隔的并发度，依次递增")
+    parser.add_argument("--duration", type=float, default=10.0, help="每个并发度的持续时间（秒）")
+    parser.add_argument("--scenarios", default="", help="只运行指定场景（逗号分隔），默认全部")
+    parser.add_argument("--timeout", type=float, default=60.0, help="单个请求超时（秒）")
+    parser.add_argument("--ttft-ms", type=float, default=300.0, help="LLM替身首字延迟")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="LLM替身输出速度")
+    parser.add_argument("--completion-tokens", type=int, default=60, help="LLM替身每次回复的token数")
+    parser.add_argument("--map-latency-ms", type=float, default=80.0, help="百度地图替身基础延迟")
+    parser.add_argument("--map-jitter-ms", type=float, default=20.0, help="百度地图替身抖动均值")
+    parser.add_argument("--output", default="", help="结果JSON路径，默认 benchmarks/results/load_test_<时间>.json")
+    parser.add_argument("--compare", default="", help="与之对比的基线结果JSON")
+    parser.add_argument("--threshold", type=float, default=10.0, help="回退判定阈值（百分比）")
+    parser.add_argument("--fail-on-regression", action="store_true", help="发现回退时以非零状态退出")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_summary(report["results"])
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load_test_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print("\n⚠️ 性能回退：")
+            for line in regressions:
+                print(f"  - {line}")
+            if args.fail_on_regression:
+                sys.exit(1)
+        else:
+            print("\n✅ 未发现性能回退")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+回放Agent transcript并测量耗时
+
+transcript由 TRANSCRIPT_RECORD_ENABLED=true 时的真实运行记录，回放时LLM与百度地图的响应
+来自文件，耗时只反映本地的解析、事件编码和工具调度（speed>0时包含按比例压缩的上游时间）。
+
+    cd backend
+    python -m benchmarks.replay_transcript logs/transcripts/run_xxx.json --speed 0 --repeat 20
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List
+
+from app.core.transcript import TranscriptPlayer, replaying
+from app.services.agent_service import agent_service
+from benchmarks.load_test import percentile, _ms
+
+
+async def replay_once(transcript: Dict[str, Any], speed: float) -> Dict[str, Any]:
+    inputs = transcript.get("inputs", {})
+    player = TranscriptPlayer(transcript, speed)
+    events = 0
+    first_event = None
+    start = time.perf_counter()
+    with replaying(player):
+        async for _ in agent_service.run_agent(
+            transcript["agent_id"],
+            inputs.get("user_input", ""),
+            inputs.get("system_prompt"),
+            inputs.get("history") or [],
+            None,
+            inputs.get("context")
+        ):
+            if first_event is None:
+                first_event = time.perf_counter() - start
+            events += 1
+    return {
+        "duration": time.perf_counter() - start,
+        "first_event": first_event,
+        "events": events,
+        **player.stats()
+    }
+
+
+async def run(path: str, speed: float, repeat: int) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        transcript = json.load(f)
+    runs: List[Dict[str, Any]] = [await replay_once(transcript, speed) for _ in range(repeat)]
+    durations = [r["duration"] for r in runs]
+    return {
+        "transcript": path,
+        "agent_id": transcript["agent_id"],
+        "recorded_duration_ms": _ms(transcript.get("duration")),
+        "speed": speed,
+        "repeat": repeat,
+        "p50_ms": _ms(percentile(durations, 50)),
+        "p95_ms": _ms(percentile(durations, 95)),
+        "max_ms": _ms(max(durations)),
+        "events": runs[-1]["events"],
+        # 回放与记录不一致（Agent行为变化）时这两项不为0
+        "missed": sum(r["missed"] for r in runs),
+        "remaining": runs[-1]["remaining"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放Agent transcript")
+    parser.add_argument("transcript", help="transcript文件路径")
+    parser.add_argument("--speed", type=float, default=0.0, help="时间压缩倍数：1为原始时间，0为不等待")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.transcript, args.speed, args.repeat)), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""
+gunicorn 配置（生产环境）
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+worker数、排空和指标相关的说明见 app/core/server.py。
+"""
+
+import os
+
+# 多进程指标目录必须在导入 prometheus_client 之前设置
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc")
+
+from app.core import server as _server  # noqa: E402
+from app.core.config import settings  # noqa: E402
+
+_server.prepare_metrics_dir()
+
+bind = f"{settings.HOST}:{settings.PORT}"
+workers = _server.default_workers()
+worker_class = "app.core.server.DrainingUvicornWorker"
+preload_app = True
+# SSE排空时间之外留出给应用shutdown事件的余量
+graceful_timeout = settings.SERVER_GRACEFUL_TIMEOUT
+keepalive = 5
+
+on_starting = _server.on_starting
+pre_fork = _server.pre_fork
+post_fork = _server.post_fork
+child_exit = _server.child_exit
@@ -38,7 +38,7 @@ def test_register():
         
         # 尝试注册
         print(f"\n🔄 开始注册...")
-        user = AuthService.register_user(db, test_user)
+        user = asyncio.run(AuthService.register_user(db, test_user))
         
         print(f"\n✅ 注册成功!")
         print(f"  用户ID: {user.id}")
@@ -81,7 +81,7 @@ def test_login(email, password):
         
         # 尝试登录
         print(f"\n🔄 开始登录...")
-        user = AuthService.authenticate_user(db, login_data)
+        user = asyncio.run(AuthService.authenticate_user(db, login_data))
         
         print(f"\n✅ 登录成功!")
         print(f"  用户ID: {user.id}")
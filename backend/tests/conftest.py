@@ -1,11 +1,14 @@
 """Pytest configuration and fixtures"""
 
+import json
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session
 from app.main import app
 from app.models.base import Base
+from app.core.config import settings
 from app.core.database import get_db
 
 # Test database URL (use SQLite for testing)
@@ -97,3 +100,14 @@ def registered_user(client: TestClient, test_user_data):
     response = client.post("/api/v1/auth/register", json=test_user_data)
     return response.json()
 
+
+@pytest.fixture
+def admin_user(registered_user, test_user_data, monkeypatch):
+    """
+    Registered user whose email is in the admin allow-list
+    
+    Returns:
+        Registration response with tokens and user info
+    """
+    monkeypatch.setattr(settings, "ADMIN_EMAILS", json.dumps([test_user_data["email"]]))
+    return registered_user
@@ -0,0 +1,140 @@
+"""
+头像上传测试
+"""
+
+import io
+import os
+from concurrent.futures import Executor, Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import ImmutableStaticFiles
+from app.services import avatar_service
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image  # noqa: E402
+
+
+def _headers(registered_user):
+    return {"Authorization": f"Bearer {registered_user['access_token']}"}
+
+
+def _png(width=800, height=400, color=(200, 30, 30)):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def avatar_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(avatar_service, "AVATAR_DIR", str(tmp_path))
+    yield tmp_path
+    avatar_service.shutdown_avatar_executor()
+
+
+def _upload(client, registered_user, content, name="a.png", content_type="image/png"):
+    return client.post(
+        "/api/v1/auth/upload-avatar",
+        headers=_headers(registered_user),
+        files={"file": (name, content, content_type)}
+    )
+
+
+class TestAvatarUpload:
+    """上传接口"""
+
+    def test_resize_and_dedup(self, client, registered_user, avatar_dir):
+        content = _png()
+        response = _upload(client, registered_user, content)
+        assert response.status_code == 200
+        result = response.json()
+        assert result["avatar_url"].startswith("/static/avatars/") and result["avatar_url"].endswith(".webp")
+        assert result["thumbnail_url"] == result["avatar_url"].replace(".webp", "_thumb.webp")
+
+        files = sorted(os.listdir(avatar_dir))
+        assert len(files) == 2
+        with Image.open(avatar_dir / os.path.basename(result["avatar_url"])) as avatar:
+            assert (avatar.format, avatar.size) == ("WEBP", (settings.AVATAR_SIZE, settings.AVATAR_SIZE))
+        with Image.open(avatar_dir / os.path.basename(result["thumbnail_url"])) as thumbnail:
+            assert thumbnail.size == (settings.AVATAR_THUMBNAIL_SIZE, settings.AVATAR_THUMBNAIL_SIZE)
+
+        me = client.get("/api/v1/auth/me", headers=_headers(registered_user)).json()
+        assert me["avatar_url"] == result["avatar_url"]
+
+        # 相同内容不再处理，文件名不变
+        assert _upload(client, registered_user, content, name="copy.png").json() == result
+        assert sorted(os.listdir(avatar_dir)) == files
+        assert _upload(client, registered_user, _png(color=(0, 0, 255))).json()["avatar_url"] != result["avatar_url"]
+
+    def test_rejects_large_and_invalid_files(self, client, registered_user, avatar_dir, monkeypatch):
+        monkeypatch.setattr(settings, "AVATAR_MAX_BYTES", 1024)
+        assert _upload(client, registered_user, b"\x89PNG" + b"0" * 2048).status_code == 413
+
+        monkeypatch.setattr(settings, "AVATAR_MAX_BYTES", 5 * 1024 * 1024)
+        assert _upload(client, registered_user, b"not an image").status_code == 400
+        assert _upload(client, registered_user, b"text", name="a.txt", content_type="text/plain").status_code == 400
+        assert os.listdir(avatar_dir) == []
+
+
+class BrokenExecutor(Executor):
+    """工作进程已崩溃的进程池"""
+
+    def __init__(self, *args, **kwargs):
+        self.shut_down = False
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_exception(BrokenProcessPool("worker died"))
+        return future
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        self.shut_down = True
+
+
+class TestBrokenPool:
+    """处理进程崩溃后恢复"""
+
+    def test_broken_pool_replaced(self, client, registered_user, avatar_dir, monkeypatch):
+        broken = BrokenExecutor()
+        monkeypatch.setattr(avatar_service, "_executor", broken)
+        assert _upload(client, registered_user, _png()).status_code == 200
+        assert broken.shut_down and avatar_service._executor is not broken
+
+    def test_repeated_crash_returns_500_then_recovers(self, client, registered_user, avatar_dir, monkeypatch):
+        monkeypatch.setattr(avatar_service, "ProcessPoolExecutor", BrokenExecutor)
+        assert _upload(client, registered_user, _png()).status_code == 500
+        assert avatar_service._executor is None
+
+        monkeypatch.undo()
+        monkeypatch.setattr(avatar_service, "AVATAR_DIR", str(avatar_dir))
+        assert _upload(client, registered_user, _png()).status_code == 200
+
+
+class TestProcessing:
+    """图片处理"""
+
+    def test_exif_orientation_and_alpha(self):
+        buffer = io.BytesIO()
+        image = Image.new("RGBA", (300, 100), (0, 0, 0, 0))
+        exif = image.getexif()
+        exif[0x0112] = 6  # 需顺时针旋转90度
+        image.save(buffer, format="PNG", exif=exif)
+
+        avatar, thumbnail = avatar_service.process_avatar(buffer.getvalue(), 64, 16)
+        with Image.open(io.BytesIO(avatar)) as result:
+            assert result.size == (64, 64) and result.mode == "RGBA"
+        with Image.open(io.BytesIO(thumbnail)) as result:
+            assert result.size == (16, 16)
+
+    def test_immutable_cache_headers(self, tmp_path):
+        (tmp_path / "abc.webp").write_bytes(b"webp")
+        static = FastAPI()
+        static.mount("/static/avatars", ImmutableStaticFiles(directory=str(tmp_path)))
+        response = TestClient(static).get("/static/avatars/abc.webp")
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == f"public, max-age={settings.AVATAR_CACHE_MAX_AGE}, immutable"
+        assert "cache-control" not in TestClient(static).get("/static/avatars/missing.webp").headers
@@ -0,0 +1,190 @@
+"""
+距离矩阵与路段估算测试
+"""
+
+import json
+
+import pytest
+import requests
+
+from app.agents.simple_trip_agent import SimpleTripAgent
+from app.utils.baidu_map_tools import BaiduMapTools
+from app.utils.distance_matrix import (
+    PairCache,
+    batch_pairs,
+    distance_cache,
+    estimate_pairs,
+    format_duration,
+    haversine_matrix,
+    to_array,
+)
+
+
+def _stops(count):
+    """北京城区内东西向排列的地点"""
+    return [{"lat": 39.91, "lng": round(116.30 + 0.01 * i, 5)} for i in range(count)]
+
+
+class FakeMatrixResponse:
+    status_code = 200
+    headers = {"content-type": "application/json"}
+
+    def __init__(self, data):
+        self.text = json.dumps(data)
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return json.loads(self.text)
+
+
+@pytest.fixture
+def matrix_api(monkeypatch):
+    """模拟百度 routematrix：距离为经度差×100000米，耗时为距离/10"""
+    distance_cache.clear()
+    calls = []
+    state = {"status": 0}
+
+    def fake_get(url, params, timeout):
+        calls.append((url, params))
+        origins = [tuple(map(float, p.split(","))) for p in params["origins"].split("|")]
+        destinations = [tuple(map(float, p.split(","))) for p in params["destinations"].split("|")]
+        assert len(origins) * len(destinations) <= 50
+        result = []
+        for o in origins:
+            for d in destinations:
+                meters = round(abs(d[1] - o[1]) * 100000)
+                result.append({
+                    "distance": {"text": "", "value": meters},
+                    "duration": {"text": "", "value": meters // 10}
+                })
+        return FakeMatrixResponse({"status": state["status"], "result": result})
+
+    monkeypatch.setattr(requests, "get", fake_get)
+    state["calls"] = calls
+    yield state
+    distance_cache.clear()
+
+
+class TestEstimator:
+    """本地估算测试"""
+
+    def test_haversine_matrix(self):
+        # 经度差0.01度、纬度39.91处约854米
+        matrix = haversine_matrix(to_array(_stops(3)), to_array(_stops(2)))
+        assert matrix.shape == (3, 2)
+        assert matrix[0, 0] == 0
+        assert matrix[0, 1] == pytest.approx(854, rel=0.01)
+
+    def test_mode_speeds(self):
+        origins, destinations = to_array(_stops(1)), to_array([{"lat": 39.91, "lng": 116.35}])
+        walk_distance, walk = estimate_pairs(origins, destinations, "walking")
+        _, drive = estimate_pairs(origins, destinations, "driving")
+        _, mixed = estimate_pairs(origins, destinations, "mixed")
+        assert walk_distance[0] > 4270
+        assert drive[0] < walk[0]
+        # 超过步行距离的混合出行按公交估算
+        assert mixed[0] < walk[0]
+
+    def test_format_duration(self):
+        assert format_duration(20) == "约1分钟"
+        assert format_duration(25 * 60) == "约25分钟"
+        assert format_duration(70 * 60) == "约1小时10分钟"
+        assert format_duration(120 * 60) == "约2小时"
+
+
+class TestBatching:
+    """分批与缓存测试"""
+
+    def test_consecutive_legs(self):
+        stops = [(i, i) for i in range(20)]
+        legs = list(zip(stops[:-1], stops[1:]))
+        batches = batch_pairs(legs[:7])
+        assert batches == [list(range(7))]
+        assert [len(b) for b in batch_pairs(legs)] == [7, 7, 5]
+
+    def test_full_matrix(self):
+        pairs = [(o, d) for o in range(5) for d in range(10)]
+        assert len(batch_pairs(pairs)) == 1
+        pairs = [(o, d) for o in range(6) for d in range(10)]
+        assert len(batch_pairs(pairs)) == 2
+
+    def test_cache_lru_and_ttl(self):
+        cache = PairCache(max_size=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+
+        expired = PairCache(max_size=2, ttl=-1)
+        expired.set("a", 1)
+        assert expired.get("a") is None
+
+
+class TestPairDistances:
+    """BaiduMapTools 距离矩阵测试"""
+
+    def test_day_of_stops_is_one_request(self, matrix_api):
+        stops = _stops(8)
+        legs = BaiduMapTools().pair_distances(list(zip(stops[:-1], stops[1:])), "driving")
+        assert len(matrix_api["calls"]) == 1
+        assert "/routematrix/v2/driving" in matrix_api["calls"][0][0]
+        assert [leg["distance"] for leg in legs] == [1000] * 7
+        assert all(leg["source"] == "baidu" for leg in legs)
+
+        # 再次查询全部命中缓存
+        legs = BaiduMapTools().pair_distances(list(zip(stops[:-1], stops[1:])), "driving")
+        assert len(matrix_api["calls"]) == 1
+        assert all(leg["source"] == "cache" for leg in legs)
+
+    def test_matrix_rows(self, matrix_api):
+        result = BaiduMapTools().distance_matrix(_stops(2), ["39.91,116.33", "39.91,116.34"], "walking")
+        assert result["success"] is True
+        rows = result["data"]["rows"]
+        assert [[cell["distance"] for cell in row] for row in rows] == [[3000, 4000], [2000, 3000]]
+        assert "/routematrix/v2/walking" in matrix_api["calls"][0][0]
+
+    def test_transit_uses_driving_distance(self, matrix_api):
+        stops = _stops(2)
+        leg, = BaiduMapTools().pair_distances([(stops[0], stops[1])], "transit")
+        assert "/routematrix/v2/driving" in matrix_api["calls"][0][0]
+        assert leg["distance"] == 1000
+        # 耗时按公交速度与候车时间换算，而不是驾车耗时
+        assert leg["duration"] > 480
+
+    def test_upstream_failure_falls_back_to_estimate(self, matrix_api):
+        matrix_api["status"] = 240
+        stops = _stops(3)
+        legs = BaiduMapTools().pair_distances(list(zip(stops[:-1], stops[1:])), "driving")
+        assert all(leg["source"] == "estimate" for leg in legs)
+        assert all(leg["distance"] > 0 for leg in legs)
+        assert len(distance_cache) == 0
+
+    def test_estimate_only(self, matrix_api):
+        stops = _stops(3)
+        legs = BaiduMapTools().pair_distances(list(zip(stops[:-1], stops[1:])), "mixed", precise=False)
+        assert matrix_api["calls"] == []
+        assert all(leg["source"] == "estimate" for leg in legs)
+
+
+class TestTripPlanLegs:
+    """行程规划中的路段耗时"""
+
+    async def test_routes_use_distance_matrix(self, matrix_api):
+        stops = _stops(4)
+        context = {"map_markers": [
+            {"id": f"poi{i}", "name": f"地点{i}", "coordinates": stop} for i, stop in enumerate(stops[:3])
+        ] + [{"id": "poi3", "name": "无坐标"}]}
+        plan = await SimpleTripAgent()._generate_trip_plan(
+            ["poi0", "poi1", "poi2", "poi3"], "1天", "driving", [], context
+        )
+        routes = plan["routes"]
+        assert len(matrix_api["calls"]) == 1
+        assert routes[0]["distance"] == 1000
+        assert routes[0]["estimated_time"] == "约2分钟"
+        # 缺少坐标的路段保留默认描述
+        assert routes[2]["estimated_time"] == "15-30分钟"
+        assert "distance" not in routes[2]
@@ -0,0 +1,136 @@
+"""
+费用批量导入测试
+"""
+
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.models.trip import Expense, ExpenseDailyRollup
+from app.services.expense_import import COLUMNS, ExpenseImportService, _copy_value, iter_json
+
+
+def _headers(registered_user):
+    return {"Authorization": f"Bearer {registered_user['access_token']}"}
+
+
+@pytest.fixture
+def trip_id(client, registered_user):
+    response = client.post("/api/v1/trips/", headers=_headers(registered_user), json={"title": "导入测试"})
+    return response.json()["id"]
+
+
+def _import(client, registered_user, name, content, **data):
+    return client.post(
+        "/api/v1/expenses/import",
+        headers=_headers(registered_user),
+        files={"file": (name, content.encode("utf-8"))},
+        data=data
+    )
+
+
+class TestExpenseImport:
+    """导入接口"""
+
+    def test_csv_with_row_errors(self, client, registered_user, db_session, trip_id, monkeypatch):
+        # 小块大小，覆盖多块写入
+        monkeypatch.setattr(settings, "EXPENSE_IMPORT_CHUNK_SIZE", 2)
+        content = (
+            "\ufeff日期,金额,分类,描述,地点\n"
+            "2025-03-01,35.5,food,早餐,\"西湖,北山街\"\n"
+            "2025-03-01,-1,food,退款,\n"
+            "2025/03/02,20,food,日期格式错误,\n"
+            "2025-03-02,120,transportation,\"高铁\n二等座\",\n"
+            "\n"
+            "2025-03-03,80,attraction,门票,\n"
+        )
+        response = _import(client, registered_user, "bank.csv", content, trip_id=trip_id)
+        assert response.status_code == 200
+        result = response.json()
+        assert (result["total"], result["imported"], result["failed"]) == (5, 3, 2)
+        assert [error["row"] for error in result["errors"]] == [2, 3]
+        assert "amount" in result["errors"][0]["errors"][0]
+
+        expenses = {e.description: e for e in db_session.query(Expense).filter(Expense.trip_id == trip_id)}
+        assert set(expenses) == {"早餐", "高铁\n二等座", "门票"}
+        assert expenses["早餐"].location == "西湖,北山街"
+
+        # 导入后日汇总已更新
+        rollups = {str(r.day): r.amount for r in db_session.query(ExpenseDailyRollup).filter_by(trip_id=trip_id)}
+        assert rollups == {"2025-03-01": 35.5, "2025-03-02": 120, "2025-03-03": 80}
+
+    def test_json_array_and_ndjson(self, client, registered_user, db_session, trip_id):
+        rows = [
+            {"trip_id": trip_id, "category": "food", "amount": 10, "description": "a", "expense_date": "2025-03-01"},
+            {"trip_id": "not-mine", "category": "food", "amount": 10, "description": "b", "expense_date": "2025-03-01"},
+            "not an object",
+        ]
+        result = _import(client, registered_user, "rows.json", json.dumps(rows)).json()
+        assert (result["imported"], result["failed"]) == (1, 2)
+        assert "行程不存在" in result["errors"][0]["errors"][0]
+
+        ndjson = "\n".join(json.dumps({**rows[0], "description": f"n{i}"}) for i in range(3))
+        result = _import(client, registered_user, "rows.ndjson", ndjson).json()
+        assert result["imported"] == 3
+        assert db_session.query(Expense).filter(Expense.trip_id == trip_id).count() == 4
+
+    def test_failed_chunk_retried_row_by_row(self, client, registered_user, db_session, trip_id, monkeypatch):
+        write = ExpenseImportService._write
+
+        def failing_write(self, rows):
+            write(self, rows)
+            if any(row["description"] == "坏" for row in rows):
+                raise RuntimeError("constraint violated")
+
+        monkeypatch.setattr(ExpenseImportService, "_write", failing_write)
+        content = "日期,金额,分类,描述\n2025-03-01,1,food,好\n2025-03-01,2,food,坏\n2025-03-01,3,food,好\n"
+        result = _import(client, registered_user, "rows.csv", content, trip_id=trip_id).json()
+        assert (result["imported"], result["failed"]) == (2, 1)
+        assert result["errors"][0]["row"] == 2
+        # 失败块的部分写入随保存点回滚
+        assert sorted(e.amount for e in db_session.query(Expense).filter(Expense.trip_id == trip_id)) == [1, 3]
+
+    def test_rows_carry_model_defaults(self, client, registered_user, db_session, trip_id, monkeypatch):
+        # PostgreSQL 上用 COPY 写入，不会应用Python侧的默认值，写入的行必须包含所有列
+        written = []
+        write = ExpenseImportService._write
+
+        def recording_write(self, rows):
+            written.extend(rows)
+            write(self, rows)
+
+        monkeypatch.setattr(ExpenseImportService, "_write", recording_write)
+        content = "日期,金额,分类,描述\n2025-03-01,1,food,a\n"
+        assert _import(client, registered_user, "rows.csv", content, trip_id=trip_id).json()["imported"] == 1
+        assert [set(row) for row in written] == [set(COLUMNS)]
+        assert written[0]["is_shared"] is False and _copy_value(False) == "false"
+        assert db_session.query(Expense).filter(Expense.trip_id == trip_id).one().is_shared is False
+
+    def test_rejects_bad_requests(self, client, registered_user, trip_id, monkeypatch):
+        assert _import(client, registered_user, "rows.txt", "x").status_code == 400
+        assert _import(client, registered_user, "rows.json", "[{\"a\": 1}, {").status_code == 400
+        assert _import(client, registered_user, "rows.csv", "a\n1\n", trip_id="missing").status_code == 404
+
+        monkeypatch.setattr(settings, "EXPENSE_IMPORT_MAX_ROWS", 1)
+        content = "日期,金额,分类,描述\n2025-03-01,1,food,a\n2025-03-01,1,food,b\n"
+        assert _import(client, registered_user, "rows.csv", content, trip_id=trip_id).status_code == 413
+
+
+async def _collect(chunks):
+    async def source():
+        for chunk in chunks:
+            yield chunk
+    return [value async for value in iter_json(source())]
+
+
+class TestIterJson:
+    """流式JSON解析"""
+
+    async def test_values_split_across_chunks(self):
+        text = json.dumps([{"amount": 12.5, "description": "中文"}, {"amount": 3}, 42])
+        chunks = [text[i:i + 3] for i in range(0, len(text), 3)]
+        assert await _collect(chunks) == [{"amount": 12.5, "description": "中文"}, {"amount": 3}, 42]
+
+    async def test_ndjson_trailing_number(self):
+        assert await _collect(['{"a": 1}\n1', "23"]) == [{"a": 1}, 123]
@@ -0,0 +1,173 @@
+"""
+费用日汇总与时间序列测试
+"""
+
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.models.trip import ExpenseDailyRollup
+from app.services.expense_rollup import rebuild_expense_rollups
+
+
+def _headers(registered_user):
+    return {"Authorization": f"Bearer {registered_user['access_token']}"}
+
+
+@pytest.fixture
+def trip_id(client, registered_user):
+    response = client.post("/api/v1/trips/", headers=_headers(registered_user), json={"title": "汇总测试"})
+    return response.json()["id"]
+
+
+def _expense(client, headers, trip_id, amount, category, expense_date):
+    response = client.post(f"/api/v1/budgets/trips/{trip_id}/expenses", headers=headers, json={
+        "amount": amount, "category": category, "expense_date": expense_date, "description": "测试"
+    })
+    assert response.status_code == 200
+    return response.json()
+
+
+def _rollups(db_session):
+    db_session.expire_all()
+    return sorted(
+        (str(row.day), row.category, round(row.amount, 2), row.count)
+        for row in db_session.query(ExpenseDailyRollup)
+    )
+
+
+class TestRollupMaintenance:
+    """费用写入时维护日汇总"""
+
+    def test_insert_update_delete(self, client, registered_user, db_session, trip_id):
+        headers = _headers(registered_user)
+        first = _expense(client, headers, trip_id, 100, "food", "2025-03-01T02:00:00")
+        _expense(client, headers, trip_id, 50, "food", "2025-03-01T03:00:00")
+        # UTC 20:00 在上海已是次日
+        _expense(client, headers, trip_id, 30, "transportation", "2025-03-01T20:00:00")
+        assert _rollups(db_session) == [
+            ("2025-03-01", "food", 150, 2), ("2025-03-02", "transportation", 30, 1)
+        ]
+
+        response = client.put(f"/api/v1/budgets/expenses/{first['id']}", headers=headers, json={
+            "amount": 80, "category": "shopping"
+        })
+        assert response.status_code == 200
+        assert _rollups(db_session) == [
+            ("2025-03-01", "food", 50, 1), ("2025-03-01", "shopping", 80, 1),
+            ("2025-03-02", "transportation", 30, 1)
+        ]
+
+        assert client.delete(f"/api/v1/budgets/expenses/{first['id']}", headers=headers).status_code == 200
+        assert _rollups(db_session) == [("2025-03-01", "food", 50, 1), ("2025-03-02", "transportation", 30, 1)]
+
+        # 删除行程时级联删除的费用同样扣减
+        assert client.delete(f"/api/v1/trips/{trip_id}", headers=headers).status_code == 200
+        assert _rollups(db_session) == []
+
+    def test_rebuild_matches_incremental(self, client, registered_user, db_session, trip_id):
+        headers = _headers(registered_user)
+        for day, amount in [(1, 10), (1, 20), (5, 7.5), (31, 3)]:
+            _expense(client, headers, trip_id, amount, "food", f"2025-01-{day:02d}T12:00:00")
+        incremental = _rollups(db_session)
+
+        assert rebuild_expense_rollups(db_session) == 3
+        assert _rollups(db_session) == incremental
+
+    def test_rebuild_endpoint_requires_admin(self, client, registered_user, test_user_data, db_session, trip_id, monkeypatch):
+        headers = _headers(registered_user)
+        _expense(client, headers, trip_id, 10, "food", "2025-01-01T12:00:00")
+
+        # 不带 user_id 会删除并重建所有用户的汇总
+        assert client.post("/api/v1/admin/expense-rollups/rebuild", headers=headers).status_code == 403
+
+        monkeypatch.setattr(settings, "ADMIN_EMAILS", json.dumps([test_user_data["email"]]))
+        response = client.post("/api/v1/admin/expense-rollups/rebuild", headers=headers)
+        assert response.status_code == 200 and response.json() == {"rows": 1}
+
+
+class TestTimeseries:
+    """时间序列接口"""
+
+    def test_granularities(self, client, registered_user, trip_id):
+        headers = _headers(registered_user)
+        # 2025-03-03 是周一
+        for expense_date, amount in [
+            ("2025-03-02T01:00:00", 10), ("2025-03-03T01:00:00", 20),
+            ("2025-03-09T01:00:00", 5), ("2025-04-01T01:00:00", 40)
+        ]:
+            _expense(client, headers, trip_id, amount, "food", expense_date)
+
+        day = client.get("/api/v1/expenses/timeseries", headers=headers, params={
+            "granularity": "day", "start_date": "2025-03-01", "end_date": "2025-03-04"
+        }).json()
+        assert day["source"] == "rollup"
+        assert [(p["bucket"], p["amount"]) for p in day["points"]] == [
+            ("2025-03-01", 0), ("2025-03-02", 10), ("2025-03-03", 20), ("2025-03-04", 0)
+        ]
+
+        week = client.get("/api/v1/expenses/timeseries", headers=headers, params={
+            "granularity": "week", "trip_id": trip_id, "fill": False
+        }).json()
+        assert [(p["bucket"], p["amount"]) for p in week["points"]] == [
+            ("2025-02-24", 10), ("2025-03-03", 25), ("2025-03-31", 40)
+        ]
+
+        month = client.get("/api/v1/expenses/timeseries", headers=headers, params={"granularity": "month"}).json()
+        assert [(p["bucket"], p["amount"], p["count"]) for p in month["points"]] == [
+            ("2025-03-01", 35, 3), ("2025-04-01", 40, 1)
+        ]
+        assert month["total_amount"] == 75
+
+    def test_other_timezone_buckets_raw_expenses(self, client, registered_user, trip_id):
+        headers = _headers(registered_user)
+        _expense(client, headers, trip_id, 30, "food", "2025-03-01T20:00:00")
+
+        shanghai = client.get("/api/v1/expenses/timeseries", headers=headers).json()
+        utc = client.get("/api/v1/expenses/timeseries", headers=headers, params={"tz": "UTC"}).json()
+        assert [p["bucket"] for p in shanghai["points"]] == ["2025-03-02"]
+        assert utc["source"] == "expenses"
+        assert [(p["bucket"], p["category_breakdown"]) for p in utc["points"]] == [("2025-03-01", {"food": 30})]
+
+    def test_invalid_parameters(self, client, registered_user):
+        headers = _headers(registered_user)
+        assert client.get("/api/v1/expenses/timeseries", headers=headers, params={"tz": "Mars/Base"}).status_code == 400
+        assert client.get("/api/v1/expenses/timeseries", headers=headers, params={"granularity": "year"}).status_code == 422
+
+    def test_oversized_range_rejected(self, client, registered_user):
+        headers = _headers(registered_user)
+        huge = client.get("/api/v1/expenses/timeseries", headers=headers, params={
+            "granularity": "day", "start_date": "0001-01-01", "end_date": "9999-12-31"
+        })
+        assert huge.status_code == 400
+        # 按月分桶同样的范围也超过上限；fill=false 时不补零，不受限制
+        assert client.get("/api/v1/expenses/timeseries", headers=headers, params={
+            "granularity": "month", "start_date": "0001-01-01", "end_date": "9999-12-31"
+        }).status_code == 400
+        assert client.get("/api/v1/expenses/timeseries", headers=headers, params={
+            "start_date": "0001-01-01", "end_date": "9999-12-31", "fill": "false"
+        }).status_code == 200
+
+    def test_fill_stops_at_max_date(self, client, registered_user):
+        headers = _headers(registered_user)
+        for granularity, count in (("day", 3), ("week", 1), ("month", 1)):
+            response = client.get("/api/v1/expenses/timeseries", headers=headers, params={
+                "granularity": granularity, "start_date": "9999-12-29", "end_date": "9999-12-31"
+            })
+            assert response.status_code == 200
+            assert len(response.json()["points"]) == count
+
+    def test_summary_and_stats_from_rollups(self, client, registered_user, trip_id):
+        headers = _headers(registered_user)
+        _expense(client, headers, trip_id, 100, "food", "2025-03-01T02:00:00")
+        _expense(client, headers, trip_id, 50, "shopping", "2025-03-02T02:00:00")
+
+        summary = client.get("/api/v1/expenses/stats/summary", headers=headers).json()
+        assert summary["total_amount"] == 150 and summary["total_count"] == 2
+        assert summary["daily_breakdown"] == {"2025-03-01": 100, "2025-03-02": 50}
+        assert summary["category_breakdown"]["food"]["percentage"] == pytest.approx(66.67)
+
+        stats = client.get(f"/api/v1/budgets/trips/{trip_id}/expenses/stats", headers=headers).json()
+        assert stats["daily_average"] == 75
+        assert stats["monthly_trend"] == [{"month": "2025-03", "amount": 150, "count": 2}]
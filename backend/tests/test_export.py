@@ -0,0 +1,127 @@
+"""
+流式导出测试
+"""
+
+import csv
+import io
+import json
+
+import pytest
+
+from app.models.trip import ItineraryItem
+from app.services.export_service import _ics_lines, _parse_time, buffered
+
+
+def _headers(registered_user):
+    return {"Authorization": f"Bearer {registered_user['access_token']}"}
+
+
+@pytest.fixture
+def trip(client, registered_user):
+    headers = _headers(registered_user)
+    trip = client.post("/api/v1/trips/", headers=headers, json={
+        "title": "杭州, 两日游",
+        "start_date": "2025-05-01T00:00:00",
+        "end_date": "2025-05-02T00:00:00",
+        "itineraries": [
+            {"day_number": 1, "items": [
+                {"name": "西湖", "address": "杭州市西湖区", "start_time": "09:00", "estimated_duration": 120,
+                 "coordinates": {"lat": 30.25, "lng": 120.15}},
+                {"name": "灵隐寺", "start_time": "14:00", "end_time": "16:30"},
+            ]},
+            {"day_number": 2, "items": [{"name": "自由活动；购物"}]},
+        ]
+    }).json()
+    client.post(f"/api/v1/budgets/trips/{trip['id']}/expenses", headers=headers, json={
+        "amount": 45, "category": "food", "description": "午餐", "expense_date": "2025-05-01T12:00:00"
+    })
+    return trip
+
+
+class TestExport:
+    """导出接口"""
+
+    def test_ndjson(self, client, registered_user, trip):
+        response = client.get("/api/v1/export/trips.ndjson", headers=_headers(registered_user))
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        assert "attachment" in response.headers["content-disposition"]
+        records = [json.loads(line) for line in response.text.splitlines()]
+        assert [r["type"] for r in records] == ["trip", "itinerary", "itinerary", "item", "item", "item", "expense"]
+        assert [r["name"] for r in records if r["type"] == "item"] == ["西湖", "灵隐寺", "自由活动；购物"]
+        assert records[-1]["amount"] == 45
+
+    def test_csv(self, client, registered_user, trip):
+        headers = _headers(registered_user)
+        response = client.get("/api/v1/export/items.csv", headers=headers, params={"trip_id": trip["id"]})
+        assert response.status_code == 200
+        rows = list(csv.DictReader(io.StringIO(response.content.decode("utf-8-sig"))))
+        assert [(row["day_number"], row["name"]) for row in rows] == [("1", "西湖"), ("1", "灵隐寺"), ("2", "自由活动；购物")]
+        assert json.loads(rows[0]["coordinates"]) == {"lat": 30.25, "lng": 120.15}
+
+        trips = client.get("/api/v1/export/trips.csv", headers=headers).content.decode("utf-8-sig")
+        assert list(csv.DictReader(io.StringIO(trips)))[0]["title"] == "杭州, 两日游"
+
+    def test_ics(self, client, registered_user, trip):
+        response = client.get("/api/v1/export/itinerary.ics", headers=_headers(registered_user))
+        assert response.status_code == 200
+        text = response.text
+        assert text.startswith("BEGIN:VCALENDAR\r\n") and text.endswith("END:VCALENDAR\r\n")
+        assert text.count("BEGIN:VEVENT") == 3
+        assert "DTSTART:20250501T090000\r\nDTEND:20250501T110000" in text
+        assert "DTSTART:20250501T140000\r\nDTEND:20250501T163000" in text
+        # 没有开始时间的节点为全天事件，日期由行程开始日期推算
+        assert "DTSTART;VALUE=DATE:20250502" in text
+        assert "SUMMARY:自由活动；购物" in text and "DESCRIPTION:杭州\\, 两日游" in text
+        assert "GEO:30.25;120.15" in text
+
+    def test_errors_and_isolation(self, client, registered_user, trip, test_user_data):
+        headers = _headers(registered_user)
+        assert client.get("/api/v1/export/budgets.csv", headers=headers).status_code == 404
+        assert client.get("/api/v1/export/trips.ndjson", headers=headers, params={"trip_id": "missing"}).status_code == 404
+
+        other = client.post("/api/v1/auth/register", json={**test_user_data, "email": "other_export@example.com"}).json()
+        response = client.get("/api/v1/export/trips.ndjson", headers=_headers(other))
+        assert response.status_code == 200 and response.text == ""
+
+
+class TestHelpers:
+    """格式细节"""
+
+    def test_ics_folding(self):
+        text = _ics_lines("SUMMARY:" + "西湖" * 30)
+        lines = text.split("\r\n")[:-1]
+        assert len(lines) > 1
+        assert all(len(line.encode("utf-8")) <= 75 for line in lines)
+        assert all(line.startswith(" ") for line in lines[1:])
+        assert "".join([lines[0]] + [line[1:] for line in lines[1:]]) == "SUMMARY:" + "西湖" * 30
+
+    def test_buffered(self):
+        chunks = list(buffered(("x" * 10 for _ in range(25)), size=100))
+        assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+
+    @pytest.mark.parametrize("value, expected", [
+        ("09:30", (9, 30)), ("23:59:00", (23, 59)), ("0:00", (0, 0)),
+        ("24:00", None), ("9:75", None), ("-1:00", None), ("上午", None), ("9", None), (None, None),
+    ])
+    def test_parse_time(self, value, expected):
+        assert _parse_time(value) == expected
+
+    def test_ics_out_of_range_time(self, client, registered_user, db_session):
+        # 接口会校验时间格式，但智能体工具直接写库，超出范围的时间不能让已经开始的 .ics 响应中途出错
+        headers = _headers(registered_user)
+        trip = client.post("/api/v1/trips/", headers=headers, json={
+            "title": "时间异常", "start_date": "2025-05-01T00:00:00",
+            "itineraries": [{"day_number": 1, "items": [{"name": "夜游"}, {"name": "早餐"}]}]
+        }).json()
+        times = {"夜游": ("24:00", None), "早餐": ("08:00", "9:75")}
+        for item in db_session.query(ItineraryItem):
+            item.start_time, item.end_time = times[item.name]
+        db_session.commit()
+
+        response = client.get("/api/v1/export/itinerary.ics", headers=headers, params={"trip_id": trip["id"]})
+        assert response.status_code == 200
+        assert response.text.count("BEGIN:VEVENT") == 2
+        assert "DTSTART;VALUE=DATE:20250501" in response.text
+        assert "DTSTART:20250501T080000\r\nDTEND:20250501T090000" in response.text
+        assert response.text.endswith("END:VCALENDAR\r\n")
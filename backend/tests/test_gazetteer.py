@@ -0,0 +1,90 @@
+"""
+离线地名库测试
+"""
+
+import requests
+
+from app.agents.budget_analyzer_agent import BudgetAnalyzerAgent
+from app.agents.trip_planner_agent import TripPlannerAgent
+from app.utils.baidu_map_tools import BaiduMapTools
+from app.utils.gazetteer import KINDS, Gazetteer, gazetteer
+
+
+class TestGazetteerData:
+    """内置数据检查"""
+
+    def test_loads_lazily(self):
+        fresh = Gazetteer()
+        assert fresh.names == []
+        assert len(fresh) > 400
+        assert fresh.coords.shape == (len(fresh), 2)
+
+    def test_parents_are_known_cities(self):
+        assert len(gazetteer) > 0
+        cities = {name for name, kind in zip(gazetteer.names, gazetteer.kinds) if KINDS[kind] == "city"}
+        assert len(cities) > 330
+        for name, parent, kind in zip(gazetteer.names, gazetteer.parents, gazetteer.kinds):
+            if KINDS[kind] != "city":
+                assert parent in cities, name
+
+    def test_coordinates_inside_china(self):
+        assert len(gazetteer) > 0
+        lat, lng = gazetteer.coords[:, 0], gazetteer.coords[:, 1]
+        assert ((lat > 15) & (lat < 54)).all()
+        assert ((lng > 73) & (lng < 136)).all()
+
+
+class TestGazetteerLookup:
+    """查询测试"""
+
+    def test_lookup_names_and_aliases(self):
+        assert gazetteer.lookup("北京") == {
+            "name": "北京", "kind": "city", "city": "北京", "province": "北京",
+            "lat": 39.9042, "lng": 116.4074
+        }
+        assert gazetteer.lookup("杭州市")["name"] == "杭州"
+        assert gazetteer.lookup(" 紫禁城 ")["name"] == "故宫博物院"
+        assert gazetteer.lookup("景洪")["name"] == "西双版纳"
+        assert gazetteer.lookup("北京市朝阳区建国路88号") is None
+
+    def test_complete(self):
+        names = [entry["name"] for entry in gazetteer.complete("北京")]
+        assert names[0] == "北京"
+        assert "北京南站" in names
+        assert gazetteer.complete("不存在的地方") == []
+
+    def test_find_in_text_prefers_longest_match(self):
+        assert gazetteer.find_in_text("想去北海公园划船")["name"] == "北海公园"
+        assert gazetteer.find_in_text("周末去北海看海")["name"] == "北海"
+        assert gazetteer.find_city("住在朝阳区附近") == "北京"
+        assert gazetteer.find_city("帮我规划兵马俑一日游") == "西安"
+        assert gazetteer.find_city("今天天气怎么样") is None
+
+    def test_city_center(self):
+        assert gazetteer.city_center("成都") == {"lat": 30.5728, "lng": 104.0668}
+        assert gazetteer.city_center("故宫") is None
+
+
+class TestGazetteerIntegration:
+    """geocode与Agent使用地名库"""
+
+    def test_geocode_skips_network_for_known_names(self, monkeypatch):
+        calls = []
+
+        def fake_get(*args, **kwargs):
+            calls.append(args)
+            raise requests.ConnectionError("offline")
+
+        monkeypatch.setattr(requests, "get", fake_get)
+        tools = BaiduMapTools()
+        assert tools.geocode("上海") == {"lat": 31.2304, "lng": 121.4737}
+        assert tools.geocode("外滩") == {"lat": 31.2400, "lng": 121.4900}
+        assert calls == []
+        # 未收录的地址仍然请求百度
+        assert tools.geocode("上海市徐汇区漕溪北路1号") is None
+        assert len(calls) == 1
+
+    def test_agents_extract_city(self):
+        assert TripPlannerAgent()._extract_location_from_input("去苏州拙政园玩两天") == "苏州"
+        assert BudgetAnalyzerAgent()._extract_location_from_input("去鼓浪屿的门票多少钱") == "厦门"
+        assert BudgetAnalyzerAgent()._extract_location_from_input("随便走走") == "北京"
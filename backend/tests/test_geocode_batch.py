@@ -0,0 +1,125 @@
+"""
+批量地理编码测试
+"""
+
+import json
+import threading
+import time
+
+import pytest
+import requests
+
+from app.utils.baidu_map_tools import BaiduMapTools, geocode_cache, reverse_geocode_cache
+
+
+class FakeResponse:
+    headers = {"content-type": "application/json"}
+    status_code = 200
+
+    def __init__(self, data):
+        self._data = data
+        self.text = json.dumps(data, ensure_ascii=False)
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._data
+
+
+class FakeBaidu:
+    """记录调用与最大并发的百度替身"""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, url, params, timeout):
+        with self._lock:
+            self.calls.append(params.get("address") or params.get("location"))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        if "address" in params:
+            if "不存在" in params["address"]:
+                return FakeResponse({"status": 1, "message": "无结果"})
+            return FakeResponse({"status": 0, "result": {"location": {"lat": 30.0 + len(params["address"]) / 100, "lng": 120.0}}})
+        return FakeResponse({"status": 0, "result": {"formatted_address": f"地址{params['location']}"}})
+
+
+@pytest.fixture
+def fake_baidu(monkeypatch):
+    geocode_cache.clear()
+    reverse_geocode_cache.clear()
+    fake = FakeBaidu()
+    monkeypatch.setattr(requests, "get", fake)
+    yield fake
+    geocode_cache.clear()
+    reverse_geocode_cache.clear()
+
+
+class TestGeocodeBatch:
+    """BaiduMapTools批量接口"""
+
+    def test_dedup_cache_and_input_order(self, fake_baidu):
+        tools = BaiduMapTools()
+        addresses = [f"测试路{i}号" for i in range(8)]
+        batch = addresses + ["北京", addresses[0], "不存在的地址"]
+        results = list(tools.geocode_batch(batch))
+
+        assert [index for index, _ in results] == list(range(len(batch)))
+        # 重复地址和地名库命中的城市不请求百度
+        assert sorted(fake_baidu.calls) == sorted(addresses + ["不存在的地址"])
+        assert results[8][1] == {"lat": 39.9042, "lng": 116.4074}
+        assert results[9][1] == results[0][1]
+        assert results[10][1] is None
+        assert fake_baidu.max_active <= tools._batch_executor._max_workers
+
+        # 成功结果已缓存，失败的地址下次重试
+        fake_baidu.calls.clear()
+        assert list(tools.geocode_batch(addresses + ["不存在的地址"]))[0][1] == results[0][1]
+        assert fake_baidu.calls == ["不存在的地址"]
+
+    def test_reverse_batch(self, fake_baidu):
+        tools = BaiduMapTools()
+        locations = [{"lat": 30.1, "lng": 120.2}, {"lat": 31.0, "lng": 121.0}, {"lat": 30.1000000001, "lng": 120.2}]
+        results = [result for _, result in tools.reverse_geocode_batch(locations)]
+        assert len(fake_baidu.calls) == 2
+        assert results[0]["data"]["address"] == results[2]["data"]["address"]
+        assert tools.reverse_geocode(31.0, 121.0)["success"] is True
+        assert len(fake_baidu.calls) == 2
+
+
+class TestGeocodeBatchEndpoints:
+    """批量地理编码接口"""
+
+    def test_json_and_ndjson(self, client, registered_user, fake_baidu):
+        headers = {"Authorization": f"Bearer {registered_user['access_token']}"}
+        body = {"addresses": ["西湖区文三路1号", "不存在的地址", "西湖区文三路1号"], "city": "杭州"}
+        response = client.post("/api/v1/map/geocode/batch", json=body, headers=headers)
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert [item["address"] for item in data["results"]] == body["addresses"]
+        assert data["resolved"] == 2
+        assert data["results"][1]["location"] is None
+        assert sorted(fake_baidu.calls) == ["杭州不存在的地址", "杭州西湖区文三路1号"]
+
+        response = client.post("/api/v1/map/reverse-geocode/batch", headers=headers, json={
+            "locations": [{"lat": 30.1, "lng": 120.2}, {"lat": 30.2, "lng": 120.3}], "stream": True
+        })
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["index"] for line in lines] == [0, 1]
+        assert lines[1]["data"]["address"] == "地址30.2,120.3"
+
+    def test_limits(self, client, registered_user):
+        headers = {"Authorization": f"Bearer {registered_user['access_token']}"}
+        assert client.post("/api/v1/map/geocode/batch", json={"addresses": []}, headers=headers).status_code == 422
+        too_many = {"addresses": ["x"] * 1000}
+        assert client.post("/api/v1/map/geocode/batch", json=too_many, headers=headers).status_code == 422
+        assert client.post("/api/v1/map/geocode/batch", json={"addresses": ["x"]}).status_code in (401, 403)
@@ -0,0 +1,85 @@
+"""
+意图与实体匹配测试
+"""
+
+import random
+
+from app.agents.budget_analyzer_agent import BudgetAnalyzerAgent
+from app.agents.trip_planner_agent import TripPlannerAgent
+from app.utils.intent_matcher import AhoCorasick, intent_matcher
+
+
+class TestAhoCorasick:
+    """自动机正确性"""
+
+    def test_matches_brute_force(self):
+        patterns = ["he", "she", "his", "hers", "a", "ab", "bab", "bc", "bca", "c", "caa", "aaa"]
+        automaton = AhoCorasick((p, p.upper()) for p in patterns)
+        rng = random.Random(7)
+        for _ in range(300):
+            text = "".join(rng.choice("abcehrs") for _ in range(40))
+            expected = sorted(
+                (i, i + len(p), p) for p in patterns for i in range(len(text)) if text.startswith(p, i)
+            )
+            hits = list(automaton.iter(text))
+            assert sorted((s, e, p) for s, e, p, _ in hits) == expected
+            assert all(value == p.upper() for _, _, p, value in hits)
+
+    def test_same_pattern_multiple_values(self):
+        automaton = AhoCorasick([("景点", "poi"), ("景点", "ticket"), ("", "ignored")])
+        assert list(automaton.iter("看景点")) == [(1, 3, "景点", "poi"), (1, 3, "景点", "ticket")]
+        assert list(automaton.iter("")) == []
+
+
+class TestIntentMatcher:
+    """意图、分类与城市"""
+
+    def test_scan_returns_all_hits_with_offsets(self):
+        result = intent_matcher.scan("帮我推荐杭州市附近的美食和去上海的路线")
+        assert {"tool", "poi", "route"} <= result.intents
+        assert "price" not in result.intents
+        assert result.categories == ["restaurant"]
+        assert result.cities == ["杭州", "上海"]
+        city = next(m for m in result.matches if m.kind == "city" and m.text == "杭州市")
+        assert (city.start, city.end) == (4, 7)
+
+    def test_without_removes_overlapping_hits(self):
+        result = intent_matcher.scan("杭州市有什么好吃的")
+        assert result.without("city") == "有什么好吃的"
+        assert intent_matcher.scan("").matches == ()
+
+    def test_scan_is_cached(self):
+        text = "重庆火锅推荐"
+        assert intent_matcher.scan(text) is intent_matcher.scan(text)
+
+
+class TestAgentsUseMatcher:
+    """Agent的关键词判断"""
+
+    def test_trip_planner(self):
+        agent = TripPlannerAgent()
+        assert agent._should_call_tools("附近有什么好玩的", "")
+        assert agent._should_call_tools("随便聊聊", "可以去看看天气再决定")
+        assert not agent._should_call_tools("随便聊聊", "好的")
+        assert agent._extract_search_keyword("苏州市拙政园") == "拙政园"
+        assert agent._extract_search_keyword("上海景点") == "北京景点"
+
+    async def test_trip_planner_uses_category(self, monkeypatch):
+        calls = []
+
+        def fake_search_poi(keyword, city, category):
+            calls.append((keyword, city, category))
+            return {"success": True, "data": []}
+
+        monkeypatch.setattr("app.agents.trip_planner_agent.baidu_map_tools.search_poi", fake_search_poi)
+        results = await TripPlannerAgent()._call_relevant_tools("成都推荐美食餐厅", "")
+        assert calls == [("推荐美食餐厅", "成都", "restaurant")]
+        assert results[0]["parameters"]["category"] == "restaurant"
+
+    def test_budget_analyzer(self):
+        agent = BudgetAnalyzerAgent()
+        assert agent._should_query_prices("去三亚大概多少钱")
+        assert not agent._should_query_prices("三亚天气")
+        matches = intent_matcher.scan("住宿和门票")
+        assert matches.has("hotel_price") and matches.has("ticket_price")
+        assert not matches.has("flight_price")
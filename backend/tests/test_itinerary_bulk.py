@@ -0,0 +1,106 @@
+"""
+行程批量写入测试
+"""
+
+import uuid
+
+from app.models.poi import Poi
+from app.models.trip import Itinerary, ItineraryItem
+from app.models.user import User
+from app.services.poi_store import flush_itinerary_sync
+from app.utils.tool_executor import ToolExecutor
+
+
+def _headers(registered_user):
+    return {"Authorization": f"Bearer {registered_user['access_token']}"}
+
+
+def _item(name, **extra):
+    return {"name": name, "category": "attraction", **extra}
+
+
+class TestCreateTripBulk:
+    """创建行程时批量写入安排与节点"""
+
+    def test_nested_itineraries(self, client, registered_user, db_session):
+        trip_data = {
+            "title": "杭州三日游",
+            "destination": "杭州",
+            "itineraries": [
+                {"day_number": day, "title": f"第{day}天", "items": [
+                    _item(f"地点{day}-{i}", coordinates={"lat": 30.25 + i / 100, "lng": 120.15}) for i in range(3)
+                ]}
+                for day in (1, 2)
+            ] + [{"day_number": 3, "items": [_item("晚到", order_index=5), _item("早到", order_index=1)]}]
+        }
+        response = client.post("/api/v1/trips/", json=trip_data, headers=_headers(registered_user))
+        assert response.status_code == 200
+        itineraries = response.json()["itineraries"]
+        assert [it["day_number"] for it in itineraries] == [1, 2, 3]
+        # 未指定order_index时按列表位置，指定时按其排序（返回时按位置重新编号）
+        assert [(i["name"], i["order_index"]) for i in itineraries[0]["items"]] == [
+            ("地点1-0", 0), ("地点1-1", 1), ("地点1-2", 2)
+        ]
+        assert [(i["name"], i["order_index"]) for i in itineraries[2]["items"]] == [("早到", 0), ("晚到", 1)]
+        # 批量INSERT同样同步到POI库
+        flush_itinerary_sync()
+        assert db_session.query(Poi).filter(Poi.source == "itinerary").count() == 6
+
+
+class TestItemsBatchEndpoint:
+    """批量添加节点接口"""
+
+    def test_appends_and_creates_days(self, client, registered_user):
+        headers = _headers(registered_user)
+        trip = client.post("/api/v1/trips/", headers=headers, json={
+            "title": "北京", "itineraries": [{"day_number": 1, "items": [_item("故宫"), _item("景山")]}]
+        }).json()
+
+        client_id = str(uuid.uuid4())
+        response = client.post(f"/api/v1/trips/{trip['id']}/items/batch", headers=headers, json={"items": [
+            {**_item("北海公园"), "day_number": 1, "id": client_id},
+            {**_item("长城"), "day_number": 2},
+            {**_item("颐和园"), "day_number": 2},
+        ]})
+        assert response.status_code == 200
+        items = response.json()
+        assert [(i["name"], i["order_index"]) for i in items] == [("北海公园", 2), ("长城", 0), ("颐和园", 1)]
+        assert items[0]["id"] == client_id
+
+        trip = client.get(f"/api/v1/trips/{trip['id']}", headers=headers).json()
+        assert [len(it["items"]) for it in trip["itineraries"]] == [3, 2]
+
+    def test_unknown_trip_and_validation(self, client, registered_user):
+        headers = _headers(registered_user)
+        body = {"items": [{**_item("x"), "day_number": 1}]}
+        assert client.post("/api/v1/trips/missing/items/batch", headers=headers, json=body).status_code == 404
+        assert client.post("/api/v1/trips/missing/items/batch", headers=headers, json={"items": []}).status_code == 422
+
+
+class TestAddItineraryItemsTool:
+    """智能体工具"""
+
+    async def test_batch_tool_and_single_tool(self, client, registered_user, db_session):
+        user_id = db_session.query(User.id).scalar()
+        executor = ToolExecutor(db_session, user_id)
+        trip = await executor.execute_tool("create_trip", {"title": "成都", "destination": "成都", "duration_days": 2})
+        trip_id = trip["data"]["trip_id"]
+
+        result = await executor.execute_tool("add_itinerary_items", {"trip_id": trip_id, "items": [
+            {"day_number": day, "name": f"地点{day}-{i}", "category": "attraction"} for day in (1, 2) for i in range(4)
+        ]})
+        assert result["success"], result
+        assert len(result["data"]["items"]) == 8
+
+        single = await executor.execute_tool("add_itinerary_item", {
+            "trip_id": trip_id, "day_number": 1, "name": "宽窄巷子", "category": "attraction"
+        })
+        assert single["success"] and single["data"]["day_number"] == 1
+        item = db_session.query(ItineraryItem).filter(ItineraryItem.id == single["data"]["item_id"]).one()
+        assert item.order_index == 4
+        assert db_session.query(Itinerary).filter(Itinerary.trip_id == trip_id).count() == 2
+
+        assert (await executor.execute_tool("add_itinerary_items", {"trip_id": "missing", "items": [
+            {"day_number": 1, "name": "x"}
+        ]}))["error"] == "行程不存在"
+        assert not (await executor.execute_tool("add_itinerary_items", {"trip_id": trip_id, "items": []}))["success"]
@@ -0,0 +1,116 @@
+"""
+LLM多供应商路由测试
+"""
+
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.services.llm_router import LLMRouter, LLMProvider
+
+
+class FakeLLMService:
+    """模拟OpenAI兼容的LLM服务"""
+
+    def __init__(self, chunks=None, fail_before=False, fail_after=False, delay=0.0):
+        self.api_key = "test-key"
+        self.model = "fake-model"
+        self.chunks = chunks or ['{"choices": [{"delta": {"content": "你好"}}]}']
+        self.fail_before = fail_before
+        self.fail_after = fail_after
+        self.delay = delay
+        self.calls = 0
+
+    async def stream_chat_completion(self, messages, tools=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail_before:
+            raise Exception("upstream 503")
+        for chunk in self.chunks:
+            yield chunk
+        if self.fail_after:
+            raise Exception("connection reset")
+
+    async def chat_completion(self, messages, stream=False, tools=None, **kwargs):
+        self.calls += 1
+        if self.fail_before:
+            raise Exception("upstream 503")
+        return {"choices": [{"message": {"content": "ok"}}]}
+
+
+def _router(primary, secondary):
+    return LLMRouter([LLMProvider("deepseek", primary), LLMProvider("aliyun", secondary)])
+
+
+async def _collect(generator):
+    return [chunk async for chunk in generator]
+
+
+class TestLLMRouter:
+    """路由与切换测试"""
+
+    async def test_failover_before_first_token(self, monkeypatch):
+        monkeypatch.setattr(settings, "LLM_DEFAULT_POLICY", "prefer:deepseek")
+        primary = FakeLLMService(fail_before=True)
+        secondary = FakeLLMService()
+        router = _router(primary, secondary)
+
+        chunks = await _collect(router.stream([{"role": "user", "content": "hi"}]))
+
+        assert len(chunks) == 1
+        assert primary.calls == 1 and secondary.calls == 1
+        stats = router.stats()["providers"]
+        assert stats["deepseek"]["total_failovers"] == 1
+        assert stats["deepseek"]["error_rate"] == 1.0
+
+    async def test_no_failover_after_first_token(self, monkeypatch):
+        monkeypatch.setattr(settings, "LLM_DEFAULT_POLICY", "prefer:deepseek")
+        primary = FakeLLMService(fail_after=True)
+        secondary = FakeLLMService()
+        router = _router(primary, secondary)
+
+        with pytest.raises(Exception, match="connection reset"):
+            await _collect(router.stream([{"role": "user", "content": "hi"}]))
+        assert secondary.calls == 0
+
+    async def test_pin_policy_never_fails_over(self, monkeypatch):
+        monkeypatch.setattr(settings, "LLM_AGENT_POLICIES", '{"chat-assistant": "pin:deepseek"}')
+        primary = FakeLLMService(fail_before=True)
+        secondary = FakeLLMService()
+        router = _router(primary, secondary)
+
+        with pytest.raises(Exception, match="upstream 503"):
+            await router.complete([{"role": "user", "content": "hi"}], agent_id="chat-assistant")
+        assert secondary.calls == 0
+
+    async def test_prefer_puts_preferred_provider_first(self, monkeypatch):
+        monkeypatch.setattr(settings, "LLM_DEFAULT_POLICY", "prefer:aliyun")
+        router = _router(FakeLLMService(), FakeLLMService())
+        assert [p.name for p in router.select()] == ["aliyun", "deepseek"]
+
+    async def test_best_provider_ranked_by_ttft(self, monkeypatch):
+        monkeypatch.setattr(settings, "LLM_DEFAULT_POLICY", "best")
+        router = _router(FakeLLMService(), FakeLLMService())
+        for _ in range(5):
+            router.providers["deepseek"].stats.record_success(2.0)
+            router.providers["aliyun"].stats.record_success(0.3)
+        assert router.select()[0].name == "aliyun"
+
+    async def test_unconfigured_provider_is_skipped(self, monkeypatch):
+        monkeypatch.setattr(settings, "LLM_DEFAULT_POLICY", "spread")
+        secondary = FakeLLMService()
+        secondary.api_key = ""
+        router = _router(FakeLLMService(), secondary)
+        assert [p.name for p in router.select()] == ["deepseek"]
+
+
+class TestLLMRouterAdminAPI:
+    """路由状态接口测试"""
+
+    def test_get_router_status(self, client, admin_user):
+        headers = {"Authorization": f"Bearer {admin_user['access_token']}"}
+        response = client.get("/api/v1/admin/llm-router", headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert set(data["providers"].keys()) == {"deepseek", "aliyun"}
@@ -0,0 +1,127 @@
+"""
+Prometheus指标测试
+"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app.core.metrics import RequestMetricsMiddleware, observe_tool, track_sse_stream, worker_id
+from app.utils.tool_definitions import AGENT_TOOLS  # noqa: F401  登记已声明的工具名
+
+
+class TestMetricsEndpoint:
+    """/metrics 端点测试"""
+
+    def test_metrics_exposes_request_latency(self, client):
+        client.get("/health")
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        body = response.text
+        assert 'http_request_duration_seconds_count{method="GET",route="/health",status="200"}' in body
+        assert "db_pool_wait_seconds" in body
+        assert "ffmpeg_queue_depth" in body
+
+    def test_route_template_used_as_label(self, client, registered_user):
+        headers = {"Authorization": f"Bearer {registered_user['access_token']}"}
+        client.get("/api/v1/trips/nonexistent-id", headers=headers)
+        body = client.get("/metrics").text
+        assert 'route="/api/v1/trips/{trip_id}"' in body
+        assert "nonexistent-id" not in body
+
+
+class TestRequestMetricsMiddleware:
+    """纯ASGI请求指标中间件"""
+
+    @pytest.fixture
+    def metrics_client(self):
+        app = FastAPI()
+        app.add_middleware(RequestMetricsMiddleware)
+
+        @app.get("/mw-test/stream")
+        async def stream():
+            async def events():
+                yield "data: 1\n\n"
+                yield "data: 2\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        @app.get("/mw-test/error")
+        async def error():
+            raise RuntimeError("boom")
+
+        return TestClient(app, raise_server_exceptions=False)
+
+    def _count(self, route, status):
+        return REGISTRY.get_sample_value(
+            "http_request_duration_seconds_count", {"method": "GET", "route": route, "status": status}
+        ) or 0
+
+    def test_streaming_and_errors_recorded(self, metrics_client):
+        in_progress = {"worker": worker_id()}
+        before = REGISTRY.get_sample_value("worker_requests_in_progress", in_progress) or 0
+        stream_count, error_count = self._count("/mw-test/stream", "200"), self._count("/mw-test/error", "500")
+
+        response = metrics_client.get("/mw-test/stream")
+        assert response.text == "data: 1\n\ndata: 2\n\n"
+        assert metrics_client.get("/mw-test/error").status_code == 500
+        metrics_client.get("/mw-test/missing")
+
+        assert self._count("/mw-test/stream", "200") == stream_count + 1
+        assert self._count("/mw-test/error", "500") == error_count + 1
+        assert self._count("unmatched", "404") >= 1
+        assert (REGISTRY.get_sample_value("worker_requests_in_progress", in_progress) or 0) == before
+
+
+class TestToolMetrics:
+    """工具调用指标测试"""
+
+    async def test_failed_result_counts_as_error(self):
+        async def failing_tool():
+            return {"success": False, "error": "boom"}
+
+        before = REGISTRY.get_sample_value(
+            "tool_errors_total", {"tool": "search_poi", "source": "unit-test"}
+        ) or 0
+        result = await observe_tool("search_poi", "unit-test", failing_tool())
+        after = REGISTRY.get_sample_value(
+            "tool_errors_total", {"tool": "search_poi", "source": "unit-test"}
+        )
+        assert result["success"] is False
+        assert after == before + 1
+        assert REGISTRY.get_sample_value(
+            "tool_duration_seconds_count", {"tool": "search_poi", "source": "unit-test"}
+        ) >= 1
+
+    async def test_undeclared_tool_names_share_one_label(self):
+        async def tool():
+            return {"success": True}
+
+        # 工具名来自LLM输出，未声明的名称不能各自成为一个标签
+        await observe_tool("made_up_tool_1", "unit-test", tool())
+        await observe_tool("made_up_tool_2", "unit-test", tool())
+        assert REGISTRY.get_sample_value(
+            "tool_duration_seconds_count", {"tool": "unknown", "source": "unit-test"}
+        ) >= 2
+        assert REGISTRY.get_sample_value(
+            "tool_duration_seconds_count", {"tool": "made_up_tool_1", "source": "unit-test"}
+        ) is None
+
+
+class TestSSEMetrics:
+    """SSE流指标测试"""
+
+    async def test_active_streams_gauge(self):
+        async def stream():
+            yield "data: 1\n\n"
+            yield "data: 2\n\n"
+
+        labels = {"endpoint": "unit-test"}
+        generator = track_sse_stream("unit-test", stream())
+        await generator.__anext__()
+        assert REGISTRY.get_sample_value("sse_active_streams", labels) == 1
+        async for _ in generator:
+            pass
+        assert REGISTRY.get_sample_value("sse_active_streams", labels) == 0
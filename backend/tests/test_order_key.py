@@ -0,0 +1,177 @@
+"""
+节点分数排序键测试
+"""
+
+import random
+
+import pytest
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from app.models.trip import Itinerary, ItineraryItem
+from app.services.itinerary_service import ORDER_COLUMNS, rebalance_itineraries
+from app.utils.order_key import key_between, keys_between
+
+
+def _headers(registered_user):
+    return {"Authorization": f"Bearer {registered_user['access_token']}"}
+
+
+def _create_trip(client, headers, days):
+    trip = client.post("/api/v1/trips/", headers=headers, json={
+        "title": "排序测试",
+        "itineraries": [
+            {"day_number": day, "items": [{"name": name} for name in names]}
+            for day, names in enumerate(days, 1)
+        ]
+    }).json()
+    return trip
+
+
+def _names(client, headers, trip_id):
+    trip = client.get(f"/api/v1/trips/{trip_id}", headers=headers).json()
+    return [[item["name"] for item in it["items"]] for it in trip["itineraries"]]
+
+
+def _ids(trip):
+    return {item["name"]: item["id"] for it in trip["itineraries"] for item in it["items"]}
+
+
+class TestOrderKey:
+    """排序键生成"""
+
+    def test_random_inserts_stay_sorted(self):
+        rng = random.Random(7)
+        keys = [key_between(None, None)]
+        for _ in range(2000):
+            i = rng.randint(0, len(keys))
+            keys.insert(i, key_between(keys[i - 1] if i else None, keys[i] if i < len(keys) else None))
+        assert keys == sorted(keys)
+        assert len(set(keys)) == len(keys)
+        assert max(len(key) for key in keys) <= 8
+
+    def test_append_and_prepend_grow_slowly(self):
+        last = first = None
+        for _ in range(15):
+            last = key_between(last, None)
+            first = key_between(None, first)
+        assert len(last) == len(first) == 1
+
+    def test_keys_between_even(self):
+        keys = keys_between("1", "2", 100)
+        assert keys == sorted(keys) and len(set(keys)) == 100
+        assert all("1" < key < "2" for key in keys)
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            key_between("b", "a")
+        with pytest.raises(ValueError):
+            key_between("a0", None)
+
+
+class TestMoveItems:
+    """移动节点接口"""
+
+    def test_reorder_and_move_across_days(self, client, registered_user, db_session):
+        headers = _headers(registered_user)
+        trip = _create_trip(client, headers, [["A", "B", "C"], ["D"]])
+        ids = _ids(trip)
+        day2 = trip["itineraries"][1]["id"]
+        keys_before = {item.id: item.order_key for item in db_session.query(ItineraryItem)}
+
+        response = client.post(f"/api/v1/trips/{trip['id']}/items/move", headers=headers, json={"moves": [
+            {"item_id": ids["C"], "before_id": ids["A"]},
+            {"item_id": ids["A"], "itinerary_id": day2, "after_id": ids["D"]},
+            {"item_id": ids["B"], "itinerary_id": day2, "before_id": ids["A"]},
+        ]})
+        assert response.status_code == 200
+        assert [item["itinerary_id"] for item in response.json()][1:] == [day2, day2]
+        assert _names(client, headers, trip["id"]) == [["C"], ["D", "B", "A"]]
+
+        # 只有被移动的节点改写了排序键
+        db_session.expire_all()
+        keys_after = {item.id: item.order_key for item in db_session.query(ItineraryItem)}
+        assert keys_after[ids["D"]] == keys_before[ids["D"]]
+        # 返回的 order_index 按位置重新编号
+        trip = client.get(f"/api/v1/trips/{trip['id']}", headers=headers).json()
+        assert [item["order_index"] for item in trip["itineraries"][1]["items"]] == [0, 1, 2]
+
+    def test_invalid_moves_roll_back(self, client, registered_user):
+        headers = _headers(registered_user)
+        trip = _create_trip(client, headers, [["A", "B"]])
+        other = _create_trip(client, headers, [["X"]])
+        ids, other_ids = _ids(trip), _ids(other)
+        url = f"/api/v1/trips/{trip['id']}/items/move"
+
+        response = client.post(url, headers=headers, json={"moves": [
+            {"item_id": ids["A"]},
+            {"item_id": ids["B"], "after_id": other_ids["X"]},
+        ]})
+        assert response.status_code == 400
+        assert client.post(url, headers=headers, json={"moves": [{"item_id": other_ids["X"]}]}).status_code == 400
+        assert _names(client, headers, trip["id"]) == [["A", "B"]]
+
+    def test_legacy_order_index_updates(self, client, registered_user):
+        headers = _headers(registered_user)
+        trip = _create_trip(client, headers, [["A", "B", "C"]])
+        ids = _ids(trip)
+        itinerary_id = trip["itineraries"][0]["id"]
+        base = f"/api/v1/trips/itineraries/{itinerary_id}/items"
+
+        assert client.put(f"{base}/{ids['C']}", headers=headers, json={"order_index": 0}).status_code == 200
+        assert client.post(base, headers=headers, json={"name": "D", "order_index": 2}).status_code == 200
+        assert client.post(base, headers=headers, json={"name": "E"}).status_code == 200
+        assert _names(client, headers, trip["id"]) == [["C", "A", "D", "B", "E"]]
+
+
+class TestLegacyItems:
+    """上线前没有排序键的旧节点"""
+
+    def test_appended_items_follow_legacy_items(self, client, registered_user, db_session):
+        headers = _headers(registered_user)
+        trip = _create_trip(client, headers, [["A", "B"]])
+        db_session.query(ItineraryItem).update({ItineraryItem.order_key: None})
+        db_session.commit()
+        itinerary_id = trip["itineraries"][0]["id"]
+
+        assert client.post(f"/api/v1/trips/itineraries/{itinerary_id}/items", headers=headers, json={"name": "C"}).status_code == 200
+        response = client.post(f"/api/v1/trips/{trip['id']}/items/batch", headers=headers, json={"items": [
+            {"name": "D", "day_number": 1}
+        ]})
+        assert response.status_code == 200
+        assert _names(client, headers, trip["id"]) == [["A", "B", "C", "D"]]
+
+    def test_null_keys_sort_first_on_postgresql(self):
+        # SQLite升序默认NULL在前，PostgreSQL默认在后，排序必须显式指定
+        statements = [
+            select(ItineraryItem.id).order_by(*ORDER_COLUMNS),
+            select(Itinerary.id).order_by(*Itinerary.items.property.order_by),
+        ]
+        for statement in statements:
+            assert "order_key NULLS FIRST" in str(statement.compile(dialect=postgresql.dialect()))
+
+
+class TestRebalance:
+    """排序键重新分配"""
+
+    def test_long_keys_rebalanced_in_background(self, client, registered_user, db_session):
+        headers = _headers(registered_user)
+        trip = _create_trip(client, headers, [["A", "B", "C"]])
+        ids = _ids(trip)
+        url = f"/api/v1/trips/{trip['id']}/items/move"
+        # 反复插到A之后：每次都落在更小的区间里，键逐渐变长
+        for i in range(100):
+            moved = "C" if i % 2 == 0 else "B"
+            response = client.post(url, headers=headers, json={"moves": [{"item_id": ids[moved], "after_id": ids["A"]}]})
+            assert response.status_code == 200
+        # TestClient 在响应后同步执行后台任务
+        db_session.expire_all()
+        assert max(len(item.order_key) for item in db_session.query(ItineraryItem)) <= 12
+        expected = _names(client, headers, trip["id"])
+        assert expected == [["A", "B", "C"]]
+
+        rebalance_itineraries(db_session.get_bind(), [trip["itineraries"][0]["id"]])
+        db_session.expire_all()
+        assert max(len(item.order_key) for item in db_session.query(ItineraryItem)) == 1
+        assert _names(client, headers, trip["id"]) == expected
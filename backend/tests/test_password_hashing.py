@@ -0,0 +1,77 @@
+"""
+密码哈希线程池与登录时重新哈希测试
+"""
+
+import threading
+
+import pytest
+from fastapi import HTTPException
+from passlib.hash import pbkdf2_sha256
+from prometheus_client import REGISTRY
+
+from app.core import security
+from app.core.config import settings
+from app.models.user import User
+
+
+def _login(client, test_user_data):
+    return client.post("/api/v1/auth/login", json={
+        "email": test_user_data["email"], "password": test_user_data["password"]
+    })
+
+
+class TestHashPool:
+    """哈希在线程池中执行"""
+
+    async def test_runs_off_event_loop(self):
+        loop_thread = threading.current_thread().name
+        threads = []
+
+        def record(password):
+            threads.append(threading.current_thread().name)
+            return security.get_password_hash(password)
+
+        before = REGISTRY.get_sample_value("password_hash_duration_seconds_count", {"operation": "hash"}) or 0
+        hashed = await security._run_hashing("hash", record, "secret123")
+        assert threads[0].startswith("password-hash") and threads[0] != loop_thread
+        assert REGISTRY.get_sample_value("password_hash_duration_seconds_count", {"operation": "hash"}) == before + 1
+
+        assert await security.verify_password_async("secret123", hashed) == (True, None)
+        assert await security.verify_password_async("wrong", hashed) == (False, None)
+        assert security._pending == 0
+
+    async def test_rejects_when_queue_full(self, monkeypatch):
+        monkeypatch.setattr(settings, "PASSWORD_HASH_MAX_PENDING", 0)
+        before = REGISTRY.get_sample_value("password_hash_rejected_total") or 0
+        with pytest.raises(HTTPException) as error:
+            await security.get_password_hash_async("secret123")
+        assert error.value.status_code == 503
+        assert REGISTRY.get_sample_value("password_hash_rejected_total") == before + 1
+
+
+class TestRehashOnLogin:
+    """迭代次数变化时登录重新哈希"""
+
+    def test_old_rounds_upgraded(self, client, registered_user, db_session, test_user_data):
+        user = db_session.query(User).filter(User.email == test_user_data["email"]).first()
+        user.password_hash = pbkdf2_sha256.using(rounds=1000).hash(test_user_data["password"])
+        db_session.commit()
+
+        assert _login(client, test_user_data).status_code == 200
+        db_session.refresh(user)
+        assert pbkdf2_sha256.from_string(user.password_hash).rounds == settings.PASSWORD_HASH_ROUNDS
+        upgraded = user.password_hash
+
+        # 已是当前参数的哈希不再重写
+        assert _login(client, test_user_data).status_code == 200
+        db_session.refresh(user)
+        assert user.password_hash == upgraded
+
+    def test_wrong_password_not_rehashed(self, client, registered_user, db_session, test_user_data):
+        user = db_session.query(User).filter(User.email == test_user_data["email"]).first()
+        user.password_hash = old = pbkdf2_sha256.using(rounds=1000).hash(test_user_data["password"])
+        db_session.commit()
+
+        assert _login(client, {**test_user_data, "password": "wrong password"}).status_code == 401
+        db_session.refresh(user)
+        assert user.password_hash == old
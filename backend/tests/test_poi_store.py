@@ -0,0 +1,190 @@
+"""
+本地POI库测试
+"""
+
+import json
+import threading
+
+import pytest
+import requests
+
+import app.services.poi_store as poi_store_module
+import app.utils.baidu_map_tools as baidu_map_module
+from app.core.config import settings
+from app.models.poi import Poi
+from app.models.trip import Itinerary, ItineraryItem, Trip
+from app.services.poi_store import PoiStore, flush_itinerary_sync
+from app.utils.baidu_map_tools import BaiduMapTools
+from app.utils.geohash import covering_cells, encode
+from tests.conftest import TestingSessionLocal
+
+CENTER = {"lat": 39.9163, "lng": 116.3972}
+
+
+def _poi(uid, name, lat, lng, tag="美食;中餐厅"):
+    return {
+        "id": uid, "name": name, "address": f"{name}地址",
+        "location": {"lat": lat, "lng": lng}, "category": tag, "rating": "4.5",
+        "price": "", "phone": "", "website": "", "opening_hours": "", "description": ""
+    }
+
+
+RESTAURANTS = [
+    _poi("r1", "四季民福", 39.9170, 116.3980),
+    _poi("r2", "全聚德", 39.9130, 116.3990),
+    _poi("r3", "南锣小馆", 39.9370, 116.4030),
+]
+
+
+@pytest.fixture
+def store(db_session):
+    return PoiStore(TestingSessionLocal)
+
+
+class FakeSearchResponse:
+    status_code = 200
+    headers = {"content-type": "application/json"}
+
+    def __init__(self, results):
+        self.text = json.dumps({"status": 0, "results": results})
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class TestGeohash:
+    """geohash测试"""
+
+    def test_encode_reference(self):
+        assert encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+
+    def test_covering_cells(self):
+        cells = covering_cells(CENTER["lat"], CENTER["lng"], 1000)
+        assert len(cells) == 9
+        assert encode(CENTER["lat"], CENTER["lng"]).startswith(cells[4])
+        # 半径越大网格越粗
+        assert len(covering_cells(CENTER["lat"], CENTER["lng"], 10000)[0]) < len(cells[0])
+
+
+class TestPoiStore:
+    """POI库查询测试"""
+
+    def test_covered_search_is_answered_locally(self, store):
+        store.add_search_results("餐厅", "restaurant", CENTER, 3000, 10, RESTAURANTS)
+        # 查询圆在覆盖范围内，按距离排序
+        pois = store.search_nearby("餐厅", "restaurant", CENTER, 1000, 10)
+        assert [p["id"] for p in pois] == ["r1", "r2"]
+        assert pois[0]["location"] == {"lat": 39.9170, "lng": 116.3980}
+        assert pois[0]["rating"] == 4.5
+
+    def test_uncovered_searches_miss(self, store, monkeypatch):
+        store.add_search_results("餐厅", "restaurant", CENTER, 3000, 10, RESTAURANTS)
+        far = {"lat": 39.9500, "lng": 116.3972}
+        assert store.search_nearby("餐厅", "restaurant", far, 1000, 10) is None
+        assert store.search_nearby("餐厅", "restaurant", CENTER, 5000, 10) is None
+        assert store.search_nearby("酒店", "hotel", CENTER, 1000, 10) is None
+        monkeypatch.setattr(settings, "POI_STORE_COVERAGE_TTL", -1)
+        assert store.search_nearby("餐厅", "restaurant", CENTER, 1000, 10) is None
+
+    def test_truncated_coverage_needs_enough_results(self, store):
+        # 返回数量等于上限，说明区域内可能还有更多POI
+        store.add_search_results("餐厅", "restaurant", CENTER, 3000, 3, RESTAURANTS)
+        assert store.search_nearby("餐厅", "restaurant", CENTER, 1000, 3) is None
+        assert len(store.search_nearby("餐厅", "restaurant", CENTER, 1000, 2)) == 2
+
+    def test_candidate_limit_keeps_nearest(self, store, monkeypatch):
+        # 远处的POI先写入；截取候选时仍应保留离中心最近的
+        store.add_search_results("餐厅", "restaurant", CENTER, 3000, 10, list(reversed(RESTAURANTS)))
+        monkeypatch.setattr(poi_store_module, "MAX_CANDIDATES", 1)
+        assert [p["id"] for p in store.nearby(CENTER["lat"], CENTER["lng"], 3000)] == ["r1"]
+        assert [p["id"] for p in store.search_nearby("餐厅", "restaurant", CENTER, 1000, 1)] == ["r1"]
+        # 候选被截断且匹配数不足时不能当作完整结果
+        assert store.search_nearby("餐厅", "restaurant", CENTER, 1000, 2) is None
+
+    def test_nearby_text_and_category_filters(self, store):
+        store.add_search_results("景点", None, None, 0, 10, [
+            _poi("a1", "故宫博物院", 39.9240, 116.4035, tag="旅游景点;博物馆")
+        ] + RESTAURANTS)
+        assert [p["id"] for p in store.nearby(CENTER["lat"], CENTER["lng"], 2000, category="attraction")] == ["a1"]
+        assert [p["id"] for p in store.nearby(CENTER["lat"], CENTER["lng"], 2000, keyword="全聚德")] == ["r2"]
+        assert len(store.nearby(CENTER["lat"], CENTER["lng"], 5000)) == 4
+
+
+class TestSearchPoiIntegration:
+    """search_poi 使用本地POI库"""
+
+    def test_second_nearby_search_skips_baidu(self, store, monkeypatch):
+        calls = []
+
+        def fake_get(url, params, timeout):
+            calls.append(params)
+            results = [{
+                "uid": p["id"], "name": p["name"], "address": p["address"], "location": p["location"],
+                "detail_info": {"tag": p["category"], "overall_rating": p["rating"]}
+            } for p in RESTAURANTS]
+            return FakeSearchResponse(results)
+
+        monkeypatch.setattr(requests, "get", fake_get)
+        monkeypatch.setattr(baidu_map_module, "poi_store", store)
+        tools = BaiduMapTools()
+
+        first = tools.search_poi("餐厅", "北京", "restaurant", location=CENTER, radius=3000, limit=10)
+        assert first["data"]["total"] == 3
+        assert "source" not in first["data"]
+        assert len(calls) == 1
+
+        second = tools.search_poi("餐厅", "北京", "restaurant", location=CENTER, radius=1000, limit=10)
+        assert second["data"]["source"] == "local"
+        assert [p["name"] for p in second["data"]["pois"]] == ["四季民福", "全聚德"]
+        assert len(calls) == 1
+
+
+class TestItineraryItemSync:
+    """行程节点写入POI库"""
+
+    def test_committed_items_are_indexed(self, store, db_session):
+        trip = Trip(user_id="user-1", title="北京")
+        db_session.add(trip)
+        db_session.flush()
+        itinerary = Itinerary(trip_id=trip.id, day_number=1)
+        db_session.add(itinerary)
+        db_session.flush()
+        db_session.add_all([
+            ItineraryItem(itinerary_id=itinerary.id, name="景山公园", category="attraction",
+                          coordinates={"lat": 39.9280, "lng": 116.3970}),
+            ItineraryItem(itinerary_id=itinerary.id, name="没有坐标", category="other"),
+        ])
+        db_session.commit()
+        # 提交后在后台线程写入POI库
+        flush_itinerary_sync()
+
+        pois = store.nearby(CENTER["lat"], CENTER["lng"], 3000, keyword="景山")
+        assert [p["name"] for p in pois] == ["景山公园"]
+        assert db_session.query(Poi).count() == 1
+        assert db_session.query(Poi).first().source == "itinerary"
+
+    def test_sync_runs_after_commit_in_background(self, store, db_session, monkeypatch):
+        threads = []
+
+        def failing_sync(db, items):
+            threads.append(threading.current_thread().name)
+            raise RuntimeError("POI库不可用")
+
+        monkeypatch.setattr(poi_store_module.poi_store, "add_itinerary_items", failing_sync)
+        trip = Trip(user_id="user-1", title="北京")
+        db_session.add(trip)
+        db_session.flush()
+        itinerary = Itinerary(trip_id=trip.id, day_number=1)
+        db_session.add(itinerary)
+        db_session.flush()
+        db_session.add(ItineraryItem(itinerary_id=itinerary.id, name="景山公园",
+                                     coordinates={"lat": 39.9280, "lng": 116.3970}))
+        # 同步失败不影响已经提交的事务
+        db_session.commit()
+        flush_itinerary_sync()
+
+        assert len(threads) == 1 and threads[0].startswith("poi-store-sync")
+        assert db_session.query(ItineraryItem).count() == 1
@@ -0,0 +1,165 @@
+"""
+路线几何处理测试
+"""
+
+import json
+
+import numpy as np
+import pytest
+import requests
+
+from app.utils.baidu_map_tools import BaiduMapTools
+from app.utils.polyline import (
+    compute_bounds,
+    decode_polyline,
+    encode_polyline,
+    format_lnglat,
+    parse_paths,
+    simplify,
+    zoom_to_tolerance,
+)
+
+
+def _straight_path(count=50):
+    """沿经线方向近似直线、带微小抖动的路径"""
+    lngs = 116.40 + np.linspace(0, 0.05, count)
+    lats = 39.90 + np.linspace(0, 0.02, count) + (np.arange(count) % 2) * 1e-7
+    return np.column_stack((lngs, lats))
+
+
+class FakeRouteResponse:
+    status_code = 200
+    headers = {"content-type": "application/json"}
+
+    def __init__(self, data):
+        self.text = json.dumps(data)
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def _route_body(routes):
+    return {"status": 0, "result": {"routes": routes}}
+
+
+@pytest.fixture
+def route_api(monkeypatch):
+    """替换 requests.get，返回可配置的路线规划响应"""
+    calls = []
+    state = {"routes": [{
+        "distance": 3000,
+        "duration": 600,
+        "steps": [
+            {"instruction": "向东行驶", "distance": 1000, "path": format_lnglat(_straight_path()[:25])},
+            {"instruction": "继续直行", "distance": 2000, "path": format_lnglat(_straight_path()[24:])},
+        ]
+    }]}
+
+    def fake_get(url, params, timeout):
+        calls.append((url, params))
+        return FakeRouteResponse(_route_body(state["routes"]))
+
+    monkeypatch.setattr(requests, "get", fake_get)
+    state["calls"] = calls
+    return state
+
+
+class TestParsePaths:
+    """path解析测试"""
+
+    def test_parses_and_joins_steps(self):
+        points = parse_paths(["116.1,39.1;116.2,39.2", "116.2,39.2;116.3,39.3;"])
+        # 相邻step首尾重复点只保留一个
+        assert points.tolist() == [[116.1, 39.1], [116.2, 39.2], [116.3, 39.3]]
+
+    def test_tolerates_malformed_points(self):
+        points = parse_paths(["116.1,39.1;;abc,39.2;116.3", "", "116.4,39.4"])
+        assert points.tolist() == [[116.1, 39.1], [116.4, 39.4]]
+
+    def test_empty(self):
+        points = parse_paths([])
+        assert points.shape == (0, 2)
+        assert compute_bounds(points) is None
+        assert format_lnglat(points) == ""
+        assert encode_polyline(points) == ""
+
+    def test_bounds(self):
+        bounds = compute_bounds(parse_paths(["116.1,39.3;116.5,39.1"]))
+        assert bounds == {
+            "southwest": {"lat": 39.1, "lng": 116.1},
+            "northeast": {"lat": 39.3, "lng": 116.5}
+        }
+
+
+class TestSimplify:
+    """抽稀测试"""
+
+    def test_keeps_endpoints_and_removes_collinear_points(self):
+        points = _straight_path()
+        result = simplify(points, 1.0)
+        assert len(result) == 2
+        assert result[0].tolist() == points[0].tolist()
+        assert result[-1].tolist() == points[-1].tolist()
+
+    def test_keeps_corner(self):
+        points = np.array([[116.0, 39.0], [116.01, 39.0], [116.02, 39.0], [116.02, 39.01], [116.02, 39.02]])
+        result = simplify(points, 5.0)
+        assert result.tolist() == [[116.0, 39.0], [116.02, 39.0], [116.02, 39.02]]
+
+    def test_zero_tolerance_is_noop(self):
+        points = _straight_path()
+        assert len(simplify(points, 0)) == len(points)
+
+    def test_zoom_tolerance_halves_per_level(self):
+        assert zoom_to_tolerance(16, 40) == pytest.approx(zoom_to_tolerance(15, 40) / 2)
+        assert 1.0 < zoom_to_tolerance(16, 40) < 2.0
+
+
+class TestEncodedPolyline:
+    """Encoded Polyline 测试"""
+
+    def test_matches_reference_example(self):
+        # Google文档中的示例：(38.5,-120.2), (40.7,-120.95), (43.252,-126.453)
+        points = np.array([[-120.2, 38.5], [-120.95, 40.7], [-126.453, 43.252]])
+        assert encode_polyline(points) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+    def test_round_trip(self):
+        points = _straight_path()
+        decoded = decode_polyline(encode_polyline(points))
+        assert np.allclose(decoded, points, atol=1e-5)
+
+
+class TestCalculateRoute:
+    """路线计算输出测试"""
+
+    def test_steps_without_geometry_by_default(self, route_api):
+        result = BaiduMapTools().calculate_route({"lat": 39.9, "lng": 116.4}, {"lat": 39.92, "lng": 116.45})
+        assert result["success"] is True
+        data = result["data"]
+        assert data["original_point_count"] == 50
+        assert data["point_count"] == 50
+        assert data["overview_polyline"].count(";") == 49
+        assert all("path" not in step for step in data["steps"])
+        assert data["bounds"]["southwest"]["lng"] == pytest.approx(116.40)
+
+    def test_simplified_encoded_output(self, route_api):
+        result = BaiduMapTools().calculate_route(
+            "39.9,116.4", "39.92,116.45", zoom=16, polyline_format="encoded", include_steps=True
+        )
+        data = result["data"]
+        assert data["origin"] == {"lat": 39.9, "lng": 116.4}
+        assert data["point_count"] == 2
+        assert data["simplify_tolerance"] > 0
+        assert "overview_polyline" not in data
+        assert len(decode_polyline(data["encoded_polyline"])) == 2
+        assert all("path" in step for step in data["steps"])
+        assert route_api["calls"][0][1]["origin"] == "39.9,116.4"
+
+    def test_no_routes(self, route_api):
+        route_api["routes"] = []
+        result = BaiduMapTools().calculate_route({"lat": 39.9, "lng": 116.4}, {"lat": 39.92, "lng": 116.45})
+        assert result["success"] is False
+        assert "未找到" in result["error"]
@@ -0,0 +1,154 @@
+"""
+系统提示词前缀布局与缓存命中统计测试
+"""
+
+import json
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.agents.simple_trip_agent import SimpleTripAgent
+from app.core.prompts import DYNAMIC_HEADER, get_prompt, register_prompt
+from app.services.expense_ai_service import ExpenseAIService
+from app.services.llm_router import LLMProvider, LLMRouter, prompt_cache_tokens
+from app.services.trip_planning_ai_service import TripPlanningAIService
+
+# 修改静态前缀时需要提升版本号并更新这里的指纹
+PINNED_PROMPTS = {
+    "trip-planning": ("2", "096c72df7b16"),
+    "expense": ("2", "03e0574f64d7"),
+    "simple-trip": ("2", "815378d1a764"),
+}
+
+
+def _trip(trip_id, title, items):
+    itinerary = SimpleNamespace(
+        id=f"{trip_id}-day1", day_number=1, date=date(2025, 5, 1), title="第1天",
+        items=[SimpleNamespace(id=f"{trip_id}-{i}", name=name, start_time=None, end_time=None,
+                               address=None, description=None) for i, name in enumerate(items)]
+    )
+    return SimpleNamespace(
+        id=trip_id, title=title, destination="北京", start_date=date(2025, 5, 1), end_date=date(2025, 5, 3),
+        duration_days=3, budget_total=5000, traveler_count=2, status="planned", itineraries=[itinerary]
+    )
+
+
+class TestPromptRegistry:
+    """提示词注册与版本"""
+
+    @pytest.mark.parametrize("name", sorted(PINNED_PROMPTS))
+    def test_static_prefix_pinned(self, name):
+        template = get_prompt(name)
+        assert (template.version, template.fingerprint) == PINNED_PROMPTS[name]
+
+    def test_changed_content_requires_new_version(self):
+        register_prompt("test-prompt", "1", "静态内容")
+        register_prompt("test-prompt", "1", "静态内容")
+        with pytest.raises(ValueError):
+            register_prompt("test-prompt", "1", "修改后的内容")
+        assert register_prompt("test-prompt", "2", "修改后的内容").version == "2"
+
+    def test_render_appends_dynamic_suffix(self):
+        template = register_prompt("test-render", "1", "静态内容")
+        assert template.render() == "静态内容"
+        assert template.render("行程ID：1") == f"静态内容\n\n{DYNAMIC_HEADER}\n行程ID：1\n"
+
+
+class TestPromptLayout:
+    """动态数据只出现在静态前缀之后"""
+
+    def test_trip_planning_prefix_stable_across_trips(self):
+        service = TripPlanningAIService(db=None)
+        first = service._build_system_prompt(_trip("trip-a", "北京三日游", ["天安门"]))
+        second = service._build_system_prompt(_trip("trip-b", "周末游", ["故宫", "景山"]))
+
+        static = get_prompt("trip-planning").static
+        assert first.startswith(static) and second.startswith(static)
+        assert "trip-a" not in static and "trip-a-day1" in first[len(static):]
+        assert "节点ID：trip-b-1" in second
+
+    def test_expense_context_after_prefix(self):
+        service = ExpenseAIService(db=None)
+        prompt = service._build_system_prompt("user-1", "trip-1", {"trip_title": "北京三日游"})
+        static = get_prompt("expense").static
+        assert prompt.startswith(static)
+        assert "当前行程ID：trip-1" in prompt[len(static):]
+        assert service._build_system_prompt("user-1", None, None) == static
+
+    def test_simple_trip_context_after_prefix(self):
+        agent = SimpleTripAgent()
+        prompt = agent._generate_system_prompt(context={"map_markers": [{"name": "天安门"}]})
+        static = get_prompt("simple-trip").static
+        assert prompt.startswith(static) and "天安门" in prompt[len(static):]
+        assert agent._generate_system_prompt("自定义提示词") == "自定义提示词"
+
+
+class UsageLLMService:
+    """返回usage的模拟LLM服务"""
+
+    def __init__(self, usage):
+        self.api_key = "test-key"
+        self.model = "fake-model"
+        self.usage = usage
+
+    async def stream_chat_completion(self, messages, tools=None, **kwargs):
+        yield '{"choices": [{"delta": {"content": "你好"}}]}'
+        yield '{"choices": [{"delta": {}, "finish_reason": "stop"}], "usage": %s}' % self.usage
+
+    async def chat_completion(self, messages, stream=False, tools=None, **kwargs):
+        return {"choices": [{"message": {"content": "ok"}}], "usage": json.loads(self.usage)}
+
+
+def _hit_tokens(agent):
+    return REGISTRY.get_sample_value(
+        "llm_prompt_tokens_total", {"provider": "deepseek", "agent": agent, "cache": "hit"}
+    ) or 0
+
+
+class TestPromptCacheUsage:
+    """前缀缓存命中token统计"""
+
+    def test_usage_formats(self):
+        assert prompt_cache_tokens({"prompt_tokens": 100, "prompt_cache_hit_tokens": 64, "prompt_cache_miss_tokens": 36}) == (64, 36)
+        assert prompt_cache_tokens({"prompt_tokens": 100, "prompt_tokens_details": {"cached_tokens": 80}}) == (80, 20)
+        assert prompt_cache_tokens({"prompt_tokens": 100}) == (0, 100)
+        assert prompt_cache_tokens(None) is None
+
+    async def test_completion_usage_recorded(self):
+        service = UsageLLMService('{"prompt_tokens": 1000, "prompt_cache_hit_tokens": 896, "prompt_cache_miss_tokens": 104}')
+        router = LLMRouter([LLMProvider("deepseek", service)])
+        before = _hit_tokens("usage-complete")
+
+        await router.complete([{"role": "user", "content": "hi"}], agent_id="usage-complete")
+
+        assert _hit_tokens("usage-complete") == before + 896
+        stats = router.stats()["providers"]["deepseek"]
+        assert stats["prompt_cache_hit_tokens"] == 896 and stats["prompt_cache_hit_ratio"] == 0.896
+
+    async def test_stream_usage_recorded_when_caller_stops_early(self):
+        service = UsageLLMService('{"prompt_tokens": 200, "prompt_cache_hit_tokens": 128, "prompt_cache_miss_tokens": 72}')
+        router = LLMRouter([LLMProvider("deepseek", service)])
+        before = _hit_tokens("usage-stream")
+
+        # 与Agent一致：收到finish_reason后直接break
+        stream = router.stream([{"role": "user", "content": "hi"}], agent_id="usage-stream")
+        async for chunk in stream:
+            if "finish_reason" in chunk:
+                break
+        await stream.aclose()
+
+        assert _hit_tokens("usage-stream") == before + 128
+        assert router.stats()["providers"]["deepseek"]["prompt_tokens"] == 200
+
+
+class TestPromptAdminAPI:
+    """提示词版本接口"""
+
+    def test_list_prompts(self, client, admin_user):
+        headers = {"Authorization": f"Bearer {admin_user['access_token']}"}
+        response = client.get("/api/v1/admin/prompts", headers=headers)
+        assert response.status_code == 200
+        names = {p["name"] for p in response.json()}
+        assert {"trip-planning", "expense"} <= names
@@ -0,0 +1,132 @@
+"""
+熔断器与对冲请求测试
+"""
+
+import time
+
+import pytest
+
+from app.utils.resilience import CircuitBreaker, CircuitOpenError, Hedger
+
+
+def _fail():
+    raise ConnectionError("upstream down")
+
+
+class TestCircuitBreaker:
+    """熔断器状态转换测试"""
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker("test", failure_threshold=3, recovery_timeout=60)
+        for _ in range(3):
+            with pytest.raises(ConnectionError):
+                breaker.call(_fail)
+
+        assert breaker.state == CircuitBreaker.OPEN
+        # 打开后快速失败，不再调用上游
+        with pytest.raises(CircuitOpenError):
+            breaker.call(lambda: "ok")
+        assert breaker.snapshot()["total_rejected"] == 1
+
+    def test_success_resets_failure_count(self):
+        breaker = CircuitBreaker("test", failure_threshold=2, recovery_timeout=60)
+        with pytest.raises(ConnectionError):
+            breaker.call(_fail)
+        assert breaker.call(lambda: "ok") == "ok"
+        with pytest.raises(ConnectionError):
+            breaker.call(_fail)
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_half_open_probe_closes_on_success(self):
+        breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=0.05)
+        with pytest.raises(ConnectionError):
+            breaker.call(_fail)
+        assert breaker.state == CircuitBreaker.OPEN
+
+        time.sleep(0.06)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.call(lambda: "ok") == "ok"
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_half_open_probe_failure_reopens(self):
+        breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=0.05)
+        with pytest.raises(ConnectionError):
+            breaker.call(_fail)
+        time.sleep(0.06)
+        with pytest.raises(ConnectionError):
+            breaker.call(_fail)
+        assert breaker.state == CircuitBreaker.OPEN
+        assert breaker.snapshot()["times_opened"] == 2
+
+    async def test_async_call(self):
+        breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=60)
+
+        async def failing():
+            raise TimeoutError("slow")
+
+        with pytest.raises(TimeoutError):
+            await breaker.call_async(failing)
+        with pytest.raises(CircuitOpenError):
+            await breaker.call_async(failing)
+
+
+class TestHedger:
+    """对冲请求测试"""
+
+    def test_fast_primary_is_not_hedged(self):
+        hedger = Hedger("test", min_delay=0.05, max_delay=0.05)
+        assert hedger.call(lambda: "fast") == "fast"
+        assert hedger.stats()["hedges_sent"] == 0
+
+    def test_slow_primary_triggers_backup(self):
+        hedger = Hedger("test", min_delay=0.02, max_delay=0.02)
+        calls = []
+
+        def upstream():
+            calls.append(1)
+            # 第一次调用很慢，备份请求很快返回
+            if len(calls) == 1:
+                time.sleep(0.5)
+                return "slow"
+            return "backup"
+
+        start = time.monotonic()
+        assert hedger.call(upstream) == "backup"
+        assert time.monotonic() - start < 0.4
+        stats = hedger.stats()
+        assert stats["hedges_sent"] == 1
+        assert stats["hedge_wins"] == 1
+
+    def test_delay_follows_p95_within_bounds(self):
+        hedger = Hedger("test", min_delay=0.1, max_delay=1.0, min_samples=5)
+        assert hedger.hedge_delay() == 1.0
+        for _ in range(10):
+            hedger.latency.record(0.3)
+        assert hedger.hedge_delay() == pytest.approx(0.3)
+        for _ in range(10):
+            hedger.latency.record(5.0)
+        assert hedger.hedge_delay() == 1.0
+
+
+class TestResilienceAdminAPI:
+    """运维接口测试"""
+
+    def test_get_resilience_status(self, client, admin_user):
+        headers = {"Authorization": f"Bearer {admin_user['access_token']}"}
+        response = client.get("/api/v1/admin/resilience", headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert "baidu_map" in data["breakers"]
+        assert "deepseek" in data["breakers"]
+        assert "xunfei" in data["breakers"]
+
+    def test_reset_unknown_breaker(self, client, admin_user):
+        headers = {"Authorization": f"Bearer {admin_user['access_token']}"}
+        response = client.post("/api/v1/admin/resilience/breakers/unknown/reset", headers=headers)
+        assert response.status_code == 404
+
+    def test_non_admin_forbidden(self, client, registered_user):
+        headers = {"Authorization": f"Bearer {registered_user['access_token']}"}
+        assert client.get("/api/v1/admin/resilience", headers=headers).status_code == 403
+        response = client.post("/api/v1/admin/resilience/breakers/baidu_map/reset", headers=headers)
+        assert response.status_code == 403
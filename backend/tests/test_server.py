@@ -0,0 +1,130 @@
+"""
+多进程启动与停机排空测试
+"""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import lifecycle
+from app.core.config import settings
+from app.core.lifecycle import drain_sse_stream
+
+server = pytest.importorskip("app.core.server", reason="gunicorn 未安装")
+
+
+@pytest.fixture
+def draining(monkeypatch):
+    """进入排空状态，测试结束后恢复"""
+    monkeypatch.setattr(lifecycle, "_drain_deadline", None)
+
+    def start(timeout=0.0):
+        lifecycle.begin_drain(timeout)
+
+    return start
+
+
+class TestWorkerCount:
+    """worker数量"""
+
+    def test_cgroup_v2_quota(self, tmp_path):
+        (tmp_path / "cpu.max").write_text("250000 100000\n")
+        assert server.cgroup_cpu_quota(str(tmp_path)) == 2.5
+        (tmp_path / "cpu.max").write_text("max 100000\n")
+        assert server.cgroup_cpu_quota(str(tmp_path)) is None
+
+    def test_cgroup_v1_quota(self, tmp_path):
+        (tmp_path / "cpu").mkdir()
+        (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("150000")
+        (tmp_path / "cpu" / "cpu.cfs_period_us").write_text("100000")
+        assert server.cgroup_cpu_quota(str(tmp_path)) == 1.5
+
+    def test_available_cpus_capped_by_quota(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(server.os, "sched_getaffinity", lambda pid: set(range(8)))
+        assert server.available_cpus(str(tmp_path)) == 8
+        (tmp_path / "cpu.max").write_text("150000 100000")
+        assert server.available_cpus(str(tmp_path)) == 2
+
+    def test_web_concurrency_override(self, monkeypatch):
+        monkeypatch.setattr(settings, "WEB_CONCURRENCY", 3)
+        assert server.default_workers() == 3
+
+
+class TestHooks:
+    """gunicorn钩子"""
+
+    def test_worker_ids_reuse_lowest_free_slot(self, monkeypatch):
+        monkeypatch.delenv(server.WORKER_ID_ENV, raising=False)
+        arbiter = SimpleNamespace(WORKERS={})
+        workers = []
+        for pid in range(3):
+            worker = SimpleNamespace()
+            server.pre_fork(arbiter, worker)
+            arbiter.WORKERS[pid] = worker
+            workers.append(worker)
+        assert [w.app_worker_id for w in workers] == [0, 1, 2]
+
+        # worker 1 退出后重启的worker复用编号1
+        del arbiter.WORKERS[1]
+        replacement = SimpleNamespace()
+        server.pre_fork(arbiter, replacement)
+        assert replacement.app_worker_id == 1
+        assert server.os.environ[server.WORKER_ID_ENV] == "1"
+
+    def test_post_fork_disposes_engine(self, monkeypatch):
+        from app.core.database import engine
+
+        calls = []
+        monkeypatch.setattr(type(engine), "dispose", lambda self, close=True: calls.append(close))
+        log = SimpleNamespace(info=lambda message: None)
+        server.post_fork(SimpleNamespace(log=log), SimpleNamespace(app_worker_id=0, pid=123))
+        assert calls == [False]
+
+
+async def _events(stream):
+    return [event async for event in stream]
+
+
+class TestDrain:
+    """停机排空"""
+
+    async def test_stream_passes_through_when_not_draining(self, draining):
+        async def source():
+            for i in range(3):
+                yield f"data: {i}\n\n"
+
+        assert await _events(drain_sse_stream(source(), "run_1")) == [f"data: {i}\n\n" for i in range(3)]
+
+    async def test_stream_ends_after_drain_deadline(self, draining):
+        closed = []
+
+        async def source():
+            try:
+                yield "data: 0\n\n"
+                draining(0.0)
+                yield "data: 1\n\n"
+                yield "data: 2\n\n"
+            finally:
+                closed.append(True)
+
+        events = await _events(drain_sse_stream(source(), "run_1"))
+        assert events[:2] == ["data: 0\n\n", "data: 1\n\n"]
+        final = json.loads(events[-1].split("data: ", 1)[1])["data"]
+        assert final["runId"] == "run_1" and final["code"] == "SERVER_SHUTDOWN"
+        assert len(events) == 3 and closed == [True]
+
+    async def test_server_shutdown_begins_drain(self, draining):
+        from uvicorn.config import Config
+
+        uvicorn_server = server.DrainingServer(Config(app=None))
+        uvicorn_server.servers = []
+        uvicorn_server.force_exit = True
+        await uvicorn_server.shutdown()
+        assert lifecycle.is_draining()
+
+    def test_ready_reports_draining(self, client, draining):
+        assert client.get("/ready").status_code == 200
+        draining(10.0)
+        response = client.get("/ready")
+        assert response.status_code == 503 and response.json()["status"] == "draining"
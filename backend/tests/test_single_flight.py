@@ -0,0 +1,185 @@
+"""
+单飞请求合并测试
+"""
+
+import asyncio
+import threading
+import time
+
+from app.utils.single_flight import SingleFlight, AsyncSingleFlight
+
+
+class TestSingleFlight:
+    """线程版合并器测试"""
+
+    def test_concurrent_identical_calls_share_one_upstream(self):
+        """并发的相同请求只调用一次上游"""
+        flight = SingleFlight("test")
+        calls = []
+
+        def upstream(address):
+            calls.append(address)
+            time.sleep(0.2)
+            return {"lat": 39.9, "lng": 116.4}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(flight.do("北京", upstream, "北京")))
+            for _ in range(5)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(calls) == 1
+        assert len(results) == 5
+        assert all(r == {"lat": 39.9, "lng": 116.4} for r in results)
+        stats = flight.stats()
+        assert stats["upstream_calls"] == 1
+        assert stats["coalesced_calls"] == 4
+        assert stats["in_flight"] == 0
+
+    def test_followers_get_independent_copies(self):
+        """跟随者拿到的结果与领导者互不影响"""
+        flight = SingleFlight("test")
+        started = threading.Event()
+
+        def upstream():
+            started.set()
+            time.sleep(0.1)
+            return {"pois": []}
+
+        leader_result = []
+        follower_result = []
+        leader = threading.Thread(target=lambda: leader_result.append(flight.do("k", upstream)))
+        leader.start()
+        started.wait()
+        follower = threading.Thread(target=lambda: follower_result.append(flight.do("k", upstream)))
+        follower.start()
+        leader.join()
+        follower.join()
+
+        follower_result[0]["pois"].append("x")
+        assert leader_result[0]["pois"] == []
+        assert flight.stats()["coalesced_calls"] == 1
+
+    def test_leader_gets_copy_when_shared(self):
+        """有跟随者时领导者也拿拷贝，上游返回的对象不会被任何调用方修改"""
+        flight = SingleFlight("test")
+        started = threading.Event()
+        upstream_result = {"pois": []}
+
+        def upstream():
+            started.set()
+            time.sleep(0.1)
+            return upstream_result
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do("k", upstream)))
+        leader.start()
+        started.wait()
+        follower = threading.Thread(target=lambda: results.append(flight.do("k", upstream)))
+        follower.start()
+        leader.join()
+        follower.join()
+
+        assert all(r is not upstream_result for r in results)
+        # 没有跟随者时直接返回，不额外拷贝
+        assert flight.do("k", lambda: upstream_result) is upstream_result
+
+    def test_sequential_calls_are_not_coalesced(self):
+        """非并发的调用各自访问上游"""
+        flight = SingleFlight("test")
+        assert flight.do("k", lambda: 1) == 1
+        assert flight.do("k", lambda: 2) == 2
+        assert flight.stats()["coalesced_calls"] == 0
+
+    def test_error_propagates_to_all_callers(self):
+        """上游异常会传递给所有等待者"""
+        flight = SingleFlight("test")
+
+        def upstream():
+            time.sleep(0.1)
+            raise RuntimeError("upstream down")
+
+        errors = []
+
+        def call():
+            try:
+                flight.do("k", upstream)
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        threads = [threading.Thread(target=call) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert errors == ["upstream down"] * 3
+
+
+class TestAsyncSingleFlight:
+    """协程版合并器测试"""
+
+    async def test_concurrent_identical_calls_share_one_upstream(self):
+        flight = AsyncSingleFlight("test")
+        calls = 0
+
+        async def upstream():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return {"content": "ok", "tool_calls": None}
+
+        results = await asyncio.gather(*[flight.do("k", upstream) for _ in range(4)])
+
+        assert calls == 1
+        assert all(r["content"] == "ok" for r in results)
+        assert flight.stats()["coalesced_calls"] == 3
+
+    async def test_error_propagates(self):
+        flight = AsyncSingleFlight("test")
+
+        async def upstream():
+            await asyncio.sleep(0.01)
+            raise ValueError("bad")
+
+        results = await asyncio.gather(
+            flight.do("k", upstream), flight.do("k", upstream), return_exceptions=True
+        )
+        assert all(isinstance(r, ValueError) for r in results)
+
+
+class TestMapHealthMetrics:
+    """合并统计通过地图健康检查上报"""
+
+    def test_map_health_reports_single_flight(self, client):
+        response = client.get("/api/v1/map/health")
+        assert response.status_code == 200
+        data = response.json()
+        assert "baidu_geocode" in data["single_flight"]
+        assert "baidu_search_poi" in data["single_flight"]
+
+    async def test_leader_cancellation_does_not_fail_followers(self):
+        """领导者的请求被取消（客户端断开）时，跟随者仍然拿到结果"""
+        flight = AsyncSingleFlight("test")
+        calls = 0
+
+        async def upstream():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return {"content": "ok"}
+
+        leader = asyncio.create_task(flight.do("k", upstream))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("k", upstream))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+
+        assert await follower == {"content": "ok"}
+        assert leader.cancelled()
+        assert calls == 1
+        assert flight.stats()["in_flight"] == 0
@@ -0,0 +1,63 @@
+"""
+冷启动测试：懒加载的Agent注册表、启动导入范围与就绪检查
+"""
+
+import json
+import subprocess
+import sys
+
+from benchmarks.import_time import LAZY_MODULES, parse_importtime
+from app.services.agent_service import AgentService
+
+
+class TestLazyImports:
+    """导入 app.main 不加载重量级模块"""
+
+    def test_lazy_modules_not_imported(self):
+        code = (
+            "import json, sys, app.main; "
+            f"print(json.dumps([name for name in {list(LAZY_MODULES)!r} if name in sys.modules]))"
+        )
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        assert json.loads(result.stdout.strip().splitlines()[-1]) == []
+
+    def test_parse_importtime(self):
+        stderr = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   json.decoder\n"
+            "import time:      2000 |       2120 | app.main\n"
+        )
+        assert parse_importtime(stderr) == {"json.decoder": (120, 120), "app.main": (2000, 2120)}
+
+
+class TestAgentRegistry:
+    """Agent在首次使用时实例化"""
+
+    def test_instantiated_on_first_use(self):
+        service = AgentService()
+        assert service.get_available_agents()["trip-planner"] == "行程规划助手"
+        assert service.get_agent_info("budget-analyzer")["agentName"] == "费用分析助手"
+        assert service.agents == {}
+
+        agent = service.get_agent("chat-assistant")
+        assert agent.agent_id == "chat-assistant"
+        assert service.get_agent("chat-assistant") is agent
+        assert list(service.agents) == ["chat-assistant"]
+        assert service.get_agent("missing") is None and service.get_agent_info("missing") is None
+
+    def test_registry_names_match_agents(self):
+        service = AgentService()
+        service.warm_up()
+        for agent_id, spec in service.registry.items():
+            assert service.agents[agent_id].agent_name == spec.name
+
+
+class TestReadiness:
+    """就绪检查"""
+
+    def test_ready_after_startup(self, client):
+        response = client.get("/ready")
+        assert response.status_code == 200
+        body = response.json()
+        assert body["status"] == "ready"
+        assert 0 < body["import_seconds"] <= body["startup_seconds"]
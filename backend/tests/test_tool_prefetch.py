@@ -0,0 +1,130 @@
+"""
+推测性工具预取测试
+"""
+
+import asyncio
+import json
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.agents.trip_planner_agent import TripPlannerAgent
+from app.core.config import settings
+from app.utils.prefetch import SpeculativePrefetch
+
+
+def _count(outcome, agent="trip-planner", tool="search_poi"):
+    return REGISTRY.get_sample_value(
+        "tool_prefetch_total", {"agent": agent, "tool": tool, "outcome": outcome}
+    ) or 0
+
+
+class FakeLLMService:
+    """第一次调用可以请求工具，补充回复固定为一段文本"""
+
+    def __init__(self, tool_call=None, content="好的"):
+        self.tool_call = tool_call
+        self.content = content
+
+    async def stream_llm_response_with_tools(self, user_input, system_prompt, history, tools, agent_id=None):
+        if self.tool_call:
+            name, arguments = self.tool_call
+            yield json.dumps({"choices": [{"delta": {"tool_calls": [{
+                "id": "call_1", "type": "function",
+                "function": {"name": name, "arguments": json.dumps(arguments, ensure_ascii=False)}
+            }]}}]})
+        yield json.dumps({"choices": [{"delta": {"content": self.content}, "finish_reason": "stop"}]})
+
+    async def stream_llm_response(self, user_input, system_prompt, history, agent_id=None):
+        yield json.dumps({"choices": [{"delta": {"content": "补充"}, "finish_reason": "stop"}]})
+
+
+@pytest.fixture
+def poi_calls(monkeypatch):
+    calls = []
+
+    def fake_search_poi(keyword, city, category):
+        calls.append((keyword, city, category))
+        return {"success": True, "data": {"pois": [keyword]}}
+
+    monkeypatch.setattr("app.agents.trip_planner_agent.baidu_map_tools.search_poi", fake_search_poi)
+    return calls
+
+
+async def _run(monkeypatch, user_input, llm):
+    monkeypatch.setattr("app.agents.trip_planner_agent.llm_service_instance", llm)
+    # SSE格式："event: ...\ndata: {...}\n"
+    return [json.loads(event.split("data: ", 1)[1])
+            async for event in TripPlannerAgent().run(user_input, run_id="run-1")]
+
+
+class TestSpeculativePrefetch:
+    """预取的复用与丢弃"""
+
+    async def test_take_matching_arguments_only(self):
+        prefetch = SpeculativePrefetch("test-prefetch")
+        assert prefetch.start("lookup", {"q": "故宫"}, lambda args: {"q": args["q"]})
+        assert not prefetch.start("lookup", {"q": "故宫"}, lambda args: None)
+
+        assert await prefetch.take("lookup", {"q": "天坛"}) is None
+        assert await prefetch.take("lookup", {"q": "故宫"}) == {"q": "故宫"}
+        assert await prefetch.take("lookup", {"q": "故宫"}) is None
+        assert _count("hit", "test-prefetch", "lookup") == 1
+
+    async def test_failed_prefetch_falls_back(self):
+        def fail(arguments):
+            raise RuntimeError("upstream")
+
+        prefetch = SpeculativePrefetch("test-prefetch-error")
+        prefetch.start("lookup", {"q": "x"}, fail)
+        assert await prefetch.take("lookup", {"q": "x"}) is None
+        assert _count("error", "test-prefetch-error", "lookup") == 1
+
+    async def test_discard_counts_waste(self):
+        prefetch = SpeculativePrefetch("test-prefetch-waste")
+        prefetch.start("lookup", {"q": "x"}, lambda args: None)
+        prefetch.discard()
+        await asyncio.sleep(0)
+        assert await prefetch.take("lookup", {"q": "x"}) is None
+        assert _count("waste", "test-prefetch-waste", "lookup") == 1
+
+    async def test_disabled(self, monkeypatch):
+        monkeypatch.setattr(settings, "TOOL_PREFETCH_ENABLED", False)
+        assert not SpeculativePrefetch("test-prefetch-off").start("lookup", {"q": "x"}, lambda args: None)
+
+
+class TestTripPlannerPrefetch:
+    """行程规划Agent在请求开始时预取POI搜索"""
+
+    async def test_model_tool_call_reuses_prefetch(self, monkeypatch, poi_calls):
+        hits = _count("hit")
+        llm = FakeLLMService(tool_call=("search_poi", {"keyword": "推荐美食餐厅", "city": "成都", "category": "restaurant"}))
+        events = await _run(monkeypatch, "成都推荐美食餐厅", llm)
+
+        # 模型的工具调用命中预取，随后的关键词工具步骤正常再查一次
+        assert poi_calls == [("推荐美食餐厅", "成都", "restaurant")] * 2
+        assert _count("hit") == hits + 1
+        results = [e for e in events if e.get("type") == "TOOL_CALL_RESULT"]
+        assert results and '"pois"' in json.dumps(results[0], ensure_ascii=False)
+
+    async def test_keyword_tool_step_reuses_prefetch(self, monkeypatch, poi_calls):
+        hits, waste = _count("hit"), _count("waste")
+        await _run(monkeypatch, "成都推荐美食餐厅", FakeLLMService())
+
+        assert poi_calls == [("推荐美食餐厅", "成都", "restaurant")]
+        assert (_count("hit"), _count("waste")) == (hits + 1, waste)
+
+    async def test_unused_prefetch_discarded(self, monkeypatch, poi_calls):
+        waste = _count("waste")
+        llm = FakeLLMService(tool_call=("search_poi", {"keyword": "宽窄巷子", "city": "成都"}))
+        # 关键词工具步骤之前出错，预取结果没有被用到
+        monkeypatch.setattr(TripPlannerAgent, "_should_call_tools", lambda self, user_input, response: 1 / 0)
+        await _run(monkeypatch, "成都推荐美食餐厅", llm)
+
+        assert ("宽窄巷子", "成都", "attraction") in poi_calls
+        assert _count("waste") == waste + 1
+
+    async def test_no_prefetch_without_poi_intent(self, monkeypatch, poi_calls):
+        started = _count("started")
+        await _run(monkeypatch, "随便聊聊", FakeLLMService())
+        assert poi_calls == [] and _count("started") == started
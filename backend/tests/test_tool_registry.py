@@ -0,0 +1,194 @@
+"""
+声明式工具注册表测试
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from app.services.expense_ai_service import EXPENSE_TOOLS, ExpenseAIService
+from app.utils.tool_definitions import AGENT_TOOLS, get_all_tools
+from app.utils.tool_executor import ToolExecutor
+from app.utils.tool_registry import (
+    ToolDispatcher,
+    ToolSet,
+    ToolSpec,
+    ToolTimeoutError,
+    UnknownToolError,
+    clear_tool_caches,
+)
+
+PARAMS = {"type": "object", "properties": {"q": {"type": "string", "description": "关键词"}}, "required": ["q"]}
+
+
+def _spec(name="lookup", **policy):
+    return ToolSpec(name=name, description="测试工具", parameters=PARAMS, **policy)
+
+
+@pytest.fixture(autouse=True)
+def _clear_caches():
+    clear_tool_caches()
+    yield
+    clear_tool_caches()
+
+
+class TestToolSpec:
+    """声明校验"""
+
+    def test_schema_built_once(self):
+        spec = _spec()
+        assert spec.schema == {
+            "type": "function",
+            "function": {"name": "lookup", "description": "测试工具", "parameters": PARAMS}
+        }
+
+    @pytest.mark.parametrize("kwargs", [
+        {"name": "bad name"},
+        {"parameters": {"type": "object", "properties": {}, "required": ["q"]}},
+        {"parameters": {"type": "object", "properties": {"q": {"type": "str"}}}},
+        {"parameters": {"type": "array"}},
+        {"cache_ttl": 60},
+        {"timeout": 0},
+    ])
+    def test_invalid_specs_rejected(self, kwargs):
+        base = {"name": "lookup", "description": "测试工具", "parameters": PARAMS}
+        with pytest.raises(ValueError):
+            ToolSpec(**{**base, **kwargs})
+
+    def test_duplicate_tool_rejected(self):
+        with pytest.raises(ValueError):
+            ToolSet("test", [_spec(), _spec()])
+
+    def test_agent_tools_shared_across_requests(self):
+        assert get_all_tools() is get_all_tools() is AGENT_TOOLS.tools
+        assert [t["function"]["name"] for t in get_all_tools()][:3] == ["search_poi", "calculate_route", "mark_location"]
+        assert '"search_poi"' in get_all_tools().json
+
+
+class TestToolDispatcher:
+    """分发与执行策略"""
+
+    async def test_dispatch_passes_context(self):
+        async def handler(arguments, user_id):
+            return {"success": True, "q": arguments["q"], "user": user_id}
+
+        dispatcher = ToolDispatcher(ToolSet("test", [_spec()]), {"lookup": handler}, source="test")
+        assert await dispatcher.dispatch("lookup", {"q": "故宫"}, "user-1") == {"success": True, "q": "故宫", "user": "user-1"}
+        with pytest.raises(UnknownToolError):
+            await dispatcher.dispatch("missing", {})
+
+    def test_handler_for_undeclared_tool_rejected(self):
+        with pytest.raises(ValueError):
+            ToolDispatcher(ToolSet("test", [_spec()]), {"other": None}, source="test")
+
+    async def test_timeout(self):
+        async def slow(arguments):
+            await asyncio.sleep(1)
+
+        dispatcher = ToolDispatcher(ToolSet("test", [_spec(timeout=0.01)]), {"lookup": slow}, source="test")
+        with pytest.raises(ToolTimeoutError):
+            await dispatcher.dispatch("lookup", {"q": "x"})
+
+    async def test_concurrency_limit(self):
+        running = peak = 0
+
+        async def handler(arguments):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return {"success": True}
+
+        dispatcher = ToolDispatcher(
+            ToolSet("test-limit", [_spec(max_concurrency=2)]), {"lookup": handler}, source="test"
+        )
+        await asyncio.gather(*(dispatcher.dispatch("lookup", {"q": str(i)}) for i in range(6)))
+        assert peak == 2
+
+    async def test_idempotent_calls_coalesced_and_cached(self):
+        calls = []
+
+        async def handler(arguments):
+            calls.append(arguments["q"])
+            await asyncio.sleep(0.01)
+            return {"success": True, "data": {"pois": [arguments["q"]]}}
+
+        dispatcher = ToolDispatcher(
+            ToolSet("test-cache", [_spec(idempotent=True, cache_ttl=60)]), {"lookup": handler}, source="test"
+        )
+        first, second = await asyncio.gather(
+            dispatcher.dispatch("lookup", {"q": "故宫"}), dispatcher.dispatch("lookup", {"q": "故宫"})
+        )
+        assert first == second and calls == ["故宫"]
+
+        # 缓存返回副本，调用方修改结果不影响缓存
+        first["data"]["pois"].append("changed")
+        assert (await dispatcher.dispatch("lookup", {"q": "故宫"}))["data"]["pois"] == ["故宫"]
+        assert calls == ["故宫"]
+
+        await dispatcher.dispatch("lookup", {"q": "天坛"})
+        assert calls == ["故宫", "天坛"]
+
+    async def test_failures_not_cached(self):
+        calls = []
+
+        async def handler(arguments):
+            calls.append(1)
+            return {"success": False, "error": "upstream"}
+
+        dispatcher = ToolDispatcher(
+            ToolSet("test-fail", [_spec(idempotent=True, cache_ttl=60)]), {"lookup": handler}, source="test"
+        )
+        await dispatcher.dispatch("lookup", {"q": "x"})
+        await dispatcher.dispatch("lookup", {"q": "x"})
+        assert len(calls) == 2
+
+    async def test_non_idempotent_never_coalesced(self):
+        calls = []
+
+        async def handler(arguments):
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"success": True}
+
+        dispatcher = ToolDispatcher(ToolSet("test-write", [_spec()]), {"lookup": handler}, source="test")
+        await asyncio.gather(*(dispatcher.dispatch("lookup", {"q": "x"}) for _ in range(3)))
+        assert len(calls) == 3
+
+
+class TestToolConsumers:
+    """调用方保持原有的错误格式"""
+
+    async def test_tool_executor_unknown_tool(self, db_session):
+        result = await ToolExecutor(db_session, "user-1").execute_tool("missing_tool", {})
+        assert result == {"success": False, "error": "未知的工具: missing_tool"}
+
+    async def test_expense_service_unknown_tool(self, db_session):
+        with pytest.raises(Exception, match="执行失败：未知功能：missing_tool"):
+            await ExpenseAIService(db_session).execute_tool_call("missing_tool", {}, "user-1")
+
+    def test_expense_tools_offered_to_llm(self, db_session):
+        assert ExpenseAIService(db_session)._tools.tools is EXPENSE_TOOLS.tools
+
+    async def test_blocking_map_calls_run_off_loop(self, db_session, monkeypatch):
+        calls = []
+
+        def slow_search_poi(keyword, city, category):
+            calls.append(keyword)
+            time.sleep(0.2)
+            return {"success": True, "data": {"pois": [keyword]}}
+
+        monkeypatch.setattr("app.utils.tool_executor.baidu_map_tools.search_poi", slow_search_poi)
+        executor = ToolExecutor(db_session, "user-1")
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            executor.execute_tool("search_poi", {"keyword": "故宫"}),
+            executor.execute_tool("search_poi", {"keyword": "故宫"}),
+            executor.execute_tool("search_poi", {"keyword": "天坛"}),
+        )
+        # 不同参数的调用并行执行，相同参数的并发调用合并为一次上游请求
+        assert time.perf_counter() - started < 0.35
+        assert sorted(calls) == ["天坛", "故宫"]
+        assert [r["data"]["pois"] for r in results] == [["故宫"], ["故宫"], ["天坛"]]
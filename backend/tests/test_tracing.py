@@ -0,0 +1,98 @@
+"""
+端到端追踪测试
+"""
+
+import json
+
+from sqlalchemy import text
+
+from app.agents.base_agent import BaseAgent
+from app.core.config import Settings, settings
+from app.core.metrics import observe_tool
+from app.core.tracing import tracer
+from app.services.agent_service import agent_service
+
+
+class FakeToolAgent(BaseAgent):
+    """执行一次工具调用和一次SQL查询的模拟Agent"""
+
+    def __init__(self, db):
+        super().__init__(agent_id="fake-agent", agent_name="模拟Agent")
+        self.db = db
+
+    async def run(self, user_input, system_prompt=None, history=None, run_id=None, context=None):
+        yield self._create_run_started_event(run_id)
+
+        async def lookup():
+            self.db.execute(text("SELECT 1"))
+            return {"success": True, "data": {}}
+
+        result = await observe_tool("search_poi", self.agent_id, lookup())
+        yield self._create_tool_call_result_event("call_1", result)
+        yield self._create_run_finished_event(run_id)
+
+
+class TestTracing:
+    """trace 收集测试"""
+
+    async def test_agent_run_records_nested_spans(self, db_session, monkeypatch, tmp_path):
+        export_file = tmp_path / "traces.jsonl"
+        monkeypatch.setattr(settings, "TRACE_EXPORT_FILE", str(export_file))
+        monkeypatch.setitem(agent_service.agents, "fake-agent", FakeToolAgent(db_session))
+
+        events = [e async for e in agent_service.run_agent("fake-agent", "你好", run_id="run_trace01")]
+        assert len(events) == 3
+
+        trace = tracer.get_trace("run_trace01")
+        assert trace is not None
+        waterfall = trace.waterfall()
+        spans = {span["name"]: span for span in waterfall["spans"]}
+        assert spans["agent.fake-agent"]["depth"] == 0
+        assert spans["tool.search_poi"]["depth"] == 1
+        assert spans["db.query"]["depth"] == 2
+        assert spans["db.query"]["parent_id"] == spans["tool.search_poi"]["span_id"]
+
+        # 等待后台导出完成
+        tracer._writer.submit(lambda: None).result()
+        exported = json.loads(export_file.read_text(encoding="utf-8").strip())
+        exported_spans = exported["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert {s["traceId"] for s in exported_spans} == {trace.trace_id}
+
+    def test_file_export_is_opt_in(self):
+        # span中含工具参数与SQL语句，默认不写入磁盘
+        assert Settings.model_fields["TRACE_EXPORT_FILE"].default == ""
+
+    def test_spans_outside_run_are_ignored(self):
+        with tracer.span("orphan") as span:
+            assert span is None
+
+
+class TestTraceAdminAPI:
+    """瀑布图接口测试"""
+
+    async def test_waterfall_endpoint(self, client, admin_user, monkeypatch):
+        monkeypatch.setattr(settings, "TRACE_EXPORT_FILE", "")
+        trace = tracer.begin_run("run_trace02", "agent.test", agent_id="test")
+        with tracer.span("tool.calculate_route", kind="tool"):
+            pass
+        tracer.end_run(trace)
+
+        headers = {"Authorization": f"Bearer {admin_user['access_token']}"}
+        response = client.get("/api/v1/admin/traces", headers=headers)
+        assert response.status_code == 200
+        assert "run_trace02" in [t["run_id"] for t in response.json()["traces"]]
+
+        response = client.get("/api/v1/admin/traces/run_trace02", headers=headers)
+        assert response.status_code == 200
+        assert [s["name"] for s in response.json()["spans"]] == ["agent.test", "tool.calculate_route"]
+
+    def test_unknown_trace_returns_404(self, client, admin_user):
+        headers = {"Authorization": f"Bearer {admin_user['access_token']}"}
+        response = client.get("/api/v1/admin/traces/run_missing", headers=headers)
+        assert response.status_code == 404
+
+    def test_traces_require_admin(self, client, registered_user):
+        # trace 包含所有用户的工具参数和SQL语句，普通用户不能查看
+        headers = {"Authorization": f"Bearer {registered_user['access_token']}"}
+        assert client.get("/api/v1/admin/traces", headers=headers).status_code == 403
+        assert client.get("/api/v1/admin/traces/run_trace02", headers=headers).status_code == 403
@@ -0,0 +1,183 @@
+"""
+Agent transcript 记录与回放测试
+"""
+
+import json
+import time
+
+import pytest
+import requests
+
+from app.core.config import settings
+from app.core.transcript import (
+    TranscriptMissError,
+    TranscriptPlayer,
+    current_recorder,
+    replaying,
+    transcript_store,
+)
+from app.services.llm_router import LLMRouter, LLMProvider, llm_router
+from app.utils.baidu_map_tools import BaiduMapTools
+from app.utils.deepseek_llm import deepseek_llm_service
+
+
+CHUNKS = [
+    '{"choices": [{"delta": {"content": "推荐"}}]}',
+    '{"choices": [{"delta": {"content": "故宫"}, "finish_reason": "stop"}]}',
+]
+
+
+class FakeLLMService:
+    """模拟OpenAI兼容的LLM服务"""
+
+    def __init__(self):
+        self.api_key = "test-key"
+        self.model = "fake-model"
+
+    async def stream_chat_completion(self, messages, tools=None, **kwargs):
+        for chunk in CHUNKS:
+            yield chunk
+
+    async def chat_completion(self, messages, stream=False, tools=None, **kwargs):
+        return {"choices": [{"message": {"content": "ok"}}]}
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {"content-type": "application/json"}
+    text = json.dumps({"status": 0, "result": {"location": {"lat": 39.9163, "lng": 116.3972}}})
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def _transcript(events):
+    return {"version": 1, "run_id": "run_test", "agent_id": "trip-planner", "inputs": {}, "events": events}
+
+
+@pytest.fixture
+def recording(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "TRANSCRIPT_RECORD_ENABLED", True)
+    monkeypatch.setattr(settings, "TRANSCRIPT_DIR", str(tmp_path))
+    recorder = transcript_store.begin_recording("run_rec", "trip-planner", user_input="去北京")
+    yield recorder
+    transcript_store.end_recording(recorder)
+
+
+class TestTranscriptRecording:
+    """记录测试"""
+
+    async def test_records_llm_chunks_and_http_without_secrets(self, recording, monkeypatch, tmp_path):
+        router = LLMRouter([LLMProvider("deepseek", FakeLLMService())])
+        chunks = [chunk async for chunk in router.stream([{"role": "user", "content": "hi"}])]
+        assert chunks == CHUNKS
+
+        monkeypatch.setattr(requests, "get", lambda url, params, timeout: FakeResponse())
+        tools = BaiduMapTools()
+        assert tools.geocode("北京故宫") == {"lat": 39.9163, "lng": 116.3972}
+
+        transcript_store.end_recording(recording)
+        transcript_store.flush()
+        assert current_recorder() is None
+
+        with open(tmp_path / "run_rec.json", encoding="utf-8") as f:
+            data = json.load(f)
+        assert data["inputs"]["user_input"] == "去北京"
+        stream, http = data["events"]
+        assert stream["type"] == "llm_stream"
+        assert stream["provider"] == "deepseek"
+        assert [c[1] for c in stream["chunks"]] == CHUNKS
+        assert http["endpoint"] == "/geocoding/v3/"
+        assert "ak" not in http["params"]
+        assert json.loads(http["body"])["status"] == 0
+
+    async def test_consumer_break_keeps_received_chunks(self, recording):
+        router = LLMRouter([LLMProvider("deepseek", FakeLLMService())])
+        generator = router.stream([{"role": "user", "content": "hi"}])
+        async for chunk in generator:
+            break
+        await generator.aclose()
+
+        stream = recording.to_dict()["events"][0]
+        assert [c[1] for c in stream["chunks"]] == CHUNKS[:1]
+        # 提前关闭仍按成功计入TTFT统计
+        assert router.providers["deepseek"].stats.ttft.count() == 1
+
+    def test_disabled_by_default(self):
+        assert settings.TRANSCRIPT_RECORD_ENABLED is False
+        assert transcript_store.begin_recording("run_x", "trip-planner") is None
+
+
+class TestTranscriptReplay:
+    """回放测试"""
+
+    async def test_replays_stream_through_deepseek_without_api_key(self, monkeypatch):
+        monkeypatch.setattr(deepseek_llm_service, "api_key", "")
+        transcript = _transcript([
+            {"type": "llm_stream", "provider": "aliyun", "chunks": [[0.01, CHUNKS[0]], [0.02, CHUNKS[1]]], "error": None}
+        ])
+        with replaying(transcript, speed=0) as player:
+            # 回放时路由固定走DeepSeek
+            assert [p.name for p in llm_router.select("trip-planner")] == ["deepseek"]
+            chunks = [chunk async for chunk in llm_router.stream([{"role": "user", "content": "hi"}])]
+        assert chunks == CHUNKS
+        assert player.stats()["remaining"] == 0
+
+    async def test_replays_completion(self):
+        result = {"choices": [{"message": {"content": "好的"}}]}
+        transcript = _transcript([
+            {"type": "llm_completion", "provider": "deepseek", "duration": 1.0, "result": result, "error": None}
+        ])
+        with replaying(transcript, speed=0):
+            assert await deepseek_llm_service.chat_completion([{"role": "user", "content": "hi"}]) == result
+
+    async def test_compressed_timing(self):
+        transcript = _transcript([
+            {"type": "llm_stream", "provider": "deepseek", "chunks": [[0.2, CHUNKS[0]], [0.4, CHUNKS[1]]], "error": None}
+        ])
+        start = time.monotonic()
+        with replaying(transcript, speed=4):
+            chunks = [chunk async for chunk in deepseek_llm_service.stream_chat_completion([])]
+        elapsed = time.monotonic() - start
+        assert chunks == CHUNKS
+        assert 0.08 <= elapsed < 0.3
+
+    async def test_replays_recorded_error(self):
+        transcript = _transcript([
+            {"type": "llm_stream", "provider": "deepseek", "chunks": [[0.0, CHUNKS[0]]], "error": "connection reset"}
+        ])
+        with replaying(transcript, speed=0):
+            generator = deepseek_llm_service.stream_chat_completion([])
+            assert await generator.__anext__() == CHUNKS[0]
+            with pytest.raises(Exception, match="connection reset"):
+                await generator.__anext__()
+
+    def test_replays_baidu_by_params(self, monkeypatch):
+        def no_network(*args, **kwargs):
+            raise AssertionError("回放时不应访问网络")
+
+        monkeypatch.setattr(requests, "get", no_network)
+        body = json.dumps({"status": 0, "result": {"location": {"lat": 31.2, "lng": 121.5}}})
+        transcript = _transcript([{
+            "type": "http", "service": "baidu_map", "endpoint": "/geocoding/v3/",
+            "params": {"address": "上海外滩", "output": "json"},
+            "duration": 0.1, "status_code": 200, "content_type": "application/json", "body": body, "error": None
+        }])
+        tools = BaiduMapTools()
+        with replaying(transcript, speed=0) as player:
+            assert tools.geocode("上海外滩") == {"lat": 31.2, "lng": 121.5}
+            # 没有记录的请求不会访问网络
+            assert tools.geocode("北京故宫") is None
+        assert player.missed == 1
+
+    def test_player_exhausted(self):
+        player = TranscriptPlayer(_transcript([]))
+        with pytest.raises(TranscriptMissError):
+            player.replay_http("baidu_map", "/geocoding/v3/", {"address": "x"})
+
+    def test_rejects_unknown_version(self):
+        with pytest.raises(ValueError):
+            TranscriptPlayer({"version": 99, "events": []})